@@ -0,0 +1,114 @@
+import pandas as pd
+
+
+class StreamingAggregator:
+    """
+    StreamingAggregator computes group-by aggregations over a stream of DataFrame chunks.
+
+    Each chunk is reduced to one partial row per group with vectorized groupby operations, and the partial rows are
+    combined once all chunks have been seen, so only the partial results are kept in memory. Groups may span chunk
+    boundaries. Means are computed from partial sums and counts.
+
+    The aggregations use the form {column: function} or {column: [functions]} with the functions 'sum', 'mean', 'min',
+    'max', 'count' (non-missing values) and 'size' (rows). With a single function the result column is named after
+    the column; with a list of functions it is named '<column>_<function>'.
+
+    Args:
+    aggregations (dict): The aggregations to compute.
+    by (list of str): The columns to group by.
+    combine_rows (int, optional): The number of partial rows above which the partial results are combined before
+    the end of the stream, bounding memory use for unsorted data. Defaults to 1000000.
+    """
+
+    functions = ["sum", "mean", "min", "max", "count", "size"]
+
+    # How the partial results of each function are combined
+    _combine = {"sum": "sum", "min": "min", "max": "max", "count": "sum", "size": "sum"}
+
+    def __init__(self, aggregations, by, combine_rows=1000000):
+        if not aggregations:
+            raise ValueError("No aggregations specified.")
+        self.by = list(by)
+        self.combine_rows = combine_rows
+        self.outputs = []
+        for column, functions in aggregations.items():
+            names = [functions] if isinstance(functions, str) else list(functions)
+            for function in names:
+                if function not in self.functions:
+                    raise ValueError(f"Unsupported aggregation: {function}. Use one of {self.functions}.")
+                output = column if isinstance(functions, str) else f"{column}_{function}"
+                self.outputs.append((output, column, function))
+
+        # The partial columns: means are split into a sum and a count
+        self._partials = {}
+        for output, column, function in self.outputs:
+            for partial_function in (["sum", "count"] if function == "mean" else [function]):
+                self._partials.setdefault((column, partial_function), f"{column}__{partial_function}")
+        self._results = []
+        self._rows = 0
+
+    @property
+    def columns(self):
+        """
+        list: The columns needed from the data, group columns first.
+        """
+        columns = list(self.by)
+        columns.extend(column for column, _ in self._partials if column not in columns)
+        return columns
+
+    def update(self, chunk):
+        """
+        Add a chunk of data.
+
+        Args:
+        chunk (pd.DataFrame): The chunk, containing the group and aggregated columns.
+        """
+        if chunk.empty:
+            return
+        grouped = chunk.groupby(self.by, sort=False)
+        partial = pd.DataFrame({name: getattr(grouped[column], function)()
+                                for (column, function), name in self._partials.items()})
+        self._results.append(partial)
+        self._rows += len(partial)
+        if self._rows > self.combine_rows and len(self._results) > 1:
+            self._results = [self._combined(sort=False)]
+            self._rows = len(self._results[0])
+
+    def merge(self, other):
+        """
+        Add the partial results of another aggregator with the same aggregations, e.g., of another partition.
+
+        Args:
+        other (StreamingAggregator): The other aggregator.
+        """
+        self._results.extend(other._results)
+        self._rows += other._rows
+
+    def _combined(self, sort=True):
+        partials = pd.concat(self._results)
+        if len(self._results) == 1 and not sort:
+            return partials
+        grouped = partials.groupby(level=list(range(len(self.by))), sort=sort)
+        return grouped.agg({name: self._combine[function] for (_, function), name in self._partials.items()})
+
+    def result(self):
+        """
+        Combine the partial results.
+
+        Returns:
+        pd.DataFrame: One row per group, with the group columns followed by the aggregated columns, sorted by the group columns.
+        """
+        if not self._results:
+            index = pd.MultiIndex.from_arrays([[] for _ in self.by], names=self.by)
+            partials = pd.DataFrame({name: pd.Series(dtype=float) for name in self._partials.values()},
+                                    index=index if len(self.by) > 1 else pd.Index([], name=self.by[0]))
+        else:
+            partials = self._combined()
+
+        data = {}
+        for output, column, function in self.outputs:
+            if function == "mean":
+                data[output] = partials[self._partials[(column, "sum")]] / partials[self._partials[(column, "count")]]
+            else:
+                data[output] = partials[self._partials[(column, function)]]
+        return pd.DataFrame(data, index=partials.index).reset_index()
@@ -0,0 +1,258 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+from .compression import get_codec, open_data_file
+from .download import download_file, file_sha256
+from .filelock import FileLock
+from .singleflight import SingleFlight
+
+
+class DataCache:
+    """
+    DataCache manages the NHANES data files stored in a local data directory.
+
+    Data files are stored as <data_directory>/<cycle_year>/<data_file_name>.XPT. Every completed download is
+    recorded with its size and SHA-256 checksum in a manifest file (manifest.json) in the data directory, so
+    interrupted runs can be resumed by skipping the files that are already cached. Partially downloaded files are
+    resumed with HTTP Range requests.
+
+    With a compression codec, data files are compressed once downloaded and stored as
+    <data_file_name>.XPT<extension> (e.g. DEMO_D.XPT.zst); readers decompress them on the fly with open(). The
+    manifest records the codec, the stored size and checksum, and the size and checksum of the original file. Files
+    stored with another codec (or uncompressed) stay valid when the codec is changed.
+
+    The data directory can be shared by several threads and processes, also across hosts on an NFS mount with lock
+    support. Writers take a file lock (<file>.XPT.lock, manifest.json.lock) and publish files with atomic renames,
+    so concurrent fetches of the same data file produce exactly one download and manifest updates are never lost.
+    Readers take no locks: they only ever see complete data files and manifests.
+
+    Args:
+    data_directory (str): The directory where data files and the manifest are stored.
+    retries (int, optional): The number of times a dropped download is resumed before giving up. Defaults to 5.
+    compression (str, optional): The codec used to store downloaded data files, one of compression.CODECS ('gzip', 'bz2', 'lzma', 'zstd', 'lz4'). Defaults to None, meaning uncompressed files.
+    """
+
+    manifest_name = "manifest.json"
+
+    def __init__(self, data_directory, retries=5, compression=None):
+        self.data_directory = data_directory
+        self.retries = retries
+        self.codec = get_codec(compression)
+        self._verified = set()
+        self._flights = SingleFlight()
+
+    def file_key(self, cycle_year, data_file_name):
+        """
+        Get the manifest key of a data file.
+
+        Args:
+        cycle_year (str): The cycle year of the data file, e.g., '2005-2006'.
+        data_file_name (str): The data file name, e.g., 'BMX_D'.
+
+        Returns:
+        str: The manifest key, e.g., '2005-2006/BMX_D.XPT'.
+        """
+        return f"{cycle_year}/{data_file_name}.XPT"
+
+    def file_path(self, cycle_year, data_file_name):
+        """
+        Get the local path of a data file.
+
+        Args:
+        cycle_year (str): The cycle year of the data file.
+        data_file_name (str): The data file name.
+
+        Returns:
+        str: The path of the data file inside the data directory.
+        """
+        return os.path.join(self.data_directory, cycle_year, f"{data_file_name}.XPT")
+
+    def stored_path(self, cycle_year, data_file_name, entry=None):
+        """
+        Get the local path a data file is stored at, which has the extension of its codec if it is compressed.
+
+        Args:
+        cycle_year (str): The cycle year of the data file.
+        data_file_name (str): The data file name.
+        entry (dict, optional): The manifest entry of the data file. Defaults to None, meaning read from the manifest.
+
+        Returns:
+        str: The path of the stored file, or the path of the uncompressed file if the data file is not cached.
+        """
+        if entry is None:
+            entry = self.read_manifest().get(self.file_key(cycle_year, data_file_name), {})
+        codec = get_codec(entry.get("codec"))
+        path = self.file_path(cycle_year, data_file_name)
+        return path if codec is None else path + codec.extension
+
+    def open(self, cycle_year, data_file_name):
+        """
+        Open a cached data file for reading, decompressing it on the fly if it is stored compressed.
+
+        Args:
+        cycle_year (str): The cycle year of the data file.
+        data_file_name (str): The data file name.
+
+        Returns:
+        file object: A binary file object reading the original XPT data.
+        int: The size of the original XPT file.
+        """
+        entry = self.read_manifest()[self.file_key(cycle_year, data_file_name)]
+        return open_data_file(self.stored_path(cycle_year, data_file_name, entry)), entry["size"]
+
+    def read_manifest(self):
+        """
+        Read the manifest of cached data files.
+
+        Returns:
+        dict: A dictionary of {file key: file entry}, empty if nothing has been cached yet.
+        """
+        manifest_path = os.path.join(self.data_directory, self.manifest_name)
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path, "r") as manifest_file:
+            return json.load(manifest_file)
+
+    def _write_manifest(self, manifest):
+        os.makedirs(self.data_directory, exist_ok=True)
+        manifest_path = os.path.join(self.data_directory, self.manifest_name)
+        temp_path = f"{manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        os.replace(temp_path, manifest_path)
+
+    def _record(self, key, entry):
+        with FileLock(os.path.join(self.data_directory, f"{self.manifest_name}.lock")):
+            manifest = self.read_manifest()
+            manifest[key] = entry
+            self._write_manifest(manifest)
+
+    def is_cached(self, cycle_year, data_file_name):
+        """
+        Check whether a data file has been completely downloaded.
+
+        Args:
+        cycle_year (str): The cycle year of the data file.
+        data_file_name (str): The data file name.
+
+        Returns:
+        bool: True if the file is recorded in the manifest and stored on disk with the recorded size.
+        """
+        entry = self.read_manifest().get(self.file_key(cycle_year, data_file_name))
+        if entry is None:
+            return False
+        path = self.stored_path(cycle_year, data_file_name, entry)
+        return os.path.exists(path) and os.path.getsize(path) == entry.get("stored_size", entry["size"])
+
+    def verify(self, cycle_year, data_file_name):
+        """
+        Verify a cached data file against the size and checksum recorded in the manifest.
+
+        Args:
+        cycle_year (str): The cycle year of the data file.
+        data_file_name (str): The data file name.
+
+        Returns:
+        bool: True if the file matches its manifest entry.
+        """
+        key = self.file_key(cycle_year, data_file_name)
+        if key in self._verified:
+            return True
+        entry = self.read_manifest().get(key)
+        if entry is None or not self.is_cached(cycle_year, data_file_name):
+            return False
+        if entry.get("stored_sha256", entry.get("sha256")) != file_sha256(self.stored_path(cycle_year, data_file_name, entry)):
+            return False
+        self._verified.add(key)
+        return True
+
+    def fetch(self, url, cycle_year, data_file_name, verify=False):
+        """
+        Download a data file into the cache unless it is already cached.
+
+        The download is written to a temporary '.part' file, resumed with HTTP Range requests when the connection
+        drops, and only renamed into place and recorded in the manifest once it has the expected size. A cached
+        file that fails verification is downloaded again. Threads fetching the same data file at the same time share
+        one download, and other processes wait for the file lock and then find the file cached.
+
+        Args:
+        url (str): The URL of the XPT file.
+        cycle_year (str): The cycle year of the data file.
+        data_file_name (str): The data file name.
+        verify (bool, optional): Whether to check the checksum of an already cached file (once per process). Defaults to False.
+
+        Returns:
+        str: The local path of the stored data file (compressed if the cache has a codec, see open()).
+        int: The number of bytes downloaded by this call (0 if the file was already cached or downloaded by another thread or process).
+
+        Raises:
+        IOError: If the download cannot be completed.
+        """
+        (path, downloaded), shared = self._flights.do(self.file_key(cycle_year, data_file_name), self._fetch, url,
+                                                      cycle_year, data_file_name, verify)
+        return path, 0 if shared else downloaded
+
+    def _fetch(self, url, cycle_year, data_file_name, verify):
+        if self.is_cached(cycle_year, data_file_name) and (not verify or self.verify(cycle_year, data_file_name)):
+            return self.stored_path(cycle_year, data_file_name), 0
+
+        path = self.file_path(cycle_year, data_file_name)
+        with FileLock(f"{path}.lock"):
+            # Another process may have downloaded the file while we were waiting for the lock
+            if self.is_cached(cycle_year, data_file_name) and (not verify or self.verify(cycle_year, data_file_name)):
+                return self.stored_path(cycle_year, data_file_name), 0
+            downloaded = self._download(url, cycle_year, data_file_name, path)
+            return self.stored_path(cycle_year, data_file_name), downloaded
+
+    def _download(self, url, cycle_year, data_file_name, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        result = download_file(url, path, retries=self.retries)
+        self._store(url, cycle_year, data_file_name, path, result["size"], result["sha256"])
+        return result["downloaded"]
+
+    def add_file(self, cycle_year, data_file_name, source, url=None):
+        """
+        Add a data file from a local source to the cache, compressing it with the cache codec.
+
+        Args:
+        cycle_year (str): The cycle year of the data file.
+        data_file_name (str): The data file name.
+        source (file object): A binary file object reading the XPT data.
+        url (str, optional): The URL the data file was downloaded from, recorded in the manifest.
+
+        Returns:
+        str: The local path of the stored data file.
+        """
+        path = self.file_path(cycle_year, data_file_name)
+        with FileLock(f"{path}.lock"):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as xport_file:
+                shutil.copyfileobj(source, xport_file, 1024 * 1024)
+            os.replace(temp_path, path)
+            self._store(url, cycle_year, data_file_name, path, os.path.getsize(path), file_sha256(path))
+        return self.stored_path(cycle_year, data_file_name)
+
+    def _store(self, url, cycle_year, data_file_name, path, size, sha256):
+        """
+        Compress a complete XPT file with the cache codec (if any) and record it in the manifest.
+        """
+        entry = {
+            "url": url,
+            "size": size,
+            "sha256": sha256,
+            "downloaded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        if self.codec is not None:
+            stored_path = path + self.codec.extension
+            self.codec.compress_file(path, stored_path)
+            os.remove(path)
+            entry.update({"codec": self.codec.name, "stored_size": os.path.getsize(stored_path),
+                          "stored_sha256": file_sha256(stored_path)})
+
+        key = self.file_key(cycle_year, data_file_name)
+        self._record(key, entry)
+        self._verified.add(key)
@@ -0,0 +1,383 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+
+class VariableCatalog:
+    """
+    VariableCatalog stores the NHANES variable tables of all data categories in an indexed SQLite database.
+
+    The database lives in the data directory, so a catalog fetched once is shared by every process that uses the same
+    data directory. Lookups of data file descriptions, data file names and variables are indexed queries instead of
+    scans over a freshly parsed HTML table. The headers of probed data files (their exact variables and number of
+    observations) and the codebooks of documented data files are stored alongside.
+
+    Args:
+    path (str): The path of the SQLite database file, e.g., 'data/catalog.sqlite'.
+    """
+
+    # Mapping of variable table columns to database columns
+    columns = {
+        "Variable Name": "variable_name",
+        "Variable Description": "variable_description",
+        "Data File Name": "data_file_name",
+        "Data File Description": "data_file_description",
+        "Years": "years",
+    }
+
+    schema = """
+        CREATE TABLE IF NOT EXISTS categories (
+            category TEXT PRIMARY KEY,
+            fetched_at TEXT NOT NULL,
+            row_count INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS category_versions (
+            category TEXT PRIMARY KEY,
+            content_hash TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS variables (
+            category TEXT NOT NULL,
+            variable_name TEXT,
+            variable_description TEXT,
+            data_file_name TEXT,
+            data_file_description TEXT,
+            years TEXT
+        );
+        CREATE INDEX IF NOT EXISTS variables_by_file ON variables (category, data_file_description, years);
+        CREATE INDEX IF NOT EXISTS variables_by_years ON variables (category, years, variable_name);
+        CREATE INDEX IF NOT EXISTS variables_by_name ON variables (variable_name);
+        CREATE TABLE IF NOT EXISTS data_file_headers (
+            years TEXT NOT NULL,
+            data_file_name TEXT NOT NULL,
+            file_size INTEGER NOT NULL,
+            nobs INTEGER NOT NULL,
+            header TEXT NOT NULL,
+            probed_at TEXT NOT NULL,
+            PRIMARY KEY (years, data_file_name)
+        );
+        CREATE TABLE IF NOT EXISTS codebooks (
+            years TEXT NOT NULL,
+            data_file_name TEXT NOT NULL,
+            codebook TEXT NOT NULL,
+            fetched_at TEXT NOT NULL,
+            PRIMARY KEY (years, data_file_name)
+        );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30)
+        if not self._initialized:
+            connection.executescript(self.schema)
+            self._initialized = True
+        return connection
+
+    def _query(self, sql, parameters=()):
+        if not os.path.exists(self.path):
+            return []
+        connection = self._connect()
+        try:
+            return connection.execute(sql, parameters).fetchall()
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _in_clause(column, values):
+        return f"{column} IN ({', '.join('?' for _ in values)})"
+
+    def categories(self):
+        """
+        List the data categories stored in the catalog.
+
+        Returns:
+        dict: A dictionary of {data category: number of variable rows}.
+        """
+        return dict(self._query("SELECT category, row_count FROM categories ORDER BY category"))
+
+    def has_category(self, data_category):
+        """
+        Check whether the variable table of a data category is stored in the catalog.
+
+        Args:
+        data_category (str): The data category.
+
+        Returns:
+        bool: True if the data category is stored.
+        """
+        return bool(self._query("SELECT 1 FROM categories WHERE category = ?", (data_category,)))
+
+    @staticmethod
+    def _content_hash(records):
+        return hashlib.sha256(json.dumps(records, separators=(",", ":"), default=str).encode("utf-8")).hexdigest()
+
+    def content_hash(self, data_category):
+        """
+        Get the content hash of the variable table of a data category, which changes whenever the table changes.
+
+        Args:
+        data_category (str): The data category.
+
+        Returns:
+        str: The SHA-256 hex digest of the stored variable rows, or None if the data category is not stored.
+        """
+        rows = self._query("SELECT content_hash FROM category_versions WHERE category = ?", (data_category,))
+        if rows:
+            return rows[0][0]
+        if not self.has_category(data_category):
+            return None
+        # Stored by an earlier version of the catalog: hash the stored rows once
+        records = self._query(f"SELECT category, {', '.join(self.columns.values())} FROM variables WHERE category = ? ORDER BY rowid",
+                              (data_category,))
+        content_hash = self._content_hash([list(record) for record in records])
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute("INSERT OR IGNORE INTO category_versions (category, content_hash) VALUES (?, ?)",
+                                       (data_category, content_hash))
+            finally:
+                connection.close()
+        return self.content_hash(data_category)
+
+    def store(self, data_category, variable_table):
+        """
+        Store (or replace) the variable table of a data category.
+
+        Args:
+        data_category (str): The data category.
+        variable_table (pd.DataFrame): The variable table as returned by NHANESDataAPI._retrieve_variable_table.
+        """
+        rows = variable_table.reindex(columns=list(self.columns)).astype(object)
+        rows = rows.where(rows.notna(), None)
+        records = [(data_category,) + tuple(row) for row in rows.itertuples(index=False, name=None)]
+
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute("DELETE FROM variables WHERE category = ?", (data_category,))
+                    connection.executemany(
+                        f"INSERT INTO variables (category, {', '.join(self.columns.values())}) VALUES (?, ?, ?, ?, ?, ?)",
+                        records,
+                    )
+                    connection.execute(
+                        "INSERT OR REPLACE INTO categories (category, fetched_at, row_count) VALUES (?, ?, ?)",
+                        (data_category, time.strftime("%Y-%m-%dT%H:%M:%S"), len(records)),
+                    )
+                    connection.execute(
+                        "INSERT OR REPLACE INTO category_versions (category, content_hash) VALUES (?, ?)",
+                        (data_category, self._content_hash([list(record) for record in records])),
+                    )
+            finally:
+                connection.close()
+
+    def variable_table(self, data_category):
+        """
+        Get the stored variable table of a data category.
+
+        Args:
+        data_category (str): The data category.
+
+        Returns:
+        pd.DataFrame: The variable table with the same columns as NHANESDataAPI._retrieve_variable_table.
+        """
+        rows = self._query(
+            f"SELECT {', '.join(self.columns.values())} FROM variables WHERE category = ? ORDER BY rowid",
+            (data_category,),
+        )
+        return pd.DataFrame(rows, columns=list(self.columns))
+
+    def file_descriptions(self, data_category, cycle_years=None):
+        """
+        Get the unique data file descriptions of a data category, in catalog order.
+
+        Args:
+        data_category (str): The data category.
+        cycle_years (list of str, optional): Only include data files of these cycle years.
+
+        Returns:
+        list: The unique data file descriptions.
+        """
+        sql = "SELECT data_file_description FROM variables WHERE category = ?"
+        parameters = [data_category]
+        if cycle_years is not None:
+            sql += " AND " + self._in_clause("years", cycle_years)
+            parameters.extend(cycle_years)
+        sql += " GROUP BY data_file_description ORDER BY MIN(rowid)"
+        return [row[0] for row in self._query(sql, parameters)]
+
+    def data_files(self, data_category, cycle_years, data_file_descriptions=None):
+        """
+        Get the data files of a data category for the given cycle years and data file descriptions.
+
+        Args:
+        data_category (str): The data category.
+        cycle_years (list of str): The cycle years.
+        data_file_descriptions (list of str, optional): Only include these data file descriptions.
+
+        Returns:
+        list of tuple: Unique (cycle year, data file name) pairs.
+        """
+        sql = "SELECT DISTINCT years, data_file_name FROM variables WHERE category = ? AND " + self._in_clause("years", cycle_years)
+        parameters = [data_category] + list(cycle_years)
+        if data_file_descriptions is not None:
+            sql += " AND " + self._in_clause("data_file_description", data_file_descriptions)
+            parameters.extend(data_file_descriptions)
+        return self._query(sql + " ORDER BY years, data_file_name", parameters)
+
+    def data_file_name(self, data_category, cycle_year, data_file_description):
+        """
+        Get the data file name for a cycle year and data file description.
+
+        Args:
+        data_category (str): The data category.
+        cycle_year (str): The cycle year.
+        data_file_description (str): The data file description.
+
+        Returns:
+        str: The data file name, or None if there is no matching data file.
+        """
+        rows = self._query(
+            "SELECT data_file_name FROM variables WHERE category = ? AND data_file_description = ? AND years = ? "
+            "ORDER BY rowid LIMIT 1",
+            (data_category, data_file_description, cycle_year),
+        )
+        return rows[0][0] if rows else None
+
+    def data_file_names(self, data_category, data_file_description):
+        """
+        Get the data file name of each cycle year for a data file description.
+
+        Args:
+        data_category (str): The data category.
+        data_file_description (str): The data file description.
+
+        Returns:
+        dict: A dictionary of {cycle year: data file name}, empty if there is no matching data file.
+        """
+        rows = self._query(
+            "SELECT years, data_file_name FROM variables WHERE category = ? AND data_file_description = ? ORDER BY rowid",
+            (data_category, data_file_description),
+        )
+        return dict(rows)
+
+    def variable_names(self, data_category, cycle_year, data_file_description=None):
+        """
+        Get the variable names of a data category (or one of its data files) in a cycle year.
+
+        Args:
+        data_category (str): The data category.
+        cycle_year (str): The cycle year.
+        data_file_description (str, optional): Only include variables of this data file description.
+
+        Returns:
+        list: The variable names, in catalog order.
+        """
+        sql = "SELECT variable_name FROM variables WHERE category = ? AND years = ?"
+        parameters = [data_category, cycle_year]
+        if data_file_description is not None:
+            sql += " AND data_file_description = ?"
+            parameters.append(data_file_description)
+        return [row[0] for row in self._query(sql + " ORDER BY rowid", parameters)]
+
+    def find_variable(self, variable_name):
+        """
+        Find a variable across all stored data categories.
+
+        Args:
+        variable_name (str): The variable name, e.g., 'LBXGH'.
+
+        Returns:
+        pd.DataFrame: The matching rows with the columns 'Data Category' plus the variable table columns.
+        """
+        rows = self._query(
+            f"SELECT category, {', '.join(self.columns.values())} FROM variables WHERE variable_name = ? "
+            "ORDER BY category, years",
+            (variable_name,),
+        )
+        return pd.DataFrame(rows, columns=["Data Category"] + list(self.columns))
+
+    def data_file_header(self, cycle_year, data_file_name):
+        """
+        Get the stored XPORT header of a data file.
+
+        Args:
+        cycle_year (str): The cycle year.
+        data_file_name (str): The data file name.
+
+        Returns:
+        dict: The header (see nhanes_data.xport.read_header), or None if it has not been stored.
+        """
+        rows = self._query("SELECT header FROM data_file_headers WHERE years = ? AND data_file_name = ?",
+                           (cycle_year, data_file_name))
+        return json.loads(rows[0][0]) if rows else None
+
+    def store_data_file_header(self, cycle_year, data_file_name, header):
+        """
+        Store (or replace) the XPORT header of a data file.
+
+        Args:
+        cycle_year (str): The cycle year.
+        data_file_name (str): The data file name.
+        header (dict): The header, see nhanes_data.xport.read_header.
+        """
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO data_file_headers (years, data_file_name, file_size, nobs, header, probed_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (cycle_year, data_file_name, header["file_size"], header["nobs"], json.dumps(header),
+                         time.strftime("%Y-%m-%dT%H:%M:%S")),
+                    )
+            finally:
+                connection.close()
+
+    def codebook(self, cycle_year, data_file_name):
+        """
+        Get the stored codebook of a data file.
+
+        Args:
+        cycle_year (str): The cycle year.
+        data_file_name (str): The data file name.
+
+        Returns:
+        dict: The codebook (see nhanes_doc.codebook.parse_codebook), or None if it has not been stored.
+        """
+        rows = self._query("SELECT codebook FROM codebooks WHERE years = ? AND data_file_name = ?",
+                           (cycle_year, data_file_name))
+        return json.loads(rows[0][0]) if rows else None
+
+    def store_codebook(self, cycle_year, data_file_name, codebook):
+        """
+        Store (or replace) the codebook of a data file.
+
+        Args:
+        cycle_year (str): The cycle year.
+        data_file_name (str): The data file name.
+        codebook (dict): The codebook, see nhanes_doc.codebook.parse_codebook.
+        """
+        with self._lock:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO codebooks (years, data_file_name, codebook, fetched_at) VALUES (?, ?, ?, ?)",
+                        (cycle_year, data_file_name, json.dumps(codebook, separators=(",", ":")),
+                         time.strftime("%Y-%m-%dT%H:%M:%S")),
+                    )
+            finally:
+                connection.close()
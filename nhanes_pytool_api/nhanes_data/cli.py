@@ -0,0 +1,216 @@
+import argparse
+import os
+import sys
+import urllib.parse
+
+from .compression import CODECS
+from .local_server import LocalNHANESServer
+from .nhanes_data_api import NHANESDataAPI
+from .service import NHANESDataService
+from .synthetic import DATA_FILES, SyntheticNHANES
+
+
+def _format_bytes(size):
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def _host_limits(args):
+    """
+    Get the host_limits of NHANESDataAPI from the --rate and --max-concurrency options, or None if neither is given.
+    """
+    if args.rate is None and args.max_concurrency is None:
+        return None
+    settings = {}
+    if args.rate is not None:
+        settings["rate"] = args.rate
+    if args.max_concurrency is not None:
+        settings.update(max_concurrency=args.max_concurrency, initial_concurrency=min(4, args.max_concurrency))
+    return {urllib.parse.urlsplit(args.base_url).netloc: settings}
+
+
+def _prefetch(args):
+    """
+    Run the 'prefetch' command: download the matching data files into the data directory and print a manifest.
+    """
+    api = NHANESDataAPI(data_directory=args.data_directory, base_url=args.base_url, cache_compression=args.compression,
+                        host_limits=_host_limits(args))
+
+    def progress(file_key, size, seconds):
+        if size:
+            throughput = size / seconds if seconds > 0 else 0
+            print(f"downloaded {file_key}: {_format_bytes(size)} in {seconds:.1f}s ({_format_bytes(throughput)}/s)")
+        else:
+            print(f"cached     {file_key}")
+
+    summary = api.prefetch_data(args.category, args.cycle, args.file, max_workers=args.workers, progress=progress)
+
+    manifest = api._cache.read_manifest()
+    cached_bytes = sum(manifest[file_key]["size"] for file_key in summary["files"])
+    throughput = summary["bytes"] / summary["seconds"] if summary["seconds"] > 0 else 0
+
+    print()
+    print("Manifest:")
+    for file_key in summary["files"]:
+        print(f"  {file_key}  {_format_bytes(manifest[file_key]['size'])}")
+    print(f"Downloaded {summary['downloaded']} file(s), {_format_bytes(summary['bytes'])} "
+          f"in {summary['seconds']:.1f}s ({_format_bytes(throughput)}/s); {summary['skipped']} already cached.")
+    print(f"Cached {len(summary['files'])} file(s), {_format_bytes(cached_bytes)} in {args.data_directory}")
+    throttle = summary["throttle"]
+    print(f"Requests: {throttle['requests']}, throttled: {throttle['throttled']}, errors: {throttle['errors']}, "
+          f"concurrency limit: {throttle['concurrency_limit']:.1f}")
+    return 0
+
+
+def _serve(args):
+    """
+    Run the 'serve' command: serve NHANES data over HTTP from the data directory until interrupted.
+    """
+    api = NHANESDataAPI(data_directory=args.data_directory, base_url=args.base_url, cache_compression=args.compression,
+                        host_limits=_host_limits(args))
+    service = NHANESDataService(api, host=args.host, port=args.port, chunk_rows=args.chunk_rows, max_memory=args.max_memory)
+    print(f"Serving NHANES data from {args.data_directory} on {service.url} (press Ctrl+C to stop)")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.httpd.server_close()
+    return 0
+
+
+def _compression_report(args):
+    """
+    Run the 'compression-report' command: measure the compression codecs on some data files and print the report.
+    """
+    api = NHANESDataAPI(data_directory=args.data_directory, base_url=args.base_url)
+    report = api.compression_report(args.category, args.cycle, args.file, codecs=args.codec, repeat=args.repeat)
+    report["Stored Bytes"] = report["Stored Bytes"].map(_format_bytes)
+    print(report.to_string(index=False, float_format=lambda value: f"{value:.2f}"))
+    return 0
+
+
+def _synthetic(args):
+    """
+    Run the 'synthetic' command: generate a synthetic NHANES-shaped website and optionally serve it until interrupted.
+    """
+    generator = SyntheticNHANES(cycles=args.cycle, participants=args.participants, extra_columns=args.extra_columns,
+                                missing_rate=args.missing_rate, data_files=args.file, seed=args.seed)
+    site = generator.write(args.output)
+    data_files = [path for url_path, path in site.items() if url_path.endswith(".XPT")]
+    size = sum(os.path.getsize(path) for path in data_files)
+    print(f"Generated {len(data_files)} data file(s), {_format_bytes(size)}, for {len(generator.cycles)} cycle(s) "
+          f"in {args.output}")
+    if not args.serve:
+        return 0
+    server = LocalNHANESServer(site, port=args.port, delay=args.delay, max_concurrent=args.max_concurrent)
+    print(f"Serving the synthetic NHANES website on {server.base_url} (press Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+    return 0
+
+
+def build_parser():
+    """
+    Build the argument parser of the nhanes-pytool command.
+
+    Returns:
+    argparse.ArgumentParser: The argument parser.
+    """
+    parser = argparse.ArgumentParser(prog="nhanes-pytool", description="Command-line tools for the NHANES pyTOOL API.")
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    prefetch = subparsers.add_parser("prefetch", help="Download NHANES data files into the local data directory.")
+    prefetch.add_argument("-c", "--category", action="append", required=True,
+                          help="Data category to prefetch, e.g. 'examination'. Can be repeated.")
+    prefetch.add_argument("-y", "--cycle", action="append", required=True,
+                          help="Cycle year or range, e.g. '2005' or '2005-2010'. Can be repeated.")
+    prefetch.add_argument("-f", "--file", action="append", default=None,
+                          help="Data file description, e.g. 'Body Measures'. Can be repeated. Defaults to all files.")
+    prefetch.add_argument("-d", "--data-directory", default="data/", help="Directory where data will be stored.")
+    prefetch.add_argument("-w", "--workers", type=int, default=4, help="Number of concurrent downloads.")
+    prefetch.add_argument("--compression", choices=list(CODECS), default=None,
+                          help="Codec used to store the downloaded files. Defaults to uncompressed files.")
+    prefetch.add_argument("--base-url", default="https://wwwn.cdc.gov", help="Base URL of the NHANES website.")
+    prefetch.add_argument("--rate", type=float, default=None,
+                          help="Maximum number of requests per second to the NHANES website (default: 10 for wwwn.cdc.gov).")
+    prefetch.add_argument("--max-concurrency", type=int, default=None,
+                          help="Maximum number of requests in flight; the actual number adapts to throttling and latency.")
+    prefetch.set_defaults(func=_prefetch)
+
+    serve = subparsers.add_parser("serve", help="Serve NHANES data over HTTP from the local data directory.")
+    serve.add_argument("--host", default="127.0.0.1", help="Address to listen on. Use 0.0.0.0 to accept remote clients.")
+    serve.add_argument("-p", "--port", type=int, default=8000, help="Port to listen on.")
+    serve.add_argument("-d", "--data-directory", default="data/", help="Directory where data will be stored.")
+    serve.add_argument("--chunk-rows", type=int, default=10000, help="Number of rows per streamed chunk.")
+    serve.add_argument("--max-memory", default=None,
+                       help="Memory budget of a /join, such as 2GB. Larger joins are computed through disk. Defaults to no budget.")
+    serve.add_argument("--compression", choices=list(CODECS), default=None,
+                       help="Codec used to store the downloaded files. Defaults to uncompressed files.")
+    serve.add_argument("--base-url", default="https://wwwn.cdc.gov", help="Base URL of the NHANES website.")
+    serve.add_argument("--rate", type=float, default=None,
+                       help="Maximum number of requests per second to the NHANES website (default: 10 for wwwn.cdc.gov).")
+    serve.add_argument("--max-concurrency", type=int, default=None,
+                       help="Maximum number of requests in flight; the actual number adapts to throttling and latency.")
+    serve.set_defaults(func=_serve)
+
+    report = subparsers.add_parser("compression-report",
+                                   help="Measure the compression ratio, decode throughput and load time of each codec.")
+    report.add_argument("-c", "--category", required=True, help="Data category, e.g. 'examination'.")
+    report.add_argument("-y", "--cycle", action="append", required=True, help="Cycle year or range. Can be repeated.")
+    report.add_argument("-f", "--file", required=True, help="Data file description, e.g. 'Body Measures'.")
+    report.add_argument("--codec", action="append", default=None,
+                        help="Cache codec to measure ('none' is the baseline). Can be repeated. Defaults to all installed codecs.")
+    report.add_argument("-r", "--repeat", type=int, default=3, help="Number of timed runs per measurement.")
+    report.add_argument("-d", "--data-directory", default="data/", help="Directory where data will be stored.")
+    report.add_argument("--base-url", default="https://wwwn.cdc.gov", help="Base URL of the NHANES website.")
+    report.set_defaults(func=_compression_report)
+
+    synthetic = subparsers.add_parser("synthetic",
+                                      help="Generate a synthetic NHANES-shaped website for load tests and optionally serve it.")
+    synthetic.add_argument("-o", "--output", default="synthetic/", help="Directory where the website will be written.")
+    synthetic.add_argument("-y", "--cycle", action="append", default=None,
+                           help="Cycle year, e.g. '2017-2018'. Can be repeated. Defaults to 2015-2016 and 2017-2018.")
+    synthetic.add_argument("-n", "--participants", type=int, default=10000, help="Number of participants per cycle.")
+    synthetic.add_argument("--extra-columns", type=int, default=0, help="Number of additional variables per data file.")
+    synthetic.add_argument("--missing-rate", type=float, default=0.05, help="Fraction of missing values per variable.")
+    synthetic.add_argument("-f", "--file", action="append", choices=list(DATA_FILES), default=None,
+                           help="Data file to generate, by base name. Can be repeated. Defaults to all data files.")
+    synthetic.add_argument("--seed", type=int, default=0, help="Seed of the generated data.")
+    synthetic.add_argument("--serve", action="store_true", help="Serve the website after generating it.")
+    synthetic.add_argument("-p", "--port", type=int, default=8080, help="Port to serve the website on.")
+    synthetic.add_argument("--delay", type=float, default=0, help="Seconds every response is delayed, to simulate latency.")
+    synthetic.add_argument("--max-concurrent", type=int, default=None,
+                           help="Answer requests beyond this number in flight with HTTP 429, to simulate throttling.")
+    synthetic.set_defaults(func=_synthetic)
+    return parser
+
+
+def main(argv=None):
+    """
+    Entry point of the nhanes-pytool command.
+
+    Args:
+    argv (list of str, optional): The command-line arguments. Defaults to sys.argv[1:].
+
+    Returns:
+    int: The exit status.
+    """
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+import bz2
+import gzip
+import importlib
+import lzma
+import os
+import shutil
+
+
+class Codec:
+    """
+    Codec is a compression format for cached data files, stored with its own file name extension.
+
+    Args:
+    name (str): The codec name, e.g., 'zstd'.
+    extension (str): The file name extension added to compressed files, e.g., '.zst'.
+    module (str): The module implementing the codec.
+    extra (str, optional): The extra to install if the module is an optional dependency, e.g., 'zstd'.
+    """
+
+    def __init__(self, name, extension, module, extra=None):
+        self.name = name
+        self.extension = extension
+        self.module = module
+        self.extra = extra
+
+    def __repr__(self):
+        return f"Codec({self.name!r})"
+
+    @property
+    def available(self):
+        """
+        bool: Whether the module implementing the codec can be imported.
+        """
+        try:
+            importlib.import_module(self.module)
+        except ImportError:
+            return False
+        return True
+
+    def open(self, path, mode="rb"):
+        """
+        Open a compressed file.
+
+        Args:
+        path (str): The path of the compressed file.
+        mode (str, optional): 'rb' or 'wb'. Defaults to 'rb'.
+
+        Returns:
+        file object: A binary file object reading or writing uncompressed data.
+
+        Raises:
+        ImportError: If the codec is an optional dependency that is not installed.
+        """
+        try:
+            module = importlib.import_module(self.module)
+        except ImportError:
+            raise ImportError(f"The '{self.name}' codec requires {self.module}. "
+                              f"Install it with 'pip install nhanes_pytool_api[{self.extra}]'.")
+        if self.name == "gzip":
+            return module.open(path, mode, compresslevel=6)
+        if self.name == "zstd":
+            return module.open(path, mode, cctx=module.ZstdCompressor(level=9, threads=-1) if "w" in mode else None)
+        return module.open(path, mode)
+
+    def compress_file(self, source, destination, chunk_size=1024 * 1024):
+        """
+        Compress a file. The compressed data is written under a temporary name and renamed when complete.
+
+        Args:
+        source (str): The path of the uncompressed file.
+        destination (str): The path of the compressed file.
+        chunk_size (int, optional): The number of bytes compressed at a time.
+        """
+        temp_path = f"{destination}.{os.getpid()}.tmp"
+        with open(source, "rb") as source_file, self.open(temp_path, "wb") as compressed_file:
+            shutil.copyfileobj(source_file, compressed_file, chunk_size)
+        os.replace(temp_path, destination)
+
+
+# Codecs for cached XPT files. zstd and lz4 are optional dependencies; gzip, bz2 and lzma are in the standard library.
+CODECS = {
+    "gzip": Codec("gzip", ".gz", "gzip"),
+    "bz2": Codec("bz2", ".bz2", "bz2"),
+    "lzma": Codec("lzma", ".xz", "lzma"),
+    "zstd": Codec("zstd", ".zst", "zstandard", extra="zstd"),
+    "lz4": Codec("lz4", ".lz4", "lz4.frame", extra="lz4"),
+}
+
+# Column codecs of the Parquet files written by PartitionedDataset (see pyarrow.parquet.write_table)
+PARQUET_CODECS = ["none", "snappy", "gzip", "brotli", "lz4", "zstd"]
+
+
+def get_codec(name):
+    """
+    Get a cache codec by name.
+
+    Args:
+    name (str): The codec name, one of CODECS, or None or 'none' for uncompressed files.
+
+    Returns:
+    Codec: The codec, or None for uncompressed files.
+
+    Raises:
+    ValueError: If the codec is unknown.
+    """
+    if name is None or name == "none":
+        return None
+    if name not in CODECS:
+        raise ValueError(f"Unknown compression codec: {name}. Use one of {['none'] + list(CODECS)}.")
+    return CODECS[name]
+
+
+def codec_for_path(path):
+    """
+    Get the codec of a file from its extension.
+
+    Args:
+    path (str): The path of the file.
+
+    Returns:
+    Codec: The codec, or None if the file is not compressed.
+    """
+    for codec in CODECS.values():
+        if path.endswith(codec.extension):
+            return codec
+    return None
+
+
+def open_data_file(path):
+    """
+    Open a cached data file for reading, decompressing it on the fly if it is compressed.
+
+    Args:
+    path (str): The path of the (possibly compressed) data file.
+
+    Returns:
+    file object: A binary file object reading the uncompressed data.
+    """
+    codec = codec_for_path(path)
+    return open(path, "rb") if codec is None else codec.open(path, "rb")
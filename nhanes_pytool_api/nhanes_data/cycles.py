@@ -0,0 +1,184 @@
+import pandas as pd
+
+from .dataset import PartitionOperations, year_last
+from .lazy import LazyDataset
+
+
+class CycleDataset(PartitionOperations):
+    """
+    CycleDataset is a multi-cycle data set that keeps one partition per cycle year instead of one flattened DataFrame.
+
+    A partition is the data file of one cycle year, decoded from the local data cache (and downloaded first if it is
+    not cached) when it is accessed. Nothing is held in memory between accesses. select() and filter() return new
+    datasets with a refined plan; filters on 'year' drop partitions, other filters are applied to each partition when
+    it is loaded. map_partitions() and aggregate() process the partitions in parallel and only combine their results,
+    so per-cycle analyses scale with the number of cores without a global concatenation.
+
+    Args:
+    api (NHANESDataAPI): The API used to fetch and decode the data files.
+    data_files (list of tuple): (cycle year, data file name) pairs, one per partition.
+    columns (list of str, optional): The columns to keep. Defaults to None, meaning all columns of each data file.
+    filters (list of tuple, optional): (column, operator, value) row filters, with the operators of LazyDataset.
+    decoder (LabelDecoder, optional): Applied to each partition to decode value labels. Defaults to None.
+    """
+
+    operators = LazyDataset.operators
+
+    def __init__(self, api, data_files, columns=None, filters=None, decoder=None):
+        self._api = api
+        self.data_files = list(data_files)
+        self._columns = None if columns is None else list(columns)
+        self.filters = list(filters or [])
+        self._decoder = decoder
+
+    def __repr__(self):
+        return f"CycleDataset(partitions={self.partitions}, columns={self._columns}, filters={self.filters})"
+
+    def _replace(self, **changes):
+        arguments = {"data_files": self.data_files, "columns": self._columns, "filters": self.filters,
+                     "decoder": self._decoder}
+        arguments.update(changes)
+        return CycleDataset(self._api, **arguments)
+
+    @property
+    def partitions(self):
+        """
+        list: The cycle years of the dataset, in order.
+        """
+        return [cycle_year for cycle_year, _ in self.data_files]
+
+    def _header_columns(self, cycle_year):
+        data_file_name = dict(self.data_files)[cycle_year]
+        return [field["name"] for field in self._api.probe_data_file(cycle_year, data_file_name)["fields"]]
+
+    @property
+    def columns(self):
+        """
+        list: The columns of the dataset with 'year' last, read from the data file headers.
+        """
+        if self._columns is not None:
+            return year_last(self._columns)
+        columns = []
+        for cycle_year in self.partitions:
+            columns.extend(name for name in self._header_columns(cycle_year) if name not in columns)
+        return columns + ["year"]
+
+    def __len__(self):
+        """
+        The number of rows before row filters, from the data file headers.
+        """
+        return sum(self._api.probe_data_file(cycle_year, data_file_name)["nobs"] for cycle_year, data_file_name in self.data_files)
+
+    def select(self, columns):
+        """
+        Restrict the dataset to some columns.
+
+        Args:
+        columns (str or list of str): The columns to keep.
+
+        Returns:
+        CycleDataset: The refined dataset.
+
+        Raises:
+        KeyError: If a column is not in any partition.
+        """
+        if isinstance(columns, str):
+            columns = [columns]
+        missing = [column for column in columns if column not in self.columns]
+        if missing:
+            raise KeyError(f"Columns not found in the data files: {missing}")
+        return self._replace(columns=list(columns))
+
+    def __getitem__(self, columns):
+        return self.select(columns)
+
+    def filter(self, column, op, value):
+        """
+        Add a row filter.
+
+        Args:
+        column (str): The column to filter on.
+        op (str): The operator, one of ==, !=, <, <=, >, >=, 'in' or 'not in'.
+        value: The value (or list of values for 'in' and 'not in') to compare with.
+
+        Returns:
+        CycleDataset: The refined dataset.
+
+        Raises:
+        ValueError: If the operator is not supported.
+        """
+        if op not in self.operators:
+            raise ValueError(f"Unsupported filter operator: {op}. Use one of {list(self.operators)}.")
+        if column == "year":
+            keep = self.operators[op](pd.Series(self.partitions), value)
+            return self._replace(data_files=[data_file for data_file, kept in zip(self.data_files, keep) if kept])
+        return self._replace(filters=self.filters + [(column, op, value)])
+
+    def read_partition(self, cycle_year, columns=None):
+        """
+        Load the data of one cycle year, with the filters applied.
+
+        Args:
+        cycle_year (str): The cycle year.
+        columns (list of str, optional): The columns to load. Defaults to None, meaning the columns of the dataset.
+        Columns that the data file lacks are left out.
+
+        Returns:
+        pd.DataFrame: The data of the cycle year, with a 'year' column.
+
+        Raises:
+        KeyError: If the cycle year is not a partition of the dataset.
+        ValueError: If the data file cannot be fetched.
+        """
+        if cycle_year not in self.partitions:
+            raise KeyError(f"No partition for {cycle_year}: {self.partitions}")
+        data_file = (cycle_year, dict(self.data_files)[cycle_year])
+        wanted = columns if columns is not None else self._columns
+        decode = None
+        if wanted is not None:
+            # Download first, so the header is read from the cached file instead of with Range requests
+            try:
+                self._api._fetch_data_file(*data_file)
+            except Exception as e:
+                raise ValueError(f"Error fetching data for cycle {cycle_year}: {str(e)}")
+            needed = list(wanted) + [column for column, _, _ in self.filters if column not in wanted]
+            decode = [column for column in self._header_columns(cycle_year) if column in needed]
+
+        data = self._api._assemble_data_files([data_file], decode)
+        data.attrs.pop("pipeline", None)
+        if self._decoder is not None:
+            data = self._decoder(data, cycle_year)
+        for column, op, value in self.filters:
+            series = data[column] if column in data.columns else pd.Series(float("nan"), index=data.index)
+            data = data[self.operators[op](series, value)]
+        if wanted is not None:
+            data = data[[column for column in year_last(wanted) if column in data.columns]]
+        return data.reset_index(drop=True)
+
+    def iter_partitions(self, columns=None):
+        """
+        Iterate over the partitions, loading one cycle year at a time.
+
+        Args:
+        columns (list of str, optional): The columns to load. Defaults to None, meaning the columns of the dataset.
+
+        Yields:
+        tuple: (cycle year, pd.DataFrame) pairs.
+        """
+        for cycle_year in self.partitions:
+            yield cycle_year, self.read_partition(cycle_year, columns)
+
+    def to_pandas(self, columns=None, max_workers=4):
+        """
+        Load the dataset (or some of its columns) into a single DataFrame, loading the partitions in parallel.
+
+        Args:
+        columns (list of str, optional): The columns to load. Defaults to None, meaning the columns of the dataset.
+        max_workers (int, optional): The number of partitions loaded in parallel. Defaults to 4.
+
+        Returns:
+        pd.DataFrame: The concatenated partitions.
+        """
+        if not self.data_files:
+            return pd.DataFrame(columns=columns if columns is not None else self.columns)
+        return self.map_partitions(lambda data: data, columns, max_workers)
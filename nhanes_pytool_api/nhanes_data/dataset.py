@@ -0,0 +1,359 @@
+import os
+import re
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from .aggregate import StreamingAggregator
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Disk-backed datasets require pyarrow. Install it with 'pip install nhanes_pytool_api[parquet]'.")
+    return pyarrow
+
+
+def year_last(columns):
+    """
+    Move the 'year' column to the end of a column list, where NHANESDataAPI.retrieve_data puts it.
+
+    Args:
+    columns (list of str): The column names.
+
+    Returns:
+    list: The column names with 'year' (if present) last.
+    """
+    columns = list(columns)
+    return [column for column in columns if column != "year"] + (["year"] if "year" in columns else [])
+
+
+def parse_memory_size(size):
+    """
+    Parse a memory size given as a number of bytes or as a string such as '512MB' or '2 GB'.
+
+    Args:
+    size (int or str): The memory size.
+
+    Returns:
+    int: The memory size in bytes.
+
+    Raises:
+    ValueError: If the memory size cannot be parsed.
+    """
+    if isinstance(size, (int, float)):
+        return int(size)
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)I?B?\s*", str(size).upper())
+    if match is None:
+        raise ValueError(f"Invalid memory size: {size}")
+    return int(float(match.group(1)) * 1024 ** " KMGT".index(match.group(2) or " "))
+
+
+def combine_partition_results(results):
+    """
+    Combine the per-cycle results of a function applied to each partition.
+
+    DataFrames are concatenated, with a 'year' column added to those without one. Series become the rows of a
+    DataFrame indexed by cycle year, and scalars a Series indexed by cycle year. Other results are returned as is.
+
+    Args:
+    results (dict): A dictionary of {cycle year: result}.
+
+    Returns:
+    pd.DataFrame, pd.Series or dict: The combined results.
+    """
+    values = list(results.values())
+    if values and all(isinstance(value, pd.DataFrame) for value in values):
+        frames = [value if "year" in value.columns else value.assign(year=cycle_year) for cycle_year, value in results.items()]
+        data = pd.concat(frames, ignore_index=True)
+        return data[year_last(data.columns)]
+    if values and all(isinstance(value, pd.Series) for value in values):
+        return pd.DataFrame(values, index=pd.Index(list(results), name="year"))
+    if values and all(pd.api.types.is_scalar(value) for value in values):
+        return pd.Series(values, index=pd.Index(list(results), name="year"))
+    return results
+
+
+class PartitionOperations:
+    """
+    Parallel operations on datasets with one partition per cycle year.
+
+    A subclass provides the partitions property and read_partition(cycle_year, columns). The partitions are loaded
+    and processed by a pool of threads, and only the per-cycle results are combined, so no global DataFrame of all
+    cycles is built.
+    """
+
+    def _map(self, function, max_workers):
+        cycle_years = self.partitions
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            return dict(zip(cycle_years, executor.map(function, cycle_years)))
+
+    def map_partitions(self, function, columns=None, max_workers=4):
+        """
+        Apply a function to the data of each cycle year in parallel and combine the results.
+
+        Args:
+        function (callable): Called with the DataFrame of one cycle year, including its 'year' column.
+        columns (list of str, optional): The columns to load. Defaults to None, meaning all columns.
+        max_workers (int, optional): The number of partitions processed in parallel. Defaults to 4.
+
+        Returns:
+        pd.DataFrame, pd.Series or dict: The results combined with combine_partition_results, e.g., the concatenated
+        DataFrames, or a DataFrame with one row per cycle year for functions returning a Series.
+        """
+        def apply(cycle_year):
+            return function(self.read_partition(cycle_year, columns))
+
+        return combine_partition_results(self._map(apply, max_workers))
+
+    def aggregate(self, aggregations, by="year", max_workers=4):
+        """
+        Compute group-by aggregations over all cycle years, aggregating the partitions in parallel.
+
+        Each partition is reduced to partial results (see StreamingAggregator), and the partial results of all
+        partitions are combined, so groups may span cycle years.
+
+        Args:
+        aggregations (dict): {column: function} or {column: [functions]} with the functions 'sum', 'mean', 'min', 'max', 'count' and 'size'.
+        by (str or list of str, optional): The columns to group by. Defaults to 'year', meaning one row per cycle year.
+        max_workers (int, optional): The number of partitions aggregated in parallel. Defaults to 4.
+
+        Returns:
+        pd.DataFrame: One row per group, with the group columns followed by the aggregated columns.
+
+        Raises:
+        ValueError: If an aggregation is not supported or a group-by column is missing from a partition.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        aggregator = StreamingAggregator(aggregations, by)
+
+        def aggregate_partition(cycle_year):
+            data = self.read_partition(cycle_year, aggregator.columns)
+            missing = [column for column in by if column not in data.columns]
+            if missing:
+                raise ValueError(f"Group-by columns {missing} not in the partition of {cycle_year}")
+            partial = StreamingAggregator(aggregations, by)
+            partial.update(data.reindex(columns=aggregator.columns))
+            return partial
+
+        for partial in self._map(aggregate_partition, max_workers).values():
+            aggregator.merge(partial)
+        return aggregator.result()
+
+
+class PartitionedDataset(PartitionOperations):
+    """
+    PartitionedDataset is a disk-backed data set stored as one Parquet file per NHANES cycle year.
+
+    Nothing is loaded when the dataset is created. Partitions are read when they are accessed, either all at once with
+    to_pandas(), one cycle at a time with iter_partitions(), or in bounded row batches with iter_batches(). Reading a
+    subset of the columns only reads those columns from disk. map_partitions() and aggregate() process the partitions
+    in parallel, see PartitionOperations.
+
+    The files stay on disk until delete() is called. Used as a context manager, the dataset is deleted on exit, which
+    suits temporary results such as the datasets spilled by NHANESDataAPI when max_memory is exceeded.
+
+    Args:
+    directory (str): The directory holding the partition files (<cycle_year>.parquet).
+    compression (str, optional): The Parquet column codec used to write partitions: 'none', 'snappy', 'gzip', 'brotli', 'lz4' or 'zstd'. Defaults to 'snappy'.
+    """
+
+    def __init__(self, directory, compression="snappy"):
+        self.directory = directory
+        self.compression = compression
+
+    def __repr__(self):
+        return f"PartitionedDataset(directory={self.directory!r}, partitions={self.partitions})"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.delete()
+
+    def partition_path(self, cycle_year):
+        """
+        Get the path of the partition file of a cycle year.
+
+        Args:
+        cycle_year (str): The cycle year.
+
+        Returns:
+        str: The partition file path.
+        """
+        return os.path.join(self.directory, f"{cycle_year}.parquet")
+
+    @property
+    def partitions(self):
+        """
+        list: The cycle years stored in the dataset, in order.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name[:-len(".parquet")] for name in os.listdir(self.directory) if name.endswith(".parquet"))
+
+    def _metadata(self, cycle_year):
+        return _import_pyarrow().parquet.ParquetFile(self.partition_path(cycle_year)).metadata
+
+    @property
+    def columns(self):
+        """
+        list: The union of the columns of all partitions, in order of first appearance with 'year' last.
+        """
+        columns = []
+        for cycle_year in self.partitions:
+            schema = _import_pyarrow().parquet.read_schema(self.partition_path(cycle_year))
+            columns.extend(name for name in schema.names if name not in columns)
+        return year_last(columns)
+
+    def __len__(self):
+        return sum(self._metadata(cycle_year).num_rows for cycle_year in self.partitions)
+
+    @property
+    def nbytes(self):
+        """
+        int: The uncompressed size of the data, an estimate of its size in memory.
+        """
+        nbytes = 0
+        for cycle_year in self.partitions:
+            metadata = self._metadata(cycle_year)
+            nbytes += sum(metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups))
+        return nbytes
+
+    def write_partition(self, cycle_year, chunks):
+        """
+        Write (or replace) the partition of a cycle year from an iterable of DataFrame chunks.
+
+        Chunks are written one at a time, so memory use is bounded by the chunk size. The file is written under a
+        temporary name and renamed when complete.
+
+        Args:
+        cycle_year (str): The cycle year.
+        chunks (iterable of pd.DataFrame): The data of the partition. All chunks must have the same columns.
+
+        Returns:
+        int: The number of rows written.
+        """
+        pyarrow = _import_pyarrow()
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.partition_path(cycle_year)
+        temp_path = f"{path}.tmp"
+        writer = None
+        rows = 0
+        empty_chunk = None
+        try:
+            for chunk in chunks:
+                if chunk.empty and writer is None:
+                    empty_chunk = chunk
+                    continue
+                if writer is None:
+                    table = pyarrow.Table.from_pandas(chunk, preserve_index=False)
+                    writer = pyarrow.parquet.ParquetWriter(temp_path, table.schema, compression=self.compression)
+                else:
+                    table = pyarrow.Table.from_pandas(chunk, schema=writer.schema, preserve_index=False)
+                writer.write_table(table)
+                rows += len(chunk)
+            if writer is None:
+                table = pyarrow.Table.from_pandas(empty_chunk if empty_chunk is not None else pd.DataFrame(),
+                                                  preserve_index=False)
+                pyarrow.parquet.write_table(table, temp_path, compression=self.compression)
+        finally:
+            if writer is not None:
+                writer.close()
+        os.replace(temp_path, path)
+        return rows
+
+    def read_partition(self, cycle_year, columns=None):
+        """
+        Read the partition of a cycle year.
+
+        Args:
+        cycle_year (str): The cycle year.
+        columns (list of str, optional): The columns to read. Defaults to None, meaning all columns.
+
+        Returns:
+        pd.DataFrame: The partition data.
+        """
+        pyarrow = _import_pyarrow()
+        if columns is not None:
+            schema = pyarrow.parquet.read_schema(self.partition_path(cycle_year))
+            columns = [column for column in columns if column in schema.names]
+        return pd.read_parquet(self.partition_path(cycle_year), columns=columns)
+
+    def iter_partitions(self, columns=None):
+        """
+        Iterate over the partitions, loading one cycle year at a time.
+
+        Args:
+        columns (list of str, optional): The columns to read. Defaults to None, meaning all columns.
+
+        Yields:
+        tuple: (cycle year, pd.DataFrame) pairs.
+        """
+        for cycle_year in self.partitions:
+            yield cycle_year, self.read_partition(cycle_year, columns)
+
+    def iter_batches(self, batch_rows, columns=None, cycle_years=None):
+        """
+        Iterate over the data in batches of at most batch_rows rows.
+
+        Args:
+        batch_rows (int): The maximum number of rows per batch.
+        columns (list of str, optional): The columns to read. Defaults to None, meaning all columns.
+        cycle_years (list of str, optional): The partitions to read. Defaults to None, meaning all partitions.
+
+        Yields:
+        pd.DataFrame: The batches, partition by partition.
+        """
+        pyarrow = _import_pyarrow()
+        for cycle_year in (self.partitions if cycle_years is None else cycle_years):
+            parquet_file = pyarrow.parquet.ParquetFile(self.partition_path(cycle_year))
+            batch_columns = None if columns is None else [column for column in columns if column in parquet_file.schema_arrow.names]
+            for batch in parquet_file.iter_batches(batch_size=batch_rows, columns=batch_columns):
+                yield batch.to_pandas()
+
+    def to_pandas(self, columns=None):
+        """
+        Load the dataset (or some of its columns) into a single DataFrame.
+
+        Args:
+        columns (list of str, optional): The columns to read. Defaults to None, meaning all columns.
+
+        Returns:
+        pd.DataFrame: The concatenated partitions.
+        """
+        frames = [frame for _, frame in self.iter_partitions(columns)]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        data = pd.concat(frames, ignore_index=True)
+        return data[year_last(data.columns)] if columns is None else data
+
+    def head(self, n=5):
+        """
+        Get the first n rows of the dataset, reading no more than needed.
+
+        Args:
+        n (int, optional): The number of rows. Defaults to 5.
+
+        Returns:
+        pd.DataFrame: The first n rows.
+        """
+        frames = []
+        rows = 0
+        for batch in self.iter_batches(n):
+            frames.append(batch)
+            rows += len(batch)
+            if rows >= n:
+                break
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True).head(n).reindex(columns=self.columns)
+
+    def delete(self):
+        """
+        Delete the dataset directory and all of its partitions.
+        """
+        shutil.rmtree(self.directory, ignore_errors=True)
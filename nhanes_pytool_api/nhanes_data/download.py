@@ -0,0 +1,135 @@
+import hashlib
+import http.client
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+
+from .throttle import THROTTLE_CODES, urlopen
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """
+    Compute the SHA-256 checksum of a file.
+
+    Args:
+    path (str): The path of the file.
+    chunk_size (int, optional): The number of bytes read at a time.
+
+    Returns:
+    str: The hexadecimal SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _expected_size(response, offset):
+    """
+    Get the total size of the remote file from a (partial) response, or None if the server does not report it.
+    """
+    content_range = response.headers.get("Content-Range")
+    if response.status == 206 and content_range and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    content_length = response.headers.get("Content-Length")
+    if content_length is None:
+        return None
+    return int(content_length) + (offset if response.status == 206 else 0)
+
+
+def _read_part_meta(meta_path):
+    if not os.path.exists(meta_path):
+        return {}
+    try:
+        with open(meta_path, "r") as meta_file:
+            return json.load(meta_file)
+    except ValueError:
+        return {}
+
+
+def download_file(url, path, retries=5, backoff=0.5, timeout=60, chunk_size=1024 * 1024):
+    """
+    Download a file with resume support and verify that it is complete.
+
+    The data is written to '<path>.part'. When the connection drops, the download is resumed from the end of the
+    partial file with an HTTP Range request (guarded by If-Range, so a file that changed on the server is downloaded
+    again from the start). Partial files left behind by an interrupted process are resumed the same way. Once the
+    partial file has the size reported by the server, its SHA-256 checksum is computed and it is renamed to 'path'.
+    Requests are paced by the rate and concurrency limits of the host (see throttle.HostThrottle), and throttled
+    requests are retried like server errors.
+
+    Args:
+    url (str): The URL of the file.
+    path (str): The destination path.
+    retries (int, optional): The number of times a dropped or failed download is retried. Defaults to 5.
+    backoff (float, optional): The delay in seconds before the first retry, doubled on every further retry. Defaults to 0.5.
+    timeout (float, optional): The socket timeout in seconds. Defaults to 60.
+    chunk_size (int, optional): The number of bytes read at a time.
+
+    Returns:
+    dict: {'size': int, 'sha256': str, 'downloaded': int} where 'downloaded' is the number of bytes transferred by this call.
+
+    Raises:
+    IOError: If the download cannot be completed within the given number of retries or the server rejects the request.
+    """
+    part_path = f"{path}.part"
+    meta_path = f"{part_path}.json"
+    meta = _read_part_meta(meta_path)
+    if meta.get("url") != url and os.path.exists(part_path):
+        os.remove(part_path)
+        meta = {}
+
+    downloaded = 0
+    attempt = 0
+    while True:
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        request = urllib.request.Request(url)
+        if offset:
+            request.add_header("Range", f"bytes={offset}-")
+            if meta.get("validator"):
+                request.add_header("If-Range", meta["validator"])
+
+        try:
+            with urlopen(request, timeout=timeout) as response:
+                expected_size = _expected_size(response, offset)
+                meta = {"url": url, "size": expected_size,
+                        "validator": response.headers.get("ETag") or response.headers.get("Last-Modified")}
+                with open(meta_path, "w") as meta_file:
+                    json.dump(meta, meta_file)
+
+                # A 200 response means the server ignored the range (or the file changed), so start over
+                mode = "ab" if response.status == 206 else "wb"
+                with open(part_path, mode) as part_file:
+                    while True:
+                        chunk = response.read(chunk_size)
+                        if not chunk:
+                            break
+                        part_file.write(chunk)
+                        downloaded += len(chunk)
+
+            size = os.path.getsize(part_path)
+            if expected_size is not None and size != expected_size:
+                raise IOError(f"Incomplete download: received {size} of {expected_size} bytes")
+            break
+        except urllib.error.HTTPError as e:
+            if e.code == 416:
+                # The partial file is not a prefix of the remote file anymore; start over
+                os.remove(part_path)
+                continue
+            if (e.code < 500 and e.code not in THROTTLE_CODES) or attempt >= retries:
+                raise IOError(f"Error downloading {url}: HTTP {e.code} {e.reason}")
+        except (OSError, http.client.HTTPException) as e:
+            if attempt >= retries:
+                raise IOError(f"Error downloading {url} after {retries} retries: {e}")
+        attempt += 1
+        time.sleep(backoff * 2 ** (attempt - 1))
+
+    sha256 = file_sha256(part_path, chunk_size)
+    os.replace(part_path, path)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+    return {"size": size, "sha256": sha256, "downloaded": downloaded}
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# fcntl locks are held per process, so threads of one process are serialized with a thread lock per lock file
+_thread_locks = {}
+_thread_locks_lock = threading.Lock()
+
+
+def _thread_lock(path):
+    with _thread_locks_lock:
+        return _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+class FileLock:
+    """
+    FileLock is an exclusive lock shared by all threads and processes using the same lock file.
+
+    It uses POSIX record locks (fcntl.lockf), which also work across hosts on NFS mounts with lock support, and
+    msvcrt.locking on Windows. The lock file is created on first use and left in place, since removing it could let
+    two processes lock different files of the same name.
+
+    Args:
+    path (str): The path of the lock file, e.g., 'data/2005-2006/DEMO_D.XPT.lock'.
+    timeout (float, optional): The number of seconds to wait for the lock before raising TimeoutError. Defaults to None, meaning wait forever.
+    poll_interval (float, optional): The number of seconds between attempts while the lock is held by another process. Defaults to 0.1.
+    """
+
+    def __init__(self, path, timeout=None, poll_interval=0.1):
+        self.path = path
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self._fd = None
+        self._thread_lock = _thread_lock(path)
+
+    def acquire(self):
+        """
+        Acquire the lock, waiting until it is released by other threads and processes.
+
+        Raises:
+        TimeoutError: If the lock cannot be acquired within the timeout.
+        """
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(timeout=-1 if self.timeout is None else self.timeout):
+            raise TimeoutError(f"Timed out waiting for the lock {self.path}")
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o666)
+            while True:
+                try:
+                    if fcntl is not None:
+                        fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    else:
+                        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if deadline is not None and time.monotonic() >= deadline:
+                        os.close(fd)
+                        raise TimeoutError(f"Timed out waiting for the lock {self.path}")
+                    time.sleep(self.poll_interval)
+            self._fd = fd
+        except BaseException:
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        """
+        Release the lock.
+        """
+        fd, self._fd = self._fd, None
+        try:
+            if fcntl is not None:
+                fcntl.lockf(fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(fd, 0, os.SEEK_SET)
+                msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(fd)
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
@@ -0,0 +1,207 @@
+import operator
+
+import pandas as pd
+
+from .dataset import year_last
+
+
+class LazyDataset:
+    """
+    LazyDataset is a handle on a planned retrieval that downloads nothing until the data is materialized.
+
+    The plan holds the data files to read (one per cycle year), the columns to keep and the row filters. Selecting
+    columns, filtering and restricting cycles return new handles with a refined plan. Data files are only downloaded
+    when the data is materialized with collect() or head(), and only for the cycles the plan still needs; the columns
+    are read from the data file headers, which only fetches the start of each file. Files are decoded in chunks, and
+    only the selected and filtered columns are decoded.
+
+    Filters use the (column, operator, value) form, e.g. ('RIDAGEYR', '>=', 18), with the operators ==, !=, <, <=, >,
+    >=, 'in' and 'not in'. Filters on the 'year' column are applied to the plan itself, so the excluded cycles are
+    never downloaded. str values match the character columns, which are decoded as bytes.
+
+    Args:
+    api (NHANESDataAPI): The API used to fetch the data files.
+    data_files (list of tuple): (cycle year, data file name) pairs.
+    columns (list of str, optional): The columns to keep. Defaults to None, meaning all columns.
+    filters (list of tuple, optional): The row filters.
+    chunk_rows (int, optional): The number of rows decoded at a time. Defaults to 100000.
+    """
+
+    operators = {
+        "==": operator.eq,
+        "!=": operator.ne,
+        "<": operator.lt,
+        "<=": operator.le,
+        ">": operator.gt,
+        ">=": operator.ge,
+        "in": lambda series, values: series.isin(values),
+        "not in": lambda series, values: ~series.isin(values),
+    }
+
+    def __init__(self, api, data_files, columns=None, filters=None, chunk_rows=100000):
+        self._api = api
+        self.data_files = list(data_files)
+        self._columns = None if columns is None else list(columns)
+        self.filters = list(filters or [])
+        self.chunk_rows = chunk_rows
+
+    def __repr__(self):
+        return (f"LazyDataset(cycles={self.cycles}, file_names={self.file_names}, "
+                f"columns={self._columns}, filters={self.filters})")
+
+    def _replace(self, **changes):
+        arguments = {"data_files": self.data_files, "columns": self._columns, "filters": self.filters,
+                     "chunk_rows": self.chunk_rows}
+        arguments.update(changes)
+        return LazyDataset(self._api, **arguments)
+
+    @property
+    def cycles(self):
+        """
+        list: The cycle years the plan will read.
+        """
+        return [cycle_year for cycle_year, _ in self.data_files]
+
+    @property
+    def file_names(self):
+        """
+        list: The data file names the plan will read.
+        """
+        return [data_file_name for _, data_file_name in self.data_files]
+
+    @property
+    def columns(self):
+        """
+        list: The columns of the materialized data, read from the data file headers without downloading the data.
+        """
+        if self._columns is not None:
+            return self._columns
+        columns = []
+        for cycle_year, data_file_name in self.data_files:
+            fields = self._api.probe_data_file(cycle_year, data_file_name)["fields"]
+            columns.extend(field["name"] for field in fields if field["name"] not in columns)
+        return columns + ["year"]
+
+    def select(self, columns):
+        """
+        Restrict the plan to some columns.
+
+        Args:
+        columns (str or list of str): The columns to keep.
+
+        Returns:
+        LazyDataset: The refined handle.
+
+        Raises:
+        KeyError: If a column is not available in any of the planned data files.
+        """
+        if isinstance(columns, str):
+            columns = [columns]
+        missing = [column for column in columns if column not in self.columns]
+        if missing:
+            raise KeyError(f"Columns not found in the planned data files: {missing}")
+        return self._replace(columns=list(columns))
+
+    def __getitem__(self, columns):
+        return self.select(columns)
+
+    def filter(self, column, op, value):
+        """
+        Add a row filter to the plan.
+
+        Args:
+        column (str): The column to filter on.
+        op (str): The operator, one of ==, !=, <, <=, >, >=, 'in' or 'not in'.
+        value: The value (or list of values for 'in' and 'not in') to compare with.
+
+        Returns:
+        LazyDataset: The refined handle.
+
+        Raises:
+        ValueError: If the operator is not supported.
+        """
+        if op not in self.operators:
+            raise ValueError(f"Unsupported filter operator: {op}. Use one of {list(self.operators)}.")
+        if column == "year":
+            keep = pd.Series(self.cycles)
+            keep = self.operators[op](keep, value)
+            return self._replace(data_files=[data_file for data_file, kept in zip(self.data_files, keep) if kept])
+        return self._replace(filters=self.filters + [(column, op, value)])
+
+    def _compare(self, series, op, value):
+        """
+        Apply a filter to a column. Character columns are decoded as bytes, so str values are compared as latin-1 bytes.
+        """
+        if pd.api.types.infer_dtype(series, skipna=True) == "bytes":
+            encode = lambda item: item.encode("latin-1") if isinstance(item, str) else item
+            value = [encode(item) for item in value] if op in ("in", "not in") else encode(value)
+        return self.operators[op](series, value)
+
+    def iter_chunks(self):
+        """
+        Download and decode the planned data files one at a time, without materializing the data.
+
+        Yields:
+        pd.DataFrame: The filtered, column-selected chunks of at most chunk_rows rows, in cycle order. Without a column
+        selection, each chunk has the columns of its data file.
+        """
+        filter_columns = [column for column, _, _ in self.filters]
+        for cycle_year, data_file_name in self.data_files:
+            decode = None
+            if self._columns is not None:
+                decode = self._columns + [column for column in filter_columns if column not in self._columns]
+            for chunk in self._api._iter_data_file_chunks(cycle_year, data_file_name, self.chunk_rows, decode):
+                if decode is not None:
+                    chunk = chunk.reindex(columns=decode)
+                for column, op, value in self.filters:
+                    series = chunk[column] if column in chunk.columns else pd.Series(float("nan"), index=chunk.index)
+                    chunk = chunk[self._compare(series, op, value)]
+                if self._columns is not None:
+                    chunk = chunk[self._columns]
+                yield chunk
+
+    def collect(self):
+        """
+        Download and decode the data of the plan.
+
+        Returns:
+        pd.DataFrame: The materialized data.
+
+        Raises:
+        ValueError: If the plan contains no data files.
+        """
+        if not self.data_files:
+            raise ValueError("No data available for the specified data category and cycle years.")
+        data = pd.concat(list(self.iter_chunks()), ignore_index=True)
+        return data[year_last(data.columns)] if self._columns is None else data
+
+    def to_pandas(self):
+        """
+        Alias of collect().
+
+        Returns:
+        pd.DataFrame: The materialized data.
+        """
+        return self.collect()
+
+    def head(self, n=5):
+        """
+        Materialize only the first n rows of the plan, downloading no more data files than needed.
+
+        Args:
+        n (int, optional): The number of rows. Defaults to 5.
+
+        Returns:
+        pd.DataFrame: The first n rows.
+        """
+        frames = []
+        rows = 0
+        for chunk in self._replace(chunk_rows=min(self.chunk_rows, max(n, 1))).iter_chunks():
+            frames.append(chunk)
+            rows += len(chunk)
+            if rows >= n:
+                break
+        if not frames:
+            return pd.DataFrame(columns=self.columns)
+        data = pd.concat(frames, ignore_index=True).head(n)
+        return data[year_last(data.columns)] if self._columns is None else data
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_CONTENT_TYPES = {".xpt": "application/octet-stream", ".htm": "text/html; charset=utf-8",
+                  ".html": "text/html; charset=utf-8", ".aspx": "text/html; charset=utf-8"}
+
+
+def _content_type(path):
+    extension = os.path.splitext(path.split("?", 1)[0])[1].lower()
+    return _CONTENT_TYPES.get(extension, "application/octet-stream")
+
+
+class LocalNHANESServer:
+    """
+    LocalNHANESServer is a local stand-in for the NHANES website, e.g., for tests and load tests without the network.
+
+    It serves the files of a dictionary of {url path: contents} over HTTP on 127.0.0.1. The url path includes the query
+    string, e.g., '/nchs/nhanes/search/variablelist.aspx?Component=demographics'. A content is either bytes, served
+    from memory, or the path of a local file, streamed from disk so that files larger than memory can be served (see
+    SyntheticNHANES.write). Point NHANESDataAPI at it with base_url=server.base_url.
+
+    Range requests (from an offset, 'bytes=start-end' and suffix ranges) are supported. With cut_after set, every
+    response is cut off after that many body bytes by closing the connection, to simulate dropped downloads. ranges and
+    content_length simulate servers that answer Range requests with the whole file, or send no Content-Length header.
+
+    Args:
+    files (dict): A dictionary of {url path: bytes or file path}, e.g., {'/Nchs/Nhanes/2005-2006/BMX_D.XPT': b'...'}.
+    cut_after (int, optional): The number of body bytes sent before the connection is dropped.
+    port (int, optional): The port to listen on. Defaults to 0, meaning any free port.
+    delay (float, optional): The number of seconds every response is delayed, to keep requests in flight. Defaults to 0.
+    max_concurrent (int, optional): Simulates a throttling server: requests beyond this number in flight are answered
+    with HTTP 429 and a Retry-After header of retry_after seconds. Defaults to None, meaning no throttling.
+    retry_after (float, optional): The Retry-After time of throttled requests. Defaults to 0.05.
+    ranges (bool, optional): Whether Range requests are honored. Defaults to True.
+    content_length (bool, optional): Whether the Content-Length header is sent; without it, the end of the body is
+    marked by closing the connection. Defaults to True.
+    """
+
+    def __init__(self, files, cut_after=None, port=0, delay=0, max_concurrent=None, retry_after=0.05, ranges=True,
+                 content_length=True):
+        self.files = files
+        self.cut_after = cut_after
+        self.ranges = ranges
+        self.content_length = content_length
+        self.delay = delay
+        self.max_concurrent = max_concurrent
+        self.retry_after = retry_after
+        self.requests = []
+        self.range_requests = []
+        self.throttled = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    if server.max_concurrent is not None and server.in_flight >= server.max_concurrent:
+                        server.throttled.append(self.path)
+                        throttled = True
+                    else:
+                        server.in_flight += 1
+                        server.max_in_flight = max(server.max_in_flight, server.in_flight)
+                        throttled = False
+                if throttled:
+                    self.send_response(429)
+                    self.send_header("Retry-After", str(server.retry_after))
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                try:
+                    self._send()
+                finally:
+                    with server._lock:
+                        server.in_flight -= 1
+
+            def _send(self):
+                server.requests.append(self.path)
+                time.sleep(server.delay)
+                body = server.files.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                if isinstance(body, bytes):
+                    size = len(body)
+                    etag = f'"{size}-{hash(body) & 0xffffffff:x}"'
+                else:
+                    stat = os.stat(body)
+                    size = stat.st_size
+                    etag = f'"{size}-{stat.st_mtime_ns & 0xffffffff:x}"'
+                start, end = 0, size
+                range_header = self.headers.get("Range")
+                if server.ranges and range_header and self.headers.get("If-Range") in (None, etag):
+                    first, last = range_header.split("=")[1].split("-")
+                    if first:
+                        start = int(first)
+                        end = min(end, int(last) + 1) if last else end
+                    else:
+                        start = max(0, size - int(last))
+                    server.range_requests.append((self.path, start))
+                    if start >= size:
+                        self.send_error(416)
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+                else:
+                    self.send_response(200)
+                self.send_header("Content-Type", _content_type(self.path))
+                if server.content_length:
+                    self.send_header("Content-Length", str(end - start))
+                else:
+                    self.close_connection = True
+                self.send_header("ETag", etag)
+                self.end_headers()
+                length = end - start
+                if server.cut_after is not None:
+                    length = min(length, server.cut_after)
+                    self.close_connection = True
+                if isinstance(body, bytes):
+                    self.wfile.write(body[start:start + length])
+                    return
+                with open(body, "rb") as data_file:
+                    data_file.seek(start)
+                    while length > 0:
+                        chunk = data_file.read(min(length, 1 << 20))
+                        if not chunk:
+                            break
+                        self.wfile.write(chunk)
+                        length -= len(chunk)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.port = self.httpd.server_address[1]
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+import re
+import time
+
+from .dataset import PartitionedDataset
+from .filelock import FileLock
+
+
+class MartDefinition:
+    """
+    MartDefinition declares an analysis mart: a wide table joining several data files on SEQN, one partition per cycle.
+
+    The first table is the base of the mart (usually the demographics). The other tables are joined to it on SEQN,
+    with a left join by default so that every participant of the base table is kept. A column that is already in the
+    mart from an earlier table is taken from that table.
+
+    Args:
+    name (str): The name of the mart, used as its directory name. Letters, digits, '_', '-' and '.' only.
+    tables (list): The tables of the mart, each a dict with the keys 'data_category', 'filename' and optionally
+    'columns', or a (data_category, filename) or (data_category, filename, columns) tuple. Columns of None (the
+    default) keep all columns of the data file.
+    how (str, optional): How the tables are joined to the base table, 'left' or 'inner'. Defaults to 'left'.
+
+    Raises:
+    ValueError: If the name, the tables or the join are invalid.
+    """
+
+    joins = ("left", "inner")
+
+    def __init__(self, name, tables, how="left"):
+        if not re.fullmatch(r"[\w.-]+", name or "") or name in (".", ".."):
+            raise ValueError(f"Invalid mart name: {name!r}. Use letters, digits, '_', '-' and '.' only.")
+        if how not in self.joins:
+            raise ValueError(f"Unsupported join: {how}. Use one of {list(self.joins)}.")
+        self.name = name
+        self.how = how
+        self.tables = [self._table(table) for table in tables]
+        if not self.tables:
+            raise ValueError("A mart needs at least one table.")
+
+    @staticmethod
+    def _table(table):
+        if isinstance(table, dict):
+            table = (table.get("data_category"), table.get("filename"), table.get("columns"))
+        if not 2 <= len(table) <= 3 or not table[0] or not table[1]:
+            raise ValueError(f"Invalid mart table: {table!r}. Give a data category, a file description and optionally columns.")
+        columns = table[2] if len(table) == 3 else None
+        if isinstance(columns, str):
+            columns = [columns]
+        return {"data_category": table[0], "filename": table[1], "columns": None if columns is None else list(columns)}
+
+    def __repr__(self):
+        return f"MartDefinition(name={self.name!r}, tables={self.tables}, how={self.how!r})"
+
+    def __eq__(self, other):
+        return isinstance(other, MartDefinition) and self.to_dict() == other.to_dict()
+
+    def to_dict(self):
+        """
+        Returns:
+        dict: The definition as {'name', 'tables', 'how'}, which can be stored as JSON.
+        """
+        return {"name": self.name, "tables": [dict(table) for table in self.tables], "how": self.how}
+
+    def fingerprint(self, inputs):
+        """
+        Compute the fingerprint of the inputs of a partition: the definition and the data files it is built from.
+
+        Args:
+        inputs (list of tuple): (data file name, SHA-256 checksum) pairs, one per table.
+
+        Returns:
+        str: A hex digest that changes whenever the definition, a data file name or a data file changes.
+        """
+        content = json.dumps({"definition": self.to_dict(), "inputs": [list(data_file) for data_file in inputs]}, sort_keys=True)
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def from_dict(cls, definition):
+        """
+        Create a definition from a dictionary, e.g., loaded from a JSON file.
+
+        Args:
+        definition (dict): The definition with the keys 'name', 'tables' and optionally 'how'.
+
+        Returns:
+        MartDefinition: The definition.
+        """
+        return cls(definition.get("name"), definition.get("tables") or [], definition.get("how", "left"))
+
+
+class AnalysisMart(PartitionedDataset):
+    """
+    AnalysisMart is the materialized table of a MartDefinition, stored as one Parquet file per cycle year.
+
+    Next to the partitions, a state file (mart.json) records the definition and, for each cycle year, the data files
+    it was built from with their checksums. NHANESDataAPI.build_mart compares them with the current inputs and only
+    rebuilds the partitions whose inputs changed. Reading a mart needs neither the network nor the data files: it is
+    a PartitionedDataset, see there for to_pandas(), iter_partitions(), iter_batches(), map_partitions() and
+    aggregate().
+
+    Args:
+    directory (str): The directory of the mart.
+    compression (str, optional): The Parquet column codec used to write partitions. Defaults to 'snappy'.
+    """
+
+    state_name = "mart.json"
+
+    def __init__(self, directory, compression="snappy"):
+        super().__init__(directory, compression)
+        self.built = []
+
+    def __repr__(self):
+        return f"AnalysisMart(directory={self.directory!r}, partitions={self.partitions})"
+
+    def read_state(self):
+        """
+        Read the state file of the mart.
+
+        Returns:
+        dict: {'definition': dict or None, 'partitions': {cycle year: {'fingerprint', 'data_files', 'rows', 'built_at'}}}.
+        """
+        path = os.path.join(self.directory, self.state_name)
+        if not os.path.exists(path):
+            return {"definition": None, "partitions": {}}
+        with open(path, "r") as state_file:
+            return json.load(state_file)
+
+    def _update_state(self, update):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, self.state_name)
+        with FileLock(f"{path}.lock"):
+            state = self.read_state()
+            update(state)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with open(temp_path, "w") as state_file:
+                json.dump(state, state_file, indent=2, sort_keys=True)
+            os.replace(temp_path, path)
+
+    @property
+    def definition(self):
+        """
+        MartDefinition: The definition the mart was built with, or None if it has not been built.
+        """
+        definition = self.read_state()["definition"]
+        return None if definition is None else MartDefinition.from_dict(definition)
+
+    def fingerprint(self, cycle_year):
+        """
+        Get the fingerprint of the inputs a partition was built from.
+
+        Args:
+        cycle_year (str): The cycle year.
+
+        Returns:
+        str: The fingerprint, or None if the partition has not been built.
+        """
+        return self.read_state()["partitions"].get(cycle_year, {}).get("fingerprint")
+
+    def reset(self, definition):
+        """
+        Delete all partitions and record a new definition.
+
+        Args:
+        definition (MartDefinition): The new definition.
+        """
+        for cycle_year in self.partitions:
+            os.remove(self.partition_path(cycle_year))
+
+        def update(state):
+            state["definition"] = definition.to_dict()
+            state["partitions"] = {}
+        self._update_state(update)
+
+    def record_partition(self, cycle_year, fingerprint, data_files, rows):
+        """
+        Record the inputs of a partition that has been written.
+
+        Args:
+        cycle_year (str): The cycle year.
+        fingerprint (str): The fingerprint of the inputs.
+        data_files (list of str): The data file names the partition was built from.
+        rows (int): The number of rows of the partition.
+        """
+        def update(state):
+            state["partitions"][cycle_year] = {"fingerprint": fingerprint, "data_files": list(data_files), "rows": rows,
+                                               "built_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        self._update_state(update)
+
+    def remove_partition(self, cycle_year):
+        """
+        Delete the partition of a cycle year and its state, e.g., when its data files are no longer available.
+
+        Args:
+        cycle_year (str): The cycle year.
+        """
+        if os.path.exists(self.partition_path(cycle_year)):
+            os.remove(self.partition_path(cycle_year))
+        self._update_state(lambda state: state["partitions"].pop(cycle_year, None))
@@ -0,0 +1,136 @@
+import copy
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from .singleflight import SingleFlight
+
+
+class MemoCache:
+    """
+    MemoCache memoizes results derived from the variable catalog, evicting the least recently used results.
+
+    Keys are tuples of JSON values (strings, numbers, lists). Callers include the content hash of the catalog data a
+    result is derived from in its key, so a result of an older catalog is never returned once the catalog changes,
+    also when another process changed it; invalidate() frees such results early. Concurrent calls for the same key
+    compute the result once. Results are copied when returned, so callers may modify them.
+
+    The results can be saved to a JSON file and loaded by a later process. Results and keys therefore have to be
+    JSON values; tuples come back as lists.
+
+    Args:
+    max_entries (int, optional): The number of results kept. Defaults to 1024.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max(0, int(max_entries))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def _key(key):
+        return json.dumps(key, separators=(",", ":"))
+
+    def _put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """
+        Get the memoized result of a key, computing and storing it if it is not memoized.
+
+        Args:
+        key (tuple): The key of the result.
+        compute (callable): The function computing the result, called without arguments. Exceptions are raised to the caller and nothing is stored.
+
+        Returns:
+        A copy of the result.
+        """
+        key = self._key(key)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self._entries[key])
+            self.misses += 1
+
+        value, shared = self._flights.do(key, compute)
+        if not shared:
+            self._put(key, value)
+        return copy.deepcopy(value)
+
+    def invalidate(self, match=None):
+        """
+        Drop memoized results.
+
+        Args:
+        match (callable, optional): A function of the key (as a list) that returns True for the results to drop. Defaults to None, meaning all results.
+
+        Returns:
+        int: The number of results dropped.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if match is None or match(json.loads(key))]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def stats(self):
+        """
+        Returns:
+        dict: {'entries', 'max_entries', 'hits', 'misses', 'evictions'}.
+        """
+        with self._lock:
+            return {"entries": len(self._entries), "max_entries": self.max_entries, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+    def save(self, path):
+        """
+        Save the memoized results to a JSON file, least recently used first. The file is replaced atomically.
+
+        Args:
+        path (str): The path of the file.
+        """
+        with self._lock:
+            entries = [[key, value] for key, value in self._entries.items()]
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w") as memo_file:
+            json.dump(entries, memo_file, separators=(",", ":"))
+        os.replace(temp_path, path)
+
+    def load(self, path):
+        """
+        Load memoized results saved with save(), keeping the most recently used ones if there are more than max_entries.
+
+        Results of an older catalog are loaded too; their keys no longer match and they are evicted as new results are
+        stored.
+
+        Args:
+        path (str): The path of the file. A missing or unreadable file is ignored.
+
+        Returns:
+        int: The number of results loaded.
+        """
+        try:
+            with open(path, "r") as memo_file:
+                entries = json.load(memo_file)
+        except (OSError, ValueError):
+            return 0
+        for key, value in entries:
+            self._put(key, value)
+        return min(len(entries), self.max_entries)
@@ -1,14 +1,56 @@
+import logging
 import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
 import pandas as pd
 
+from .aggregate import StreamingAggregator
+from .cache import DataCache
+from .catalog import VariableCatalog
+from .compression import CODECS, PARQUET_CODECS
+from .cycles import CycleDataset
+from .dataset import PartitionedDataset, _import_pyarrow, parse_memory_size, year_last
+from .lazy import LazyDataset
+from .mart import AnalysisMart, MartDefinition
+from .memo import MemoCache
+from .pipeline import PipelineStats, bounded_prefetch
+from .plan import RetrievalPlan, estimate_decoded_bytes
+from .sampling import sample_rows
+from .singleflight import SingleFlight
+from .throttle import configure_host, host_throttle
+from .variable_list import fetch_table
+from .xport import allocate_buffers, decode_into, decode_rows_into, fetch_header, iter_frames, read_header, union_schema
+
+try:
+    from ..nhanes_doc.codebook import LabelDecoder
+    from ..nhanes_doc.nhanes_doc_api import NHANESDocAPI
+except ImportError:  # Installed, nhanes_data and nhanes_doc are top-level packages
+    from nhanes_doc.codebook import LabelDecoder
+    from nhanes_doc.nhanes_doc_api import NHANESDocAPI
+
+logger = logging.getLogger(__name__)
+
 class NHANESDataAPI:
     """
     NHANESDataAPI provides an interface for accessing and manipulating data from the National Health and Nutrition Examination Survey (NHANES).
 
     The NHANES dataset consists of various data categories collected over multiple cycles. This API allows users to retrieve data by specifying data categories, cycle years, and data file descriptions, and perform common data operations.
 
+    An instance is thread-safe and can be shared, e.g., by the worker threads of a web application. Concurrent requests for the same variable table, data file or data file header wait for one in-flight fetch and share its result.
+
     Args:
     data_directory (str, optional): The directory where data will be stored or retrieved. Defaults to 'data/'.
+    base_url (str, optional): The base URL of the NHANES website. Defaults to 'https://wwwn.cdc.gov'.
+    cache_compression (str, optional): The codec used to store downloaded data files: 'gzip', 'bz2', 'lzma', 'zstd' or 'lz4'. Defaults to None, meaning uncompressed XPT files.
+    spill_compression (str, optional): The Parquet column codec of disk-backed datasets: 'none', 'snappy', 'gzip', 'brotli', 'lz4' or 'zstd'. Defaults to 'snappy'.
+    download_workers (int, optional): The number of data files downloaded ahead of decoding in multi-cycle retrievals. Defaults to 2.
+    max_buffered_bytes (int or str, optional): The limit on the size of the data files that are downloaded but not yet decoded in multi-cycle retrievals, in bytes or as a string such as '512MB'. Defaults to '1GB'.
+    host_limits (dict, optional): Rate limit and concurrency settings per host, {host: settings}, see throttle.configure_host. The settings apply to the whole process. Defaults to None, meaning the built-in settings (10 requests per second and an adaptive concurrency of up to 12 requests for wwwn.cdc.gov).
+    memo_size (int, optional): The number of results of list_file_names, retrieve_cycle_data_file_name_mapping and get_common_and_uncommon_variables that are memoized, see save_memo. Defaults to 1024.
 
     Attributes:
     __cycle_list (list of str): A list of available NHANES cycle years.
@@ -18,14 +60,28 @@ class NHANESDataAPI:
     - list_data_categories(): List the available NHANES data categories.
     - list_cycle_years(): List the available NHANES cycle years.
     - _retrieve_variable_table(data_category): Retrieve the variable table for a specific data category.
+    - build_catalog(data_categories=None, max_workers=6, refresh=False): Fetch the variable tables of several data categories concurrently into the local catalog.
+    - find_variable(variable_name): Find a variable across all data categories in the local catalog.
+    - save_memo(): Save the memoized catalog lookups to the data directory for later processes.
+    - memo_stats(): Get the size and hit statistics of the memoized catalog lookups.
     - list_file_names(data_category, cycle_years=None): Get a list of unique values in the 'Data File Description' column for a specific data category and optional cycle years.
     - retrieve_cycle_data_file_name_mapping(variable_table, file_name): Retrieve a dictionary of years and Data File Names based on a given "Data File Description."
     - _check_cycle(input_cycle): Check the validity of a cycle and return valid cycle(s) based on input.
     - _check_in_between_cycle(start_year, end_year): Check for valid cycles within a range.
     - _get_data_filename(data_category, cycle_year, data_file_description): Get the data file name for a specific cycle year and data file description.
-    - get_common_and_uncommon_variables(data_category, cycle_years): Find common and uncommon variables across multiple cycle years for a specific data category.
-    - retrieve_data(data_category, cycle, filename, include_uncommon_variables=True): Retrieve data for a specific data category, cycle year(s), and data file description.
-    - join_data_files(cycle_year, data_category1, file_name1, data_category2, file_name2, include_uncommon_variables=True): Join two data files from specified data categories and file names based on the common variable SEQN.
+    - get_common_and_uncommon_variables(data_category, cycle_years, data_file_description=None): Find common and uncommon variables across multiple cycle years for a specific data category or data file.
+    - probe_data_file(cycle_year, data_file_name, refresh=False): Read the exact variables and number of observations of a data file from its header.
+    - describe_data_files(data_category, cycle, filename): Get the data file name, number of variables and observations of each cycle year.
+    - plan(data_category, cycle, filename, include_uncommon_variables=True, max_memory=None, decode_labels=False, join=None, max_workers=4): Plan a retrieval or join and estimate its downloads, rows, columns and peak memory without downloading; the plan is executable.
+    - retrieve_data(data_category, cycle, filename, include_uncommon_variables=True, max_memory=None, lazy=False, decode_labels=False, partitioned=False): Retrieve data for a specific data category, cycle year(s), and data file description.
+    - append_cycles(data, data_category, cycle, filename, include_new_variables=False, decode_labels=False, chunk_rows=100000): Extend retrieved data or a stored dataset with only the cycle years it does not hold yet.
+    - join_data_files(cycle_year, data_category1, file_name1, data_category2, file_name2, include_uncommon_variables=True, max_memory=None, max_workers=4, decode_labels=False): Join two data files from specified data categories and file names based on the common variable SEQN.
+    - aggregate_data(data_category, cycle, filename, aggregations, by='SEQN', chunk_rows=100000): Aggregate the data per participant while decoding, without loading the rows.
+    - sample_data(data_category, cycle, filename, fraction=None, n=None, seed=0, include_uncommon_variables=True, decode_labels=False): Retrieve a consistent random sample of participants, decoding only their records.
+    - build_mart(definition, cycle, max_workers=4): Materialize an analysis mart of joined data files per cycle, rebuilding only the cycles whose inputs changed.
+    - load_mart(name): Load a materialized analysis mart.
+    - prefetch_data(data_categories, cycles, file_names=None, max_workers=4, progress=None): Download the matching data files into the data directory concurrently.
+    - compression_report(data_category, cycle, filename, codecs=None, spill_codecs=None, repeat=3): Measure the trade-offs of the cache and Parquet compression codecs on some data files.
 
     """
 
@@ -51,14 +107,35 @@ class NHANESDataAPI:
         "limitedaccess"
     ]
 
-    def __init__(self, data_directory="data/"):
+    def __init__(self, data_directory="data/", base_url="https://wwwn.cdc.gov", cache_compression=None, spill_compression="snappy",
+                 download_workers=2, max_buffered_bytes="1GB", host_limits=None, memo_size=1024):
         """
         Initialize the NHANES Data API.
 
         Args:
         data_directory (str): Directory where data will be stored.
+        base_url (str): The base URL of the NHANES website.
+        cache_compression (str): The codec used to store downloaded data files, or None for uncompressed files.
+        spill_compression (str): The Parquet column codec of disk-backed datasets.
+        download_workers (int): The number of data files downloaded ahead of decoding.
+        max_buffered_bytes (int or str): The limit on the size of downloaded but not yet decoded data files.
+        host_limits (dict): Rate limit and concurrency settings per host.
+        memo_size (int): The number of memoized catalog lookups.
         """
         self.data_directory = data_directory
+        self.base_url = base_url.rstrip("/")
+        self.spill_compression = spill_compression
+        self.download_workers = max(1, int(download_workers))
+        self.max_buffered_bytes = parse_memory_size(max_buffered_bytes)
+        self._cache = DataCache(data_directory, compression=cache_compression)
+        self._catalog = VariableCatalog(os.path.join(data_directory, "catalog.sqlite"))
+        self._headers = {}
+        self._flights = SingleFlight()
+        self._docs = NHANESDocAPI(data_directory, base_url)
+        self._memo = MemoCache(memo_size)
+        self._memo.load(os.path.join(data_directory, "memo.json"))
+        for host, settings in (host_limits or {}).items():
+            configure_host(host, **settings)
 
     def list_data_categories(self):
         """
@@ -84,6 +161,8 @@ class NHANESDataAPI:
         """
         Retrieve the variable table for a specific data category.
 
+        The variablelist page is parsed while it is downloaded, keeping only the columns of the variable table.
+
         Args:
         data_category (str): The data category for which you want the variable table.
 
@@ -93,18 +172,20 @@ class NHANESDataAPI:
         Raises:
         Exception: If there is an error fetching the variable table or if the website's format has changed.
         """
-        url = f"https://wwwn.cdc.gov/nchs/nhanes/search/variablelist.aspx?Component={data_category}"
+        url = f"{self.base_url}/nchs/nhanes/search/variablelist.aspx?Component={data_category}"
 
         try:
-            variable_table = pd.read_html(url)[0]  # Assuming the table is the first one on the page
+            # Assuming the table is the first one on the page
+            variable_table = fetch_table(url, ["Variable Name", "Variable Description", "Data File Name",
+                                               "Data File Description", "Begin Year", "EndYear"])
         except (ValueError, IndexError) as e:
             # If no tables are found, return None
-            print(f"Exception raised: {type(e).__name__} - {str(e)}")
+            logger.warning("No variable table found for data category %r: %s - %s", data_category, type(e).__name__, e)
             return None
 
         if "Begin Year" in variable_table.columns and "EndYear" in variable_table.columns:
-            variable_table["Years"] = variable_table.apply(lambda row: f"{row['Begin Year']}-{row['EndYear']}", axis=1)
-            variable_table.drop(["Begin Year", "EndYear", "Component", "Use Constraints"], axis=1, inplace=True)
+            variable_table["Years"] = variable_table["Begin Year"].str.cat(variable_table["EndYear"], sep="-")
+            variable_table.drop(["Begin Year", "EndYear"], axis=1, inplace=True)
             variable_table = variable_table.loc[variable_table["Years"].isin(self.__cycle_list)]
 
             if variable_table.empty:
@@ -122,6 +203,122 @@ class NHANESDataAPI:
         return variable_table
 
 
+    def _load_catalog(self, data_category):
+        """
+        Make sure the variable table of a data category is stored in the local catalog, fetching it on first use.
+
+        Args:
+        data_category (str): The data category.
+
+        Returns:
+        bool: True if the catalog holds variables for the data category, False if no variable table is available.
+        """
+        if self._catalog.has_category(data_category):
+            return True
+        stored, _ = self._flights.do(("catalog", data_category), self._fetch_catalog, data_category, False)
+        return stored
+
+
+    def _fetch_catalog(self, data_category, refresh):
+        """
+        Fetch the variable table of a data category into the local catalog. Concurrent callers go through
+        self._flights, so a variable table is fetched once however many threads need it.
+
+        Args:
+        data_category (str): The data category.
+        refresh (bool): Whether to fetch the variable table even if it is already stored.
+
+        Returns:
+        bool: True if the catalog holds variables for the data category, False if no variable table is available.
+        """
+        if not refresh and self._catalog.has_category(data_category):
+            return True
+        variable_table = self._retrieve_variable_table(data_category)
+        if variable_table is None:
+            return False
+        self._catalog.store(data_category, variable_table)
+        self._memo.invalidate(lambda key: key[1] == data_category)
+        return True
+
+
+    def build_catalog(self, data_categories=None, max_workers=6, refresh=False):
+        """
+        Fetch the variable tables of several data categories concurrently and store them in the local catalog.
+
+        The catalog is an indexed SQLite database (catalog.sqlite) in the data directory, shared by all processes that
+        use the same data directory. Data categories that are already stored are not fetched again unless refresh is True.
+
+        Args:
+        data_categories (str or list of str, optional): The data categories to fetch. Defaults to None, meaning all data categories.
+        max_workers (int, optional): The number of variable tables fetched concurrently. Defaults to 6.
+        refresh (bool, optional): Whether to fetch data categories that are already stored again. Defaults to False.
+
+        Returns:
+        dict: A dictionary of {data category: number of variable rows} for the requested data categories that have data.
+
+        Raises:
+        Exception: If a variable table cannot be retrieved.
+        """
+        if data_categories is None:
+            data_categories = self.__data_category_list
+        elif isinstance(data_categories, str):
+            data_categories = [data_categories]
+
+        to_fetch = [category for category in data_categories if refresh or not self._catalog.has_category(category)]
+        if to_fetch:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(self._flights.do, ("catalog", category), self._fetch_catalog, category, refresh): category
+                           for category in to_fetch}
+                for future in as_completed(futures):
+                    try:
+                        future.result()
+                    except Exception as e:
+                        raise Exception(f"Error while retrieving the variable table for {futures[future]}: {e}")
+
+        stored = self._catalog.categories()
+        return {category: stored[category] for category in data_categories if category in stored}
+
+
+    def find_variable(self, variable_name):
+        """
+        Find a variable across all data categories stored in the local catalog.
+
+        Args:
+        variable_name (str): The variable name, e.g., 'LBXGH'.
+
+        Returns:
+        pd.DataFrame: A pandas DataFrame with the data category, data file and cycle year of every occurrence of the variable.
+        """
+        return self._catalog.find_variable(variable_name)
+
+
+    def save_memo(self):
+        """
+        Save the memoized results of list_file_names, retrieve_cycle_data_file_name_mapping and
+        get_common_and_uncommon_variables to memo.json in the data directory, where new instances load them from.
+
+        Results are keyed by the data category, the normalized cycle years and the content hash of the variable table
+        in the local catalog, so results of a catalog that has changed since (e.g., with build_catalog(refresh=True))
+        are never used.
+
+        Returns:
+        str: The path of the saved file.
+        """
+        path = os.path.join(self.data_directory, "memo.json")
+        self._memo.save(path)
+        return path
+
+
+    def memo_stats(self):
+        """
+        Get the statistics of the memoized catalog lookups.
+
+        Returns:
+        dict: {'entries', 'max_entries', 'hits', 'misses', 'evictions'}.
+        """
+        return self._memo.stats()
+
+
     def list_file_names(self, data_category, cycle_years=None):
         """
         Get a list of unique values in the 'Data File Description' column for a specific data category and optional cycle years.
@@ -137,25 +334,20 @@ class NHANESDataAPI:
         Exception: If there is an error fetching the variable table, if no data is available, or if the data category is not recognized.
         """
         try:
-            variable_table = self._retrieve_variable_table(data_category)
+            available = self._load_catalog(data_category)
         except Exception as e:
             raise Exception(f"Error while retrieving the variable table: {e}")
 
-        if variable_table is None:
+        if not available:
             raise Exception("No data available for the specified data category and cycle years.")
 
-        if cycle_years is not None:
-            # Filter the variable table based on specified year-cycles
-            valid_cycles = self._check_cycle(cycle_years)
-            variable_table = variable_table[variable_table['Years'].isin(valid_cycles)]
+        # Filter on the specified year-cycles, if any
+        valid_cycles = self._normalize_cycles(self._check_cycle(cycle_years)) if cycle_years is not None else None
+        key = ("file_names", data_category, self._catalog.content_hash(data_category), valid_cycles)
+        unique_descriptions = self._memo.get_or_compute(key, lambda: self._catalog.file_descriptions(data_category, valid_cycles))
 
-            if variable_table.empty:
-                raise Exception("No data available for the specified data category and cycle years.")
-
-        try:
-            unique_descriptions = variable_table["Data File Description"].unique().tolist()
-        except KeyError:
-            raise Exception("The variable table format has changed. Please update the code to match the new format.")
+        if not unique_descriptions:
+            raise Exception("No data available for the specified data category and cycle years.")
 
         return unique_descriptions
     
@@ -165,8 +357,11 @@ class NHANESDataAPI:
         """
         Retrieve a dictionary of years and Data File Names based on a given "Data File Description."
 
+        Given a data category instead of a variable table, the mapping is looked up in the local catalog and memoized.
+
         Args:
-        data_file_description (str): The "Data File Description" to filter the variable table.
+        variable_table (pd.DataFrame or str): The variable table to filter, or a data category.
+        file_name (str): The "Data File Description" to filter the variable table.
 
         Returns:
         dict: A dictionary mapping years to Data File Names.
@@ -174,18 +369,22 @@ class NHANESDataAPI:
         Raises:
         ValueError: If no data matches the provided "Data File Description."
         """
+        if isinstance(variable_table, str):
+            data_category = variable_table
+            years_data_files_dict = {}
+            if self._load_catalog(data_category):
+                key = ("file_name_mapping", data_category, self._catalog.content_hash(data_category), file_name)
+                years_data_files_dict = self._memo.get_or_compute(key, lambda: self._catalog.data_file_names(data_category, file_name))
+            if not years_data_files_dict:
+                raise ValueError(f"No data found for the specified 'Data File Description': {file_name}")
+            return years_data_files_dict
+
         filtered_data = variable_table[variable_table["Data File Description"] == file_name]
 
         if filtered_data.empty:
             raise ValueError(f"No data found for the specified 'Data File Description': {file_name}")
 
-        years_data_files_dict = {}
-        for index, row in filtered_data.iterrows():
-            years = row["Years"]
-            data_file_name = row["Data File Name"]
-            years_data_files_dict[years] = data_file_name
-
-        return years_data_files_dict
+        return dict(zip(filtered_data["Years"], filtered_data["Data File Name"]))
 
 
     def _check_cycle(self, input_cycle):
@@ -227,6 +426,19 @@ class NHANESDataAPI:
     
 
 
+    def _normalize_cycles(self, cycle_years):
+        """
+        Normalize valid cycle years to a set in chronological order, so that equivalent cycle inputs share memoized results.
+
+        Args:
+        cycle_years (list of str): Valid cycle years, as returned by _check_cycle.
+
+        Returns:
+        list: The unique cycle years in chronological order.
+        """
+        return sorted(set(cycle_years), key=self.__cycle_list.index)
+
+
     def _check_in_between_cycle(self, start_year, end_year):
         """
         Check for valid cycles within a range.
@@ -267,23 +479,47 @@ class NHANESDataAPI:
         Raises:
         ValueError: If no matching data file name is found.
         """
-        variable_table = self._retrieve_variable_table(data_category)
+        data_file_name = None
+        if self._load_catalog(data_category):
+            data_file_name = self._catalog.data_file_name(data_category, cycle_year, data_file_description)
 
-        try:
-            data_file_name = variable_table.loc[(variable_table['Years'] == cycle_year) & (variable_table['Data File Description'] == data_file_description), 'Data File Name'].values[0]
-            return data_file_name
-        except IndexError:
+        if data_file_name is None:
             raise ValueError(f"No data file found for Data Category: {data_category}, Year: {cycle_year}, Data File Description: {data_file_description}")
+        return data_file_name
+
+
+
+    def _find_data_files(self, data_category, cycle_years, data_file_description):
+        """
+        Get the data file of each cycle year that has one, skipping the cycle years without the data file.
+
+        Args:
+        data_category (str): The data category.
+        cycle_years (list of str): The valid cycle years.
+        data_file_description (str): The data file description.
+
+        Returns:
+        list of tuple: (cycle year, data file name) pairs in the order of cycle_years, empty if no cycle year has the data file.
+        """
+        if not self._load_catalog(data_category):
+            return []
+        names = [(cycle_year, self._catalog.data_file_name(data_category, cycle_year, data_file_description)) for cycle_year in cycle_years]
+        return [(cycle_year, data_file_name) for cycle_year, data_file_name in names if data_file_name is not None]
 
 
 
-    def get_common_and_uncommon_variables(self, data_category, cycle_years):
+    def get_common_and_uncommon_variables(self, data_category, cycle_years, data_file_description=None):
         """
         Find common and uncommon variables across multiple cycle years for a specific data category.
 
+        Without a data file description, the variables of the whole data category are compared, as listed in the
+        variable table. With a data file description, the variables of the actual data files are compared, as read
+        from their headers (see probe_data_file).
+
         Args:
         data_category (str): The data category for which data is requested.
         cycle_years (str or list of str): Either a single cycle year or a list of cycle years.
+        data_file_description (str, optional): Only compare the variables of the data files with this description. Defaults to None.
 
         Returns:
         list: List of common variables found across the specified cycle years.
@@ -291,19 +527,17 @@ class NHANESDataAPI:
         dict: A dictionary of {variable (Variable Description): [cycles]} showing which cycles each variable appears in.
         
         Raises:
-        ValueError: If the specified cycle years are invalid or if there is only one cycle specified.
+        ValueError: If the specified cycle years are invalid, if there is only one cycle specified or if a data file is not found.
         """
         if isinstance(cycle_years, str):
             cycle_years = [cycle_years]
 
-        common_variables = None
-        variable_cycles_dict = {}
-        all_variables = list()  # Initialize a list for all variables
-        variable_table = self._retrieve_variable_table(data_category)  # Retrieve the variable table once
+        self._load_catalog(data_category)  # Make sure the variable table is in the local catalog
 
         valid_cycles = list()
         for cycle in cycle_years:
             valid_cycles = valid_cycles + self._check_cycle(cycle)
+        valid_cycles = self._normalize_cycles(valid_cycles)
 
         if valid_cycles == []:
             raise ValueError(f"You have entered an Invalid cycle. Below is a list of valid cycles: \n {self.__cycle_list}")
@@ -311,10 +545,38 @@ class NHANESDataAPI:
         if len(valid_cycles) < 2:
             raise ValueError("There is only one cycle here. This function can only be performed for 2 or more cycle years.")
 
+        if data_file_description is None:
+            def compare():
+                return self._compare_variables({cycle: self._catalog.variable_names(data_category, cycle) for cycle in valid_cycles})
+
+            key = ("common_variables", data_category, self._catalog.content_hash(data_category), valid_cycles)
+            return tuple(self._memo.get_or_compute(key, compare))
+
+        # The variables of the data files are read from their headers, which are stored per data file
+        variables = {}
         for valid_cycle in valid_cycles:
-            variables = [row['Variable Name'] for index, row in variable_table.iterrows() if row['Years'] == valid_cycle]
+            header = self.probe_data_file(valid_cycle, self._get_data_filename(data_category, valid_cycle, data_file_description))
+            variables[valid_cycle] = [field["name"] for field in header["fields"]]
+        return self._compare_variables(variables)
+
 
+    def _compare_variables(self, cycle_variables):
+        """
+        Compare the variables of several cycle years.
 
+        Args:
+        cycle_variables (dict): A dictionary of {cycle year: [variables]}.
+
+        Returns:
+        list: The variables found in every cycle year.
+        list: The variables not found in every cycle year.
+        dict: A dictionary of {variable: [cycles]} showing which cycles each variable appears in.
+        """
+        common_variables = None
+        variable_cycles_dict = {}
+        all_variables = list()  # Initialize a list for all variables
+
+        for valid_cycle, variables in cycle_variables.items():
             if common_variables is None:
                 common_variables = set(variables)
             else:
@@ -394,82 +656,584 @@ class NHANESDataAPI:
 
 
 
-    def retrieve_data(self, data_category, cycle, filename, include_uncommon_variables=True):
+    def _data_file_url(self, cycle_year, data_file_name):
+        """
+        Get the download URL of a data file.
+
+        Args:
+        cycle_year (str): The cycle year of the data file.
+        data_file_name (str): The data file name.
+
+        Returns:
+        str: The URL of the XPT file on the NHANES website.
+        """
+        return f"{self.base_url}/Nchs/Nhanes/{cycle_year}/{data_file_name}.XPT"
+
+
+    def _fetch_data_file(self, cycle_year, data_file_name):
+        """
+        Make sure a data file is in the data directory and verified against the cache manifest.
+
+        Args:
+        cycle_year (str): The cycle year of the data file.
+        data_file_name (str): The data file name.
+
+        Returns:
+        str: The local path of the data file.
+        """
+        path, _ = self._cache.fetch(self._data_file_url(cycle_year, data_file_name), cycle_year, data_file_name, verify=True)
+        return path
+
+
+    def probe_data_file(self, cycle_year, data_file_name, refresh=False):
+        """
+        Read the exact variables, variable types and number of observations of a data file from its XPORT header.
+
+        A cached data file is probed locally. Otherwise only the header records are requested from the NHANES website
+        with HTTP Range requests (a few kilobytes), and the data file itself is not downloaded, unless the server
+        reports neither the size of the file nor byte ranges; the file is then downloaded to the cache. Probed headers are
+        stored in the local catalog, so every data file is probed only once per data directory. A stored header is
+        probed again if the cached data file no longer has the size it was probed with.
+
+        Args:
+        cycle_year (str): The cycle year of the data file, e.g., '2005-2006'.
+        data_file_name (str): The data file name, e.g., 'DEMO_D'.
+        refresh (bool, optional): Whether to probe the data file again even if its header is stored. Defaults to False.
+
+        Returns:
+        dict: The header with the keys 'fields' (list of dicts with 'name', 'type' ('numeric' or 'char'), 'length',
+        'offset' and 'label'), 'nobs' (the number of observations), 'record_length' and 'file_size'.
+
+        Raises:
+        ValueError: If the data file is not a SAS XPORT file.
+        IOError: If the header cannot be requested.
+        """
+        header, _ = self._flights.do(("header", cycle_year, data_file_name), self._probe_data_file, cycle_year, data_file_name, refresh)
+        return header
+
+
+    def _probe_data_file(self, cycle_year, data_file_name, refresh):
+        key = (cycle_year, data_file_name)
+        header = None if refresh else (self._headers.get(key) or self._catalog.data_file_header(cycle_year, data_file_name))
+        cached = self._cache.is_cached(cycle_year, data_file_name)
+        if header is not None and cached:
+            entry = self._cache.read_manifest().get(self._cache.file_key(cycle_year, data_file_name), {})
+            if header["file_size"] != entry.get("size"):
+                header = None
+
+        if header is None:
+            if not cached:
+                header = fetch_header(self._data_file_url(cycle_year, data_file_name))
+                if header is None:
+                    # The server reports neither the size of the file nor its last bytes, so the header is read from
+                    # the downloaded file
+                    self._fetch_data_file(cycle_year, data_file_name)
+            if header is None:
+                xport_file, file_size = self._cache.open(cycle_year, data_file_name)
+                with xport_file:
+                    header = read_header(xport_file, file_size)
+            self._catalog.store_data_file_header(cycle_year, data_file_name, header)
+        self._headers[key] = header
+        return header
+
+
+    def describe_data_files(self, data_category, cycle, filename):
+        """
+        Describe the data files a call to retrieve_data would read, without downloading them.
+
+        Args:
+        data_category (str): The data category.
+        cycle (str or list): The cycle year(s).
+        filename (str): The data file description.
+
+        Returns:
+        pd.DataFrame: One row per cycle year with the columns 'Years', 'Data File Name', 'Variables' (the number of
+        variables), 'Observations' and 'File Size' (in bytes).
+
+        Raises:
+        ValueError: If the cycle is invalid or a data file is not found.
+        """
+        cycle_years = self._check_cycle(cycle)
+        if not cycle_years:
+            raise ValueError("Invalid cycle input.")
+
+        rows = []
+        for cycle_year in cycle_years:
+            data_file_name = self._get_data_filename(data_category, cycle_year, filename)
+            header = self.probe_data_file(cycle_year, data_file_name)
+            rows.append((cycle_year, data_file_name, len(header["fields"]), header["nobs"], header["file_size"]))
+        return pd.DataFrame(rows, columns=["Years", "Data File Name", "Variables", "Observations", "File Size"])
+
+
+    def plan(self, data_category, cycle, filename, include_uncommon_variables=True, max_memory=None, decode_labels=False, join=None, max_workers=4):
+        """
+        Plan a call to retrieve_data, or to join_data_files with join, and estimate its cost without downloading any data file.
+
+        The cycles are resolved with _check_cycle and the data file names from the local catalog, as the call would
+        resolve them. The cache state of each data file is read from the cache manifest and its header with
+        probe_data_file (from the cached file, the local catalog or with HTTP Range requests), max_workers headers at a
+        time. See RetrievalPlan for the estimates.
+
+        Args:
+        data_category (str): The data category.
+        cycle (str or list): The cycle year(s), in any format accepted by retrieve_data.
+        filename (str): The data file description.
+        include_uncommon_variables (bool, optional): Whether to include uncommon variables. Defaults to True.
+        max_memory (int or str, optional): The memory budget of the call, see retrieve_data and join_data_files. Defaults to None, meaning no budget.
+        decode_labels (bool, optional): Whether the call decodes value labels. The documentation pages are only fetched when the plan is executed. Defaults to False.
+        join (tuple, optional): The (data category, data file description) of a second data file, to plan join_data_files(cycle, data_category, filename, *join). Defaults to None, meaning retrieve_data.
+        max_workers (int, optional): The number of headers probed at a time, and the number of cycles joined in parallel when the plan is executed. Defaults to 4.
+
+        Returns:
+        RetrievalPlan: The plan with the data files, their cache state and the estimated rows, columns and peak memory. plan.execute() runs the call.
+
+        Raises:
+        ValueError: If the cycle is invalid or none of the cycle years has the data file (for a join: if the two data files are not both available in any of the cycle years). Cycle years without the data file(s) are listed in plan.skipped.
+        """
+        cycle_years = self._check_cycle(cycle)
+        if not cycle_years:
+            raise ValueError("Invalid cycle input.")
+
+        inputs = [(data_category, filename)] + ([tuple(join)] if join is not None else [])
+        names = []
+        for category, file_name in inputs:
+            if join is not None and not self._load_catalog(category):
+                raise ValueError(f"No data available for data category '{category}'.")
+            names.append(dict(self._find_data_files(category, cycle_years, file_name)))
+        cycles = [cycle_year for cycle_year in cycle_years if all(side.get(cycle_year) for side in names)]
+        if not cycles and join is None:
+            raise ValueError(f"No data available for Data Category: {data_category}, Years: {cycle_years}, Data File Description: {filename}")
+        if not cycles:
+            raise ValueError(f"Data files '{filename}' and '{join[1]}' are not both available in any of the cycle years {cycle_years}.")
+        skipped = [cycle_year for cycle_year in cycle_years if cycle_year not in cycles]
+
+        data_files = list(dict.fromkeys((cycle_year, side[cycle_year]) for side in names for cycle_year in cycles))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            headers = dict(zip(data_files, executor.map(lambda data_file: self.probe_data_file(*data_file), data_files)))
+
+        sides = []
+        for (category, file_name), side in zip(inputs, names):
+            columns = None
+            if include_uncommon_variables is False and len(cycles) > 1:
+                common_variables, _, _ = self.get_common_and_uncommon_variables(category, cycles, file_name)
+                columns = [field["name"] for field in headers[(cycles[0], side[cycles[0]])]["fields"] if field["name"] in common_variables]
+            sides.append({"data_category": category, "filename": file_name, "columns": columns, "data_files": [
+                {"cycle_year": cycle_year, "data_file_name": side[cycle_year], "header": headers[(cycle_year, side[cycle_year])],
+                 "cached": self._cache.is_cached(cycle_year, side[cycle_year])} for cycle_year in cycles]})
+
+        if join is None:
+            arguments = {"data_category": data_category, "cycle": cycle, "filename": filename,
+                         "include_uncommon_variables": include_uncommon_variables, "max_memory": max_memory,
+                         "decode_labels": decode_labels}
+            return RetrievalPlan(self, "retrieve_data", arguments, sides, skipped=skipped)
+        arguments = {"cycle_year": cycle, "data_category1": data_category, "file_name1": filename,
+                     "data_category2": join[0], "file_name2": join[1], "include_uncommon_variables": include_uncommon_variables,
+                     "max_memory": max_memory, "max_workers": max_workers, "decode_labels": decode_labels}
+        return RetrievalPlan(self, "join_data_files", arguments, sides, skipped=skipped)
+
+
+    def _spill_if_over_budget(self, data_files, columns, max_memory, decoder=None):
+        """
+        Write the data files to a disk-backed dataset if loading them would exceed the memory budget.
+
+        The decision is made from the XPORT headers alone (from the catalog, the cache or HTTP Range requests), so no
+        data file is downloaded for a result that fits in memory before _assemble_data_files. The projected size of the
+        result is that of the selected columns of all the records (see plan.estimate_decoded_bytes): decoded numeric
+        values take 8 bytes and character values about 41 bytes plus their length, plus the 'year' column. The result
+        is decoded into preallocated buffers, so the cycles are never held twice. Over budget, each file is decoded in
+        chunks of about a quarter of the budget and written to its own Parquet partition under
+        data_directory/spill/, so only one chunk is in memory at a time. The spilled dataset is kept until it is
+        deleted, with PartitionedDataset.delete() or by using it as a context manager.
+
+        Args:
+        data_files (list of tuple): (cycle year, data file name) pairs.
+        columns (list of str): The columns to keep, or None to keep all columns.
+        max_memory (int or str): The memory budget in bytes, or a string such as '2GB'.
+        decoder (LabelDecoder, optional): Applied to each chunk to decode value labels. Defaults to None.
+
+        Returns:
+        PartitionedDataset: The disk-backed dataset, or None if the result fits in the memory budget.
+
+        Raises:
+        ValueError: If a data file cannot be probed or fetched.
+        """
+        budget = parse_memory_size(max_memory)
+        headers = []
+        for cycle_year, data_file_name in data_files:
+            try:
+                headers.append(self.probe_data_file(cycle_year, data_file_name))
+            except Exception as e:
+                raise ValueError(f"Error fetching data for cycle {cycle_year}: {str(e)}")
+
+        if estimate_decoded_bytes(headers, columns) <= budget:
+            return None
+
+        dataset = PartitionedDataset(os.path.join(self.data_directory, "spill", uuid.uuid4().hex), compression=self.spill_compression)
+        try:
+            for (cycle_year, data_file_name), header in zip(data_files, headers):
+                try:
+                    self._fetch_data_file(cycle_year, data_file_name)
+                except Exception as e:
+                    raise ValueError(f"Error fetching data for cycle {cycle_year}: {str(e)}")
+                chunk_rows = max(1, (budget // 4) // max(1, header["record_length"]))
+                chunks = self._iter_data_file_chunks(cycle_year, data_file_name, chunk_rows, columns)
+                if decoder is not None:
+                    chunks = (decoder(chunk) for chunk in chunks)
+                dataset.write_partition(cycle_year, chunks)
+        except BaseException:
+            dataset.delete()
+            raise
+        return dataset
+
+
+    def _iter_data_file_chunks(self, cycle_year, data_file_name, chunk_rows, columns=None):
+        """
+        Fetch a data file and decode it in chunks of at most chunk_rows rows.
+
+        Args:
+        cycle_year (str): The cycle year, added as the 'year' column.
+        data_file_name (str): The data file name.
+        chunk_rows (int): The maximum number of rows per chunk.
+        columns (list of str, optional): The columns to keep. Defaults to None, meaning all columns.
+
+        Yields:
+        pd.DataFrame: The decoded chunks.
+        """
+        self._fetch_data_file(cycle_year, data_file_name)
+        header = self.probe_data_file(cycle_year, data_file_name)
+        xport_file, _ = self._cache.open(cycle_year, data_file_name)
+        with xport_file:
+            for chunk in iter_frames(xport_file, header, chunk_rows, columns):
+                chunk['year'] = cycle_year
+                yield chunk
+
+
+    def retrieve_data(self, data_category, cycle, filename, include_uncommon_variables=True, max_memory=None, lazy=False, decode_labels=False, partitioned=False):
         """
         Retrieve data for a specific data category, cycle year(s), and data file description.
 
+        Cycle years without the data file are skipped when several cycle years are requested, as in aggregate_data,
+        sample_data and append_cycles; a single cycle year without it raises a ValueError.
+
         Args:
         data_category (str): The data category for which you want to retrieve data.
         cycle (str or list): The cycle year(s) for which you want to retrieve data.
         filename (str): The data file description for which you want to retrieve data.
         include_uncommon_variables (bool, optional): Whether to include uncommon variables. Defaults to True.
         specific_variables (list of str, optional): List of specific variables to retrieve. Defaults to None, meaning all variables will be retrieved.
+        max_memory (int or str, optional): Memory budget for the result in bytes, or a string such as '2GB'. If the projected size of the result (estimated from the XPORT headers for the selected columns, before any download) exceeds it, the data is written to Parquet files under data_directory/spill/ instead of being loaded. The files are kept until the returned dataset is deleted with delete(), or on exit when it is used as a context manager. Requires pyarrow. Defaults to None, meaning no budget.
+
+        lazy (bool, optional): Whether to return a LazyDataset handle holding the resolved plan instead of downloading the data. Defaults to False.
+        decode_labels (bool, optional): Whether to turn coded variables into pandas Categoricals of their value labels and missing-value codes (refused, don't know) into NaN, using the codebooks of the data files (see NHANESDocAPI). Variables with ranges of values stay numeric. Not supported with lazy. Defaults to False.
+        partitioned (bool, optional): Whether to return a CycleDataset with one partition per cycle year, decoded from the cache when accessed, instead of one DataFrame. Its map_partitions, filter and aggregate operations process the cycles in parallel. max_memory is not used, and lazy is not supported. Defaults to False.
 
         Returns:
         pd.DataFrame: A pandas DataFrame containing the retrieved data.
+        PartitionedDataset: A disk-backed dataset with one partition per cycle, instead of the DataFrame, if max_memory is exceeded.
+        LazyDataset: A handle on the planned retrieval, if lazy is True. Nothing is downloaded until it is materialized.
+        CycleDataset: The per-cycle partitions, if partitioned is True. Nothing is downloaded until a partition is accessed.
 
         Raises:
-        Exception: If there is an error retrieving the data.
+        ValueError: If the cycle is invalid, none of the cycle years has the data file, or a data file cannot be fetched.
         """
         temp_cycle_list = self._check_cycle(cycle)
         if not temp_cycle_list:
             raise ValueError("Invalid cycle input.")
         
-        if len(temp_cycle_list) == 1:
+        if lazy:
+            if decode_labels:
+                raise ValueError("decode_labels is not supported with lazy=True.")
+            if partitioned:
+                raise ValueError("partitioned is not supported with lazy=True.")
+            return self._plan_lazy(data_category, temp_cycle_list, filename, include_uncommon_variables)
+
+        if len(temp_cycle_list) == 1 and not partitioned:
             data_file_name = self._get_data_filename(data_category, temp_cycle_list[0], filename)
             if data_file_name is None:
                 raise ValueError(f"No data file found for Data Category: {data_category}, Year: {temp_cycle_list[0]}, Data File Description: {filename}")
-            data = pd.read_sas(f"https://wwwn.cdc.gov/Nchs/Nhanes/{temp_cycle_list[0]}/{data_file_name}.XPT")
-            data['year'] = temp_cycle_list[0]
-            return data
+            data_files = [(temp_cycle_list[0], data_file_name)]
+            decoder = self._label_decoder(data_files) if decode_labels else None
+            if max_memory is not None:
+                dataset = self._spill_if_over_budget(data_files, None, max_memory, decoder)
+                if dataset is not None:
+                    return dataset
+            data = self._assemble_data_files(data_files)
+            return data if decoder is None else decoder(data)
+
+        data_files = self._find_data_files(data_category, temp_cycle_list, filename)  # Skip cycles without the data file
+        if not data_files:
+            raise ValueError(f"No data available for Data Category: {data_category}, Years: {temp_cycle_list}, Data File Description: {filename}")
+
+        # Include or exclude uncommon variables based on the parameter, using the variables of the actual data files
+        columns = None
+        if include_uncommon_variables is False and len(data_files) > 1:  # Every variable is common to a single data file
+            common_variables, _, _ = self.get_common_and_uncommon_variables(data_category, [cycle_year for cycle_year, _ in data_files], filename)
+            first_header = self.probe_data_file(*data_files[0])
+            columns = [field["name"] for field in first_header["fields"] if field["name"] in common_variables]
+
+        decoder = self._label_decoder(data_files) if decode_labels else None
+        if partitioned:
+            return CycleDataset(self, data_files, columns=None if columns is None else columns + ["year"], decoder=decoder)
+
+        if max_memory is not None:
+            dataset = self._spill_if_over_budget(data_files, columns, max_memory, decoder)
+            if dataset is not None:
+                return dataset
+
+        data = self._assemble_data_files(data_files, columns)
+        return data if decoder is None else decoder(data)
+
+
+    def _label_decoder(self, data_files):
+        """
+        Build the value label decoder of some data files from their codebooks.
+
+        The codebook of each data file is fetched (or read from the local catalog) once, and its variables are read
+        from the data file header.
+
+        Args:
+        data_files (list of tuple): (cycle year, data file name) pairs, one per cycle year.
+
+        Returns:
+        LabelDecoder: The decoder, applied to DataFrames with a 'year' column.
+
+        Raises:
+        ValueError: If the documentation of a data file cannot be fetched.
+        """
+        codebooks = {}
+        variables = {}
+        for cycle_year, data_file_name in data_files:
+            codebooks[cycle_year] = self._docs.get_codebook(cycle_year, data_file_name)
+            variables[cycle_year] = [field["name"] for field in self.probe_data_file(cycle_year, data_file_name)["fields"]]
+        return LabelDecoder(codebooks, variables)
+
+
+    def _assemble_data_files(self, data_files, columns=None):
+        """
+        Decode the data files of one or more cycles into a single DataFrame without pd.concat.
+
+        The union schema (column order and one dtype per column) and the total number of rows are computed up front
+        from the XPORT headers. Each file is then decoded directly into preallocated, schema-aligned column buffers, so
+        the per-cycle frames are never materialized and no reindexing or copying is needed to assemble the result.
+        Columns missing from a cycle stay NaN, as with pd.concat.
+
+        With more than one data file the headers are probed first (from the catalog, or with HTTP Range requests), and
+        the retrieval runs as a bounded pipeline: up to download_workers data files are downloaded in cycle order while
+        the previous cycle is decoded into its slice of the buffers. A download is only started while the data files
+        that are downloaded but not yet decoded stay within max_buffered_bytes (one file is always allowed), so a slow
+        decoder holds back the downloads instead of filling the disk cache and memory. The busy time, number of
+        files, bytes and utilization of the download, decode and assemble (schema alignment, buffer allocation and the
+        'year' column) stages are stored in the attrs of the result, under 'pipeline'.
+
+        Args:
+        data_files (list of tuple): (cycle year, data file name) pairs.
+        columns (list of str, optional): The columns to keep, in this order. Defaults to None, meaning all columns.
 
-        data_frames = []  # List to store individual data frames from different cycles
+        Returns:
+        pd.DataFrame: The data of all cycles with a 'year' column indicating the cycle year.
 
-        common_variables, uncommon_variables, _ = self.get_common_and_uncommon_variables(data_category, temp_cycle_list)
+        Raises:
+        ValueError: If a data file cannot be fetched or lacks one of the requested columns.
+        """
+        stats = PipelineStats({"download": self.download_workers, "decode": 1, "assemble": 1})
 
-        for cycle_year in temp_cycle_list:
+        def download(data_file):
+            cycle_year, data_file_name = data_file
+            start = time.perf_counter()
             try:
-                data_file_name = self._get_data_filename(data_category, cycle_year, filename)
-                if data_file_name is None:
-                    continue  # Skip this cycle if the data file name is not found
-                data = pd.read_sas(f"https://wwwn.cdc.gov/Nchs/Nhanes/{cycle_year}/{data_file_name}.XPT")
-                
-                # Include or exclude uncommon variables based on the parameter
-                if include_uncommon_variables is False:
-                    data = data[common_variables]
-
-                # Add a 'year' column indicating the cycle year
-                data['year'] = cycle_year
-
-                data_frames.append(data)
+                self._fetch_data_file(cycle_year, data_file_name)
             except Exception as e:
                 raise ValueError(f"Error fetching data for cycle {cycle_year}: {str(e)}")
+            stats.record("download", time.perf_counter() - start, self.probe_data_file(cycle_year, data_file_name)["file_size"])
 
-        if not data_frames:
-            raise ValueError(f"No data available for the specified data category and cycle years.")
-        
-        # Concatenate data frames from different cycles
-        concatenated_data = pd.concat(data_frames, ignore_index=True)
-        return concatenated_data
+        if len(data_files) == 1:
+            download(data_files[0])  # Nothing to overlap: the header is then read from the downloaded file
 
-    def join_data_files(self, cycle_year, data_category1, file_name1, data_category2, file_name2, include_uncommon_variables=True):
+        headers = []
+        for cycle_year, data_file_name in data_files:
+            try:
+                header = self.probe_data_file(cycle_year, data_file_name)
+            except Exception as e:
+                raise ValueError(f"Error fetching data for cycle {cycle_year}: {str(e)}")
+            if columns is not None:
+                names = {field["name"] for field in header["fields"]}
+                missing = [column for column in columns if column not in names]
+                if missing:
+                    raise ValueError(f"Error fetching data for cycle {cycle_year}: {missing} not in the data file {data_file_name}")
+            headers.append(header)
+
+        start = time.perf_counter()
+        row_counts = [header["nobs"] for header in headers]
+        buffers = allocate_buffers(union_schema(headers, columns), sum(row_counts))
+        stats.record("assemble", time.perf_counter() - start)
+
+        items = list(zip(data_files, headers, np.cumsum([0] + row_counts[:-1])))
+        fetch = (lambda item: download(item[0])) if len(data_files) > 1 else (lambda item: None)
+        sizes = [header["file_size"] for header in headers]
+        for (data_file, header, row_offset), _, buffered in bounded_prefetch(items, fetch, sizes, self.max_buffered_bytes, self.download_workers):
+            stats.max_buffered_bytes = max(stats.max_buffered_bytes, buffered)
+            start = time.perf_counter()
+            xport_file, _ = self._cache.open(*data_file)
+            with xport_file:
+                decode_into(xport_file, header, buffers, int(row_offset))
+            stats.record("decode", time.perf_counter() - start, header["file_size"])
+
+        # Add a 'year' column indicating the cycle year
+        start = time.perf_counter()
+        buffers['year'] = np.repeat([cycle_year for cycle_year, _ in data_files], row_counts)
+        data = pd.DataFrame(buffers, copy=False)
+        stats.record("assemble", time.perf_counter() - start)
+        stats.finish()
+        data.attrs["pipeline"] = stats.as_dict()
+        return data
+
+    def _plan_lazy(self, data_category, cycle_years, filename, include_uncommon_variables):
+        """
+        Resolve the data files and columns of a retrieval from the catalog, without downloading any data file.
+
+        Args:
+        data_category (str): The data category.
+        cycle_years (list of str): The valid cycle years.
+        filename (str): The data file description.
+        include_uncommon_variables (bool): Whether to include uncommon variables.
+
+        Returns:
+        LazyDataset: The handle on the planned retrieval.
+
+        Raises:
+        ValueError: If none of the cycle years has the data file.
+        """
+        data_files = self._find_data_files(data_category, cycle_years, filename)
+        if not data_files:
+            raise ValueError(f"No data available for Data Category: {data_category}, Years: {cycle_years}, Data File Description: {filename}")
+        cycle_years = [cycle_year for cycle_year, _ in data_files]
+
+        columns = None
+        if include_uncommon_variables is False and len(cycle_years) > 1:
+            common_variables, _, _ = self.get_common_and_uncommon_variables(data_category, cycle_years, filename)
+            first_header = self.probe_data_file(*data_files[0])
+            columns = [field["name"] for field in first_header["fields"] if field["name"] in common_variables] + ["year"]
+        return LazyDataset(self, data_files, columns=columns)
+
+
+    def append_cycles(self, data, data_category, cycle, filename, include_new_variables=False, decode_labels=False, chunk_rows=100000):
+        """
+        Extend retrieved data with the cycle years it does not hold yet, fetching and decoding only those cycles.
+
+        The cycle years already held are read from the 'year' column of a DataFrame, or from the partitions of a stored
+        dataset, and cycle years without the data file are skipped. The appended cycles are aligned to the existing
+        schema: their columns follow the existing column order, existing columns that a new cycle lacks are missing
+        (NaN), and variables that only the new cycles have are left out unless include_new_variables is True. With
+        decode_labels, the categories of decoded variables are extended so that they stay Categoricals.
+
+        A stored dataset is appended to in place: each new cycle year is written as a new Parquet partition, chunk_rows
+        rows at a time, and the existing partitions are neither read nor rewritten. A DataFrame cannot grow in place,
+        so a new DataFrame with the existing rows followed by the appended rows is returned.
+
+        Args:
+        data (pd.DataFrame, PartitionedDataset or str): The existing data with a 'year' column, a stored dataset (e.g., from retrieve_data with max_memory), or the directory of a stored dataset, which is created if it does not exist.
+        data_category (str): The data category.
+        cycle (str or list): The cycle year(s) the data should hold, in any format accepted by retrieve_data.
+        filename (str): The data file description.
+        include_new_variables (bool, optional): Whether to add the variables of the new cycles that the existing data does not have. Earlier rows (or partitions) have no values for them. Defaults to False.
+        decode_labels (bool, optional): Whether to decode value labels and missing-value codes of the appended cycles, as with retrieve_data. Use it if the existing data was decoded. Defaults to False.
+        chunk_rows (int, optional): The number of rows decoded and written at a time for a stored dataset. Defaults to 100000.
+
+        Returns:
+        pd.DataFrame: For a DataFrame, the existing and the appended rows; data.attrs['appended'] lists the appended cycle years.
+        PartitionedDataset: For a stored dataset, the dataset with the new partitions; dataset.appended lists the appended cycle years.
+
+        Raises:
+        ValueError: If the cycle is invalid or the DataFrame has no 'year' column.
+        """
+        cycle_years = self._check_cycle(cycle)
+        if not cycle_years:
+            raise ValueError("Invalid cycle input.")
+        if isinstance(data, str):
+            data = PartitionedDataset(data, compression=self.spill_compression)
+        if isinstance(data, PartitionedDataset):
+            held, columns = data.partitions, data.columns
+        elif isinstance(data, pd.DataFrame):
+            if "year" not in data.columns:
+                raise ValueError("The data has no 'year' column telling which cycle years it holds.")
+            held, columns = list(data["year"].dropna().unique()), list(data.columns)
+        else:
+            raise ValueError(f"Cannot append to a {type(data).__name__}. Give a DataFrame, a PartitionedDataset or a directory.")
+
+        missing = [cycle_year for cycle_year in self._normalize_cycles(cycle_years) if cycle_year not in held]
+        data_files = self._find_data_files(data_category, missing, filename)
+        missing = [cycle_year for cycle_year, _ in data_files]
+        decoder = self._label_decoder(data_files) if decode_labels and data_files else None
+        existing = [column for column in columns if column != "year"]
+
+        def file_columns(data_file):
+            names = [field["name"] for field in self.probe_data_file(*data_file)["fields"]]
+            kept = [name for name in existing if name in names]
+            if include_new_variables or not existing:
+                kept += [name for name in names if name not in existing]
+            return kept
+
+        if isinstance(data, PartitionedDataset):
+            for data_file in data_files:
+                chunks = self._iter_data_file_chunks(*data_file, chunk_rows, file_columns(data_file))
+                if decoder is not None:
+                    chunks = (decoder(chunk) for chunk in chunks)
+                data.write_partition(data_file[0], chunks)
+            data.appended = missing
+            return data
+
+        frames = [data]
+        for data_file in data_files:
+            frame = self._assemble_data_files([data_file], file_columns(data_file))
+            frames.append(frame if decoder is None else decoder(frame))
+        for column in existing:
+            if isinstance(data[column].dtype, pd.CategoricalDtype):
+                categories = list(data[column].cat.categories)
+                for frame in frames[1:]:
+                    if column in frame.columns and isinstance(frame[column].dtype, pd.CategoricalDtype):
+                        categories.extend(category for category in frame[column].cat.categories if category not in categories)
+                frames = [frame.assign(**{column: pd.Categorical(frame[column], categories=categories)})
+                          if column in frame.columns else frame for frame in frames]
+        appended = pd.concat(frames, ignore_index=True) if len(frames) > 1 else data.copy(deep=False)
+        appended = appended[year_last(appended.columns)]
+        appended.attrs["appended"] = missing
+        return appended
+
+
+    def join_data_files(self, cycle_year, data_category1, file_name1, data_category2, file_name2, include_uncommon_variables=True, max_memory=None, max_workers=4, decode_labels=False):
         """
         Join two data files from specified data categories and file names based on the common variable SEQN.
 
+        With several cycle years (e.g., '1999-2018'), SEQN is unique within each cycle, so the join is computed for
+        each cycle independently and in parallel, and the joined cycles are concatenated once at the end. Cycles in
+        which either data file is missing are skipped.
+
         Args:
-        cycle_year (str): The cycle year to retrieve data.
+        cycle_year (str or list): The cycle year(s) to retrieve data, in any format accepted by retrieve_data.
         data_category1 (str): The first data category to retrieve data from.
         file_name1 (str): The data file description for the first data file.
         data_category2 (str): The second data category to retrieve data from.
         file_name2 (str): The data file description for the second data file.
         include_uncommon_variables (bool, optional): Whether to include uncommon variables. Defaults to True.
+        max_memory (int or str, optional): Memory budget in bytes, or a string such as '2GB'. Each input file gets a third of the budget (two inputs plus the joined result). If an input exceeds its share, it is spilled to disk and the join is computed batch by batch into a disk-backed dataset. With several cycle years, the joined cycles are written to a disk-backed dataset (one partition per cycle) instead of being concatenated if the decoded inputs exceed the budget, fewer cycles are joined in parallel if the cycles in flight would not fit in it, and a cycle with an input over a third of the budget is joined through disk like a single cycle. Requires pyarrow. Defaults to None, meaning no budget.
+        max_workers (int, optional): The number of cycles joined in parallel. Defaults to 4.
+        decode_labels (bool, optional): Whether to decode value labels and missing-value codes, as with retrieve_data. Defaults to False.
 
         Returns:
-        pd.DataFrame: A pandas DataFrame containing the joined data.
+        pd.DataFrame: A pandas DataFrame containing the joined data, with a 'year' column if several cycle years are joined.
+        PartitionedDataset: A disk-backed dataset with the joined data, instead of the DataFrame, if max_memory is exceeded.
 
         Raises:
         Exception: If there is an error joining the data or if data retrieval fails for either of the data categories.
         """
+        cycle_years = self._check_cycle(cycle_year)
+        if len(cycle_years) > 1:
+            try:
+                return self._join_cycles(cycle_years, data_category1, file_name1, data_category2, file_name2,
+                                         include_uncommon_variables, max_memory, max_workers, decode_labels)
+            except Exception as e:
+                raise ValueError(f"Error while joining data files: {str(e)}")
+
         try:
             # Check if the specified data file names are available in the given cycle year
             data_file_names1 = self.list_file_names(data_category1, cycle_year)
@@ -480,11 +1244,18 @@ class NHANESDataAPI:
             if file_name2 not in data_file_names2:
                 raise ValueError(f"Data file name '{file_name2}' is not available in the specified cycle year '{cycle_year}' for data category '{data_category2}'.")
             
+            input_memory = parse_memory_size(max_memory) // 3 if max_memory is not None else None
+
             # Retrieve data for the first data file
-            data1 = self.retrieve_data(data_category1, cycle_year, file_name1, include_uncommon_variables)
+            data1 = self.retrieve_data(data_category1, cycle_year, file_name1, include_uncommon_variables, max_memory=input_memory,
+                                       decode_labels=decode_labels)
             
             # Retrieve data for the second data file
-            data2 = self.retrieve_data(data_category2, cycle_year, file_name2, include_uncommon_variables)
+            data2 = self.retrieve_data(data_category2, cycle_year, file_name2, include_uncommon_variables, max_memory=input_memory,
+                                       decode_labels=decode_labels)
+
+            if isinstance(data1, PartitionedDataset) or isinstance(data2, PartitionedDataset):
+                return self._join_spilled(data1, data2, input_memory)
             
             # Perform inner join on the common variable SEQN
             joined_data = pd.merge(data1, data2, on='SEQN', how='inner')
@@ -495,3 +1266,565 @@ class NHANESDataAPI:
             return joined_data
         except Exception as e:
             raise ValueError(f"Error while joining data files: {str(e)}")
+
+
+    def _join_cycles(self, cycle_years, data_category1, file_name1, data_category2, file_name2, include_uncommon_variables, max_memory, max_workers, decode_labels):
+        """
+        Join two data files across several cycle years, one cycle at a time in parallel.
+
+        Args:
+        cycle_years (list of str): The valid cycle years.
+        data_category1 (str): The first data category.
+        file_name1 (str): The data file description of the first data file.
+        data_category2 (str): The second data category.
+        file_name2 (str): The data file description of the second data file.
+        include_uncommon_variables (bool): Whether to include variables that are not in every joined cycle.
+        max_memory (int or str): The memory budget, or None.
+        max_workers (int): The number of cycles joined in parallel.
+        decode_labels (bool): Whether to decode value labels and missing-value codes.
+
+        Returns:
+        pd.DataFrame: The joined data of all cycles with a 'year' column, or a PartitionedDataset if the inputs exceed max_memory.
+
+        Raises:
+        ValueError: If neither data file is available in any of the cycle years.
+        """
+        data_files = []
+        for category, file_name in [(data_category1, file_name1), (data_category2, file_name2)]:
+            if not self._load_catalog(category):
+                raise ValueError(f"No data available for data category '{category}'.")
+            names = {cycle: self._catalog.data_file_name(category, cycle, file_name) for cycle in cycle_years}
+            data_files.append({cycle: name for cycle, name in names.items() if name is not None})
+
+        cycles = [cycle for cycle in cycle_years if cycle in data_files[0] and cycle in data_files[1]]
+        if not cycles:
+            raise ValueError(f"Data files '{file_name1}' and '{file_name2}' are not both available in any of the cycle years {cycle_years}.")
+
+        columns = [None, None]
+        if include_uncommon_variables is False and len(cycles) > 1:
+            for side, (category, file_name) in enumerate([(data_category1, file_name1), (data_category2, file_name2)]):
+                common_variables, _, _ = self.get_common_and_uncommon_variables(category, cycles, file_name)
+                first_header = self.probe_data_file(cycles[0], data_files[side][cycles[0]])
+                columns[side] = [field["name"] for field in first_header["fields"] if field["name"] in common_variables]
+
+        decoders = [None, None]
+        if decode_labels:
+            decoders = [self._label_decoder([(cycle, side[cycle]) for cycle in cycles]) for side in data_files]
+
+        def join_cycle(cycle):
+            left = self._assemble_data_files([(cycle, data_files[0][cycle])], columns[0])
+            right = self._assemble_data_files([(cycle, data_files[1][cycle])], columns[1])
+            if decode_labels:
+                left, right = decoders[0](left), decoders[1](right)
+            joined = pd.merge(left.drop(columns='year'), right.drop(columns='year'), on='SEQN', how='inner')
+            joined['year'] = cycle
+            return joined
+
+        def join_spilled_cycle(cycle, input_memory):
+            sides = []
+            try:
+                for side in (0, 1):
+                    data_file = (cycle, data_files[side][cycle])
+                    data = self._spill_if_over_budget([data_file], columns[side], input_memory, decoders[side])
+                    if data is None:
+                        data = self._assemble_data_files([data_file], columns[side])
+                        if decode_labels:
+                            data = decoders[side](data)
+                    sides.append(data)
+                self._join_spilled(sides[0], sides[1], input_memory, dataset)
+            finally:
+                for data in sides:
+                    if isinstance(data, PartitionedDataset):
+                        data.delete()
+
+        dataset = None
+        spilled_cycles = []
+        workers = max_workers
+        if max_memory is not None:
+            # The decoded size of the selected columns of each input, estimated from the headers as in
+            # _spill_if_over_budget; a cycle whose input exceeds a third of the budget is joined as a single cycle
+            # would be, through disk
+            budget = parse_memory_size(max_memory)
+            sizes = {cycle: [estimate_decoded_bytes([self.probe_data_file(cycle, side[cycle])], columns[index])
+                             for index, side in enumerate(data_files)] for cycle in cycles}
+            spilled_cycles = [cycle for cycle in cycles if max(sizes[cycle]) > budget // 3]
+            if spilled_cycles or sum(map(sum, sizes.values())) > budget:
+                dataset = PartitionedDataset(os.path.join(self.data_directory, "spill", uuid.uuid4().hex), compression=self.spill_compression)
+            # A cycle joined in memory holds its two inputs and the joined result, which is at most about their size
+            in_memory = [sum(sizes[cycle]) for cycle in cycles if cycle not in spilled_cycles]
+            if in_memory:
+                workers = max(1, min(max_workers, budget // max(1, 2 * max(in_memory))))
+
+        joined = {}
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(join_cycle, cycle): cycle for cycle in cycles if cycle not in spilled_cycles}
+                for future in as_completed(futures):
+                    if dataset is None:
+                        joined[futures[future]] = future.result()
+                    else:
+                        dataset.write_partition(futures[future], [future.result()])
+            for cycle in spilled_cycles:
+                join_spilled_cycle(cycle, budget // 3)
+        except BaseException:
+            if dataset is not None:
+                dataset.delete()
+            raise
+
+        if dataset is not None:
+            return dataset
+        data = pd.concat([joined[cycle] for cycle in cycles], ignore_index=True)
+        return data[year_last(data.columns)]
+
+
+    def _join_spilled(self, data1, data2, batch_bytes, dataset=None):
+        """
+        Join two inputs on SEQN when at least one of them is a disk-backed dataset.
+
+        The larger input is streamed from disk in batches of about batch_bytes bytes and merged with the smaller input,
+        which is loaded into memory. The joined batches are written to a new disk-backed dataset, so the joined result is
+        never held in memory as a whole. Spilled inputs are deleted afterwards.
+
+        Args:
+        data1 (pd.DataFrame or PartitionedDataset): The first (left) input.
+        data2 (pd.DataFrame or PartitionedDataset): The second (right) input.
+        batch_bytes (int): The approximate size of a streamed batch.
+        dataset (PartitionedDataset, optional): The dataset the joined partitions are written to, with a 'year' column,
+        as in the joins of several cycle years. Defaults to None, meaning a new dataset without a 'year' column.
+
+        Returns:
+        PartitionedDataset: The joined data.
+        """
+        def size(data):
+            if isinstance(data, PartitionedDataset):
+                return data.nbytes
+            return data.memory_usage(deep=True).sum()
+
+        stream_left = isinstance(data1, PartitionedDataset) and (not isinstance(data2, PartitionedDataset) or size(data1) >= size(data2))
+        streamed, loaded = (data1, data2) if stream_left else (data2, data1)
+        if isinstance(loaded, PartitionedDataset):
+            loaded_dataset, loaded = loaded, loaded.to_pandas()
+            loaded_dataset.delete()
+
+        row_bytes = max(1, size(streamed) // max(1, len(streamed)))
+
+        def joined_batches(cycle_year):
+            for batch in streamed.iter_batches(max(1, batch_bytes // row_bytes), cycle_years=[cycle_year]):
+                if stream_left:
+                    joined = pd.merge(batch, loaded, on='SEQN', how='inner')
+                else:
+                    joined = pd.merge(loaded, batch, on='SEQN', how='inner')
+                joined = joined.drop(['year_x', 'year_y'], axis=1)
+                if keep_year:
+                    joined['year'] = cycle_year
+                yield joined
+
+        keep_year = dataset is not None
+        if dataset is None:
+            dataset = PartitionedDataset(os.path.join(self.data_directory, "spill", uuid.uuid4().hex), compression=self.spill_compression)
+        try:
+            for cycle_year in streamed.partitions:
+                dataset.write_partition(cycle_year, joined_batches(cycle_year))
+        except BaseException:
+            if not keep_year:
+                dataset.delete()
+            raise
+        finally:
+            streamed.delete()
+        return dataset
+
+
+    def aggregate_data(self, data_category, cycle, filename, aggregations, by="SEQN", chunk_rows=100000):
+        """
+        Aggregate data per participant (or other groups) chunk by chunk while decoding, returning only the result.
+
+        This is meant for data files with many rows per participant, such as the dietary 'Individual Foods' files with
+        one row per food item. Each data file is decoded chunk_rows rows at a time, only the grouped and aggregated
+        columns are decoded, and each chunk is reduced with vectorized group-by operations before the next one is
+        decoded, so the rows are never loaded as a whole. Cycles are aggregated separately, and cycle years without the
+        data file are skipped.
+
+        Args:
+        data_category (str): The data category.
+        cycle (str or list): The cycle year(s), in any format accepted by retrieve_data.
+        filename (str): The data file description, e.g., 'Dietary Interview - Individual Foods, First Day'.
+        aggregations (dict): {column: function} or {column: [functions]}, with the functions 'sum', 'mean', 'min', 'max', 'count' (non-missing values) and 'size' (rows), e.g., {'DR1IKCAL': 'sum', 'DR1IFDCD': 'size'}. With a list of functions, the result columns are named '<column>_<function>'.
+        by (str or list of str, optional): The column(s) to group by. Defaults to 'SEQN'.
+        chunk_rows (int, optional): The number of rows decoded at a time. Defaults to 100000.
+
+        Returns:
+        pd.DataFrame: One row per group and cycle year, with the group columns, the aggregated columns and a 'year' column.
+
+        Raises:
+        ValueError: If none of the cycle years has the data file, an aggregation is not supported, or a data file lacks a group column.
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        cycle_years = self._check_cycle(cycle)
+        if not cycle_years:
+            raise ValueError("Invalid cycle input.")
+
+        data_files = self._find_data_files(data_category, cycle_years, filename)
+        if not data_files:
+            raise ValueError(f"No data available for Data Category: {data_category}, Years: {cycle_years}, Data File Description: {filename}")
+
+        results = []
+        for cycle_year, data_file_name in data_files:
+            aggregator = StreamingAggregator(aggregations, by)
+            try:
+                self._fetch_data_file(cycle_year, data_file_name)
+                header = self.probe_data_file(cycle_year, data_file_name)
+            except Exception as e:
+                raise ValueError(f"Error fetching data for cycle {cycle_year}: {str(e)}")
+            names = {field["name"] for field in header["fields"]}
+            missing = [column for column in by if column not in names]
+            if missing:
+                raise ValueError(f"Error fetching data for cycle {cycle_year}: {missing} not in the data file {data_file_name}")
+
+            for chunk in self._iter_data_file_chunks(cycle_year, data_file_name, chunk_rows, aggregator.columns):
+                aggregator.update(chunk.reindex(columns=aggregator.columns))
+            result = aggregator.result()
+            result['year'] = cycle_year
+            results.append(result)
+        return pd.concat(results, ignore_index=True) if len(results) > 1 else results[0]
+
+
+    def sample_data(self, data_category, cycle, filename, fraction=None, n=None, seed=0, include_uncommon_variables=True, decode_labels=False):
+        """
+        Retrieve the records of a random sample of participants, decoding only the sampled records.
+
+        Participants are sampled by a hash of their SEQN and the seed (see sampling.sample_rows), so the same fraction
+        and seed select the same participants in every cycle and data file, and sampled frames of different data files
+        still join on SEQN. Only the SEQN column of each data file is decoded to find the sampled records; the sampled
+        records are then read by seeking to their fixed-width offsets and decoded into schema-aligned buffers, as with
+        retrieve_data. Sampling saves decoding time and memory, not downloads: the SEQN of every record is needed, so
+        each data file is downloaded in full (into the cache, as usual) and its whole SEQN column is decoded before any
+        record is sampled. Cycle years without the data file are skipped.
+
+        Args:
+        data_category (str): The data category.
+        cycle (str or list): The cycle year(s), in any format accepted by retrieve_data.
+        filename (str): The data file description.
+        fraction (float, optional): The fraction of participants to sample, between 0 and 1.
+        n (int, optional): The approximate number of participants to sample, instead of fraction. It is turned into the fraction n / (number of participants in the data files), stored in the attrs of the result, which can be passed to sample other data files consistently.
+        seed (int, optional): The seed of the sample. Defaults to 0.
+        include_uncommon_variables (bool, optional): Whether to include uncommon variables. Defaults to True.
+        decode_labels (bool, optional): Whether to decode value labels, as with retrieve_data. Defaults to False.
+
+        Returns:
+        pd.DataFrame: The sampled records with a 'year' column. data.attrs['sample'] holds the 'fraction', 'seed', number of 'participants' and 'rows'.
+
+        Raises:
+        ValueError: If neither or both of fraction and n are given, none of the cycle years has the data file, or a data file has no SEQN column.
+        """
+        if (fraction is None) == (n is None):
+            raise ValueError("Specify either fraction or n.")
+        if fraction is not None and not 0 < fraction <= 1:
+            raise ValueError(f"The fraction must be between 0 and 1, got {fraction}.")
+        if n is not None and n < 1:
+            raise ValueError(f"n must be a positive number of participants, got {n}.")
+
+        cycle_years = self._check_cycle(cycle)
+        if not cycle_years:
+            raise ValueError("Invalid cycle input.")
+
+        data_files = self._find_data_files(data_category, cycle_years, filename)
+        if not data_files:
+            raise ValueError(f"No data available for Data Category: {data_category}, Years: {cycle_years}, Data File Description: {filename}")
+
+        headers = []
+        participants = []
+        for cycle_year, data_file_name in data_files:
+            try:
+                self._fetch_data_file(cycle_year, data_file_name)
+                header = self.probe_data_file(cycle_year, data_file_name)
+            except Exception as e:
+                raise ValueError(f"Error fetching data for cycle {cycle_year}: {str(e)}")
+            if "SEQN" not in {field["name"] for field in header["fields"]}:
+                raise ValueError(f"The data file {data_file_name} ({cycle_year}) has no SEQN column to sample participants by.")
+            xport_file, _ = self._cache.open(cycle_year, data_file_name)
+            with xport_file:
+                seqn = np.concatenate([chunk["SEQN"].to_numpy() for chunk in iter_frames(xport_file, header, 65536, ["SEQN"])] or [np.empty(0)])
+            headers.append(header)
+            participants.append(seqn)
+
+        if fraction is None:
+            total = sum(len(np.unique(seqn[~np.isnan(seqn)])) for seqn in participants)
+            fraction = min(1.0, n / total) if total else 1.0
+        rows = [sample_rows(seqn, fraction, seed) for seqn in participants]
+
+        columns = None
+        if include_uncommon_variables is False and len(data_files) > 1:
+            common_variables, _, _ = self.get_common_and_uncommon_variables(data_category, [cycle_year for cycle_year, _ in data_files], filename)
+            columns = [field["name"] for field in headers[0]["fields"] if field["name"] in common_variables]
+
+        row_counts = [len(selected) for selected in rows]
+        buffers = allocate_buffers(union_schema(headers, columns), sum(row_counts))
+        row_offset = 0
+        for (cycle_year, data_file_name), header, selected in zip(data_files, headers, rows):
+            xport_file, _ = self._cache.open(cycle_year, data_file_name)
+            with xport_file:
+                row_offset += decode_rows_into(xport_file, header, selected, buffers, row_offset)
+        buffers['year'] = np.repeat([cycle_year for cycle_year, _ in data_files], row_counts)
+        data = pd.DataFrame(buffers, copy=False)
+        if decode_labels:
+            data = self._label_decoder(data_files)(data)
+
+        sampled = data["SEQN"].to_numpy()
+        data.attrs["sample"] = {"fraction": fraction, "seed": seed, "participants": len(np.unique(sampled[~np.isnan(sampled)])),
+                                "rows": len(data)}
+        return data
+
+
+    def build_mart(self, definition, cycle, max_workers=4):
+        """
+        Materialize an analysis mart: the data files of its definition joined on SEQN, one Parquet partition per cycle.
+
+        The mart is stored under data_directory/marts/<name>/ and records the data files and checksums each partition
+        was built from. Building it again only rebuilds the partitions whose inputs changed: a new cycle, a data file
+        that was downloaded again with other contents, a data file renamed in a refreshed catalog. Changing the
+        definition rebuilds every partition. Cycles in which a data file of the definition is missing are skipped (and
+        their partitions removed). Partitions are built in parallel.
+
+        Args:
+        definition (MartDefinition or dict): The definition of the mart, see MartDefinition.
+        cycle (str or list): The cycle year(s), in any format accepted by retrieve_data.
+        max_workers (int, optional): The number of cycles built in parallel. Defaults to 4.
+
+        Returns:
+        AnalysisMart: The mart. Its 'built' attribute lists the cycle years that were (re)built by this call.
+
+        Raises:
+        ValueError: If the definition or the cycle is invalid, a data category has no data, no cycle has all data files, or a data file cannot be fetched.
+        """
+        if isinstance(definition, dict):
+            definition = MartDefinition.from_dict(definition)
+        cycle_years = self._check_cycle(cycle)
+        if not cycle_years:
+            raise ValueError("Invalid cycle input.")
+        for table in definition.tables:
+            if not self._load_catalog(table["data_category"]):
+                raise ValueError(f"No data available for data category '{table['data_category']}'.")
+
+        mart = AnalysisMart(os.path.join(self.data_directory, "marts", definition.name), compression=self.spill_compression)
+        if mart.definition != definition:
+            mart.reset(definition)
+
+        def build(cycle_year):
+            data_files = [self._catalog.data_file_name(table["data_category"], cycle_year, table["filename"]) for table in definition.tables]
+            if None in data_files:
+                mart.remove_partition(cycle_year)
+                return None
+            try:
+                for data_file_name in data_files:
+                    self._fetch_data_file(cycle_year, data_file_name)
+            except Exception as e:
+                raise ValueError(f"Error fetching data for cycle {cycle_year}: {str(e)}")
+            manifest = self._cache.read_manifest()
+            fingerprint = definition.fingerprint([(data_file_name, manifest[self._cache.file_key(cycle_year, data_file_name)]["sha256"])
+                                                  for data_file_name in data_files])
+            if fingerprint == mart.fingerprint(cycle_year) and os.path.exists(mart.partition_path(cycle_year)):
+                return False
+
+            data = None
+            for table, data_file_name in zip(definition.tables, data_files):
+                names = [field["name"] for field in self.probe_data_file(cycle_year, data_file_name)["fields"]]
+                if "SEQN" not in names:
+                    raise ValueError(f"The data file {data_file_name} ({cycle_year}) has no SEQN column to join on.")
+                wanted = names if table["columns"] is None else ["SEQN"] + table["columns"]
+                columns = [name for name in dict.fromkeys(wanted) if name in names and (name == "SEQN" or data is None or name not in data.columns)]
+                frame = self._assemble_data_files([(cycle_year, data_file_name)], columns).drop(columns="year")
+                data = frame if data is None else pd.merge(data, frame, on="SEQN", how=definition.how)
+            data["year"] = cycle_year
+            data.attrs = {}
+            rows = mart.write_partition(cycle_year, [data])
+            mart.record_partition(cycle_year, fingerprint, data_files, rows)
+            return True
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            built = dict(zip(cycle_years, executor.map(build, cycle_years)))
+        if all(result is None for result in built.values()):
+            raise ValueError(f"The data files of the mart '{definition.name}' are not all available in any of the cycle years {cycle_years}.")
+        mart.built = [cycle_year for cycle_year in cycle_years if built[cycle_year]]
+        return mart
+
+
+    def load_mart(self, name):
+        """
+        Load a materialized analysis mart without fetching anything.
+
+        Args:
+        name (str): The name of the mart.
+
+        Returns:
+        AnalysisMart: The mart, a disk-backed dataset with one partition per cycle year.
+
+        Raises:
+        ValueError: If the mart has not been built in this data directory.
+        """
+        mart = AnalysisMart(os.path.join(self.data_directory, "marts", name), compression=self.spill_compression)
+        if mart.definition is None:
+            raise ValueError(f"The mart '{name}' has not been built. Build it with build_mart.")
+        return mart
+
+
+    def prefetch_data(self, data_categories, cycles, file_names=None, max_workers=4, progress=None):
+        """
+        Download the data files matching the given data categories, cycles and file descriptions into the data directory.
+
+        Files are downloaded concurrently. Files that are already cached are skipped, so an interrupted prefetch can
+        simply be run again to resume it. Requests are paced by the rate limit and adaptive concurrency limit of the
+        host (see host_limits), so max_workers is an upper bound on the number of downloads in flight.
+
+        Args:
+        data_categories (str or list of str): The data categories to prefetch.
+        cycles (str or list of str): The cycle year(s), in any format accepted by _check_cycle.
+        file_names (str or list of str, optional): The data file descriptions to prefetch. Defaults to None, meaning all data files.
+        max_workers (int, optional): The number of concurrent downloads. Defaults to 4.
+        progress (callable, optional): Called as progress(file_key, bytes_downloaded, seconds) after each file.
+
+        Returns:
+        dict: A summary with the keys 'files' (list of cached file keys), 'downloaded', 'skipped', 'bytes', 'seconds' and 'throttle' (the request statistics of the host, see HostThrottle.stats).
+
+        Raises:
+        ValueError: If the cycle input is invalid or if no data file matches the request.
+        """
+        if isinstance(data_categories, str):
+            data_categories = [data_categories]
+        if isinstance(file_names, str):
+            file_names = [file_names]
+
+        valid_cycles = self._check_cycle(cycles)
+        if not valid_cycles:
+            raise ValueError("Invalid cycle input.")
+
+        targets = []
+        self.build_catalog(data_categories)
+        for data_category in data_categories:
+            targets.extend(self._catalog.data_files(data_category, valid_cycles, file_names))
+
+        if not targets:
+            raise ValueError("No data files found for the specified data categories, cycle years and file names.")
+
+        def download(cycle_year, data_file_name):
+            start = time.perf_counter()
+            _, size = self._cache.fetch(self._data_file_url(cycle_year, data_file_name), cycle_year, data_file_name)
+            return self._cache.file_key(cycle_year, data_file_name), size, time.perf_counter() - start
+
+        summary = {"files": [], "downloaded": 0, "skipped": 0, "bytes": 0, "seconds": 0.0}
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(download, cycle_year, data_file_name) for cycle_year, data_file_name in targets]
+            for future in as_completed(futures):
+                file_key, size, seconds = future.result()
+                summary["files"].append(file_key)
+                if size:
+                    summary["downloaded"] += 1
+                    summary["bytes"] += size
+                else:
+                    summary["skipped"] += 1
+                if progress is not None:
+                    progress(file_key, size, seconds)
+        summary["seconds"] = time.perf_counter() - start
+        summary["files"].sort()
+        summary["throttle"] = host_throttle(self.base_url).stats()
+        return summary
+
+
+    def compression_report(self, data_category, cycle, filename, codecs=None, spill_codecs=None, repeat=3):
+        """
+        Measure the trade-offs of the compression codecs on the data files of a retrieval.
+
+        Every cache codec stores a copy of the data files in a scratch directory inside the data directory, and every
+        Parquet codec writes the retrieved data as a disk-backed dataset. The scratch directory is removed afterwards.
+
+        Args:
+        data_category (str): The data category.
+        cycle (str or list): The cycle year(s).
+        filename (str): The data file description.
+        codecs (list of str, optional): The cache codecs to measure, 'none' being the uncompressed baseline. Defaults to None, meaning 'none' and every installed codec.
+        spill_codecs (list of str, optional): The Parquet codecs to measure. Defaults to None, meaning all of them if pyarrow is installed.
+        repeat (int, optional): The number of timed runs of each load, of which the fastest is reported. Defaults to 3.
+
+        Returns:
+        pd.DataFrame: One row per codec with the columns 'Kind' ('cache' or 'parquet'), 'Codec', 'Stored Bytes',
+        'Ratio' (uncompressed XPT size / stored size), 'Compress Seconds', 'Decode MB/s' (uncompressed XPT megabytes
+        decompressed per second, or loaded per second for Parquet), 'Load Seconds' (retrieve_data for cache codecs,
+        to_pandas() for Parquet codecs) and 'Load vs Baseline' (relative to the uncompressed cache).
+
+        Raises:
+        ValueError: If the cycle is invalid, a data file is not found or a codec is unknown.
+        """
+        cycle_years = self._check_cycle(cycle)
+        if not cycle_years:
+            raise ValueError("Invalid cycle input.")
+        data_files = [(cycle_year, self._get_data_filename(data_category, cycle_year, filename)) for cycle_year in cycle_years]
+        for cycle_year, data_file_name in data_files:
+            self._fetch_data_file(cycle_year, data_file_name)
+        raw_size = sum(self.probe_data_file(cycle_year, data_file_name)["file_size"] for cycle_year, data_file_name in data_files)
+
+        if codecs is None:
+            codecs = ["none"] + [name for name, codec in CODECS.items() if codec.available]
+        if spill_codecs is None:
+            try:
+                pyarrow = _import_pyarrow()
+                spill_codecs = [name for name in PARQUET_CODECS if name == "none" or pyarrow.Codec.is_available(name)]
+            except ImportError:
+                spill_codecs = []
+
+        def fastest(function):
+            timings = []
+            for _ in range(max(1, repeat)):
+                start = time.perf_counter()
+                function()
+                timings.append(time.perf_counter() - start)
+            return min(timings)
+
+        rows = []
+        work_directory = os.path.join(self.data_directory, "benchmark", uuid.uuid4().hex)
+        try:
+            for codec in codecs:
+                directory = os.path.join(work_directory, codec)
+                os.makedirs(directory)
+                if os.path.exists(self._catalog.path):
+                    shutil.copy(self._catalog.path, os.path.join(directory, "catalog.sqlite"))
+                api = NHANESDataAPI(directory, base_url=self.base_url, cache_compression=None if codec == "none" else codec)
+
+                start = time.perf_counter()
+                for cycle_year, data_file_name in data_files:
+                    source, _ = self._cache.open(cycle_year, data_file_name)
+                    with source:
+                        api._cache.add_file(cycle_year, data_file_name, source, self._data_file_url(cycle_year, data_file_name))
+                compress_seconds = time.perf_counter() - start
+                stored_bytes = sum(os.path.getsize(api._cache.stored_path(*data_file)) for data_file in data_files)
+
+                def decompress():
+                    for cycle_year, data_file_name in data_files:
+                        xport_file, _ = api._cache.open(cycle_year, data_file_name)
+                        with xport_file:
+                            while xport_file.read(1024 * 1024):
+                                pass
+
+                decode_seconds = fastest(decompress)
+                load_seconds = fastest(lambda: api.retrieve_data(data_category, cycle_years, filename))
+                rows.append(("cache", codec, stored_bytes, compress_seconds, decode_seconds, load_seconds))
+
+            if spill_codecs:
+                data = self.retrieve_data(data_category, cycle_years, filename)
+                for codec in spill_codecs:
+                    dataset = PartitionedDataset(os.path.join(work_directory, f"parquet-{codec}"), compression=codec)
+                    start = time.perf_counter()
+                    for cycle_year, partition in data.groupby("year", sort=False):
+                        dataset.write_partition(cycle_year, [partition.reset_index(drop=True)])
+                    compress_seconds = time.perf_counter() - start
+                    stored_bytes = sum(os.path.getsize(dataset.partition_path(cycle_year)) for cycle_year in dataset.partitions)
+                    load_seconds = fastest(dataset.to_pandas)
+                    rows.append(("parquet", codec, stored_bytes, compress_seconds, load_seconds, load_seconds))
+        finally:
+            shutil.rmtree(work_directory, ignore_errors=True)
+
+        report = pd.DataFrame(rows, columns=["Kind", "Codec", "Stored Bytes", "Compress Seconds", "Decode Seconds", "Load Seconds"])
+        report.insert(3, "Ratio", raw_size / report["Stored Bytes"])
+        report["Decode MB/s"] = raw_size / 2 ** 20 / report.pop("Decode Seconds")
+        baseline = report.loc[(report["Kind"] == "cache") & (report["Codec"] == "none"), "Load Seconds"]
+        report["Load vs Baseline"] = report["Load Seconds"] / baseline.iloc[0] if len(baseline) else float("nan")
+        return report[["Kind", "Codec", "Stored Bytes", "Ratio", "Compress Seconds", "Decode MB/s", "Load Seconds", "Load vs Baseline"]]
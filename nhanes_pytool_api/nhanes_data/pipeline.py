@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class PipelineStats:
+    """
+    PipelineStats records the busy time of the stages of a pipeline, to report how well they overlap.
+
+    The utilization of a stage is its busy time divided by the wall time of the pipeline and by the number of
+    workers of the stage: 1.0 means the stage never waited, so it is the bottleneck.
+
+    Args:
+    workers (dict): A dictionary of {stage name: number of workers}, in pipeline order.
+    """
+
+    def __init__(self, workers):
+        self.workers = dict(workers)
+        self.busy = {stage: 0.0 for stage in self.workers}
+        self.items = {stage: 0 for stage in self.workers}
+        self.bytes = {stage: 0 for stage in self.workers}
+        self.max_buffered_bytes = 0
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self.wall_seconds = None
+
+    def record(self, stage, seconds, nbytes=0):
+        with self._lock:
+            self.busy[stage] += seconds
+            self.items[stage] += 1
+            self.bytes[stage] += nbytes
+
+    def finish(self):
+        self.wall_seconds = time.perf_counter() - self._start
+
+    def as_dict(self):
+        """
+        Returns:
+        dict: {'wall_seconds', 'max_buffered_bytes', 'stages': {stage: {'workers', 'items', 'bytes', 'busy_seconds', 'utilization'}}}.
+        """
+        wall = self.wall_seconds if self.wall_seconds is not None else time.perf_counter() - self._start
+        return {
+            "wall_seconds": wall,
+            "max_buffered_bytes": self.max_buffered_bytes,
+            "stages": {
+                stage: {
+                    "workers": workers,
+                    "items": self.items[stage],
+                    "bytes": self.bytes[stage],
+                    "busy_seconds": self.busy[stage],
+                    "utilization": self.busy[stage] / (wall * workers) if wall > 0 else 0.0,
+                }
+                for stage, workers in self.workers.items()
+            },
+        }
+
+
+def bounded_prefetch(items, fetch, sizes, max_buffered_bytes, workers):
+    """
+    Fetch items ahead of their consumer on a thread pool, with backpressure on the fetched bytes.
+
+    Items are fetched in order by up to `workers` threads and yielded in order once fetched. An item is only
+    submitted while the total size of the items that are fetched (or being fetched) but not yet consumed stays within
+    max_buffered_bytes; an item is always allowed when nothing is buffered, so items larger than the limit still pass.
+    An item counts as consumed when the consumer asks for the next one, and the next items are fetched while it is
+    being consumed.
+
+    Args:
+    items (list): The items to fetch.
+    fetch (callable): Called with an item; runs on a worker thread.
+    sizes (list of int): The size in bytes of each item.
+    max_buffered_bytes (int): The limit on the size of fetched but unconsumed items.
+    workers (int): The number of fetch threads.
+
+    Yields:
+    tuple: (item, result of fetch, bytes buffered when the item was yielded).
+
+    Raises:
+    Exception: Whatever fetch raised, when the failed item is reached.
+    """
+    pending = deque()
+    buffered = 0
+    next_index = 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        def submit():
+            # The consumed item still counts until the consumer is done with it
+            nonlocal buffered, next_index
+            while next_index < len(items) and len(pending) < max(1, workers) and \
+                    (buffered == 0 or buffered + sizes[next_index] <= max_buffered_bytes):
+                pending.append((next_index, executor.submit(fetch, items[next_index])))
+                buffered += sizes[next_index]
+                next_index += 1
+
+        try:
+            while submit() or pending:
+                index, future = pending.popleft()
+                result = future.result()
+                submit()
+                yield items[index], result, buffered
+                buffered -= sizes[index]
+        finally:
+            for _, future in pending:
+                future.cancel()
@@ -0,0 +1,260 @@
+import pandas as pd
+
+from .dataset import parse_memory_size
+from .xport import union_schema
+
+# Approximate in-memory size of a decoded character value: an object pointer and a bytes object (33 bytes + length)
+_CHAR_OVERHEAD = 8 + 33
+# Approximate in-memory size of a 'year' value: 9 characters and an offset (or a pointer to a shared string)
+_YEAR_BYTES = 17
+# Rows decoded at a time by decode_into
+_DECODE_BATCH_ROWS = 65536
+
+
+def _format_bytes(size):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def decoded_schema(headers, columns=None):
+    """
+    Get the columns of data files decoded into one DataFrame, with the approximate in-memory size of one value of each.
+
+    Args:
+    headers (list of dict): The XPORT headers of the data files, see xport.read_header.
+    columns (list of str, optional): The columns to keep. Defaults to None, meaning all columns.
+
+    Returns:
+    list: (name, bytes) pairs in the order of union_schema; the 'year' column is not included.
+    """
+    lengths = {}
+    for header in headers:
+        for field in header["fields"]:
+            lengths[field["name"]] = max(lengths.get(field["name"], 0), field["length"])
+    return [(name, 8 if kind == "numeric" else _CHAR_OVERHEAD + lengths[name])
+            for name, kind in union_schema(headers, columns)]
+
+
+def estimate_decoded_bytes(headers, columns=None):
+    """
+    Estimate the in-memory size of data files decoded into one DataFrame with a 'year' column, from their headers.
+
+    Args:
+    headers (list of dict): The XPORT headers of the data files.
+    columns (list of str, optional): The columns to keep. Defaults to None, meaning all columns.
+
+    Returns:
+    int: The estimated size in bytes.
+    """
+    row_bytes = sum(size for _, size in decoded_schema(headers, columns)) + _YEAR_BYTES
+    return row_bytes * sum(header["nobs"] for header in headers)
+
+
+class RetrievalPlan:
+    """
+    RetrievalPlan is a dry run of retrieve_data or join_data_files: the resolved data files with their cache state and
+    header metadata, and the estimated cost of the call. It is made by NHANESDataAPI.plan without downloading any data
+    file, and execute() runs the planned call.
+
+    The estimates come from the XPORT headers (from the cache, the local catalog or HTTP Range requests):
+    - Rows: the observations of the data files. For a join, the smaller of the two files of each cycle, which is exact
+    when SEQN is unique in both and the participants of the smaller file are all in the larger one, e.g., for a data
+    file joined with the demographics. Joins with multi-record data files (such as the dietary individual foods
+    files) have more rows.
+    - Memory: decoded numeric values take 8 bytes and character values about 41 bytes plus their length. The peak
+    memory follows the way the call runs: the preallocated result plus one decoded batch for retrieve_data; for joins,
+    both inputs and the joined result of the cycles joined in parallel (fewer of them if max_memory requires it), or
+    the final concatenation if it is larger; and about one chunk (a quarter of max_memory) and its Parquet conversion
+    when the result is spilled to disk.
+
+    Args:
+    api (NHANESDataAPI): The API that executes the plan.
+    operation (str): 'retrieve_data' or 'join_data_files'.
+    arguments (dict): The keyword arguments of the call.
+    sides (list of dict): One entry per input (two for a join) with the keys 'data_category', 'filename', 'columns'
+    (the selected columns or None) and 'data_files', a list of {'cycle_year', 'data_file_name', 'header', 'cached'}.
+    skipped (list of str, optional): The cycle years left out because a data file is missing. Defaults to None.
+
+    Attributes:
+    files (pd.DataFrame): One row per data file with the columns 'Years', 'Data Category', 'Data File Name', 'Cached',
+    'File Size', 'Download Bytes', 'Rows' and 'Columns'.
+    rows (int): The estimated number of rows of the result.
+    columns (list of str): The columns of the result.
+    result_bytes (int): The estimated in-memory size of the result.
+    peak_memory (int): The estimated peak memory of the call.
+    spill (bool): Whether the result would exceed max_memory and be written to disk instead.
+    """
+
+    def __init__(self, api, operation, arguments, sides, skipped=None):
+        self._api = api
+        self.operation = operation
+        self.arguments = dict(arguments)
+        self.sides = sides
+        self.skipped = list(skipped or [])
+        self.files = pd.DataFrame(
+            [(data_file["cycle_year"], side["data_category"], data_file["data_file_name"], data_file["cached"],
+              data_file["header"]["file_size"], 0 if data_file["cached"] else data_file["header"]["file_size"],
+              data_file["header"]["nobs"], len(data_file["header"]["fields"]))
+             for side in sides for data_file in side["data_files"]],
+            columns=["Years", "Data Category", "Data File Name", "Cached", "File Size", "Download Bytes", "Rows", "Columns"])
+        self.spill = False
+        if operation == "join_data_files":
+            self._estimate_join()
+        else:
+            self._estimate_retrieval()
+
+    def __repr__(self):
+        return (f"RetrievalPlan(operation={self.operation!r}, cycles={self.cycles}, files={len(self.files)}, "
+                f"cache_hits={self.cache_hits}, download_bytes={self.download_bytes}, rows={self.rows}, "
+                f"columns={len(self.columns)}, peak_memory={self.peak_memory}, spill={self.spill})")
+
+    @property
+    def cycles(self):
+        """
+        list: The cycle years the plan reads.
+        """
+        return [data_file["cycle_year"] for data_file in self.sides[0]["data_files"]]
+
+    @property
+    def download_bytes(self):
+        """
+        int: The number of bytes to download, for the data files that are not cached.
+        """
+        return int(self.files["Download Bytes"].sum())
+
+    @property
+    def cache_hits(self):
+        """
+        int: The number of data files that are already cached.
+        """
+        return int(self.files["Cached"].sum())
+
+    @staticmethod
+    def _schema(data_files, columns):
+        """
+        Get the columns of the assembled data files with the decoded size of one row of each.
+        """
+        return decoded_schema([data_file["header"] for data_file in data_files], columns)
+
+    def _spilled_peak(self, data_files, row_bytes):
+        """
+        Estimate the peak memory of spilling data files: one chunk of a quarter of the budget and its Parquet table.
+        """
+        budget = parse_memory_size(self.arguments["max_memory"])
+        peak = 0
+        for data_file in data_files:
+            header = data_file["header"]
+            chunk_rows = min(header["nobs"], max(1, (budget // 4) // max(1, header["record_length"])))
+            peak = max(peak, 2 * chunk_rows * row_bytes)
+        return peak
+
+    def _estimate_retrieval(self):
+        side = self.sides[0]
+        schema = self._schema(side["data_files"], side["columns"])
+        row_bytes = sum(size for _, size in schema) + _YEAR_BYTES
+        self.columns = [name for name, _ in schema] + ["year"]
+        self.rows = sum(data_file["header"]["nobs"] for data_file in side["data_files"])
+        self.result_bytes = self.rows * row_bytes
+        batch_rows = max([min(data_file["header"]["nobs"], _DECODE_BATCH_ROWS) for data_file in side["data_files"]] + [0])
+        batch_bytes = batch_rows * (max(data_file["header"]["record_length"] for data_file in side["data_files"]) + row_bytes)
+        self.peak_memory = self.result_bytes + batch_bytes
+        # The rule of NHANESDataAPI._spill_if_over_budget
+        max_memory = self.arguments.get("max_memory")
+        if max_memory is not None and self.result_bytes > parse_memory_size(max_memory):
+            self.spill = True
+            self.peak_memory = self._spilled_peak(side["data_files"], row_bytes)
+
+    def _estimate_join(self):
+        left, right = self.sides
+        several = len(left["data_files"]) + len(self.skipped) > 1  # join_data_files adds 'year' for several cycle years
+        schemas = [self._schema(side["data_files"], side["columns"]) for side in self.sides]
+        names = [[name for name, _ in schema] for schema in schemas]
+        shared = set(names[0]) & set(names[1]) - {"SEQN"}
+        self.columns = ([f"{name}_x" if name in shared else name for name in names[0]]
+                        + [f"{name}_y" if name in shared else name for name in names[1] if name != "SEQN"]
+                        + (["year"] if several else []))
+        row_bytes = [sum(size for _, size in schema) + _YEAR_BYTES for schema in schemas]
+        joined_row_bytes = row_bytes[0] + row_bytes[1] - 8 - _YEAR_BYTES - (0 if several else _YEAR_BYTES)  # one SEQN
+
+        cycles = []
+        for left_file, right_file in zip(left["data_files"], right["data_files"]):
+            rows = [left_file["header"]["nobs"], right_file["header"]["nobs"]]
+            joined = min(rows) * joined_row_bytes
+            cycles.append((min(rows), rows[0] * row_bytes[0] + rows[1] * row_bytes[1] + joined, joined))
+        self.rows = sum(rows for rows, _, _ in cycles)
+        self.result_bytes = sum(joined for _, _, joined in cycles)
+
+        max_memory = self.arguments.get("max_memory")
+        workers = self.arguments.get("max_workers", 4) if several else 1
+        # The joined cycles are concatenated once at the end, holding them and the result at the same time
+        concatenated = 2 * self.result_bytes if several else 0
+        if max_memory is None:
+            self.peak_memory = max(self._in_flight(cycles, workers), concatenated)
+            return
+        # The decoded size of each input, as estimated by NHANESDataAPI._spill_if_over_budget
+        budget = parse_memory_size(max_memory)
+        sizes = [[estimate_decoded_bytes([left_file["header"]], left["columns"]),
+                  estimate_decoded_bytes([right_file["header"]], right["columns"])]
+                 for left_file, right_file in zip(left["data_files"], right["data_files"])]
+        # An input over a third of the budget is spilled and joined through disk, holding about the budget
+        over = [max(cycle_sizes) > budget // 3 for cycle_sizes in sizes]
+        spilled_peak = max([min(peak, budget) for (_, peak, _), spilled in zip(cycles, over) if spilled] + [0])
+        in_memory = [cycle for cycle, spilled in zip(cycles, over) if not spilled]
+        if several:
+            # The rules of NHANESDataAPI._join_cycles
+            in_memory_sizes = [sum(cycle_sizes) for cycle_sizes, spilled in zip(sizes, over) if not spilled]
+            if in_memory_sizes:
+                workers = max(1, min(workers, budget // max(1, 2 * max(in_memory_sizes))))
+            self.spill = any(over) or sum(map(sum, sizes)) > budget
+        else:
+            self.spill = any(over)
+        peak = max(self._in_flight(in_memory, workers), spilled_peak)
+        self.peak_memory = peak if self.spill else max(peak, concatenated)
+
+    @staticmethod
+    def _in_flight(cycles, workers):
+        """
+        Estimate the peak memory of joining cycles in memory, workers cycles at a time.
+        """
+        return sum(sorted((cycle_peak for _, cycle_peak, _ in cycles), reverse=True)[:workers])
+
+    def summary(self):
+        """
+        Returns:
+        dict: {'operation', 'cycles', 'skipped', 'files', 'cache_hits', 'download_bytes', 'rows', 'columns',
+        'result_bytes', 'peak_memory', 'spill'}.
+        """
+        return {"operation": self.operation, "cycles": self.cycles, "skipped": self.skipped, "files": len(self.files),
+                "cache_hits": self.cache_hits, "download_bytes": self.download_bytes, "rows": self.rows,
+                "columns": len(self.columns), "result_bytes": self.result_bytes, "peak_memory": self.peak_memory,
+                "spill": self.spill}
+
+    def report(self):
+        """
+        Format the plan as a human-readable report: the data files and the totals.
+
+        Returns:
+        str: The report.
+        """
+        files = self.files.copy()
+        files["File Size"] = files["File Size"].map(_format_bytes)
+        files["Download Bytes"] = files["Download Bytes"].map(_format_bytes)
+        lines = [f"Plan of {self.operation} for {', '.join(self.cycles)}", files.to_string(index=False), ""]
+        if self.skipped:
+            lines.append(f"Skipped cycles without the data files: {', '.join(self.skipped)}")
+        lines.append(f"Cached: {self.cache_hits} of {len(self.files)} file(s); to download: {_format_bytes(self.download_bytes)}")
+        lines.append(f"Result: about {self.rows} rows x {len(self.columns)} columns, {_format_bytes(self.result_bytes)}")
+        lines.append(f"Peak memory: about {_format_bytes(self.peak_memory)}" + (" (spilled to disk)" if self.spill else ""))
+        return "\n".join(lines)
+
+    def execute(self):
+        """
+        Run the planned call. The data files are resolved again, so the result reflects the current catalog and cache.
+
+        Returns:
+        The result of retrieve_data or join_data_files.
+        """
+        return getattr(self._api, self.operation)(**self.arguments)
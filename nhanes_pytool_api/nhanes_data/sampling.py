@@ -0,0 +1,50 @@
+import numpy as np
+
+_GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+
+def participant_hash(seqn, seed=0):
+    """
+    Map participant numbers (SEQN) to pseudo-random numbers in [0, 1), the same for a SEQN in every data file.
+
+    The hash is SplitMix64 of the SEQN offset by the seed, so it depends only on the SEQN and the seed, not on the
+    data file, the cycle or the position of the record.
+
+    Args:
+    seqn (np.ndarray): The participant numbers. Missing values hash to 1.0, so they are never sampled.
+    seed (int, optional): The seed of the sample. Defaults to 0.
+
+    Returns:
+    np.ndarray: The float64 hash of each participant.
+    """
+    seqn = np.asarray(seqn, dtype=np.float64)
+    missing = np.isnan(seqn)
+    x = np.where(missing, 0, seqn).astype(np.int64).astype(np.uint64)
+    x += np.uint64((seed * _GOLDEN_GAMMA) % 2 ** 64)
+    x ^= x >> np.uint64(30)
+    x *= np.uint64(0xBF58476D1CE4E5B9)
+    x ^= x >> np.uint64(27)
+    x *= np.uint64(0x94D049BB133111EB)
+    x ^= x >> np.uint64(31)
+    values = (x >> np.uint64(11)).astype(np.float64) / 2 ** 53
+    values[missing] = 1.0
+    return values
+
+
+def sample_rows(seqn, fraction, seed=0):
+    """
+    Select the records of the participants in a consistent random sample.
+
+    A participant is in the sample if its hash is below the fraction, so sampling several data files (or cycles) with
+    the same fraction and seed selects the same participants in each of them, and the sampled frames still join on
+    SEQN. Larger fractions select supersets of smaller ones.
+
+    Args:
+    seqn (np.ndarray): The SEQN of each record.
+    fraction (float): The fraction of participants to sample, between 0 and 1.
+    seed (int, optional): The seed of the sample. Defaults to 0.
+
+    Returns:
+    np.ndarray: The selected record numbers, in increasing order.
+    """
+    return np.flatnonzero(participant_hash(seqn, seed) < fraction)
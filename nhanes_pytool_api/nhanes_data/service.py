@@ -0,0 +1,373 @@
+import json
+import logging
+import re
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from .dataset import PartitionedDataset, _import_pyarrow
+from .lazy import LazyDataset
+from .xport import union_schema
+
+logger = logging.getLogger(__name__)
+
+
+class _ChunkedWriter:
+    """
+    A file-like object writing to an HTTP response with chunked transfer encoding.
+    """
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.closed = False
+
+    def write(self, data):
+        if data:
+            self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + bytes(data) + b"\r\n")
+        return len(data)
+
+    def flush(self):
+        self.wfile.flush()
+
+    def close(self):
+        if not self.closed:
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+            self.closed = True
+
+
+class NHANESDataService:
+    """
+    NHANESDataService serves NHANES data over HTTP from one shared NHANESDataAPI, so that many clients use a single
+    warm cache instead of each downloading from the NHANES website.
+
+    The service uses the standard library HTTP server with one thread per request; the API instance is thread-safe
+    and coalesces concurrent fetches of the same file. Endpoints (GET):
+
+    - /files?category=...&cycle=...: The data file descriptions, as returned by list_file_names (JSON).
+    - /data?category=...&cycle=...&file=...: The data, as returned by retrieve_data.
+    - /join?cycle=...&category1=...&file1=...&category2=...&file2=...: The joined data, as returned by join_data_files.
+
+    /data and /join accept include_uncommon_variables=false and the row and column selection parameters
+    columns=SEQN,RIDAGEYR, filter=RIDAGEYR>=18 (repeatable; operators ==, !=, <, <=, >, >=), offset and limit. The
+    result is streamed with chunked transfer encoding as CSV (format=csv, the default) or as an Arrow IPC stream
+    (format=arrow, requires pyarrow), chunk_rows rows at a time, with character values as text (latin-1). /data
+    plans the retrieval with retrieve_data(lazy=True), so only the selected and filtered columns are decoded, one
+    data file chunk at a time, and the rows are never held as a whole; filters on 'year' skip the other cycles. /join
+    holds the joined data in memory unless max_memory is set, in which case larger joins are computed through disk
+    and streamed from it (see join_data_files). The X-Row-Count header is sent when the number of rows is known up
+    front: from the XPORT headers for /data and from the joined data for /join, and not with other filters than on
+    'year'. An error once the data is being streamed is logged, and the connection is closed without the terminating
+    chunk, so clients see an incomplete response.
+
+    Args:
+    api (NHANESDataAPI): The API serving the requests.
+    host (str, optional): The address to listen on. Defaults to '127.0.0.1'.
+    port (int, optional): The port to listen on. Defaults to 8000; 0 picks a free port.
+    chunk_rows (int, optional): The number of rows per streamed chunk. Defaults to 10000.
+    max_memory (int or str, optional): The memory budget of a /join, in bytes or a string such as '2GB'. Defaults to
+    None, meaning no budget.
+    """
+
+    _filter_pattern = re.compile(r"^\s*(\w+)\s*(==|!=|<=|>=|<|>)\s*(.*?)\s*$")
+
+    def __init__(self, api, host="127.0.0.1", port=8000, chunk_rows=10000, max_memory=None):
+        self.api = api
+        self.chunk_rows = chunk_rows
+        self.max_memory = max_memory
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                service._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.host, self.port = self.httpd.server_address[:2]
+        self.url = f"http://{self.host}:{self.port}"
+
+    def serve_forever(self):
+        """
+        Serve requests until shutdown() is called.
+        """
+        self.httpd.serve_forever()
+
+    def shutdown(self):
+        """
+        Stop serving and close the server socket.
+        """
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    @classmethod
+    def parse_filter(cls, expression):
+        """
+        Parse a row filter such as 'RIDAGEYR>=18' into the (column, operator, value) form used by LazyDataset.
+
+        Args:
+        expression (str): The filter expression.
+
+        Returns:
+        tuple: (column, operator, value), where value is a float if it is numeric and a string otherwise.
+
+        Raises:
+        ValueError: If the expression is not a valid filter.
+        """
+        match = cls._filter_pattern.match(expression)
+        if match is None:
+            raise ValueError(f"Invalid filter: {expression}. Use the form column<op>value, e.g. RIDAGEYR>=18.")
+        column, op, value = match.groups()
+        try:
+            value = float(value)
+        except ValueError:
+            pass
+        return column, op, value
+
+    def _handle(self, request):
+        url = urllib.parse.urlsplit(request.path)
+        query = urllib.parse.parse_qs(url.query)
+        try:
+            if url.path == "/files":
+                cycles = query.get("cycle")
+                self._send_json(request, 200, self.api.list_file_names(self._param(query, "category"), cycles))
+            elif url.path == "/data":
+                lazy = self.api.retrieve_data(
+                    self._param(query, "category"), self._params(query, "cycle"),
+                    self._param(query, "file"), include_uncommon_variables=self._include_uncommon(query), lazy=True,
+                )
+                self._send_data(request, *self._select_lazy(lazy, query), query)
+            elif url.path == "/join":
+                data = self.api.join_data_files(
+                    self._param(query, "cycle"), self._param(query, "category1"), self._param(query, "file1"),
+                    self._param(query, "category2"), self._param(query, "file2"),
+                    include_uncommon_variables=self._include_uncommon(query), max_memory=self.max_memory,
+                )
+                if isinstance(data, PartitionedDataset):
+                    with data:
+                        self._send_data(request, *self._select_partitioned(data, query), query)
+                else:
+                    strings = [column for column in data.columns
+                               if pd.api.types.infer_dtype(data[column], skipna=True) in ("bytes", "string")]
+                    data = self._select(self._decode_strings(data, strings), query)
+                    strings = [column for column in strings if column in data.columns]
+                    self._send_data(request, [data], list(data.columns), strings, len(data), query)
+            else:
+                self._send_json(request, 404, {"error": f"Unknown endpoint: {url.path}"})
+        except (ValueError, KeyError, ImportError) as e:
+            self._send_json(request, 400, {"error": str(e).strip("'\"")})
+        except Exception as e:
+            self._send_json(request, 500, {"error": str(e)})
+
+    @staticmethod
+    def _params(query, name):
+        values = query.get(name)
+        if not values:
+            raise ValueError(f"Missing query parameter: {name}")
+        return values
+
+    def _param(self, query, name):
+        return self._params(query, name)[0]
+
+    @staticmethod
+    def _include_uncommon(query):
+        return query.get("include_uncommon_variables", ["true"])[0].lower() not in ("false", "0", "no")
+
+    @staticmethod
+    def _columns(query):
+        return [column for value in query.get("columns", []) for column in value.split(",") if column]
+
+    @staticmethod
+    def _window(query):
+        """
+        Get the offset and limit query parameters, with None for no limit.
+        """
+        limit = query.get("limit")
+        return int(query.get("offset", ["0"])[0]), None if limit is None else int(limit[0])
+
+    def _window_chunks(self, chunks, query, total=None):
+        """
+        Apply the offset and limit query parameters to a stream of chunks.
+
+        Returns:
+        tuple: (chunks, rows), where rows is the number of rows of the window, or None if total is None.
+        """
+        offset, limit = self._window(query)
+        rows = None
+        if total is not None:
+            rows = max(0, total - offset) if limit is None else max(0, min(total - offset, limit))
+
+        def windowed():
+            skip, remaining = offset, limit
+            for chunk in chunks:
+                if remaining is not None and remaining <= 0:
+                    break
+                if skip:
+                    skipped = min(skip, len(chunk))
+                    chunk, skip = chunk.iloc[skipped:], skip - skipped
+                if remaining is not None:
+                    chunk = chunk.iloc[:remaining]
+                    remaining -= len(chunk)
+                if len(chunk):
+                    yield chunk
+
+        return windowed(), rows
+
+    @staticmethod
+    def _decode_strings(data, columns):
+        """
+        Decode character columns, which are decoded from XPORT files as bytes, to str. Missing values become None.
+        """
+        decoded = {}
+        for column in columns:
+            series = data[column]
+            if pd.api.types.infer_dtype(series, skipna=True) == "bytes":
+                decoded[column] = series.str.decode("latin-1")
+            elif series.dtype != object:
+                decoded[column] = series.astype(object).where(series.notna(), None)
+        return data.assign(**decoded) if decoded else data
+
+    def _select(self, data, query):
+        """
+        Apply the filter, columns, offset and limit query parameters to the data.
+        """
+        for expression in query.get("filter", []):
+            column, op, value = self.parse_filter(expression)
+            if column not in data.columns:
+                raise KeyError(f"Unknown filter column: {column}")
+            data = data[LazyDataset.operators[op](data[column], value)]
+        columns = self._columns(query)
+        if columns:
+            missing = [column for column in columns if column not in data.columns]
+            if missing:
+                raise KeyError(f"Unknown columns: {missing}")
+            data = data[columns]
+        offset, limit = self._window(query)
+        return data.iloc[offset:] if limit is None else data.iloc[offset:offset + limit]
+
+    def _select_lazy(self, lazy, query):
+        """
+        Apply the filter, columns, offset and limit query parameters to a LazyDataset, without decoding its data.
+
+        Returns:
+        tuple: (chunks, columns, strings, rows), where chunks is an iterator of the selected chunks, columns the output
+        columns, strings the character columns among them and rows the number of rows, or None with row filters.
+        """
+        for expression in query.get("filter", []):
+            lazy = lazy.filter(*self.parse_filter(expression))
+        # Checked once the year filters have pruned the plan, so only the headers of the kept cycles are read
+        for column, _, _ in lazy.filters:
+            if column not in lazy.columns:
+                raise KeyError(f"Unknown filter column: {column}")
+        # Download the planned data files first, shared with concurrent requests, so their headers are read locally
+        for data_file in lazy.data_files:
+            self.api._fetch_data_file(*data_file)
+        headers = [self.api.probe_data_file(*data_file) for data_file in lazy.data_files]
+        kinds = dict(union_schema(headers))
+        kinds["year"] = "char"
+        columns = self._columns(query)
+        if columns:
+            lazy = lazy.select(columns)
+        else:
+            columns = [column for column in lazy.columns if column in kinds] if not self._include_uncommon(query) else list(kinds)
+
+        # The filtered rows are only known once decoded, so they are streamed without a count
+        total = None if lazy.filters else sum(header["nobs"] for header in headers)
+        chunks, rows = self._window_chunks(lazy.iter_chunks(), query, total)
+        return chunks, columns, [column for column in columns if kinds.get(column) == "char"], rows
+
+    def _select_partitioned(self, dataset, query):
+        """
+        Apply the filter, columns, offset and limit query parameters to a disk-backed dataset, reading chunk_rows rows
+        at a time.
+
+        Returns:
+        tuple: (chunks, columns, strings, rows), as returned by _select_lazy.
+        """
+        pyarrow = _import_pyarrow()
+        strings = []
+        for cycle_year in dataset.partitions:
+            for field in pyarrow.parquet.read_schema(dataset.partition_path(cycle_year)):
+                character = pyarrow.types.is_binary(field.type) or pyarrow.types.is_string(field.type)
+                if character and field.name not in strings:
+                    strings.append(field.name)
+        available = dataset.columns
+        filters = [self.parse_filter(expression) for expression in query.get("filter", [])]
+        for column, _, _ in filters:
+            if column not in available:
+                raise KeyError(f"Unknown filter column: {column}")
+        columns = self._columns(query) or available
+        missing = [column for column in columns if column not in available]
+        if missing:
+            raise KeyError(f"Unknown columns: {missing}")
+
+        def chunks():
+            for chunk in dataset.iter_batches(self.chunk_rows):
+                chunk = self._decode_strings(chunk, [column for column in strings if column in chunk.columns])
+                for column, op, value in filters:
+                    chunk = chunk[LazyDataset.operators[op](chunk[column], value)]
+                yield chunk
+
+        chunks, rows = self._window_chunks(chunks(), query, None if filters else len(dataset))
+        return chunks, columns, [column for column in columns if column in strings], rows
+
+    def _send_json(self, request, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", "application/json")
+        request.send_header("Content-Length", str(len(payload)))
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def _send_data(self, request, chunks, columns, strings, rows, query):
+        """
+        Stream data chunks as chunked CSV or as an Arrow IPC stream, chunk_rows rows at a time.
+
+        Args:
+        chunks (iterable of pd.DataFrame): The data. Missing columns of a chunk are sent as missing values.
+        columns (list of str): The columns to send.
+        strings (list of str): The character columns; the other columns are numeric.
+        rows (int): The number of rows, sent in the X-Row-Count header, or None if it is not known up front.
+        """
+        data_format = query.get("format", ["csv"])[0].lower()
+        if data_format not in ("csv", "arrow"):
+            raise ValueError(f"Unsupported format: {data_format}. Use 'csv' or 'arrow'.")
+        pyarrow = _import_pyarrow() if data_format == "arrow" else None
+
+        request.send_response(200)
+        request.send_header("Content-Type", "text/csv" if data_format == "csv" else "application/vnd.apache.arrow.stream")
+        request.send_header("Transfer-Encoding", "chunked")
+        if rows is not None:
+            request.send_header("X-Row-Count", str(rows))
+        request.end_headers()
+
+        def batches():
+            for data in chunks:
+                data = self._decode_strings(data.reindex(columns=columns), strings)
+                for start in range(0, len(data), self.chunk_rows):
+                    yield data.iloc[start:start + self.chunk_rows]
+
+        writer = _ChunkedWriter(request.wfile)
+        try:
+            if data_format == "csv":
+                writer.write(pd.DataFrame(columns=columns).to_csv(index=False).encode("utf-8"))
+                for chunk in batches():
+                    writer.write(chunk.to_csv(index=False, header=False).encode("utf-8"))
+            else:
+                schema = pyarrow.schema([(column, pyarrow.string() if column in strings else pyarrow.float64())
+                                         for column in columns])
+                with pyarrow.ipc.new_stream(writer, schema) as stream:
+                    for chunk in batches():
+                        stream.write_batch(pyarrow.RecordBatch.from_pandas(chunk, schema=schema, preserve_index=False))
+        except Exception:
+            # The status line is sent, so the error can't be reported in the response: end it without the terminating
+            # chunk, which clients see as an incomplete response
+            logger.exception("Error while streaming %s", request.path)
+            request.close_connection = True
+            return
+        writer.close()
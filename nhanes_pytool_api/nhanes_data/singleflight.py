@@ -0,0 +1,60 @@
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    SingleFlight coalesces concurrent calls for the same key into one call.
+
+    The first caller for a key runs the function. Callers that ask for the same key while it is running wait for it
+    and share its result (or its exception) instead of running the function again. Once the call has finished, the
+    next caller for the key runs the function again, so results are not cached here.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, function, *args, **kwargs):
+        """
+        Run function(*args, **kwargs) unless a call for the same key is already in flight, and return its result.
+
+        Args:
+        key (hashable): The key identifying the call, e.g., ('catalog', 'demographics').
+        function (callable): The function to run.
+
+        Returns:
+        The result of the function.
+        bool: True if the result was shared from another caller's call, False if this caller ran the function.
+
+        Raises:
+        Exception: Whatever the function raised, re-raised in every caller waiting for it.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            shared = call is not None
+            if not shared:
+                call = self._calls[key] = _Call()
+
+        if shared:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = function(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
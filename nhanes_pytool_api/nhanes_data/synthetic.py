@@ -0,0 +1,471 @@
+import html
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from .sampling import participant_hash
+from .xport import XportWriter
+
+# Data file name suffix of each cycle year, e.g., DEMO_D for 2005-2006
+CYCLE_SUFFIXES = {
+    "1999-2000": "",
+    "2001-2002": "_B",
+    "2003-2004": "_C",
+    "2005-2006": "_D",
+    "2007-2008": "_E",
+    "2009-2010": "_F",
+    "2011-2012": "_G",
+    "2013-2014": "_H",
+    "2015-2016": "_I",
+    "2017-2018": "_J",
+}
+
+_YES_NO = {1: "Yes", 2: "No", 7: "Refused", 9: "Don't know"}
+
+# The data files of the synthetic website. Each variable is (name, SAS label, codes or range); codes are
+# {code: value description} and a range is (low, high). Coverage is the fraction of participants in the file and
+# min_age the youngest participants in it, as in the real surveys. Keys, like SEQN, are never missing.
+DATA_FILES = {
+    "DEMO": {
+        "data_category": "demographics",
+        "description": "Demographic Variables & Sample Weights",
+        "coverage": 1.0,
+        "min_age": 0,
+        "variables": [
+            ("RIAGENDR", "Gender", {1: "Male", 2: "Female"}),
+            ("RIDAGEYR", "Age in years at screening", (0, 80)),
+            ("RIDRETH1", "Race/Hispanic origin", {1: "Mexican American", 2: "Other Hispanic", 3: "Non-Hispanic White",
+                                                  4: "Non-Hispanic Black", 5: "Other Race - Including Multi-Racial"}),
+            ("DMDEDUC2", "Education level - Adults 20+", {1: "Less than 9th grade",
+                                                          2: "9-11th grade (Includes 12th grade with no diploma)",
+                                                          3: "High school graduate/GED or equivalent",
+                                                          4: "Some college or AA degree", 5: "College graduate or above",
+                                                          7: "Refused", 9: "Don't Know"}),
+            ("INDFMPIR", "Ratio of family income to poverty", (0, 5)),
+            ("WTMEC2YR", "Full sample 2 year MEC exam weight", (2000, 200000)),
+        ],
+    },
+    "BMX": {
+        "data_category": "examination",
+        "description": "Body Measures",
+        "coverage": 0.95,
+        "min_age": 0,
+        "variables": [
+            ("BMXWT", "Weight (kg)", (3, 250)),
+            ("BMXHT", "Standing Height (cm)", (80, 210)),
+            ("BMXBMI", "Body Mass Index (kg/m**2)", (11, 85)),
+        ],
+    },
+    "BPX": {
+        "data_category": "examination",
+        "description": "Blood Pressure",
+        "coverage": 0.85,
+        "min_age": 8,
+        "variables": [
+            ("BPXSY1", "Systolic: Blood pres (1st rdg) mm Hg", (70, 230)),
+            ("BPXDI1", "Diastolic: Blood pres (1st rdg) mm Hg", (0, 130)),
+        ],
+    },
+    "GHB": {
+        "data_category": "laboratory",
+        "description": "Glycohemoglobin",
+        "coverage": 0.7,
+        "min_age": 12,
+        "variables": [
+            ("LBXGH", "Glycohemoglobin (%)", (3.5, 17)),
+        ],
+    },
+    "TCHOL": {
+        "data_category": "laboratory",
+        "description": "Cholesterol - Total",
+        "coverage": 0.75,
+        "min_age": 6,
+        "variables": [
+            ("LBXTC", "Total Cholesterol (mg/dL)", (70, 500)),
+            ("LBDTCSI", "Total Cholesterol (mmol/L)", (1.81, 12.93)),
+        ],
+    },
+    "SMQ": {
+        "data_category": "questionnaire",
+        "description": "Smoking - Cigarette Use",
+        "coverage": 0.95,
+        "min_age": 18,
+        "variables": [
+            ("SMQ020", "Smoked at least 100 cigarettes in life", _YES_NO),
+        ],
+    },
+    "DR1IFF": {
+        "data_category": "dietary",
+        "description": "Dietary Interview - Individual Foods, First Day",
+        "coverage": 0.9,
+        "min_age": 0,
+        "records_per_participant": 14,
+        "keys": ["DR1ILINE"],
+        "variables": [
+            ("DR1ILINE", "Food/Individual component number", (1, 80)),
+            ("DR1IFDCD", "USDA food code", (11000000, 99999999)),
+            ("DR1IGRMS", "Grams", (0, 3000)),
+            ("DR1IKCAL", "Energy (kcal)", (0, 3500)),
+        ],
+    },
+}
+
+
+def _bounded(values, low, high, decimals=0):
+    return np.round(np.clip(values, low, high), decimals)
+
+
+def _coded(rng, codes, probabilities, size):
+    return rng.choice(np.array(codes, dtype=float), size=size, p=np.array(probabilities) / np.sum(probabilities))
+
+
+class SyntheticNHANES:
+    """
+    SyntheticNHANES generates an NHANES-shaped website: SAS XPORT data files, their documentation pages (codebooks) and
+    the variablelist pages of the data categories, for load tests of retrieval, joins and the cache without the CDC
+    website, at any size.
+
+    The data files mimic real ones (DEMO, BMX, BPX, GHB, TCHOL, SMQ and the multi-record DR1IFF, see DATA_FILES) with
+    their file name suffixes per cycle, coded variables with value labels including refused and don't know codes,
+    age-dependent coverage and participants (SEQN) shared by the data files of a cycle. Participant attributes such as
+    gender and age are derived from a hash of the SEQN, so that the data files are generated chunk by chunk, never
+    holding a whole file in memory, and still agree with each other. The data only depends on the arguments.
+
+    Use write() to generate the files into a directory and LocalNHANESServer to serve them:
+
+        site = SyntheticNHANES(participants=1000000).write("synthetic/")
+        with LocalNHANESServer(site) as server:
+            api = NHANESDataAPI(base_url=server.base_url)
+
+    Args:
+    cycles (list of str, optional): The cycle years. Defaults to ['2015-2016', '2017-2018'].
+    participants (int, optional): The number of participants per cycle. Defaults to 10000, about the real size.
+    extra_columns (int, optional): The number of additional variables per data file, to make wide files. Every third
+    one is a coded yes/no variable, the others are continuous. Defaults to 0.
+    missing_rate (float, optional): The fraction of values of each variable (except keys) that are missing, on top of
+    the participants a variable does not apply to. Defaults to 0.05.
+    data_files (list of str, optional): The data files to generate, by base name, e.g., ['DEMO', 'BMX']. Defaults to None,
+    meaning all of DATA_FILES.
+    seed (int, optional): The seed of the data. Defaults to 0.
+    chunk_rows (int, optional): The number of participants generated at a time. Defaults to 100000.
+
+    Raises:
+    ValueError: If a cycle year or a data file is unknown, or a size or rate is out of range.
+    """
+
+    def __init__(self, cycles=None, participants=10000, extra_columns=0, missing_rate=0.05, data_files=None, seed=0,
+                 chunk_rows=100000):
+        self.cycles = list(cycles) if cycles is not None else ["2015-2016", "2017-2018"]
+        unknown = [cycle_year for cycle_year in self.cycles if cycle_year not in CYCLE_SUFFIXES]
+        if unknown:
+            raise ValueError(f"Unknown cycle years: {unknown}. Use some of {list(CYCLE_SUFFIXES)}.")
+        self.data_files = list(data_files) if data_files is not None else list(DATA_FILES)
+        unknown = [base_name for base_name in self.data_files if base_name not in DATA_FILES]
+        if unknown:
+            raise ValueError(f"Unknown data files: {unknown}. Use some of {list(DATA_FILES)}.")
+        if participants < 1 or chunk_rows < 1:
+            raise ValueError("participants and chunk_rows must be at least 1.")
+        if not 0 <= extra_columns <= 9999:
+            raise ValueError("extra_columns must be between 0 and 9999.")
+        if not 0 <= missing_rate < 1:
+            raise ValueError("missing_rate must be at least 0 and less than 1.")
+        self.participants = int(participants)
+        self.extra_columns = int(extra_columns)
+        self.missing_rate = missing_rate
+        self.seed = seed
+        self.chunk_rows = int(chunk_rows)
+
+    def __repr__(self):
+        return (f"SyntheticNHANES(cycles={self.cycles}, participants={self.participants}, "
+                f"extra_columns={self.extra_columns}, missing_rate={self.missing_rate}, seed={self.seed})")
+
+    @staticmethod
+    def data_file_name(cycle_year, base_name):
+        """
+        Get the name of a data file in a cycle year, e.g., 'DEMO_D' for ('2005-2006', 'DEMO').
+        """
+        return base_name + CYCLE_SUFFIXES[cycle_year]
+
+    def variables(self, base_name):
+        """
+        Get the variables of a data file, including the extra columns.
+
+        Args:
+        base_name (str): The base name of the data file, e.g., 'BMX'.
+
+        Returns:
+        list of tuple: (name, SAS label, codes or range) tuples, starting with SEQN.
+        """
+        variables = [("SEQN", "Respondent sequence number", None)] + list(DATA_FILES[base_name]["variables"])
+        for number in range(1, self.extra_columns + 1):
+            name = f"{base_name[:3]}X{number:04d}"
+            if number % 3 == 0:
+                variables.append((name, f"Synthetic question {number}", _YES_NO))
+            else:
+                variables.append((name, f"Synthetic measurement {number}", (0, 1000)))
+        return variables
+
+    def _first_seqn(self, cycle_year):
+        return list(CYCLE_SUFFIXES).index(cycle_year) * self.participants + 1
+
+    def _attributes(self, seqn):
+        """
+        Derive the gender, age and race of participants from their SEQN.
+        """
+        gender = np.where(participant_hash(seqn, self.seed * 8 + 1) < 0.49, 1.0, 2.0)
+        age = np.floor(participant_hash(seqn, self.seed * 8 + 2) * 86)
+        age[age > 80] = 80  # topcoded, as in the real data
+        race = np.searchsorted([0.17, 0.26, 0.62, 0.84], participant_hash(seqn, self.seed * 8 + 3), side="right") + 1.0
+        return {"RIAGENDR": gender, "RIDAGEYR": age, "RIDRETH1": race}
+
+    def _values(self, base_name, seqn, attributes, rng):
+        """
+        Generate the variables of a data file (except the extra columns) for some participants.
+        """
+        n = len(seqn)
+        age = attributes["RIDAGEYR"]
+        adult = age >= 20
+        male = attributes["RIAGENDR"] == 1
+        if base_name == "DEMO":
+            education = _coded(rng, [1, 2, 3, 4, 5, 7, 9], [0.1, 0.12, 0.23, 0.3, 0.24, 0.005, 0.005], n)
+            return {"RIAGENDR": attributes["RIAGENDR"], "RIDAGEYR": attributes["RIDAGEYR"],
+                    "RIDRETH1": attributes["RIDRETH1"], "DMDEDUC2": np.where(adult, education, np.nan),
+                    "INDFMPIR": _bounded(rng.gamma(2.0, 1.2, n), 0, 5, 2),
+                    "WTMEC2YR": _bounded(rng.lognormal(10.2, 0.8, n), 2000, 200000, 3)}
+        if base_name == "BMX":
+            height = np.where(adult, rng.normal(np.where(male, 175, 161), 7),
+                              rng.normal(80 + np.minimum(age, 18) * 5.5, 6))
+            bmi = np.where(adult, rng.lognormal(np.log(28), 0.2, n), rng.lognormal(np.log(18), 0.15, n))
+            weight = _bounded(bmi * (height / 100) ** 2, 3, 250, 1)
+            height = _bounded(height, 80, 210, 1)
+            return {"BMXWT": weight, "BMXHT": height, "BMXBMI": _bounded(weight / (height / 100) ** 2, 11, 85, 1)}
+        if base_name == "BPX":
+            systolic = _bounded(rng.normal(100 + 0.5 * age, 15) // 2 * 2, 70, 230)
+            return {"BPXSY1": systolic, "BPXDI1": _bounded(rng.normal(68, 12, n) // 2 * 2, 0, 130)}
+        if base_name == "GHB":
+            return {"LBXGH": _bounded(rng.lognormal(np.log(5.5), 0.12, n), 3.5, 17, 1)}
+        if base_name == "TCHOL":
+            total = _bounded(rng.normal(160 + 0.6 * np.minimum(age, 60), 38), 70, 500)
+            return {"LBXTC": total, "LBDTCSI": np.round(total * 0.02586, 2)}
+        if base_name == "SMQ":
+            return {"SMQ020": _coded(rng, [1, 2, 7, 9], [0.42, 0.57, 0.005, 0.005], n)}
+        if base_name == "DR1IFF":
+            return {"DR1ILINE": np.ones(n), "DR1IFDCD": np.floor(rng.uniform(11000000, 99999999, n)),
+                    "DR1IGRMS": _bounded(rng.lognormal(4.5, 1.0, n), 0, 3000, 2),
+                    "DR1IKCAL": _bounded(rng.lognormal(4.6, 1.1, n), 0, 3500)}
+        raise ValueError(f"Unknown data file: {base_name}")
+
+    def iter_chunks(self, cycle_year, base_name):
+        """
+        Generate the records of a data file, a chunk of participants at a time.
+
+        Args:
+        cycle_year (str): The cycle year.
+        base_name (str): The base name of the data file, e.g., 'BMX'.
+
+        Yields:
+        pd.DataFrame: The records of the next chunk_rows participants, with float64 columns in file order.
+        """
+        template = DATA_FILES[base_name]
+        variables = self.variables(base_name)
+        first = self._first_seqn(cycle_year)
+        file_number = list(DATA_FILES).index(base_name)
+        cycle_number = list(CYCLE_SUFFIXES).index(cycle_year)
+        for chunk_number, start in enumerate(range(first, first + self.participants, self.chunk_rows)):
+            rng = np.random.default_rng([self.seed, cycle_number, file_number, chunk_number])
+            seqn = np.arange(start, min(start + self.chunk_rows, first + self.participants), dtype=float)
+            attributes = self._attributes(seqn)
+            covered = (participant_hash(seqn, self.seed * 8 + 4 + file_number * 97) < template["coverage"]) \
+                & (attributes["RIDAGEYR"] >= template["min_age"])
+            seqn = seqn[covered]
+            attributes = {name: values[covered] for name, values in attributes.items()}
+            records = template.get("records_per_participant")
+            if records:
+                counts = rng.poisson(records - 1, len(seqn)) + 1
+                seqn = np.repeat(seqn, counts)
+                attributes = {name: np.repeat(values, counts) for name, values in attributes.items()}
+            columns = {"SEQN": seqn}
+            columns.update(self._values(base_name, seqn, attributes, rng))
+            if records:
+                starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+                columns["DR1ILINE"] = np.arange(len(seqn)) - np.repeat(starts, counts) + 1.0
+            for name, _, codes in variables[len(template["variables"]) + 1:]:
+                if isinstance(codes, dict):
+                    columns[name] = _coded(rng, [1, 2, 9], [0.5, 0.49, 0.01], len(seqn))
+                else:
+                    columns[name] = np.round(rng.uniform(0, 1000, len(seqn)), 2)
+            if self.missing_rate > 0:
+                for name in [name for name, _, _ in variables[1:] if name not in template.get("keys", [])]:
+                    columns[name] = np.where(rng.random(len(seqn)) < self.missing_rate, np.nan, columns[name])
+            yield pd.DataFrame({name: columns[name] for name, _, _ in variables})
+
+    def data_frame(self, cycle_year, base_name):
+        """
+        Generate a whole data file in memory, e.g., to compare with what the API retrieves.
+
+        Args:
+        cycle_year (str): The cycle year.
+        base_name (str): The base name of the data file, e.g., 'BMX'.
+
+        Returns:
+        pd.DataFrame: The records of the data file.
+        """
+        return pd.concat(list(self.iter_chunks(cycle_year, base_name)), ignore_index=True)
+
+    def codebook_page(self, cycle_year, base_name, counts=None):
+        """
+        Render the documentation page of a data file, in the format of the NHANES codebooks that parse_codebook reads.
+
+        Args:
+        cycle_year (str): The cycle year.
+        base_name (str): The base name of the data file.
+        counts (dict, optional): A dictionary of {variable name: {code: count}}, with the count of non-missing values
+        of continuous variables under 'range' and of missing values under '.'. Defaults to None, meaning no counts.
+
+        Returns:
+        str: The HTML of the page.
+        """
+        name = self.data_file_name(cycle_year, base_name)
+        description = DATA_FILES[base_name]["description"]
+        parts = [f"<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\">\n<title>{html.escape(description)} "
+                 f"({name})</title>\n</head>\n<body>\n<h2>{html.escape(description)} ({name})</h2>\n"
+                 f"<h4>Data File: {name}.xpt</h4>\n"]
+        for variable, label, codes in self.variables(base_name):
+            variable_counts = (counts or {}).get(variable, {})
+            rows = []
+            if isinstance(codes, dict):
+                rows = [(str(code), value_description, variable_counts.get(code)) for code, value_description in codes.items()]
+            elif codes is not None:
+                rows = [(f"{codes[0]:g} to {codes[1]:g}", "Range of Values", variable_counts.get("range"))]
+            parts.append(f"<div class=\"pagebreak\">\n<h3 class=\"vartitle\" id=\"{variable}\">{variable} - "
+                         f"{html.escape(label)}</h3>\n<dl>\n<dt>Variable Name: </dt><dd>{variable}</dd>\n"
+                         f"<dt>SAS Label: </dt><dd>{html.escape(label)}</dd>\n"
+                         f"<dt>English Text: </dt><dd>{html.escape(label)}.</dd>\n"
+                         f"<dt>Target: </dt><dd>Both males and females {DATA_FILES[base_name]['min_age']} YEARS - 150 YEARS</dd>\n</dl>\n")
+            if rows:
+                rows.append((".", "Missing", variable_counts.get(".")))
+                parts.append("<table class=\"values\">\n<thead>\n<tr>\n<th scope=\"col\">Code or Value</th>"
+                             "<th scope=\"col\">Value Description</th><th scope=\"col\">Count</th>"
+                             "<th scope=\"col\">Cumulative</th><th scope=\"col\">Skip to Item</th>\n</tr>\n</thead>\n<tbody>\n")
+                cumulative = 0
+                for code, value_description, count in rows:
+                    cumulative += count or 0
+                    count_cells = ("", "") if count is None else (count, cumulative)
+                    parts.append(f"<tr><td scope=\"row\" class=\"values\">{code}</td>"
+                                 f"<td class=\"values\">{html.escape(value_description)}</td>"
+                                 f"<td class=\"values\">{count_cells[0]}</td><td class=\"values\">{count_cells[1]}</td>"
+                                 f"<td class=\"values\"></td></tr>\n")
+                parts.append("</tbody>\n</table>\n")
+            parts.append("</div>\n")
+        parts.append("</body>\n</html>\n")
+        return "".join(parts)
+
+    def variable_list_page(self, data_category):
+        """
+        Render the variablelist page of a data category, in the format of the NHANES website.
+
+        Args:
+        data_category (str): The data category, e.g., 'examination'.
+
+        Returns:
+        str: The HTML of the page, with one row per variable of each data file of the category in each cycle year.
+        """
+        component = data_category.capitalize()
+        parts = [f"<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<meta charset=\"utf-8\">\n"
+                 f"<title>NHANES Variable List - {component} Data</title>\n</head>\n<body>\n"
+                 f"<h1>{component} Variable List</h1>\n<table id=\"GridView1\" class=\"table table-bordered\">\n"
+                 "\t<thead>\n\t\t<tr>\n"
+                 + "".join(f"\t\t\t<th scope=\"col\">{header}</th>\n" for header in
+                           ["Variable Name", "Variable Description", "Data File Name", "Data File Description",
+                            "Begin Year", "EndYear", "Component", "Use Constraints"])
+                 + "\t\t</tr>\n\t</thead><tbody>\n"]
+        for cycle_year in self.cycles:
+            begin_year, end_year = cycle_year.split("-")
+            for base_name in self.data_files:
+                template = DATA_FILES[base_name]
+                if template["data_category"] != data_category:
+                    continue
+                name = self.data_file_name(cycle_year, base_name)
+                for variable, label, _ in self.variables(base_name):
+                    parts.append(f"\t\t<tr>\n\t\t\t<td>{variable}</td><td>{html.escape(label)}</td>"
+                                 f"<td><a href=\"/Nchs/Nhanes/{cycle_year}/{name}.htm\">{name}</a></td>"
+                                 f"<td>{html.escape(template['description'])}</td><td>{begin_year}</td>"
+                                 f"<td>{end_year}</td><td>{component}</td><td>None</td>\n\t\t</tr>\n")
+        parts.append("</tbody>\n</table>\n</body>\n</html>\n")
+        return "".join(parts)
+
+    def _write_data_file(self, path, cycle_year, base_name):
+        """
+        Write a data file chunk by chunk and count the values of its variables for the codebook.
+        """
+        variables = self.variables(base_name)
+        counts = {}
+        fields = [{"name": name, "type": "numeric", "label": label} for name, label, _ in variables]
+        with XportWriter(path, fields, dataset_name=self.data_file_name(cycle_year, base_name)) as writer:
+            for chunk in self.iter_chunks(cycle_year, base_name):
+                writer.write(chunk)
+                for name, _, codes in variables[1:]:
+                    values = chunk[name].to_numpy()
+                    variable_counts = counts.setdefault(name, {})
+                    missing = int(np.isnan(values).sum())
+                    variable_counts["."] = variable_counts.get(".", 0) + missing
+                    if isinstance(codes, dict):
+                        for code, count in zip(*np.unique(values[~np.isnan(values)], return_counts=True)):
+                            variable_counts[int(code)] = variable_counts.get(int(code), 0) + int(count)
+                    else:
+                        variable_counts["range"] = variable_counts.get("range", 0) + len(values) - missing
+        return counts
+
+    def write(self, directory):
+        """
+        Generate the website into a directory: Nchs/Nhanes/<cycle year>/<data file>.XPT and .htm and
+        variablelist/<data category>.html for the data categories of the data files, plus site.json mapping the URL
+        paths to the files (see load_site).
+
+        Args:
+        directory (str): The directory.
+
+        Returns:
+        dict: A dictionary of {url path: file path}, to serve with LocalNHANESServer.
+        """
+        site = {}
+        for cycle_year in self.cycles:
+            cycle_directory = os.path.join(directory, "Nchs", "Nhanes", cycle_year)
+            os.makedirs(cycle_directory, exist_ok=True)
+            for base_name in self.data_files:
+                name = self.data_file_name(cycle_year, base_name)
+                data_path = os.path.join(cycle_directory, f"{name}.XPT")
+                counts = self._write_data_file(data_path, cycle_year, base_name)
+                page_path = os.path.join(cycle_directory, f"{name}.htm")
+                with open(page_path, "w", encoding="utf-8") as page_file:
+                    page_file.write(self.codebook_page(cycle_year, base_name, counts))
+                site[f"/Nchs/Nhanes/{cycle_year}/{name}.XPT"] = data_path
+                site[f"/Nchs/Nhanes/{cycle_year}/{name}.htm"] = page_path
+
+        os.makedirs(os.path.join(directory, "variablelist"), exist_ok=True)
+        for data_category in sorted({DATA_FILES[base_name]["data_category"] for base_name in self.data_files}):
+            page_path = os.path.join(directory, "variablelist", f"{data_category}.html")
+            with open(page_path, "w", encoding="utf-8") as page_file:
+                page_file.write(self.variable_list_page(data_category))
+            site[f"/nchs/nhanes/search/variablelist.aspx?Component={data_category}"] = page_path
+
+        with open(os.path.join(directory, "site.json"), "w") as site_file:
+            json.dump({url_path: os.path.relpath(path, directory) for url_path, path in site.items()}, site_file, indent=2)
+        return site
+
+
+def load_site(directory):
+    """
+    Load the URL paths of a website generated with SyntheticNHANES.write, e.g., in another process.
+
+    Args:
+    directory (str): The directory of the website.
+
+    Returns:
+    dict: A dictionary of {url path: file path}, to serve with LocalNHANESServer.
+    """
+    with open(os.path.join(directory, "site.json"), "r") as site_file:
+        site = json.load(site_file)
+    return {url_path: os.path.join(directory, path) for url_path, path in site.items()}
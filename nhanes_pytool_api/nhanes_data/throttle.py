@@ -0,0 +1,306 @@
+import contextlib
+import http.client
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+# Responses of a server asking its clients to slow down
+THROTTLE_CODES = (429, 503)
+
+# Settings of the hosts that are known to throttle, see configure_host
+DEFAULT_HOST_SETTINGS = {
+    "wwwn.cdc.gov": {"rate": 10, "burst": 10, "initial_concurrency": 4, "max_concurrency": 12},
+}
+
+
+class TokenBucket:
+    """
+    TokenBucket limits the rate of requests to `rate` per second, allowing bursts of up to `burst` requests.
+
+    A server that asks for a pause (e.g., with a Retry-After header) pauses the bucket, so no request is started
+    until the pause is over.
+
+    Args:
+    rate (float): The sustained number of requests per second, or None for no limit.
+    burst (int, optional): The number of requests that can be started at once. Defaults to max(1, rate).
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1, rate or 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Take one token, waiting until one is available and the bucket is not paused.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if self.rate is not None:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self.rate is None:
+                        return
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """
+        Start no request for the given number of seconds.
+        """
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrency:
+    """
+    AdaptiveConcurrency limits the number of requests in flight, adapting the limit with AIMD (additive increase,
+    multiplicative decrease).
+
+    Every request that completes while at least half of the limit is in use adds 1/limit to it, so the limit grows by
+    about one per round trip of requests. A throttled or failed request, or a smoothed response latency above
+    latency_tolerance times the lowest latency seen (the server is queueing), multiplies the limit by `backoff`, at
+    most once per smoothed latency so that one congested round trip is only counted once.
+
+    Args:
+    initial (int, optional): The initial limit. Defaults to 8.
+    minimum (int, optional): The lowest limit. Defaults to 1.
+    maximum (int, optional): The highest limit. Defaults to 32.
+    latency_tolerance (float, optional): The factor over the lowest latency that counts as congestion. Defaults to 3.
+    backoff (float, optional): The factor applied to the limit on congestion. Defaults to 0.5.
+    """
+
+    def __init__(self, initial=8, minimum=1, maximum=32, latency_tolerance=3.0, backoff=0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(min(max(initial, minimum), maximum))
+        self.latency_tolerance = latency_tolerance
+        self.backoff = backoff
+        self.in_flight = 0
+        self.min_latency = None
+        self.latency = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait until fewer requests than the limit are in flight and count one more.
+        """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, latency=None, congested=False):
+        """
+        Count a completed request and adapt the limit.
+
+        Args:
+        latency (float, optional): The response latency in seconds, or None if there is none.
+        congested (bool, optional): Whether the request was throttled or failed. Defaults to False.
+        """
+        with self._condition:
+            # At least half of the limit in use counts as using the limit
+            saturated = 2 * self.in_flight >= self.limit
+            self.in_flight -= 1
+            if latency is not None:
+                self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+                self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+                # An absolute floor keeps the jitter of very fast responses from counting as congestion
+                congested = congested or self.latency > self.latency_tolerance * self.min_latency + 0.01
+            if congested:
+                now = time.monotonic()
+                if now - self._last_decrease >= (self.latency or 0):
+                    self.limit = max(self.minimum, self.limit * self.backoff)
+                    self._last_decrease = now
+            elif saturated:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class HostThrottle:
+    """
+    HostThrottle paces the requests to one host with a token bucket and an adaptive concurrency limit.
+
+    Throttled responses (HTTP 429 and 503) halve the concurrency limit, pause the token bucket for the Retry-After
+    time of the response (or an exponential backoff) and are retried, so callers only see them once the retries are
+    used up.
+
+    Args:
+    rate (float, optional): The sustained number of requests per second. Defaults to None, meaning no rate limit.
+    burst (int, optional): The number of requests that can be started at once. Defaults to max(1, rate).
+    initial_concurrency (int, optional): The initial number of requests in flight. Defaults to 8.
+    min_concurrency (int, optional): The lowest concurrency limit. Defaults to 1.
+    max_concurrency (int, optional): The highest concurrency limit. Defaults to 32.
+    latency_tolerance (float, optional): The factor over the lowest latency that counts as congestion. Defaults to 3.
+    retries (int, optional): The number of times a throttled request is retried. Defaults to 5.
+    backoff (float, optional): The pause in seconds after the first throttled response without Retry-After, doubled on every further retry. Defaults to 0.5.
+    """
+
+    def __init__(self, rate=None, burst=None, initial_concurrency=8, min_concurrency=1, max_concurrency=32,
+                 latency_tolerance=3.0, retries=5, backoff=0.5):
+        self.bucket = TokenBucket(rate, burst)
+        self.concurrency = AdaptiveConcurrency(initial_concurrency, min_concurrency, max_concurrency, latency_tolerance)
+        self.retries = retries
+        self.backoff = backoff
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _count(self, throttled=False, error=False):
+        with self._lock:
+            self.requests += 1
+            self.throttled += throttled
+            self.errors += error
+
+    def _retry_after(self, error, attempt):
+        retry_after = error.headers.get("Retry-After") if error.headers is not None else None
+        try:
+            return max(0.0, float(retry_after))
+        except (TypeError, ValueError):
+            return self.backoff * 2 ** attempt
+
+    @contextlib.contextmanager
+    def open(self, request, timeout=60):
+        """
+        Open a URL within the limits of the host, as urllib.request.urlopen does.
+
+        The concurrency slot is held until the response is closed, so streamed downloads count as in flight.
+
+        Args:
+        request (str or urllib.request.Request): The URL or request.
+        timeout (float, optional): The socket timeout in seconds. Defaults to 60.
+
+        Yields:
+        http.client.HTTPResponse: The response.
+
+        Raises:
+        urllib.error.HTTPError: If the server rejects the request, or still throttles it after the retries.
+        urllib.error.URLError: If the server cannot be reached.
+        """
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self.concurrency.acquire()
+            with self._lock:
+                self.max_in_flight = max(self.max_in_flight, self.concurrency.in_flight)
+            start = time.monotonic()
+            try:
+                response = urllib.request.urlopen(request, timeout=timeout)
+            except urllib.error.HTTPError as e:
+                throttled = e.code in THROTTLE_CODES
+                self.concurrency.release(congested=throttled or e.code >= 500)
+                self._count(throttled=throttled, error=e.code >= 500 and not throttled)
+                if throttled and attempt < self.retries:
+                    self.bucket.pause(self._retry_after(e, attempt))
+                    e.close()
+                    attempt += 1
+                    continue
+                raise
+            except (OSError, http.client.HTTPException):
+                self.concurrency.release(congested=True)
+                self._count(error=True)
+                raise
+            break
+
+        latency = time.monotonic() - start
+        failed = False
+        try:
+            with response:
+                yield response
+        except (OSError, http.client.HTTPException):
+            failed = True  # e.g., the connection dropped while the body was read
+            raise
+        finally:
+            self.concurrency.release(latency=latency, congested=failed)
+            self._count(error=failed)
+
+    def stats(self):
+        """
+        Returns:
+        dict: {'requests', 'throttled', 'errors', 'concurrency_limit', 'max_in_flight', 'latency'} where 'latency' is the smoothed response latency in seconds.
+        """
+        with self._lock:
+            return {"requests": self.requests, "throttled": self.throttled, "errors": self.errors,
+                    "concurrency_limit": self.concurrency.limit, "max_in_flight": self.max_in_flight,
+                    "latency": self.concurrency.latency}
+
+
+_settings = dict(DEFAULT_HOST_SETTINGS)
+_throttles = {}
+_registry_lock = threading.Lock()
+
+
+def _host(url):
+    if isinstance(url, urllib.request.Request):
+        url = url.full_url
+    return urllib.parse.urlsplit(url).netloc
+
+
+def configure_host(host, **settings):
+    """
+    Set the rate limit and concurrency settings of a host, for all NHANESDataAPI and NHANESDocAPI instances of the
+    process. Settings that are not given keep their current values (initially DEFAULT_HOST_SETTINGS), e.g., setting
+    max_concurrency alone keeps the rate limit of wwwn.cdc.gov. Requests already in flight keep the previous settings.
+
+    Args:
+    host (str): The host name, e.g., 'wwwn.cdc.gov', or 'host:port'.
+    **settings: The arguments of HostThrottle, e.g., rate=5, max_concurrency=8.
+    """
+    with _registry_lock:
+        merged = dict(_settings.get(host, DEFAULT_HOST_SETTINGS.get(host, {})), **settings)
+    HostThrottle(**merged)  # Validate the settings
+    with _registry_lock:
+        _settings[host] = merged
+        _throttles.pop(host, None)
+
+
+def host_throttle(url):
+    """
+    Get the throttle of the host of a URL, created from its settings on first use.
+
+    Args:
+    url (str or urllib.request.Request): The URL.
+
+    Returns:
+    HostThrottle: The throttle shared by all requests to the host.
+    """
+    host = _host(url)
+    with _registry_lock:
+        throttle = _throttles.get(host)
+        if throttle is None:
+            settings = _settings.get(host, _settings.get(host.rsplit(":", 1)[0], {}))
+            throttle = _throttles[host] = HostThrottle(**settings)
+        return throttle
+
+
+def urlopen(request, timeout=60):
+    """
+    Open a URL within the rate and concurrency limits of its host, see HostThrottle.open.
+    """
+    return host_throttle(request).open(request, timeout)
+
+
+def throttle_stats():
+    """
+    Get the request statistics of every host contacted by the process.
+
+    Returns:
+    dict: A dictionary of {host: HostThrottle.stats()}.
+    """
+    with _registry_lock:
+        throttles = dict(_throttles)
+    return {host: throttle.stats() for host, throttle in throttles.items()}
@@ -0,0 +1,180 @@
+import codecs
+import html
+import re
+
+import numpy as np
+import pandas as pd
+
+from .throttle import urlopen
+
+_TABLE_START = re.compile(r"<table\b", re.I)
+_TABLE_END = re.compile(r"</table\s*>", re.I)
+_ROW_START = re.compile(r"<tr\b", re.I)
+_ROW = re.compile(r"<tr\b[^>]*>(.*?)</tr\s*>", re.I | re.S)
+_COMPLETE_ROWS = re.compile(r".*</tr\s*>", re.I | re.S)
+_CELL = re.compile(r"<t[dh]\b[^>]*>([^<]*(?:<(?!/t[dh]\b)[^<]*)*)</t[dh]\s*>", re.I)
+_TAG = re.compile(r"<[^>]*>")
+_WHITESPACE = re.compile(r"[\r\n]+|\s{2,}")
+# Texts without any of these cannot contain whitespace to collapse (short of unusual Unicode spaces)
+_WHITESPACE_HINTS = ["\n", "\r", "  ", "\t", "\xa0"]
+
+
+def _cell_texts(cells):
+    """
+    Get the texts of table cells as pd.read_html does: tags removed, entities decoded and whitespace collapsed.
+
+    The cells are cleaned up together, joined with a separator, so each step runs once instead of once per cell.
+    """
+    raw = "\x00".join(cells)
+    if "<" in raw:
+        raw = _TAG.sub("", raw)
+    if "&" in raw:
+        raw = html.unescape(raw)
+    if any(whitespace in raw for whitespace in _WHITESPACE_HINTS):
+        raw = _WHITESPACE.sub(" ", raw)
+    return [text.strip() or np.nan for text in raw.split("\x00")]
+
+
+class _TableScanner:
+    """
+    Incremental scanner of the first HTML table of a page, keeping only some of its columns.
+
+    Rows are extracted with regular expressions as soon as they are complete, so the page is never held in memory as
+    a whole and no DOM is built. Only the cells of the kept columns are cleaned up, in one batch per column and piece
+    of the page. The first row is the header.
+    """
+
+    def __init__(self, columns):
+        self.columns = columns
+        self.header = None
+        self.indexes = None
+        self.values = None
+        self.started = False
+        self.finished = False
+        self._buffer = ""
+
+    def feed(self, text):
+        if self.finished:
+            return
+        buffer = self._buffer + text
+        if not self.started:
+            match = _TABLE_START.search(buffer)
+            if match is None:
+                self._buffer = buffer[-16:]
+                return
+            self.started = True
+            buffer = buffer[match.end():]
+
+        # Rows after the end of the table belong to another table
+        end = _TABLE_END.search(buffer)
+        table_end = len(buffer) if end is None else end.start()
+        position = 0
+        if self.header is None:
+            row = _ROW.search(buffer, 0, table_end)
+            if row is None:
+                self.finished = end is not None
+                self._buffer = buffer
+                return
+            self._set_header(_cell_texts(_CELL.findall(row.group(1))))
+            position = row.end()
+
+        # Only complete rows are parsed; the rest is kept for the next piece
+        rows = _COMPLETE_ROWS.match(buffer, position, table_end)
+        if rows is not None:
+            self._add_rows(rows.group())
+            position = rows.end()
+
+        if end is not None:
+            self.finished = True
+            self._buffer = ""
+        else:
+            self._buffer = buffer[position:]
+
+    def _add_rows(self, rows):
+        """
+        Add the kept cells of some complete rows.
+        """
+        width = len(self.header)
+        cells = _CELL.findall(rows)
+        row_count = len(_ROW_START.findall(rows))
+        if cells and len(cells) == row_count * width:
+            # Every row has a cell per column: the cells of a column are every width-th cell
+            for column, index in self.indexes:
+                self.values[column].extend(_cell_texts(cells[index::width]))
+            return
+
+        kept = []
+        for row in _ROW.finditer(rows):
+            cells = _CELL.findall(row.group(1))
+            kept.extend(cells[index] if index < len(cells) else "" for _, index in self.indexes)
+        if kept:
+            texts = _cell_texts(kept)
+            for offset, (column, _) in enumerate(self.indexes):
+                self.values[column].extend(texts[offset::len(self.indexes)])
+
+    def _set_header(self, header):
+        self.header = header
+        self.indexes = [(column, header.index(column)) for column in self.columns if column in header]
+        self.values = {column: [] for column, _ in self.indexes}
+
+    def close(self):
+        """
+        Returns:
+        pd.DataFrame: The kept columns of the table.
+
+        Raises:
+        ValueError: If the page contains no table.
+        """
+        if self.header is None:
+            raise ValueError("No tables found")
+        return pd.DataFrame(self.values, columns=[column for column, _ in self.indexes])
+
+
+def parse_table(chunks, columns):
+    """
+    Parse some columns of the first table of an HTML page, streaming over the page.
+
+    Args:
+    chunks (iterable of str): The page, in pieces of any size.
+    columns (list of str): The column headers to keep. Columns that are not in the table are left out.
+
+    Returns:
+    pd.DataFrame: The kept columns of the table, with the cell texts as strings (NaN for empty cells).
+
+    Raises:
+    ValueError: If the page contains no table.
+    """
+    scanner = _TableScanner(columns)
+    for chunk in chunks:
+        scanner.feed(chunk)
+        if scanner.finished:
+            break
+    return scanner.close()
+
+
+def fetch_table(url, columns, timeout=60, chunk_size=256 * 1024):
+    """
+    Download an HTML page and parse some columns of its first table while it is being downloaded.
+
+    Args:
+    url (str): The URL of the page.
+    columns (list of str): The column headers to keep.
+    timeout (float, optional): The timeout of the connection in seconds. Defaults to 60.
+    chunk_size (int, optional): The number of bytes read at a time. Defaults to 256 KiB.
+
+    Returns:
+    pd.DataFrame: The kept columns of the table.
+
+    Raises:
+    ValueError: If the page contains no table.
+    urllib.error.URLError: If the page cannot be downloaded.
+    """
+    with urlopen(url, timeout=timeout) as response:
+        decoder = codecs.getincrementaldecoder(response.headers.get_content_charset() or "utf-8")(errors="replace")
+
+        def chunks():
+            for data in iter(lambda: response.read(chunk_size), b""):
+                yield decoder.decode(data)
+            yield decoder.decode(b"", final=True)
+
+        return parse_table(chunks(), columns)
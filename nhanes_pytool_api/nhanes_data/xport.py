@@ -0,0 +1,581 @@
+import contextlib
+import os
+import struct
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from .throttle import urlopen
+
+
+_LIBRARY_HEADER = b"HEADER RECORD*******LIBRARY HEADER RECORD!!!!!!!000000000000000000000000000000  "
+_MEMBER_HEADER = b"HEADER RECORD*******MEMBER  HEADER RECORD!!!!!!!000000000000000001600000000"
+_DESCRIPTOR_HEADER = b"HEADER RECORD*******DSCRPTR HEADER RECORD!!!!!!!000000000000000000000000000000  "
+_NAMESTR_HEADER = b"HEADER RECORD*******NAMESTR HEADER RECORD!!!!!!!"
+_OBS_HEADER = b"HEADER RECORD*******OBS     HEADER RECORD!!!!!!!000000000000000000000000000000  "
+_NAMESTR_FORMAT = ">hhhh8s40s8shhh2s8shhl52s"
+
+
+def parse_header(data, file_size=None):
+    """
+    Parse the header records of a SAS XPORT (version 5) file.
+
+    Args:
+    data (bytes): The beginning of the file, at least up to the end of the observation header record.
+    file_size (int, optional): The total size of the file, used to compute the number of observations.
+
+    Returns:
+    dict: The header with the keys 'dataset' (str), 'fields' (list of dicts with 'name', 'type' ('numeric' or 'char'),
+    'length', 'offset' and 'label'), 'record_length', 'record_start' and, if file_size is given, 'nobs'.
+    None if data does not contain the complete header yet.
+
+    Raises:
+    ValueError: If the data is not a SAS XPORT file.
+    """
+    if len(data) < 80 * 8:
+        if not _LIBRARY_HEADER.startswith(data[:80]):
+            raise ValueError("Header record is not an XPORT file.")
+        return None
+    if data[:80] != _LIBRARY_HEADER:
+        raise ValueError("Header record is not an XPORT file.")
+    if not (data[240:320].startswith(_MEMBER_HEADER) and data[320:400] == _DESCRIPTOR_HEADER):
+        raise ValueError("Member header not found")
+
+    namestr_length = int(data[240:320][-5:-2])
+    dataset = data[408:416].decode("latin-1").strip()
+    namestr_header = data[560:640]
+    if not namestr_header.startswith(_NAMESTR_HEADER):
+        raise ValueError("Namestr header not found")
+    field_count = int(namestr_header[54:58])
+
+    namestr_start = 640
+    namestr_size = namestr_length * field_count
+    namestr_size += -namestr_size % 80
+    record_start = namestr_start + namestr_size + 80
+    if len(data) < record_start:
+        return None
+    if data[record_start - 80:record_start] != _OBS_HEADER:
+        raise ValueError("Observation header not found.")
+
+    fields = []
+    offset = 0
+    for i in range(field_count):
+        raw = data[namestr_start + i * namestr_length:namestr_start + (i + 1) * namestr_length].ljust(140, b"\0")
+        ntype, _, length, _, name, label = struct.unpack(_NAMESTR_FORMAT, raw)[:6]
+        field_type = "numeric" if ntype == 1 else "char"
+        if field_type == "numeric" and not 2 <= length <= 8:
+            raise TypeError(f"Floating field width {length} is not between 2 and 8.")
+        fields.append({
+            "name": name.decode("latin-1").strip(),
+            "type": field_type,
+            "length": length,
+            "offset": offset,
+            "label": label.decode("latin-1").strip(),
+        })
+        offset += length
+
+    header = {"dataset": dataset, "fields": fields, "record_length": offset, "record_start": record_start}
+    if file_size is not None:
+        header["nobs"] = _record_count(header, file_size, None)
+    return header
+
+
+def _record_count(header, file_size, last_card):
+    """
+    Compute the number of observations from the file size. Records are padded with blanks to a multiple of 80 bytes;
+    when records are shorter than 80 bytes, blank 8-byte words in the last card are counted as padding (the same rule
+    pandas.read_sas uses).
+    """
+    data_length = file_size - header["record_start"]
+    record_length = header["record_length"]
+    if record_length == 0:
+        return 0
+    if record_length > 80 or last_card is None:
+        return data_length // record_length
+    tail_pad = 8 * int(np.count_nonzero(np.frombuffer(last_card, dtype=np.uint64) == 2314885530818453536))
+    return (data_length - tail_pad) // record_length
+
+
+def _open(source):
+    """
+    Open a path for reading, or wrap an already open binary file object (which is left open).
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return open(source, "rb")
+    return contextlib.nullcontext(source)
+
+
+def _read_exactly(xport_file, size):
+    """
+    Read size bytes, or fewer at the end of the file. Decompressing readers may return short reads.
+    """
+    chunks = []
+    while size > 0:
+        chunk = xport_file.read(size)
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_header(source, file_size=None):
+    """
+    Read the header of a local SAS XPORT file, including the number of observations.
+
+    The file is only read forwards, so source can also be a decompressing reader of a compressed data file.
+
+    Args:
+    source (str or file object): The path of the XPT file, or a binary file object positioned at its start.
+    file_size (int, optional): The size of the (uncompressed) file. Required if source is a file object.
+
+    Returns:
+    dict: The header, see parse_header, with 'nobs' and 'file_size'.
+
+    Raises:
+    ValueError: If the file is not a SAS XPORT file.
+    """
+    if file_size is None:
+        file_size = os.path.getsize(source)
+    with _open(source) as xport_file:
+        data = b""
+        size = 8192
+        while True:
+            data += _read_exactly(xport_file, size - len(data))
+            header = parse_header(data)
+            if header is not None or len(data) >= file_size or len(data) < size:
+                break
+            size *= 4
+        if header is None:
+            raise ValueError("Incomplete XPORT header.")
+        last_card = None
+        if header["record_length"] <= 80 and file_size - header["record_start"] >= 80:
+            xport_file.seek(file_size - 80)
+            last_card = _read_exactly(xport_file, 80)
+    header["nobs"] = _record_count(header, file_size, last_card)
+    header["file_size"] = file_size
+    return header
+
+
+def _read_range(url, start, end, timeout):
+    """
+    Read bytes start to end (inclusive) of a remote file, or its last -start bytes if start is negative.
+
+    Returns the bytes and the total size of the file, or None if the server reports it neither in a Content-Range nor
+    in a Content-Length header. If the server ignores the range, only the requested number of bytes of the full
+    response is read before the connection is closed; the last bytes of the file would take the whole response, so
+    None is returned instead of them.
+    """
+    request = urllib.request.Request(url)
+    request.add_header("Range", f"bytes={start}-{end}" if start >= 0 else f"bytes={start}")
+    with urlopen(request, timeout=timeout) as response:
+        content_range = response.headers.get("Content-Range")
+        if response.status == 206 and content_range and "/" in content_range:
+            file_size = int(content_range.rsplit("/", 1)[1])
+            return response.read(), file_size
+        content_length = response.headers.get("Content-Length")
+        file_size = int(content_length) if content_length is not None else None
+        if start < 0:
+            return None, file_size
+        return response.read(end - start + 1), file_size
+
+
+def fetch_header(url, timeout=60, initial_bytes=8192):
+    """
+    Read the header of a remote SAS XPORT file with HTTP Range requests, without downloading the data records.
+
+    The first initial_bytes bytes are requested, four times more at a time until the header records are complete.
+    The number of observations is computed from the file size reported by the server; for records of 80 bytes or
+    less, the last 80 bytes of the file are requested as well to account for padding.
+
+    Args:
+    url (str): The URL of the XPT file.
+    timeout (float, optional): The socket timeout in seconds. Defaults to 60.
+    initial_bytes (int, optional): The number of bytes requested first. Defaults to 8192.
+
+    Returns:
+    dict: The header, see read_header, or None if the server does not report the size of the file, or ignores the
+    Range request of the last 80 bytes. The file then has to be downloaded to read its header.
+
+    Raises:
+    ValueError: If the file is not a SAS XPORT file.
+    IOError: If the request fails.
+    """
+    size = initial_bytes
+    while True:
+        data, file_size = _read_range(url, 0, size - 1, timeout)
+        if file_size is None:
+            return None
+        header = parse_header(data)
+        if header is not None:
+            break
+        if size >= file_size:
+            raise ValueError("Incomplete XPORT header.")
+        size *= 4
+
+    last_card = None
+    if header["record_length"] <= 80 and file_size - header["record_start"] >= 80:
+        last_card, _ = _read_range(url, -80, None, timeout)
+        if last_card is None:
+            return None
+    header["nobs"] = _record_count(header, file_size, last_card)
+    header["file_size"] = file_size
+    return header
+
+
+def ibm_to_ieee(words):
+    """
+    Convert big-endian IBM 8-byte floats (given as unsigned 64-bit integers) to float64.
+
+    SAS missing values ('.', '_' and '.A' to '.Z') become NaN and IBM zero becomes 0.0.
+
+    Args:
+    words (np.ndarray): The IBM floats as an array of dtype '>u8'.
+
+    Returns:
+    np.ndarray: The float64 values.
+    """
+    words = words.astype(np.uint64)
+    fraction = words & np.uint64(0x00FFFFFFFFFFFFFF)
+    exponent = ((words >> np.uint64(56)) & np.uint64(0x7F)).astype(np.int32)
+
+    # value = fraction / 2**56 * 16**(exponent - 64); fractions from IEEE doubles fit in 53 bits, so this is exact
+    values = np.ldexp(fraction.astype(np.float64), exponent * 4 - 312)
+    np.negative(values, out=values, where=(words >> np.uint64(63)).astype(bool))
+
+    zero_fraction = np.flatnonzero(fraction == 0)
+    if len(zero_fraction):
+        first_byte = words[zero_fraction] >> np.uint64(56)
+        missing = (first_byte == 0x2E) | (first_byte == 0x5F) | ((first_byte >= 0x41) & (first_byte <= 0x5A))
+        values[zero_fraction[missing]] = np.nan
+    return values
+
+
+def _decode_field(block, field):
+    """
+    Decode one field of a block of records (an (n, record_length) uint8 array).
+    """
+    raw = block[:, field["offset"]:field["offset"] + field["length"]]
+    if field["type"] == "numeric":
+        padded = np.zeros((len(block), 8), dtype=np.uint8)
+        padded[:, :field["length"]] = raw
+        return ibm_to_ieee(padded.view(">u8").ravel())
+    strings = np.ascontiguousarray(raw).view(f"S{field['length']}").ravel()
+    stripped = np.char.rstrip(strings)
+    values = stripped.astype(object)
+    # Like pd.read_sas, trailing NULs are dropped and then trailing whitespace. The S dtype also drops the NULs the
+    # whitespace stripping uncovers (b'G\x00 ' becomes b'G', pd.read_sas keeps b'G\x00'), so values followed by a NUL
+    # and then by more than NUL padding are stripped again as bytes
+    lengths = np.char.str_len(stripped)
+    rows = np.flatnonzero(lengths < field["length"])
+    rows = rows[raw[rows, lengths[rows]] == 0]
+    after = np.arange(field["length"]) > lengths[rows, None]
+    for row in rows[((raw[rows] != 0) & after).any(axis=1)]:
+        values[row] = bytes(strings[row]).rstrip()
+    return values
+
+
+def _iter_blocks(xport_file, header, batch_rows):
+    """
+    Read the records of an open XPORT file as (n, record_length) uint8 arrays of at most batch_rows rows.
+    """
+    record_length = header["record_length"]
+    xport_file.seek(header["record_start"])
+    done = 0
+    while done < header["nobs"]:
+        rows = min(batch_rows, header["nobs"] - done)
+        raw = _read_exactly(xport_file, rows * record_length)
+        yield np.frombuffer(raw, dtype=np.uint8, count=rows * record_length).reshape(rows, record_length)
+        done += rows
+
+
+def decode_into(source, header, buffers, row_offset, batch_rows=65536):
+    """
+    Decode the records of a local XPORT file straight into preallocated column buffers.
+
+    Only the fields that have a buffer are decoded. Records are read in batches of batch_rows rows, so the temporary
+    memory used is bounded by the batch size regardless of the file size.
+
+    Args:
+    source (str or file object): The path of the XPT file, or a binary file object positioned before its records.
+    header (dict): The header of the file, see read_header.
+    buffers (dict): A dictionary of {column name: np.ndarray} with room for the file's rows starting at row_offset.
+    row_offset (int): The buffer row where the first record of the file goes.
+    batch_rows (int, optional): The number of records decoded at a time. Defaults to 65536.
+
+    Returns:
+    int: The number of records decoded.
+    """
+    fields = [field for field in header["fields"] if field["name"] in buffers]
+    with _open(source) as xport_file:
+        start = row_offset
+        for block in _iter_blocks(xport_file, header, batch_rows):
+            for field in fields:
+                buffers[field["name"]][start:start + len(block)] = _decode_field(block, field)
+            start += len(block)
+    return header["nobs"]
+
+
+def decode_rows_into(source, header, rows, buffers, row_offset):
+    """
+    Decode only some records of a local XPORT file into preallocated column buffers, seeking to their offsets.
+
+    Records have a fixed width, so record i starts at record_start + i * record_length. Runs of consecutive records
+    are read with one read each, and records that are not selected are neither read nor decoded.
+
+    Args:
+    source (str or file object): The path of the XPT file, or a seekable binary file object.
+    header (dict): The header of the file, see read_header.
+    rows (array-like of int): The record numbers (0-based) to decode, in increasing order.
+    buffers (dict): A dictionary of {column name: np.ndarray} with room for the selected records starting at row_offset.
+    row_offset (int): The buffer row where the first selected record goes.
+
+    Returns:
+    int: The number of records decoded.
+    """
+    rows = np.asarray(rows, dtype=np.int64)
+    record_length = header["record_length"]
+    fields = [field for field in header["fields"] if field["name"] in buffers]
+    runs = np.split(rows, np.flatnonzero(np.diff(rows) != 1) + 1) if len(rows) else []
+    blocks = []
+    with _open(source) as xport_file:
+        for run in runs:
+            xport_file.seek(header["record_start"] + int(run[0]) * record_length)
+            raw = _read_exactly(xport_file, len(run) * record_length)
+            blocks.append(np.frombuffer(raw, dtype=np.uint8, count=len(run) * record_length).reshape(len(run), record_length))
+    if blocks:
+        block = np.concatenate(blocks)
+        for field in fields:
+            buffers[field["name"]][row_offset:row_offset + len(block)] = _decode_field(block, field)
+    return len(rows)
+
+
+def iter_frames(source, header, chunk_rows, columns=None):
+    """
+    Decode the records of a local XPORT file as DataFrames of at most chunk_rows rows.
+
+    Args:
+    source (str or file object): The path of the XPT file, or a binary file object positioned before its records.
+    header (dict): The header of the file, see read_header.
+    chunk_rows (int): The maximum number of rows per DataFrame.
+    columns (list of str, optional): Only decode these columns, in this order; columns not in the file are skipped. Defaults to None, meaning all columns.
+
+    Yields:
+    pd.DataFrame: The decoded chunks. Character values are bytes, as with pd.read_sas.
+    """
+    by_name = {field["name"]: field for field in header["fields"]}
+    fields = header["fields"] if columns is None else [by_name[name] for name in columns if name in by_name]
+    with _open(source) as xport_file:
+        for block in _iter_blocks(xport_file, header, chunk_rows):
+            yield pd.DataFrame({field["name"]: _decode_field(block, field) for field in fields}, copy=False)
+
+
+def union_schema(headers, columns=None):
+    """
+    Compute the union schema of several XPORT files: the column order and one unified kind per column.
+
+    Columns are ordered by first appearance, as pd.concat would order them. A column that is numeric in every file
+    is 'numeric'; a column that is character data in any file is 'char'.
+
+    Args:
+    headers (list of dict): The headers of the files.
+    columns (list of str, optional): Only include these columns, in this order. Defaults to None, meaning all columns.
+
+    Returns:
+    list of tuple: (column name, 'numeric' or 'char') pairs.
+    """
+    kinds = {}
+    for header in headers:
+        for field in header["fields"]:
+            if kinds.get(field["name"]) != "char":
+                kinds[field["name"]] = field["type"]
+    names = list(kinds) if columns is None else [name for name in columns if name in kinds]
+    return [(name, kinds[name]) for name in names]
+
+
+def allocate_buffers(schema, rows):
+    """
+    Allocate column buffers for a schema, filled with missing values.
+
+    Args:
+    schema (list of tuple): (column name, 'numeric' or 'char') pairs, see union_schema.
+    rows (int): The number of rows.
+
+    Returns:
+    dict: A dictionary of {column name: np.ndarray}, float64 for numeric columns and object for character columns.
+    """
+    buffers = {}
+    for name, kind in schema:
+        buffers[name] = np.full(rows, np.nan, dtype=np.float64 if kind == "numeric" else object)
+    return buffers
+
+
+def ieee_to_ibm(values):
+    """
+    Convert float64 values to big-endian IBM 8-byte floats, the inverse of ibm_to_ieee. NaN becomes the SAS missing
+    value '.'. IBM floats have a smaller exponent range than float64: magnitudes below 16**-65 (about 5.4e-79)
+    become 0.
+
+    Args:
+    values (array-like): The values.
+
+    Returns:
+    np.ndarray: The IBM floats as an array of dtype '>u8'.
+
+    Raises:
+    ValueError: If a magnitude is above the largest IBM float (about 7.2e75) or infinite.
+    """
+    values = np.asarray(values, dtype="f8")
+    out = np.zeros(len(values), dtype=">u8")
+    missing = np.isnan(values)
+    if np.isinf(values).any():
+        raise ValueError("Infinite values cannot be stored as IBM floats.")
+    nonzero = ~missing & (values != 0)
+    mantissa, exponent = np.frexp(np.abs(values[nonzero]))
+    exponent16 = -(-exponent // 4)
+    if len(exponent16) and exponent16.max() > 63:
+        raise ValueError(f"{np.abs(values[nonzero]).max()} is out of the range of IBM floats (about 7.2e75).")
+    underflow = exponent16 < -64
+    if underflow.any():
+        nonzero[np.flatnonzero(nonzero)[underflow]] = False
+        mantissa, exponent, exponent16 = mantissa[~underflow], exponent[~underflow], exponent16[~underflow]
+    fraction = np.ldexp(mantissa, 56 - (4 * exponent16 - exponent)).astype("u8")
+    sign = (values[nonzero] < 0).astype("u8") << np.uint64(63)
+    out[nonzero] = sign | ((exponent16 + 64).astype("u8") << np.uint64(56)) | fraction
+    out[missing] = np.uint64(0x2E) << np.uint64(56)
+    return out
+
+
+def _encode_strings(values, length):
+    """
+    Encode character values as an (n, length) uint8 array, blank-padded and truncated to length bytes.
+    """
+    encoded = b"".join(
+        (b"" if pd.isna(value) else value if isinstance(value, bytes) else str(value).encode("latin-1"))[:length].ljust(length)
+        for value in values)
+    return np.frombuffer(encoded, dtype=np.uint8).reshape(-1, length)
+
+
+class XportWriter:
+    """
+    XportWriter writes a SAS XPORT (version 5) file incrementally, so that files larger than memory can be written.
+
+    The header is written when the writer is created, each write() appends the records of a DataFrame and close()
+    pads the records to a multiple of 80 bytes. It can be used as a context manager.
+
+    Args:
+    destination (str or file object): The path of the file, or a binary file object (which is left open).
+    fields (list of dict): The variables, in order, with the keys 'name', 'type' ('numeric' or 'char'), 'length'
+    (required for 'char'; numeric variables are 8 bytes) and optionally 'label', as in the header of read_header.
+    dataset_name (str, optional): The SAS dataset name. Defaults to 'DATA'.
+
+    Raises:
+    ValueError: If a variable name is longer than 8 characters or a 'char' variable has no length.
+    """
+
+    created = "01JAN20:00:00:00"
+
+    def __init__(self, destination, fields, dataset_name="DATA"):
+        self.fields = []
+        offset = 0
+        for field in fields:
+            if len(field["name"]) > 8:
+                raise ValueError(f"Variable name {field['name']!r} is longer than 8 characters.")
+            length = 8 if field["type"] == "numeric" else field.get("length")
+            if not length:
+                raise ValueError(f"Character variable {field['name']!r} needs a length.")
+            self.fields.append({"name": field["name"], "type": field["type"], "length": length, "offset": offset,
+                                "label": field.get("label") or field["name"]})
+            offset += length
+        self.record_length = offset
+        self.rows = 0
+        self._written = 0
+        self._owned = isinstance(destination, (str, os.PathLike))
+        self._file = open(destination, "wb") if self._owned else destination
+        self._write(self._header(dataset_name))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _write(self, data):
+        self._file.write(data)
+        self._written += len(data)
+
+    def _header(self, dataset_name):
+        created = self.created
+        header = (
+            _LIBRARY_HEADER.decode("ascii")
+            + "SAS     SAS     SASLIB  9.4     X64_7PRO" + " " * 24 + created
+            + created + " " * 64
+            + _MEMBER_HEADER.decode("ascii") + "140  "
+            + _DESCRIPTOR_HEADER.decode("ascii")
+            + "SAS     " + dataset_name.ljust(8)[:8] + "SASDATA 9.4     X64_7PRO" + " " * 24 + created
+            + created + " " * 16 + dataset_name.ljust(40)[:40] + " " * 8
+            + _NAMESTR_HEADER.decode("ascii") + f"000000{len(self.fields):04d}00000000000000000000  "
+        ).encode("ascii")
+        namestrs = b"".join(
+            struct.pack(_NAMESTR_FORMAT, 1 if field["type"] == "numeric" else 2, 0, field["length"], number,
+                        field["name"].ljust(8).encode("latin-1"), field["label"][:40].ljust(40).encode("latin-1"),
+                        b" " * 8, 0, 0, 0, b"  ", b" " * 8, 0, 0, field["offset"], b"\0" * 52)
+            for number, field in enumerate(self.fields, start=1))
+        namestrs = namestrs.ljust(-(-len(namestrs) // 80) * 80, b" ")
+        return header + namestrs + _OBS_HEADER
+
+    def write(self, frame):
+        """
+        Append the rows of a DataFrame. Missing numeric values are written as '.' and missing characters as blanks.
+
+        Args:
+        frame (pd.DataFrame): The rows, with a column for every variable (other columns are ignored).
+        """
+        block = np.empty((len(frame), self.record_length), dtype=np.uint8)
+        for field in self.fields:
+            values = frame[field["name"]]
+            if field["type"] == "numeric":
+                raw = ieee_to_ibm(values.to_numpy(dtype="f8", na_value=np.nan)).view(np.uint8).reshape(-1, 8)
+            else:
+                raw = _encode_strings(values, field["length"])
+            block[:, field["offset"]:field["offset"] + field["length"]] = raw
+        self._write(block.tobytes())
+        self.rows += len(frame)
+
+    def close(self):
+        """
+        Pad the records to a multiple of 80 bytes and close the file if the writer opened it.
+        """
+        if self._file is None:
+            return
+        self._write(b" " * (-self._written % 80))
+        if self._owned:
+            self._file.close()
+        self._file = None
+
+
+def write_xport(frame, destination, dataset_name="DATA", labels=None):
+    """
+    Write a DataFrame as a SAS XPORT (version 5) file. Numeric columns become 8-byte numeric variables and all other
+    columns become character variables as long as their longest value.
+
+    Args:
+    frame (pd.DataFrame): The data to write.
+    destination (str or file object): The path of the file, or a binary file object.
+    dataset_name (str, optional): The SAS dataset name. Defaults to 'DATA'.
+    labels (dict, optional): A dictionary of {column name: SAS label}. Defaults to None, meaning the column names.
+    """
+    fields = []
+    for column in frame.columns:
+        series = frame[column]
+        field = {"name": str(column), "label": (labels or {}).get(column)}
+        if pd.api.types.is_numeric_dtype(series):
+            field.update(type="numeric", length=8)
+        else:
+            lengths = [len(value if isinstance(value, bytes) else str(value).encode("latin-1"))
+                       for value in series if not pd.isna(value)]
+            field.update(type="char", length=max([1] + lengths))
+        fields.append(field)
+    with XportWriter(destination, fields, dataset_name) as writer:
+        writer.write(frame)
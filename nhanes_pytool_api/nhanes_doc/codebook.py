@@ -0,0 +1,228 @@
+import html
+import re
+
+import numpy as np
+import pandas as pd
+
+try:
+    from ..nhanes_data.variable_list import parse_table
+except ImportError:  # Installed, nhanes_data and nhanes_doc are top-level packages
+    from nhanes_data.variable_list import parse_table
+
+_VARIABLE_TITLE = re.compile(r"<h3\b[^>]*\bid=\"([^\"]+)\"[^>]*>", re.I)
+_DEFINITION = re.compile(r"<dt\b[^>]*>(.*?)</dt>\s*<dd\b[^>]*>(.*?)</dd>", re.I | re.S)
+_TAG = re.compile(r"<[^>]*>")
+_RANGE = re.compile(r"^\s*(-?[\d.]+)\s+to\s+(-?[\d.]+)\s*$", re.I)
+
+# Value descriptions of the codes used for refused, don't know and otherwise missing answers
+MISSING_DESCRIPTIONS = ("refused", "don't know", "don’t know", "dont know", "missing")
+
+VALUE_COLUMNS = ["Code or Value", "Value Description", "Count", "Cumulative", "Skip to Item"]
+
+
+def _text(raw):
+    return " ".join(html.unescape(_TAG.sub("", raw)).split())
+
+
+def _number(text):
+    try:
+        value = float(text)
+    except (TypeError, ValueError):
+        return None
+    return int(value) if value.is_integer() else value
+
+
+def is_missing_description(description):
+    """
+    Check whether a value description marks a missing-value code, e.g., 'Refused' or "Don't know".
+
+    Args:
+    description (str): The value description.
+
+    Returns:
+    bool: True if the code is a missing-value code.
+    """
+    return isinstance(description, str) and description.strip().lower().startswith(MISSING_DESCRIPTIONS)
+
+
+def _definitions(section):
+    definitions = {}
+    for term, definition in _DEFINITION.findall(section):
+        definitions.setdefault(_text(term).rstrip(":").strip(), []).append(_text(definition))
+    return definitions
+
+
+def parse_variable(section):
+    """
+    Parse the codebook of one variable from its section of a documentation page.
+
+    Args:
+    section (str): The HTML of the variable section, from its title to the next variable.
+
+    Returns:
+    dict: The codebook of the variable with the keys 'label', 'text', 'target', 'values' (a list of [code,
+    description, count]), 'ranges' (a list of [low, high, count]) and 'missing' (the missing-value codes).
+    """
+    definitions = _definitions(section)
+    codebook = {
+        "label": (definitions.get("SAS Label") or [None])[0],
+        "text": (definitions.get("English Text") or [None])[0],
+        "target": definitions.get("Target", []),
+        "values": [],
+        "ranges": [],
+        "missing": [],
+    }
+    if "<table" not in section.lower():
+        return codebook
+
+    table = parse_table([section], VALUE_COLUMNS)
+    if "Code or Value" not in table.columns:
+        return codebook
+    descriptions = table["Value Description"] if "Value Description" in table.columns else pd.Series(None, index=table.index)
+    counts = table["Count"] if "Count" in table.columns else pd.Series(None, index=table.index)
+    for code, description, count in zip(table["Code or Value"], descriptions, counts):
+        description = None if pd.isna(description) else description
+        count = None if pd.isna(count) else _number(count)
+        if pd.isna(code) or code.strip() == ".":
+            continue  # '.' is the SAS missing value, decoded as NaN anyway
+        value_range = _RANGE.match(code)
+        if value_range is not None:
+            codebook["ranges"].append([_number(value_range.group(1)), _number(value_range.group(2)), count])
+            continue
+        number = _number(code)
+        code = code if number is None else number
+        codebook["values"].append([code, description, count])
+        if is_missing_description(description):
+            codebook["missing"].append(code)
+    return codebook
+
+
+def parse_codebook(page):
+    """
+    Parse the documentation page of a data file into a compact codebook of all of its variables.
+
+    Args:
+    page (str): The HTML of the documentation page, e.g., of https://wwwn.cdc.gov/Nchs/Nhanes/2005-2006/DEMO_D.htm.
+
+    Returns:
+    dict: A dictionary of {variable name: variable codebook}, see parse_variable. Sections without a 'Variable Name'
+    (such as the component description) are skipped.
+    """
+    titles = list(_VARIABLE_TITLE.finditer(page))
+    codebook = {}
+    for title, next_title in zip(titles, titles[1:] + [None]):
+        section = page[title.end():next_title.start() if next_title is not None else len(page)]
+        names = _definitions(section).get("Variable Name")
+        if names:
+            codebook[names[0]] = parse_variable(section)
+    return codebook
+
+
+class LabelDecoder:
+    """
+    LabelDecoder turns the numeric codes of NHANES data into value labels, with vectorized lookups.
+
+    It is built once from the codebooks of the data files of a retrieval (one per cycle year) and then applied to the
+    retrieved data, or to each chunk of it. A variable with value labels and no ranges of values, such as RIAGENDR,
+    becomes a pandas Categorical whose categories are the value labels of all cycles; the codes are looked up with a
+    binary search per cycle. Missing-value codes (refused, don't know, missing) become NaN in the same pass, as do
+    codes that the codebook does not list. A variable with ranges of values, such as RIDAGEYR, stays numeric and only
+    its missing-value codes become NaN. Variables without value labels, and variables that are not documented in
+    every cycle that has them, are left unchanged.
+
+    Args:
+    codebooks (dict): A dictionary of {cycle year: codebook of the data file}, see parse_codebook.
+    variables (dict): A dictionary of {cycle year: variable names of the data file}.
+    """
+
+    def __init__(self, codebooks, variables):
+        self.categorical = {}
+        self.missing = {}
+        names = []
+        for cycle_year in variables:
+            names.extend(name for name in variables[cycle_year] if name not in names)
+
+        for name in names:
+            cycles = [cycle_year for cycle_year in variables if name in variables[cycle_year]]
+            documented = [codebooks.get(cycle_year, {}).get(name) for cycle_year in cycles]
+            if any(variable is None for variable in documented):
+                continue
+            labeled = all(not variable["ranges"] and len(variable["values"]) > len(variable["missing"])
+                          for variable in documented)
+            if labeled:
+                self.categorical[name] = self._lookup_tables(dict(zip(cycles, documented)))
+            else:
+                missing = {cycle_year: np.array([code for code in variable["missing"] if _is_number(code)], dtype=float)
+                           for cycle_year, variable in zip(cycles, documented)}
+                if any(len(codes) for codes in missing.values()):
+                    self.missing[name] = missing
+
+    @staticmethod
+    def _lookup_tables(documented):
+        """
+        Build the categories of a variable and, per cycle, its sorted codes and their category numbers.
+        """
+        categories = []
+        tables = {}
+        for cycle_year, variable in documented.items():
+            missing = set(variable["missing"])
+            codes = []
+            for code, description, _ in variable["values"]:
+                if code in missing or not _is_number(code):
+                    continue
+                label = description if description is not None else str(code)
+                if label not in categories:
+                    categories.append(label)
+                codes.append((float(code), categories.index(label)))
+            codes.sort()
+            tables[cycle_year] = (np.array([code for code, _ in codes], dtype=float),
+                                  np.array([number for _, number in codes], dtype=np.int64))
+        return categories, tables
+
+    def __call__(self, data, cycle_year=None):
+        """
+        Decode the data in place.
+
+        Args:
+        data (pd.DataFrame): The data, with a 'year' column unless cycle_year is given.
+        cycle_year (str, optional): The cycle year of all rows. Defaults to None, meaning the 'year' column.
+
+        Returns:
+        pd.DataFrame: The decoded data.
+        """
+        years = None if cycle_year is not None else data["year"].to_numpy()
+
+        def cycle_rows(cycle):
+            if years is None:
+                return slice(None) if cycle == cycle_year else slice(0)
+            return years == cycle
+
+        for name, (categories, tables) in self.categorical.items():
+            if name not in data.columns or not pd.api.types.is_numeric_dtype(data[name]):
+                continue
+            values = data[name].to_numpy(dtype=float, na_value=np.nan)
+            codes = np.full(len(values), -1, dtype=np.int64)
+            for cycle, (sorted_codes, numbers) in tables.items():
+                if not len(sorted_codes):
+                    continue
+                rows = cycle_rows(cycle)
+                cycle_values = values[rows]
+                positions = np.minimum(np.searchsorted(sorted_codes, cycle_values), len(sorted_codes) - 1)
+                codes[rows] = np.where(sorted_codes[positions] == cycle_values, numbers[positions], -1)
+            data[name] = pd.Categorical.from_codes(codes, categories=categories)
+
+        for name, missing in self.missing.items():
+            if name not in data.columns or not pd.api.types.is_numeric_dtype(data[name]):
+                continue
+            values = data[name].to_numpy(dtype=float, na_value=np.nan, copy=True)
+            for cycle, codes in missing.items():
+                rows = cycle_rows(cycle)
+                cycle_values = values[rows]
+                cycle_values[np.isin(cycle_values, codes)] = np.nan
+                values[rows] = cycle_values
+            data[name] = values
+        return data
+
+
+def _is_number(code):
+    return isinstance(code, (int, float)) and not isinstance(code, bool)
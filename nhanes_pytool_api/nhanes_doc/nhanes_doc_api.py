@@ -0,0 +1,171 @@
+import os
+import urllib.error
+
+import pandas as pd
+
+from .codebook import parse_codebook
+
+try:
+    from ..nhanes_data.catalog import VariableCatalog
+    from ..nhanes_data.singleflight import SingleFlight
+    from ..nhanes_data.throttle import urlopen
+except ImportError:  # Installed, nhanes_data and nhanes_doc are top-level packages
+    from nhanes_data.catalog import VariableCatalog
+    from nhanes_data.singleflight import SingleFlight
+    from nhanes_data.throttle import urlopen
+
+
+class NHANESDocAPI:
+    """
+    NHANESDocAPI provides the codebooks of NHANES data files: variable labels, value labels, value ranges and
+    missing-value codes.
+
+    The codebooks are parsed from the documentation page of each data file (e.g.,
+    https://wwwn.cdc.gov/Nchs/Nhanes/2005-2006/DEMO_D.htm). A page is downloaded and parsed once per data file, and
+    the parsed codebook of all of its variables is stored compactly (as JSON) in the local catalog of the data
+    directory, so later lookups, also by other processes, do not download or parse the page again. Batch lookups of
+    many variables cost one parse per data file. An instance is thread-safe.
+
+    Args:
+    data_directory (str, optional): The directory of the local catalog, shared with NHANESDataAPI. Defaults to 'data/'.
+    base_url (str, optional): The base URL of the NHANES website. Defaults to 'https://wwwn.cdc.gov'.
+
+    Methods:
+    - get_codebook(cycle_year, data_file_name, refresh=False): Get the codebook of all variables of a data file.
+    - get_variable_codebook(cycle_year, data_file_name, variable_name): Get the codebook of one variable.
+    - get_codebooks(variables): Get the codebooks of many variables, parsing each data file once.
+    - value_labels(cycle_year, data_file_name, variable_names=None): Get the value labels of a data file as a DataFrame.
+    """
+
+    def __init__(self, data_directory="data/", base_url="https://wwwn.cdc.gov"):
+        """
+        Initialize the NHANES Doc API.
+
+        Args:
+        data_directory (str): Directory of the local catalog.
+        base_url (str): The base URL of the NHANES website.
+        """
+        self.data_directory = data_directory
+        self.base_url = base_url.rstrip("/")
+        self._catalog = VariableCatalog(os.path.join(data_directory, "catalog.sqlite"))
+        self._codebooks = {}
+        self._flights = SingleFlight()
+
+    def _doc_url(self, cycle_year, data_file_name):
+        """
+        Get the URL of the documentation page of a data file.
+
+        Args:
+        cycle_year (str): The cycle year of the data file.
+        data_file_name (str): The data file name.
+
+        Returns:
+        str: The URL of the documentation page on the NHANES website.
+        """
+        return f"{self.base_url}/Nchs/Nhanes/{cycle_year}/{data_file_name}.htm"
+
+    def get_codebook(self, cycle_year, data_file_name, refresh=False):
+        """
+        Get the codebook of all variables of a data file.
+
+        Each variable codebook is a dictionary with the keys 'label' (the SAS label), 'text' (the English text of the
+        question), 'target', 'values' (a list of [code, value description, count]), 'ranges' (a list of [low, high,
+        count] for ranges of values) and 'missing' (the codes for refused, don't know and otherwise missing answers).
+
+        Args:
+        cycle_year (str): The cycle year, e.g., '2005-2006'.
+        data_file_name (str): The data file name, e.g., 'DEMO_D'.
+        refresh (bool, optional): Whether to download and parse the documentation page again. Defaults to False.
+
+        Returns:
+        dict: A dictionary of {variable name: variable codebook}.
+
+        Raises:
+        ValueError: If the documentation page cannot be downloaded or documents no variables.
+        """
+        key = (cycle_year, data_file_name)
+        if not refresh and key in self._codebooks:
+            return self._codebooks[key]
+        codebook, _ = self._flights.do(("codebook",) + key, self._load_codebook, cycle_year, data_file_name, refresh)
+        return codebook
+
+    def _load_codebook(self, cycle_year, data_file_name, refresh):
+        key = (cycle_year, data_file_name)
+        codebook = None if refresh else self._catalog.codebook(cycle_year, data_file_name)
+        if codebook is None:
+            url = self._doc_url(cycle_year, data_file_name)
+            try:
+                with urlopen(url, timeout=60) as response:
+                    page = response.read().decode(response.headers.get_content_charset() or "utf-8", errors="replace")
+            except urllib.error.URLError as e:
+                raise ValueError(f"Error fetching the documentation of {data_file_name} ({cycle_year}): {str(e)}")
+            codebook = parse_codebook(page)
+            if not codebook:
+                raise ValueError(f"No variables documented for {data_file_name} ({cycle_year}) at {url}")
+            self._catalog.store_codebook(cycle_year, data_file_name, codebook)
+        self._codebooks[key] = codebook
+        return codebook
+
+    def get_variable_codebook(self, cycle_year, data_file_name, variable_name):
+        """
+        Get the codebook of one variable of a data file.
+
+        Args:
+        cycle_year (str): The cycle year.
+        data_file_name (str): The data file name.
+        variable_name (str): The variable name, e.g., 'RIAGENDR'.
+
+        Returns:
+        dict: The variable codebook, see get_codebook.
+
+        Raises:
+        KeyError: If the variable is not documented for the data file.
+        """
+        codebook = self.get_codebook(cycle_year, data_file_name)
+        if variable_name not in codebook:
+            raise KeyError(f"Variable {variable_name} is not documented for {data_file_name} ({cycle_year}).")
+        return codebook[variable_name]
+
+    def get_codebooks(self, variables):
+        """
+        Get the codebooks of many variables, downloading and parsing each data file's documentation once.
+
+        Args:
+        variables (list of tuple): (cycle year, data file name, variable name) tuples.
+
+        Returns:
+        dict: A dictionary of {(cycle year, data file name, variable name): variable codebook}. Variables that are not documented are left out.
+        """
+        by_file = {}
+        for cycle_year, data_file_name, variable_name in variables:
+            by_file.setdefault((cycle_year, data_file_name), []).append(variable_name)
+
+        codebooks = {}
+        for (cycle_year, data_file_name), variable_names in by_file.items():
+            codebook = self.get_codebook(cycle_year, data_file_name)
+            for variable_name in variable_names:
+                if variable_name in codebook:
+                    codebooks[(cycle_year, data_file_name, variable_name)] = codebook[variable_name]
+        return codebooks
+
+    def value_labels(self, cycle_year, data_file_name, variable_names=None):
+        """
+        Get the value labels of a data file as a table.
+
+        Args:
+        cycle_year (str): The cycle year.
+        data_file_name (str): The data file name.
+        variable_names (list of str, optional): Only include these variables. Defaults to None, meaning all variables.
+
+        Returns:
+        pd.DataFrame: One row per code with the columns 'Variable Name', 'Code', 'Value Description', 'Count' and 'Missing' (True for missing-value codes).
+        """
+        codebook = self.get_codebook(cycle_year, data_file_name)
+        rows = []
+        for variable_name, variable in codebook.items():
+            if variable_names is not None and variable_name not in variable_names:
+                continue
+            missing = set(variable["missing"])
+            for code, description, count in variable["values"]:
+                rows.append((variable_name, code, description, count, code in missing))
+        return pd.DataFrame(rows, columns=["Variable Name", "Code", "Value Description", "Count", "Missing"])
@@ -28,7 +28,15 @@ setup(
         "pandas",
     ],
     extras_require={
-        'test': ['pytest']
+        'test': ['pytest'],
+        'parquet': ['pyarrow'],
+        'zstd': ['zstandard'],
+        'lz4': ['lz4'],
+    },
+    entry_points={
+        'console_scripts': [
+            'nhanes-pytool=nhanes_data.cli:main',
+        ]
     },
         project_urls={
         "Documentation": "https://kkrusere.github.io/NHANES-pyTOOL-API/",
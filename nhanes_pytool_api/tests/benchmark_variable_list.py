@@ -0,0 +1,66 @@
+"""
+Benchmark of the variable table parser against pd.read_html on the saved variablelist page fixture.
+
+The rows of the fixture are repeated to the size of a large variablelist page. Run with:
+
+    python -m nhanes_pytool_api.tests.benchmark_variable_list [--rows 60000] [--repeat 3]
+"""
+import argparse
+import io
+import re
+import time
+
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.variable_list import parse_table
+from nhanes_pytool_api.tests.test_variable_list import COLUMNS, CYCLES, chunked, read_fixture, read_html_variable_table
+
+
+def make_page(rows):
+    """
+    Build a variablelist page with the given number of rows by repeating the rows of the fixture.
+    """
+    page = read_fixture()
+    table_rows = re.findall(r"\t\t<tr>\s*<td>.*?</tr>\n", page, re.S)
+    body = "".join(table_rows[i % len(table_rows)] for i in range(rows))
+    start = page.index(table_rows[0])
+    end = page.index(table_rows[-1]) + len(table_rows[-1])
+    return page[:start] + body + page[end:]
+
+
+def parse_variable_table(page):
+    variable_table = parse_table(chunked(page, 256 * 1024), COLUMNS)
+    variable_table["Years"] = variable_table["Begin Year"].str.cat(variable_table["EndYear"], sep="-")
+    variable_table.drop(["Begin Year", "EndYear"], axis=1, inplace=True)
+    variable_table = variable_table.loc[variable_table["Years"].isin(CYCLES)]
+    return variable_table.reset_index(drop=True)
+
+
+def fastest(function, page, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(page)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=60000, help="The number of variable rows of the page.")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of timed runs; the fastest is reported.")
+    args = parser.parse_args(argv)
+
+    page = make_page(args.rows)
+    pd.testing.assert_frame_equal(parse_variable_table(page).astype(str), read_html_variable_table(page).astype(str))
+
+    baseline = fastest(read_html_variable_table, page, args.repeat)
+    streaming = fastest(parse_variable_table, page, args.repeat)
+    print(f"Page: {args.rows} rows, {len(page) / 1e6:.1f} MB")
+    print(f"pd.read_html + apply: {baseline:.3f} s")
+    print(f"parse_table + str.cat: {streaming:.3f} s")
+    print(f"Speedup: {baseline / streaming:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import io
+
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.xport import write_xport
+
+
+def make_variable_table(rows):
+    """
+    Build a variable table like the one returned by NHANESDataAPI._retrieve_variable_table.
+
+    Args:
+    rows (list of tuple): (Variable Name, Data File Name, Data File Description, Years) tuples.
+
+    Returns:
+    pd.DataFrame: The variable table.
+    """
+    return pd.DataFrame(rows, columns=["Variable Name", "Data File Name", "Data File Description", "Years"])
+
+
+def make_xport_bytes(frame):
+    """
+    Get the contents of a SAS XPORT file holding a DataFrame.
+
+    Args:
+    frame (pd.DataFrame): The data.
+
+    Returns:
+    bytes: The XPORT file contents.
+    """
+    buffer = io.BytesIO()
+    write_xport(frame, buffer)
+    return buffer.getvalue()
@@ -0,0 +1,113 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.aggregate import StreamingAggregator
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.tests.helpers import make_variable_table, make_xport_bytes
+
+rng = np.random.default_rng(2)
+
+
+def make_foods(first_seqn, participants, max_foods=20):
+    foods = rng.integers(1, max_foods, participants)
+    kcal = rng.gamma(2, 100, foods.sum())
+    kcal[rng.random(foods.sum()) < 0.05] = np.nan
+    return pd.DataFrame({
+        "SEQN": np.repeat(np.arange(first_seqn, first_seqn + participants, dtype=float), foods),
+        "DR1IKCAL": kcal,
+        "DR1IPROT": rng.gamma(2, 5, foods.sum()),
+    })
+
+
+DR1IFF_D = make_foods(1, 300)
+DR1IFF_E = make_foods(1000, 200)
+
+FILES = {
+    "/Nchs/Nhanes/2005-2006/DR1IFF_D.XPT": make_xport_bytes(DR1IFF_D),
+    "/Nchs/Nhanes/2007-2008/DR1IFF_E.XPT": make_xport_bytes(DR1IFF_E),
+}
+
+DESCRIPTION = "Dietary Interview - Individual Foods, First Day"
+TABLES = {
+    "dietary": make_variable_table(
+        [(name, "DR1IFF_D", DESCRIPTION, "2005-2006") for name in DR1IFF_D.columns]
+        + [(name, "DR1IFF_E", DESCRIPTION, "2007-2008") for name in DR1IFF_E.columns]),
+}
+
+
+class TestStreamingAggregator(unittest.TestCase):
+    def test_matches_pandas_groupby_across_chunks(self):
+        data = make_foods(1, 100).sample(frac=1, random_state=0, ignore_index=True)  # groups span all chunks
+        aggregator = StreamingAggregator({"DR1IKCAL": ["sum", "mean", "min", "max", "count", "size"],
+                                          "DR1IPROT": "sum"}, ["SEQN"], combine_rows=50)
+        for start in range(0, len(data), 37):
+            aggregator.update(data.iloc[start:start + 37])
+
+        expected = data.groupby("SEQN").agg(
+            DR1IKCAL_sum=("DR1IKCAL", "sum"), DR1IKCAL_mean=("DR1IKCAL", "mean"), DR1IKCAL_min=("DR1IKCAL", "min"),
+            DR1IKCAL_max=("DR1IKCAL", "max"), DR1IKCAL_count=("DR1IKCAL", "count"),
+            DR1IKCAL_size=("DR1IKCAL", "size"), DR1IPROT=("DR1IPROT", "sum")).reset_index()
+        pd.testing.assert_frame_equal(aggregator.result(), expected, check_dtype=False)
+
+    def test_columns(self):
+        aggregator = StreamingAggregator({"DR1IKCAL": "mean", "DR1IPROT": ["min", "max"]}, ["SEQN"])
+        self.assertEqual(aggregator.columns, ["SEQN", "DR1IKCAL", "DR1IPROT"])
+
+    def test_empty_stream(self):
+        result = StreamingAggregator({"DR1IKCAL": "sum"}, ["SEQN"]).result()
+        self.assertEqual(list(result.columns), ["SEQN", "DR1IKCAL"])
+        self.assertEqual(len(result), 0)
+
+    def test_unsupported_function(self):
+        with self.assertRaises(ValueError):
+            StreamingAggregator({"DR1IKCAL": "median"}, ["SEQN"])
+
+
+class TestAggregateData(unittest.TestCase):
+    def setUp(self):
+        self.data_directory = tempfile.mkdtemp()
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", autospec=True,
+                                    side_effect=lambda api, data_category: TABLES.get(data_category))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = LocalNHANESServer(FILES).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDataAPI(self.data_directory, base_url=self.server.base_url)
+
+    def test_aggregate_data_matches_retrieve_data(self):
+        result = self.api.aggregate_data("dietary", "2005-2008", DESCRIPTION,
+                                         {"DR1IKCAL": "sum", "DR1IPROT": ["mean", "size"]}, chunk_rows=100)
+
+        data = self.api.retrieve_data("dietary", "2005-2008", DESCRIPTION)
+        expected = data.groupby(["year", "SEQN"]).agg(
+            DR1IKCAL=("DR1IKCAL", "sum"), DR1IPROT_mean=("DR1IPROT", "mean"),
+            DR1IPROT_size=("DR1IPROT", "size")).reset_index()
+        expected = expected[["SEQN", "DR1IKCAL", "DR1IPROT_mean", "DR1IPROT_size", "year"]]
+
+        self.assertEqual(len(result), 500)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+    def test_aggregate_data_missing_column_is_nan(self):
+        result = self.api.aggregate_data("dietary", "2005-2006", DESCRIPTION, {"DR1IFDCD": "max"})
+        self.assertEqual(len(result), 300)
+        self.assertTrue(result["DR1IFDCD"].isna().all())
+
+    def test_aggregate_data_skips_cycles_without_the_data_file(self):
+        aggregations = {"DR1IKCAL": "sum"}
+        result = self.api.aggregate_data("dietary", "2005-2010", DESCRIPTION, aggregations)
+        pd.testing.assert_frame_equal(result, self.api.aggregate_data("dietary", "2005-2008", DESCRIPTION, aggregations))
+        with self.assertRaises(ValueError):
+            self.api.aggregate_data("dietary", "2009-2010", DESCRIPTION, aggregations)
+
+    def test_aggregate_data_missing_group_column(self):
+        with self.assertRaises(ValueError):
+            self.api.aggregate_data("dietary", "2005-2006", DESCRIPTION, {"DR1IKCAL": "sum"}, by="RIAGENDR")
+
+
+if __name__ == '__main__':
+    unittest.main()
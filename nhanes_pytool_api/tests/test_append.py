@@ -0,0 +1,95 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.dataset import PartitionedDataset
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.nhanes_data.synthetic import SyntheticNHANES
+
+
+class TestAppendCycles(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        site = SyntheticNHANES(cycles=["2013-2014", "2015-2016", "2017-2018"], participants=500, extra_columns=1,
+                               data_files=["DEMO", "BMX"]).write(os.path.join(self.directory, "site"))
+        # Glycohemoglobin is only published for the last two cycles
+        site.update(SyntheticNHANES(cycles=["2015-2016", "2017-2018"], participants=500,
+                                    data_files=["GHB"]).write(os.path.join(self.directory, "lab")))
+        self.server = LocalNHANESServer(site).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDataAPI(os.path.join(self.directory, "data"), base_url=self.server.base_url)
+
+    def downloads(self):
+        ranges = [path for path, _ in self.server.range_requests]
+        return {path: self.server.requests.count(path) - ranges.count(path)
+                for path in set(self.server.requests) if path.endswith(".XPT")}
+
+    def test_append_to_frame_fetches_only_missing_cycles(self):
+        data = self.api.retrieve_data("examination", "2013-2016", "Body Measures")
+        downloaded = self.downloads()
+        appended = self.api.append_cycles(data, "examination", "2013-2018", "Body Measures")
+        self.assertEqual(appended.attrs["appended"], ["2017-2018"])
+        self.assertEqual(self.downloads(), dict(downloaded, **{"/Nchs/Nhanes/2017-2018/BMX_J.XPT": 1}))
+        self.assertEqual(len(data), len(appended) - len(self.api.retrieve_data("examination", "2017-2018", "Body Measures")))
+        pd.testing.assert_frame_equal(appended, self.api.retrieve_data("examination", "2013-2018", "Body Measures"))
+
+        unchanged = self.api.append_cycles(appended, "examination", ["2015-2016", "2017-2018"], "Body Measures")
+        self.assertEqual(unchanged.attrs["appended"], [])
+        pd.testing.assert_frame_equal(unchanged, appended)
+
+    def test_skips_cycles_without_the_data_file(self):
+        data = self.api.retrieve_data("laboratory", "2017-2018", "Glycohemoglobin")
+        appended = self.api.append_cycles(data, "laboratory", "2013-2018", "Glycohemoglobin")
+        self.assertEqual(appended.attrs["appended"], ["2015-2016"])
+        self.assertEqual(list(appended["year"].unique()), ["2017-2018", "2015-2016"])
+
+        dataset = self.api.append_cycles(os.path.join(self.directory, "store"), "laboratory", "2013-2018", "Glycohemoglobin")
+        self.assertEqual(dataset.appended, ["2015-2016", "2017-2018"])
+
+    def test_schema_alignment(self):
+        data = self.api.retrieve_data("examination", "2013-2016", "Body Measures").drop(columns=["BMXHT"])
+        appended = self.api.append_cycles(data, "examination", "2017-2018", "Body Measures")
+        self.assertEqual(list(appended.columns), list(data.columns))
+
+        appended = self.api.append_cycles(data, "examination", "2017-2018", "Body Measures", include_new_variables=True)
+        self.assertEqual(list(appended.columns), list(data.columns[:-1]) + ["BMXHT", "year"])
+        self.assertTrue(appended.loc[appended["year"] != "2017-2018", "BMXHT"].isna().all())
+        self.assertGreater(appended.loc[appended["year"] == "2017-2018", "BMXHT"].notna().sum(), 0)
+
+        with self.assertRaises(ValueError):
+            self.api.append_cycles(data.drop(columns=["year"]), "examination", "2017-2018", "Body Measures")
+
+    def test_decoded_categories_are_extended(self):
+        data = self.api.retrieve_data("demographics", "2015-2016", "Demographic Variables & Sample Weights",
+                                      decode_labels=True)
+        data["RIAGENDR"] = data["RIAGENDR"].cat.remove_unused_categories().cat.set_categories(["Male"])
+        appended = self.api.append_cycles(data, "demographics", "2017-2018", "Demographic Variables & Sample Weights",
+                                          decode_labels=True)
+        self.assertEqual(list(appended["RIAGENDR"].cat.categories), ["Male", "Female"])
+        self.assertIn("Female", set(appended.loc[appended["year"] == "2017-2018", "RIAGENDR"]))
+
+    def test_append_to_stored_dataset_in_place(self):
+        dataset = self.api.retrieve_data("examination", "2013-2016", "Body Measures", max_memory=1)
+        self.assertIsInstance(dataset, PartitionedDataset)
+        modified = {cycle_year: os.stat(dataset.partition_path(cycle_year)).st_mtime_ns for cycle_year in dataset.partitions}
+
+        appended = self.api.append_cycles(dataset.directory, "examination", "2013-2018", "Body Measures", chunk_rows=100)
+        self.assertEqual(appended.appended, ["2017-2018"])
+        self.assertEqual(appended.partitions, ["2013-2014", "2015-2016", "2017-2018"])
+        self.assertEqual({cycle_year: os.stat(appended.partition_path(cycle_year)).st_mtime_ns
+                          for cycle_year in modified}, modified)
+        pd.testing.assert_frame_equal(appended.to_pandas(),
+                                      self.api.retrieve_data("examination", "2013-2018", "Body Measures"))
+
+    def test_new_stored_dataset(self):
+        directory = os.path.join(self.directory, "store")
+        dataset = self.api.append_cycles(directory, "examination", "2015-2018", "Body Measures")
+        self.assertEqual(dataset.partitions, ["2015-2016", "2017-2018"])
+        self.assertEqual(self.api.append_cycles(dataset, "examination", "2017", "Body Measures").appended, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.tests.helpers import make_variable_table
+
+
+TABLES = {
+    "demographics": make_variable_table([
+        ("SEQN", "DEMO_D", "Demographic Variables & Sample Weights", "2005-2006"),
+        ("RIAGENDR", "DEMO_D", "Demographic Variables & Sample Weights", "2005-2006"),
+        ("SEQN", "DEMO_E", "Demographic Variables & Sample Weights", "2007-2008"),
+        ("RIAGENDR", "DEMO_E", "Demographic Variables & Sample Weights", "2007-2008"),
+        ("DMDHRGND", "DEMO_E", "Demographic Variables & Sample Weights", "2007-2008"),
+    ]),
+    "laboratory": make_variable_table([
+        ("SEQN", "GHB_D", "Glycohemoglobin", "2005-2006"),
+        ("LBXGH", "GHB_D", "Glycohemoglobin", "2005-2006"),
+        ("SEQN", "GHB_E", "Glycohemoglobin", "2007-2008"),
+        ("LBXGH", "GHB_E", "Glycohemoglobin", "2007-2008"),
+        ("SEQN", "CRP_D", "C-Reactive Protein (CRP)", "2005-2006"),
+    ]),
+}
+
+
+def fake_retrieve_variable_table(self, data_category):
+    return TABLES.get(data_category)
+
+
+class TestVariableCatalog(unittest.TestCase):
+    def setUp(self):
+        self.data_directory = tempfile.mkdtemp()
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", autospec=True,
+                                    side_effect=fake_retrieve_variable_table)
+        self.retrieve = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.api = NHANESDataAPI(self.data_directory)
+
+    def test_build_catalog_fetches_all_categories(self):
+        result = self.api.build_catalog()
+        self.assertEqual(result, {"demographics": 5, "laboratory": 5})
+        self.assertEqual(self.retrieve.call_count, 6)
+        self.assertTrue(os.path.exists(os.path.join(self.data_directory, "catalog.sqlite")))
+
+    def test_catalog_persists_across_instances(self):
+        self.api.build_catalog(["demographics", "laboratory"])
+        self.retrieve.reset_mock()
+
+        api = NHANESDataAPI(self.data_directory)
+        self.assertEqual(api.list_file_names("laboratory"), ["Glycohemoglobin", "C-Reactive Protein (CRP)"])
+        self.assertEqual(api._get_data_filename("laboratory", "2007-2008", "Glycohemoglobin"), "GHB_E")
+        self.retrieve.assert_not_called()
+
+    def test_list_file_names_filters_cycles(self):
+        self.assertEqual(self.api.list_file_names("laboratory", "2007"), ["Glycohemoglobin"])
+        with self.assertRaises(Exception):
+            self.api.list_file_names("laboratory", "2017")
+        with self.assertRaises(Exception):
+            self.api.list_file_names("examination")
+
+    def test_get_data_filename_missing(self):
+        with self.assertRaises(ValueError):
+            self.api._get_data_filename("laboratory", "2007-2008", "C-Reactive Protein (CRP)")
+        with self.assertRaises(ValueError):
+            self.api._get_data_filename("invalid_category", "2007-2008", "Glycohemoglobin")
+
+    def test_common_and_uncommon_variables(self):
+        common, uncommon, variable_cycles = self.api.get_common_and_uncommon_variables("demographics", ["2005-2008"])
+        self.assertEqual(sorted(common), ["RIAGENDR", "SEQN"])
+        self.assertEqual(uncommon, ["DMDHRGND"])
+        self.assertEqual(variable_cycles["SEQN"], ["2005-2006", "2007-2008"])
+
+    def test_find_variable(self):
+        self.api.build_catalog()
+        found = self.api.find_variable("LBXGH")
+        self.assertEqual(found["Data Category"].tolist(), ["laboratory", "laboratory"])
+        self.assertEqual(found["Data File Name"].tolist(), ["GHB_D", "GHB_E"])
+
+
+if __name__ == '__main__':
+    unittest.main()
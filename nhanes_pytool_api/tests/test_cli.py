@@ -0,0 +1,112 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from nhanes_pytool_api.nhanes_data import cli, throttle
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.tests.helpers import make_variable_table
+
+
+VARIABLE_TABLE = make_variable_table([
+    ("SEQN", "BMX_D", "Body Measures", "2005-2006"),
+    ("BMXWT", "BMX_D", "Body Measures", "2005-2006"),
+    ("SEQN", "BMX_E", "Body Measures", "2007-2008"),
+    ("SEQN", "BPX_D", "Blood Pressure", "2005-2006"),
+])
+
+FILES = {
+    "/Nchs/Nhanes/2005-2006/BMX_D.XPT": b"a" * 3000,
+    "/Nchs/Nhanes/2007-2008/BMX_E.XPT": b"b" * 2000,
+    "/Nchs/Nhanes/2005-2006/BPX_D.XPT": b"c" * 1000,
+}
+
+
+class TestPrefetch(unittest.TestCase):
+    def setUp(self):
+        self.data_directory = tempfile.mkdtemp()
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", return_value=VARIABLE_TABLE)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prefetch_data_downloads_matching_files(self):
+        with LocalNHANESServer(FILES) as server:
+            api = NHANESDataAPI(self.data_directory, base_url=server.base_url)
+            summary = api.prefetch_data("examination", "2005-2008", "Body Measures")
+
+        self.assertEqual(summary["files"], ["2005-2006/BMX_D.XPT", "2007-2008/BMX_E.XPT"])
+        self.assertEqual(summary["downloaded"], 2)
+        self.assertEqual(summary["bytes"], 5000)
+        self.assertEqual(os.path.getsize(os.path.join(self.data_directory, "2005-2006", "BMX_D.XPT")), 3000)
+        self.assertEqual(set(api._cache.read_manifest()), set(summary["files"]))
+
+    def test_prefetch_data_skips_cached_files(self):
+        with LocalNHANESServer(FILES) as server:
+            api = NHANESDataAPI(self.data_directory, base_url=server.base_url)
+            api.prefetch_data("examination", "2005", "Body Measures")
+            summary = api.prefetch_data("examination", "2005-2008", "Body Measures")
+
+        self.assertEqual(summary["downloaded"], 1)
+        self.assertEqual(summary["skipped"], 1)
+        self.assertEqual(server.requests.count("/Nchs/Nhanes/2005-2006/BMX_D.XPT"), 1)
+
+    def test_prefetch_data_invalid_cycle(self):
+        api = NHANESDataAPI(self.data_directory)
+        with self.assertRaises(ValueError):
+            api.prefetch_data("examination", "2022", "Body Measures")
+
+    def test_cli_prefetch_prints_manifest(self):
+        with LocalNHANESServer(FILES) as server:
+            output = io.StringIO()
+            with redirect_stdout(output):
+                status = cli.main(["prefetch", "-c", "examination", "-y", "2005", "-d", self.data_directory,
+                                   "--base-url", server.base_url])
+
+        self.assertEqual(status, 0)
+        self.assertIn("2005-2006/BMX_D.XPT", output.getvalue())
+        self.assertIn("2005-2006/BPX_D.XPT", output.getvalue())
+        self.assertIn("Cached 2 file(s)", output.getvalue())
+
+
+class TestServe(unittest.TestCase):
+    def test_cli_serve_rate_options(self):
+        with mock.patch.object(cli, "NHANESDataService") as service, mock.patch.object(cli, "NHANESDataAPI") as api:
+            service.return_value.serve_forever.side_effect = KeyboardInterrupt
+            with redirect_stdout(io.StringIO()):
+                status = cli.main(["serve", "-d", tempfile.mkdtemp(), "--base-url", "http://127.0.0.1:8123",
+                                   "--rate", "5", "--max-concurrency", "2"])
+        self.assertEqual(status, 0)
+        self.assertEqual(api.call_args.kwargs["host_limits"],
+                         {"127.0.0.1:8123": {"rate": 5.0, "max_concurrency": 2, "initial_concurrency": 2}})
+        service.return_value.httpd.server_close.assert_called_once()
+
+    def test_cli_max_concurrency_keeps_default_rate(self):
+        with mock.patch.dict(throttle._settings), mock.patch.dict(throttle._throttles), \
+                mock.patch.object(cli, "NHANESDataService") as service:
+            service.return_value.serve_forever.side_effect = KeyboardInterrupt
+            with redirect_stdout(io.StringIO()):
+                status = cli.main(["serve", "-d", tempfile.mkdtemp(), "--max-concurrency", "6"])
+            host_throttle = throttle.host_throttle("https://wwwn.cdc.gov/Nchs/Nhanes/")
+        self.assertEqual(status, 0)
+        self.assertEqual((host_throttle.bucket.rate, host_throttle.bucket.burst), (10, 10))
+        self.assertEqual(host_throttle.concurrency.maximum, 6)
+
+
+class TestSynthetic(unittest.TestCase):
+    def test_cli_synthetic_writes_website(self):
+        output_directory = tempfile.mkdtemp()
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status = cli.main(["synthetic", "-o", output_directory, "-y", "2017-2018", "-n", "200", "-f", "DEMO",
+                               "-f", "SMQ", "--extra-columns", "2"])
+        self.assertEqual(status, 0)
+        self.assertIn("Generated 2 data file(s)", output.getvalue())
+        self.assertTrue(os.path.exists(os.path.join(output_directory, "Nchs", "Nhanes", "2017-2018", "SMQ_J.XPT")))
+        self.assertTrue(os.path.exists(os.path.join(output_directory, "site.json")))
+
+
+if __name__ == '__main__':
+    unittest.main()
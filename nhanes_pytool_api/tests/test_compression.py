@@ -0,0 +1,121 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data import cli
+from nhanes_pytool_api.nhanes_data.cache import DataCache
+from nhanes_pytool_api.nhanes_data.compression import CODECS, get_codec, open_data_file
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.tests.helpers import make_variable_table, make_xport_bytes
+
+
+ROWS = 3000
+rng = np.random.default_rng(0)
+BMX_D = pd.DataFrame({"SEQN": np.arange(1, ROWS + 1, dtype=float), "BMXWT": rng.normal(70, 10, ROWS).round(1),
+                      "BMIWT": np.where(rng.random(ROWS) < 0.9, np.nan, 3.0)})
+BMX_E = pd.DataFrame({"SEQN": np.arange(ROWS + 1, 2 * ROWS + 1, dtype=float), "BMXWT": rng.normal(70, 10, ROWS).round(1)})
+FILES = {
+    "/Nchs/Nhanes/2005-2006/BMX_D.XPT": make_xport_bytes(BMX_D),
+    "/Nchs/Nhanes/2007-2008/BMX_E.XPT": make_xport_bytes(BMX_E),
+}
+TABLE = make_variable_table([(name, "BMX_D", "Body Measures", "2005-2006") for name in BMX_D.columns]
+                            + [(name, "BMX_E", "Body Measures", "2007-2008") for name in BMX_E.columns])
+AVAILABLE = [name for name, codec in CODECS.items() if codec.available]
+
+
+class TestCompressedCache(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", return_value=TABLE)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = LocalNHANESServer(FILES).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.expected = NHANESDataAPI(tempfile.mkdtemp(), base_url=self.server.base_url).retrieve_data(
+            "examination", "2005-2008", "Body Measures")
+
+    def test_codecs_store_compressed_files(self):
+        for name in AVAILABLE:
+            with self.subTest(codec=name):
+                directory = tempfile.mkdtemp()
+                api = NHANESDataAPI(directory, base_url=self.server.base_url, cache_compression=name)
+                data = api.retrieve_data("examination", "2005-2008", "Body Measures")
+                pd.testing.assert_frame_equal(data, self.expected)
+
+                stored = os.path.join(directory, "2005-2006", "BMX_D.XPT" + CODECS[name].extension)
+                self.assertTrue(os.path.exists(stored))
+                self.assertFalse(os.path.exists(os.path.join(directory, "2005-2006", "BMX_D.XPT")))
+                self.assertLess(os.path.getsize(stored), len(FILES["/Nchs/Nhanes/2005-2006/BMX_D.XPT"]))
+                with open_data_file(stored) as xport_file:
+                    self.assertEqual(xport_file.read(), FILES["/Nchs/Nhanes/2005-2006/BMX_D.XPT"])
+
+                entry = api._cache.read_manifest()["2005-2006/BMX_D.XPT"]
+                self.assertEqual(entry["codec"], name)
+                self.assertEqual(entry["size"], len(FILES["/Nchs/Nhanes/2005-2006/BMX_D.XPT"]))
+
+    def test_lazy_and_spilled_reads_of_compressed_files(self):
+        api = NHANESDataAPI(tempfile.mkdtemp(), base_url=self.server.base_url, cache_compression="gzip", spill_compression="zstd")
+        lazy = api.retrieve_data("examination", "2005-2008", "Body Measures", lazy=True)
+        pd.testing.assert_frame_equal(lazy.collect(), self.expected)
+        dataset = api.retrieve_data("examination", "2005-2008", "Body Measures", max_memory=10000)
+        pd.testing.assert_frame_equal(dataset.to_pandas(), self.expected)
+
+    def test_corrupted_compressed_file_is_downloaded_again(self):
+        directory = tempfile.mkdtemp()
+        api = NHANESDataAPI(directory, base_url=self.server.base_url, cache_compression="gzip")
+        api.retrieve_data("examination", "2005-2006", "Body Measures")
+        stored = os.path.join(directory, "2005-2006", "BMX_D.XPT.gz")
+        with open(stored, "r+b") as stored_file:
+            stored_file.seek(100)
+            stored_file.write(b"\0" * 10)
+
+        requests = len(self.server.requests)
+        data = NHANESDataAPI(directory, base_url=self.server.base_url, cache_compression="gzip").retrieve_data(
+            "examination", "2005-2006", "Body Measures")
+        self.assertEqual(len(self.server.requests), requests + 1)
+        self.assertEqual(data["SEQN"].tolist(), BMX_D["SEQN"].tolist())
+
+    def test_changing_codec_keeps_cached_files(self):
+        directory = tempfile.mkdtemp()
+        NHANESDataAPI(directory, base_url=self.server.base_url).retrieve_data("examination", "2005-2006", "Body Measures")
+        requests = len(self.server.requests)
+        cache = DataCache(directory, compression="bz2")
+        self.assertTrue(cache.is_cached("2005-2006", "BMX_D"))
+        self.assertEqual(cache.stored_path("2005-2006", "BMX_D"), os.path.join(directory, "2005-2006", "BMX_D.XPT"))
+        self.assertEqual(len(self.server.requests), requests)
+
+    def test_unknown_codec(self):
+        with self.assertRaises(ValueError):
+            get_codec("rar")
+
+    def test_compression_report(self):
+        api = NHANESDataAPI(tempfile.mkdtemp(), base_url=self.server.base_url)
+        report = api.compression_report("examination", "2005-2008", "Body Measures", repeat=1)
+
+        cache = report[report["Kind"] == "cache"].set_index("Codec")
+        self.assertEqual(list(cache.index), ["none"] + AVAILABLE)
+        self.assertEqual(cache.loc["none", "Stored Bytes"], sum(len(body) for body in FILES.values()))
+        self.assertAlmostEqual(cache.loc["none", "Ratio"], 1.0)
+        self.assertAlmostEqual(cache.loc["none", "Load vs Baseline"], 1.0)
+        self.assertGreater(cache.loc["gzip", "Ratio"], 2.0)
+        self.assertTrue((report["Decode MB/s"] > 0).all())
+        self.assertIn("snappy", report.loc[report["Kind"] == "parquet", "Codec"].tolist())
+        self.assertEqual(os.listdir(os.path.join(api.data_directory, "benchmark")), [])
+
+        output = io.StringIO()
+        with redirect_stdout(output):
+            status = cli.main(["compression-report", "-c", "examination", "-y", "2005-2006", "-f", "Body Measures",
+                               "--codec", "none", "--codec", "gzip", "-r", "1", "-d", api.data_directory,
+                               "--base-url", self.server.base_url])
+        self.assertEqual(status, 0)
+        self.assertIn("gzip", output.getvalue())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,150 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.cache import DataCache
+from nhanes_pytool_api.nhanes_data.filelock import FileLock
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.nhanes_data.singleflight import SingleFlight
+from nhanes_pytool_api.tests.helpers import make_variable_table, make_xport_bytes
+
+
+DEMO = pd.DataFrame({"SEQN": [1.0, 2.0, 3.0], "RIAGENDR": [1.0, 2.0, 1.0]})
+TABLE = make_variable_table([(name, "DEMO_D", "Demographic Variables & Sample Weights", "2005-2006") for name in DEMO.columns])
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_calls_share_one_call(self):
+        flights = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def slow(value):
+            calls.append(value)
+            release.wait(5)
+            return value * 2
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(flights.do, "key", slow, 21) for _ in range(8)]
+            time.sleep(0.2)
+            release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(calls, [21])
+        self.assertEqual([value for value, _ in results], [42] * 8)
+        self.assertEqual(sorted(shared for _, shared in results), [False] + [True] * 7)
+
+        # Once finished, the next call runs the function again
+        self.assertEqual(flights.do("key", slow, 1), (2, False))
+
+    def test_exception_is_shared(self):
+        flights = SingleFlight()
+        release = threading.Event()
+
+        def failing():
+            release.wait(5)
+            raise IOError("connection reset")
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(flights.do, "key", failing) for _ in range(4)]
+            time.sleep(0.2)
+            release.set()
+            for future in futures:
+                with self.assertRaises(IOError):
+                    future.result()
+
+
+class TestSharedAPI(unittest.TestCase):
+    def setUp(self):
+        def slow_table(data_category):
+            self.table_calls.append(data_category)
+            time.sleep(0.2)
+            return TABLE
+
+        self.table_calls = []
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", side_effect=slow_table)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = LocalNHANESServer({"/Nchs/Nhanes/2005-2006/DEMO_D.XPT": make_xport_bytes(DEMO)}, delay=0.2).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDataAPI(tempfile.mkdtemp(), base_url=self.server.base_url)
+
+    def test_concurrent_retrievals_fetch_once(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(self.api.retrieve_data, "demographics", "2005-2006",
+                                       "Demographic Variables & Sample Weights") for _ in range(8)]
+            results = [future.result() for future in futures]
+
+        for data in results:
+            self.assertEqual(data["SEQN"].tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(self.table_calls, ["demographics"])
+        self.assertEqual(self.server.requests, ["/Nchs/Nhanes/2005-2006/DEMO_D.XPT"])
+
+    def test_concurrent_probes_fetch_once(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            futures = [executor.submit(self.api.probe_data_file, "2005-2006", "DEMO_D") for _ in range(8)]
+            nobs = [future.result()["nobs"] for future in futures]
+
+        self.assertEqual(nobs, [3] * 8)
+        self.assertEqual(len(self.server.requests), 2)  # The header and the last card, requested once
+
+
+def _fetch_in_process(data_directory, base_url, data_file_names):
+    cache = DataCache(data_directory)
+    return [cache.fetch(f"{base_url}/Nchs/Nhanes/2005-2006/{name}.XPT", "2005-2006", name)[1] for name in data_file_names]
+
+
+def _hold_lock(path, seconds):
+    with FileLock(path):
+        time.sleep(seconds)
+        open(f"{path}.released", "w").close()
+
+
+class TestSharedDataDirectory(unittest.TestCase):
+    def setUp(self):
+        self.files = {f"/Nchs/Nhanes/2005-2006/{name}.XPT": make_xport_bytes(DEMO) for name in ["DEMO_D", "BMX_D", "BPX_D", "GHB_D"]}
+        self.server = LocalNHANESServer(self.files, delay=0.2).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.directory = tempfile.mkdtemp()
+        self.context = multiprocessing.get_context("spawn")
+
+    def test_processes_download_each_file_once(self):
+        names = ["DEMO_D", "BMX_D", "BPX_D", "GHB_D"]
+        with self.context.Pool(4) as pool:
+            # Every process fetches every file, in a different order
+            results = pool.starmap(_fetch_in_process, [(self.directory, self.server.base_url, names[i:] + names[:i]) for i in range(4)])
+
+        self.assertEqual(sorted(self.server.requests), sorted(self.files))
+        self.assertEqual(sum(size > 0 for sizes in results for size in sizes), 4)
+        with open(os.path.join(self.directory, "manifest.json")) as manifest_file:
+            manifest = json.load(manifest_file)
+        self.assertEqual(sorted(manifest), sorted(f"2005-2006/{name}.XPT" for name in names))
+        self.assertFalse([name for _, _, names in os.walk(self.directory) for name in names if name.endswith((".part", ".tmp"))])
+
+    def test_file_lock_excludes_other_processes(self):
+        path = os.path.join(self.directory, "test.lock")
+        process = self.context.Process(target=_hold_lock, args=(path, 2))
+        process.start()
+        self.addCleanup(process.join)
+        deadline = time.monotonic() + 10
+        while not os.path.exists(path) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        time.sleep(0.5)
+
+        with self.assertRaises(TimeoutError):
+            FileLock(path, timeout=0.2).acquire()
+        with FileLock(path, timeout=10):
+            self.assertTrue(os.path.exists(f"{path}.released"))
+
+
+if __name__ == '__main__':
+    unittest.main()
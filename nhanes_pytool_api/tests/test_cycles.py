@@ -0,0 +1,130 @@
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.cycles import CycleDataset
+from nhanes_pytool_api.nhanes_data.dataset import PartitionedDataset
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.tests.helpers import make_variable_table, make_xport_bytes
+
+ROWS = 1500
+rng = np.random.default_rng(5)
+CYCLES = {"2005-2006": "D", "2007-2008": "E", "2009-2010": "F"}
+DEMO = {}
+for index, cycle in enumerate(CYCLES):
+    DEMO[cycle] = pd.DataFrame({"SEQN": np.arange(index * ROWS + 1, (index + 1) * ROWS + 1, dtype=float),
+                                "RIAGENDR": rng.integers(1, 3, ROWS).astype(float),
+                                "RIDAGEYR": rng.integers(0, 86, ROWS).astype(float)})
+DEMO["2007-2008"]["DMDEDUC2"] = rng.integers(1, 6, ROWS).astype(float)
+FILES = {f"/Nchs/Nhanes/{cycle}/DEMO_{suffix}.XPT": make_xport_bytes(DEMO[cycle]) for cycle, suffix in CYCLES.items()}
+TABLES = {"demographics": make_variable_table(
+    [(name, f"DEMO_{CYCLES[cycle]}", "Demographic Variables & Sample Weights", cycle)
+     for cycle in DEMO for name in DEMO[cycle].columns])}
+FILE_DESCRIPTION = "Demographic Variables & Sample Weights"
+
+
+class TestCycleDataset(unittest.TestCase):
+    def setUp(self):
+        self.data_directory = tempfile.mkdtemp()
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", autospec=True,
+                                    side_effect=lambda api, data_category: TABLES.get(data_category))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = LocalNHANESServer(dict(FILES)).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDataAPI(self.data_directory, base_url=self.server.base_url)
+        self.dataset = self.api.retrieve_data("demographics", "2005-2010", FILE_DESCRIPTION, partitioned=True)
+        self.expected = self.api.retrieve_data("demographics", "2005-2010", FILE_DESCRIPTION)
+
+    def test_partitions_are_loaded_lazily(self):
+        api = NHANESDataAPI(tempfile.mkdtemp(), base_url=self.server.base_url)
+        requests = len(self.server.requests)
+        dataset = api.retrieve_data("demographics", "2005-2010", FILE_DESCRIPTION, partitioned=True)
+        self.assertIsInstance(dataset, CycleDataset)
+        self.assertEqual(dataset.partitions, list(CYCLES))
+        self.assertEqual(len(self.server.requests), requests)
+
+        data = dataset.read_partition("2007-2008")
+        self.assertEqual(data["SEQN"].tolist(), DEMO["2007-2008"]["SEQN"].tolist())
+        self.assertEqual(set(data["year"]), {"2007-2008"})
+        self.assertEqual(self.server.requests[requests:], ["/Nchs/Nhanes/2007-2008/DEMO_E.XPT"])
+
+    def test_single_cycle_common_variables(self):
+        dataset = self.api.retrieve_data("demographics", "2007-2008", FILE_DESCRIPTION, partitioned=True,
+                                         include_uncommon_variables=False)
+        self.assertEqual(dataset.partitions, ["2007-2008"])
+        pd.testing.assert_frame_equal(dataset.to_pandas(), self.api.retrieve_data("demographics", "2007-2008", FILE_DESCRIPTION))
+
+    def test_to_pandas_matches_retrieve_data(self):
+        pd.testing.assert_frame_equal(self.dataset.to_pandas(), self.expected, check_like=True)
+        self.assertEqual(self.dataset.columns, list(self.expected.columns))
+        self.assertEqual(len(self.dataset), ROWS * 3)
+
+    def test_map_partitions(self):
+        counts = self.dataset.map_partitions(len)
+        self.assertEqual(counts.to_dict(), {cycle: ROWS for cycle in CYCLES})
+
+        means = self.dataset.map_partitions(lambda data: data[["RIDAGEYR"]].mean(), columns=["RIDAGEYR"])
+        self.assertEqual(list(means.index), list(CYCLES))
+        self.assertAlmostEqual(means.loc["2009-2010", "RIDAGEYR"], DEMO["2009-2010"]["RIDAGEYR"].mean())
+
+        adults = self.dataset.map_partitions(lambda data: data[data["RIDAGEYR"] >= 18])
+        pd.testing.assert_frame_equal(adults, self.expected[self.expected["RIDAGEYR"] >= 18].reset_index(drop=True),
+                                      check_like=True)
+
+    def test_partitions_are_processed_in_parallel(self):
+        # Each call waits for the calls of the other cycles, so this only finishes if they run at the same time
+        barrier = threading.Barrier(len(CYCLES), timeout=10)
+        threads = self.dataset.map_partitions(lambda data: barrier.wait() is not None and threading.get_ident(),
+                                              max_workers=len(CYCLES))
+        self.assertEqual(len(set(threads)), len(CYCLES))
+
+    def test_filter_and_select(self):
+        dataset = self.dataset.filter("year", "in", ["2005-2006", "2009-2010"]).filter("RIAGENDR", "==", 2)
+        dataset = dataset[["SEQN", "RIDAGEYR"]]
+        self.assertEqual(dataset.partitions, ["2005-2006", "2009-2010"])
+
+        data = dataset.to_pandas()
+        expected = self.expected[self.expected["year"].isin(["2005-2006", "2009-2010"]) & (self.expected["RIAGENDR"] == 2)]
+        self.assertEqual(list(data.columns), ["SEQN", "RIDAGEYR", "year"])
+        self.assertEqual(data["SEQN"].tolist(), expected["SEQN"].tolist())
+
+        with self.assertRaises(KeyError):
+            self.dataset.select(["LBXGH"])
+        with self.assertRaises(ValueError):
+            self.dataset.filter("RIDAGEYR", "~", 1)
+
+    def test_aggregate(self):
+        per_cycle = self.dataset.aggregate({"RIDAGEYR": ["mean", "max"], "SEQN": "count"})
+        expected = self.expected.groupby("year").agg(RIDAGEYR_mean=("RIDAGEYR", "mean"), RIDAGEYR_max=("RIDAGEYR", "max"),
+                                                      SEQN=("SEQN", "count")).reset_index()
+        pd.testing.assert_frame_equal(per_cycle, expected, check_dtype=False)
+
+        # Groups spanning all cycles are combined from the per-cycle partial results
+        by_gender = self.dataset.aggregate({"RIDAGEYR": "mean", "DMDEDUC2": "count"}, by="RIAGENDR")
+        expected = self.expected.groupby("RIAGENDR").agg(RIDAGEYR=("RIDAGEYR", "mean"),
+                                                         DMDEDUC2=("DMDEDUC2", "count")).reset_index()
+        pd.testing.assert_frame_equal(by_gender, expected, check_dtype=False)
+
+        with self.assertRaises(ValueError):
+            self.dataset.aggregate({"RIDAGEYR": "mean"}, by="DMDEDUC2")
+
+    def test_lazy_is_not_supported(self):
+        with self.assertRaises(ValueError):
+            self.api.retrieve_data("demographics", "2005-2010", FILE_DESCRIPTION, lazy=True, partitioned=True)
+
+    def test_partitioned_dataset_operations(self):
+        dataset = self.api.retrieve_data("demographics", "2005-2010", FILE_DESCRIPTION, max_memory=1000)
+        self.assertIsInstance(dataset, PartitionedDataset)
+        pd.testing.assert_frame_equal(dataset.aggregate({"RIDAGEYR": "mean"}, by="RIAGENDR"),
+                                      self.dataset.aggregate({"RIDAGEYR": "mean"}, by="RIAGENDR"))
+        self.assertEqual(dataset.map_partitions(len, columns=["SEQN"]).tolist(), [ROWS] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.dataset import PartitionedDataset, parse_memory_size
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.tests.helpers import make_variable_table, make_xport_bytes
+
+
+ROWS = 2000
+rng = np.random.default_rng(0)
+BMX_D = pd.DataFrame({"SEQN": np.arange(1, ROWS + 1, dtype=float), "BMXWT": rng.normal(70, 10, ROWS),
+                      "BMXHT": rng.normal(170, 10, ROWS)})
+BMX_E = pd.DataFrame({"SEQN": np.arange(ROWS + 1, 2 * ROWS + 1, dtype=float), "BMXWT": rng.normal(70, 10, ROWS),
+                      "BMXWAIST": rng.normal(90, 10, ROWS)})
+DEMO_D = pd.DataFrame({"SEQN": np.arange(1, ROWS + 1, 2, dtype=float), "RIAGENDR": rng.integers(1, 3, ROWS // 2).astype(float)})
+
+FILES = {
+    "/Nchs/Nhanes/2005-2006/BMX_D.XPT": make_xport_bytes(BMX_D),
+    "/Nchs/Nhanes/2007-2008/BMX_E.XPT": make_xport_bytes(BMX_E),
+    "/Nchs/Nhanes/2005-2006/DEMO_D.XPT": make_xport_bytes(DEMO_D),
+}
+
+TABLES = {
+    "examination": make_variable_table(
+        [(name, "BMX_D", "Body Measures", "2005-2006") for name in BMX_D.columns]
+        + [(name, "BMX_E", "Body Measures", "2007-2008") for name in BMX_E.columns]),
+    "demographics": make_variable_table(
+        [(name, "DEMO_D", "Demographic Variables & Sample Weights", "2005-2006") for name in DEMO_D.columns]),
+}
+
+
+class TestMemoryBudget(unittest.TestCase):
+    def setUp(self):
+        self.data_directory = tempfile.mkdtemp()
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", autospec=True,
+                                    side_effect=lambda api, data_category: TABLES.get(data_category))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = LocalNHANESServer(FILES).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDataAPI(self.data_directory, base_url=self.server.base_url)
+
+    def test_parse_memory_size(self):
+        self.assertEqual(parse_memory_size(1000), 1000)
+        self.assertEqual(parse_memory_size("512MB"), 512 * 1024 ** 2)
+        self.assertEqual(parse_memory_size("2 GB"), 2 * 1024 ** 3)
+        with self.assertRaises(ValueError):
+            parse_memory_size("a lot")
+
+    def test_retrieve_data_within_budget_returns_dataframe(self):
+        data = self.api.retrieve_data("examination", "2005-2008", "Body Measures", max_memory="1GB")
+        self.assertIsInstance(data, pd.DataFrame)
+        self.assertEqual(len(data), 2 * ROWS)
+
+    def test_retrieve_data_over_budget_spills_to_disk(self):
+        expected = self.api.retrieve_data("examination", "2005-2008", "Body Measures")
+        dataset = self.api.retrieve_data("examination", "2005-2008", "Body Measures", max_memory=20000)
+
+        self.assertIsInstance(dataset, PartitionedDataset)
+        self.assertEqual(dataset.partitions, ["2005-2006", "2007-2008"])
+        self.assertEqual(len(dataset), 2 * ROWS)
+        self.assertEqual(dataset.columns, list(expected.columns))
+        pd.testing.assert_frame_equal(dataset.to_pandas(), expected, check_dtype=False)
+        pd.testing.assert_frame_equal(dataset.head(3), expected.head(3), check_dtype=False)
+        self.assertEqual(list(dataset.to_pandas(columns=["SEQN", "BMXWT"]).columns), ["SEQN", "BMXWT"])
+
+    def test_retrieve_data_over_budget_common_variables(self):
+        dataset = self.api.retrieve_data("examination", "2005-2008", "Body Measures", include_uncommon_variables=False,
+                                         max_memory=20000)
+        self.assertEqual(sorted(dataset.columns), ["BMXWT", "SEQN", "year"])
+
+    def test_budget_counts_only_the_selected_columns(self):
+        # Two numeric columns and 'year' take about 4000 * 33 bytes, all four columns about 4000 * 49 bytes
+        data = self.api.retrieve_data("examination", "2005-2008", "Body Measures", include_uncommon_variables=False,
+                                      max_memory=150000)
+        self.assertIsInstance(data, pd.DataFrame)
+        dataset = self.api.retrieve_data("examination", "2005-2008", "Body Measures", max_memory=150000)
+        self.assertIsInstance(dataset, PartitionedDataset)
+
+    def test_budget_decision_does_not_download(self):
+        data_files = [("2005-2006", "BMX_D"), ("2007-2008", "BMX_E")]
+        self.assertIsNone(self.api._spill_if_over_budget(data_files, None, "1GB"))
+        self.assertEqual(len(self.server.requests), len(self.server.range_requests))
+
+    def test_spilled_dataset_cleanup(self):
+        with self.api.retrieve_data("examination", "2005-2008", "Body Measures", max_memory=20000) as dataset:
+            self.assertEqual(len(dataset), 2 * ROWS)
+        self.assertFalse(os.path.exists(dataset.directory))
+
+    def test_join_data_files_over_budget(self):
+        expected = self.api.join_data_files("2005-2006", "examination", "Body Measures", "demographics",
+                                            "Demographic Variables & Sample Weights")
+        dataset = self.api.join_data_files("2005-2006", "examination", "Body Measures", "demographics",
+                                           "Demographic Variables & Sample Weights", max_memory=60000)
+
+        self.assertIsInstance(dataset, PartitionedDataset)
+        joined = dataset.to_pandas()
+        self.assertEqual(list(joined.columns), list(expected.columns))
+        pd.testing.assert_frame_equal(joined.sort_values("SEQN", ignore_index=True),
+                                      expected.sort_values("SEQN", ignore_index=True), check_dtype=False)
+        self.assertEqual(os.listdir(os.path.join(self.data_directory, "spill")), [os.path.basename(dataset.directory)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+from nhanes_pytool_api.nhanes_data.cache import DataCache
+from nhanes_pytool_api.nhanes_data.download import download_file, file_sha256
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+
+
+BODY = bytes(range(256)) * 40  # 10240 bytes
+URL_PATH = "/Nchs/Nhanes/2005-2006/DR1IFF_D.XPT"
+
+
+class TestDownload(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "DR1IFF_D.XPT")
+
+    def test_download_resumes_dropped_connections(self):
+        with LocalNHANESServer({URL_PATH: BODY}, cut_after=3000) as server:
+            result = download_file(server.base_url + URL_PATH, self.path, retries=5, backoff=0)
+
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), BODY)
+        self.assertEqual(result["size"], len(BODY))
+        self.assertEqual(result["sha256"], file_sha256(self.path))
+        self.assertEqual([start for _, start in server.range_requests], [3000, 6000, 9000])
+        self.assertFalse(os.path.exists(self.path + ".part"))
+
+    def test_download_gives_up_after_retries(self):
+        with LocalNHANESServer({URL_PATH: BODY}, cut_after=1000) as server:
+            with self.assertRaises(IOError):
+                download_file(server.base_url + URL_PATH, self.path, retries=2, backoff=0)
+
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(os.path.getsize(self.path + ".part"), 3000)
+
+        # A later run picks up the partial file where the previous one stopped
+        with LocalNHANESServer({URL_PATH: BODY}, port=server.port) as server:
+            result = download_file(server.base_url + URL_PATH, self.path, backoff=0)
+        self.assertEqual(server.range_requests, [(URL_PATH, 3000)])
+        self.assertEqual(result["downloaded"], len(BODY) - 3000)
+
+    def test_download_restarts_when_remote_file_changed(self):
+        with LocalNHANESServer({URL_PATH: BODY}, cut_after=1000) as server:
+            with self.assertRaises(IOError):
+                download_file(server.base_url + URL_PATH, self.path, retries=0, backoff=0)
+
+        new_body = BODY[::-1]
+        with LocalNHANESServer({URL_PATH: new_body}, port=server.port) as server:
+            download_file(server.base_url + URL_PATH, self.path, backoff=0)
+        with open(self.path, "rb") as f:
+            self.assertEqual(f.read(), new_body)
+        self.assertEqual(server.range_requests, [])
+
+    def test_cache_redownloads_corrupted_file(self):
+        cache = DataCache(self.directory, retries=0)
+        with LocalNHANESServer({URL_PATH: BODY}) as server:
+            url = server.base_url + URL_PATH
+            path, size = cache.fetch(url, "2005-2006", "DR1IFF_D")
+            self.assertEqual(size, len(BODY))
+            self.assertEqual(cache.read_manifest()["2005-2006/DR1IFF_D.XPT"]["sha256"], file_sha256(path))
+
+            with open(path, "r+b") as f:
+                f.write(b"corrupt")
+            self.assertFalse(DataCache(self.directory).verify("2005-2006", "DR1IFF_D"))
+
+            cache = DataCache(self.directory)
+            _, size = cache.fetch(url, "2005-2006", "DR1IFF_D", verify=True)
+            self.assertEqual(size, len(BODY))
+            self.assertTrue(cache.verify("2005-2006", "DR1IFF_D"))
+
+
+if __name__ == '__main__':
+    unittest.main()
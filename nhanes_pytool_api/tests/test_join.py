@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.dataset import PartitionedDataset
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.tests.helpers import make_variable_table, make_xport_bytes
+
+ROWS = 1000
+rng = np.random.default_rng(1)
+CYCLES = {"2005-2006": "D", "2007-2008": "E", "2009-2010": "F"}
+BMX = {}
+DEMO = {}
+for index, (cycle, suffix) in enumerate(CYCLES.items()):
+    seqn = np.arange(index * ROWS + 1, (index + 1) * ROWS + 1, dtype=float)
+    BMX[cycle] = pd.DataFrame({"SEQN": seqn, "BMXWT": rng.normal(70, 10, ROWS)})
+    if cycle == "2007-2008":
+        BMX[cycle]["BMXWAIST"] = rng.normal(90, 10, ROWS)
+    # Demographics are only available for the first two cycles
+    if cycle != "2009-2010":
+        DEMO[cycle] = pd.DataFrame({"SEQN": seqn[::2], "RIAGENDR": rng.integers(1, 3, ROWS // 2).astype(float)})
+
+FILES = {}
+for cycle, suffix in CYCLES.items():
+    FILES[f"/Nchs/Nhanes/{cycle}/BMX_{suffix}.XPT"] = make_xport_bytes(BMX[cycle])
+    if cycle in DEMO:
+        FILES[f"/Nchs/Nhanes/{cycle}/DEMO_{suffix}.XPT"] = make_xport_bytes(DEMO[cycle])
+
+TABLES = {
+    "examination": make_variable_table(
+        [(name, f"BMX_{CYCLES[cycle]}", "Body Measures", cycle) for cycle in BMX for name in BMX[cycle].columns]),
+    "demographics": make_variable_table(
+        [(name, f"DEMO_{CYCLES[cycle]}", "Demographic Variables & Sample Weights", cycle)
+         for cycle in DEMO for name in DEMO[cycle].columns]),
+}
+
+
+class TestMultiCycleJoin(unittest.TestCase):
+    def setUp(self):
+        self.data_directory = tempfile.mkdtemp()
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", autospec=True,
+                                    side_effect=lambda api, data_category: TABLES.get(data_category))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = LocalNHANESServer(FILES).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDataAPI(self.data_directory, base_url=self.server.base_url)
+
+    def join(self, cycle_year, **kwargs):
+        return self.api.join_data_files(cycle_year, "examination", "Body Measures", "demographics",
+                                        "Demographic Variables & Sample Weights", **kwargs)
+
+    def test_join_matches_per_cycle_joins(self):
+        joined = self.join("2005-2010", max_workers=2)
+
+        expected = []
+        for cycle in ["2005-2006", "2007-2008"]:
+            frame = self.join(cycle)
+            frame["year"] = cycle
+            expected.append(frame)
+        expected = pd.concat(expected, ignore_index=True)
+
+        self.assertEqual(list(joined.columns), ["SEQN", "BMXWT", "RIAGENDR", "BMXWAIST", "year"])
+        self.assertEqual(list(joined["year"].unique()), ["2005-2006", "2007-2008"])
+        pd.testing.assert_frame_equal(joined[expected.columns], expected, check_dtype=False)
+
+    def test_join_common_variables(self):
+        joined = self.join(["2005-2006", "2007-2008"], include_uncommon_variables=False)
+        self.assertEqual(list(joined.columns), ["SEQN", "BMXWT", "RIAGENDR", "year"])
+        self.assertEqual(len(joined), ROWS)
+
+    def test_join_over_budget_writes_one_partition_per_cycle(self):
+        expected = self.join("2005-2010")
+        dataset = self.join("2005-2010", max_memory=10000)
+
+        self.assertIsInstance(dataset, PartitionedDataset)
+        self.assertEqual(dataset.partitions, ["2005-2006", "2007-2008"])
+        pd.testing.assert_frame_equal(dataset.to_pandas()[expected.columns], expected, check_dtype=False)
+
+    def test_join_spills_only_the_cycles_over_budget(self):
+        expected = self.join("2005-2010")
+        # The decoded 2007-2008 body measures (3 columns and 'year') exceed a third of the budget, the other inputs do not
+        dataset = self.join("2005-2010", max_memory=120000)
+
+        self.assertIsInstance(dataset, PartitionedDataset)
+        self.assertEqual(dataset.partitions, ["2005-2006", "2007-2008"])
+        pd.testing.assert_frame_equal(dataset.to_pandas()[expected.columns], expected, check_dtype=False)
+        self.assertEqual(os.listdir(os.path.join(self.data_directory, "spill")), [os.path.basename(dataset.directory)])
+
+    def test_join_limits_the_cycles_in_flight(self):
+        with mock.patch("nhanes_pytool_api.nhanes_data.nhanes_data_api.ThreadPoolExecutor", wraps=ThreadPoolExecutor) as executor:
+            joined = self.join("2005-2010", max_memory=200000, max_workers=4)
+        self.assertIsInstance(joined, pd.DataFrame)
+        self.assertEqual(executor.call_args.kwargs["max_workers"], 1)
+
+    def test_failed_join_deletes_the_spilled_data(self):
+        with mock.patch.object(NHANESDataAPI, "_assemble_data_files", side_effect=RuntimeError("decode failed")):
+            with self.assertRaises(ValueError):
+                self.join("2005-2010", max_memory=60000)
+        self.assertEqual(os.listdir(os.path.join(self.data_directory, "spill")), [])
+
+    def test_join_without_common_cycles_raises(self):
+        with self.assertRaises(ValueError):
+            self.join(["2009-2010", "2011-2012"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.dataset import PartitionedDataset
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.tests.helpers import make_variable_table, make_xport_bytes
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "DEMO_D.htm")
+ROWS = 1000
+rng = np.random.default_rng(3)
+
+
+def make_demo(first_seqn):
+    education = rng.choice([1, 2, 3, 4, 5, 7, 9, np.nan], ROWS)
+    return pd.DataFrame({
+        "SEQN": np.arange(first_seqn, first_seqn + ROWS, dtype=float),
+        "RIAGENDR": rng.integers(1, 3, ROWS).astype(float),
+        "RIDAGEYR": rng.integers(0, 86, ROWS).astype(float),
+        "DMDEDUC2": education,
+    })
+
+
+DEMO_D = make_demo(1)
+DEMO_E = make_demo(ROWS + 1)
+BMX_D = pd.DataFrame({"SEQN": DEMO_D["SEQN"], "BMXWT": rng.normal(70, 10, ROWS)})
+
+with open(FIXTURE, "r", encoding="utf-8") as f:
+    DEMO_D_DOC = f.read()
+# The labels of a code may change between cycles
+DEMO_E_DOC = DEMO_D_DOC.replace("Less Than 9th Grade", "Less than 9th grade")
+
+FILES = {
+    "/Nchs/Nhanes/2005-2006/DEMO_D.XPT": make_xport_bytes(DEMO_D),
+    "/Nchs/Nhanes/2007-2008/DEMO_E.XPT": make_xport_bytes(DEMO_E),
+    "/Nchs/Nhanes/2005-2006/BMX_D.XPT": make_xport_bytes(BMX_D),
+    "/Nchs/Nhanes/2005-2006/DEMO_D.htm": DEMO_D_DOC.encode("utf-8"),
+    "/Nchs/Nhanes/2007-2008/DEMO_E.htm": DEMO_E_DOC.encode("utf-8"),
+    "/Nchs/Nhanes/2005-2006/BMX_D.htm": b"<html><body><h3 id=\"BMXWT\">BMXWT</h3><dl><dt>Variable Name: </dt>"
+                                        b"<dd>BMXWT</dd></dl><table><tr><th>Code or Value</th><th>Value Description</th>"
+                                        b"</tr><tr><td>3.1 to 193.3</td><td>Range of Values</td></tr></table></body></html>",
+}
+
+TABLES = {
+    "demographics": make_variable_table(
+        [(name, "DEMO_D", "Demographic Variables & Sample Weights", "2005-2006") for name in DEMO_D.columns]
+        + [(name, "DEMO_E", "Demographic Variables & Sample Weights", "2007-2008") for name in DEMO_E.columns]),
+    "examination": make_variable_table([(name, "BMX_D", "Body Measures", "2005-2006") for name in BMX_D.columns]),
+}
+
+EDUCATION = {1: "Less Than 9th Grade", 2: "9-11th Grade (Includes 12th grade with no diploma)",
+             3: "High School Grad/GED or Equivalent", 4: "Some College or AA degree", 5: "College Graduate or above"}
+
+
+class TestDecodeLabels(unittest.TestCase):
+    def setUp(self):
+        self.data_directory = tempfile.mkdtemp()
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", autospec=True,
+                                    side_effect=lambda api, data_category: TABLES.get(data_category))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = LocalNHANESServer(FILES).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDataAPI(self.data_directory, base_url=self.server.base_url)
+
+    def test_retrieve_data_decodes_labels(self):
+        data = self.api.retrieve_data("demographics", "2005-2006", "Demographic Variables & Sample Weights",
+                                      decode_labels=True)
+
+        self.assertIsInstance(data["RIAGENDR"].dtype, pd.CategoricalDtype)
+        self.assertEqual(list(data["RIAGENDR"].cat.categories), ["Male", "Female"])
+        self.assertEqual(data["RIAGENDR"].tolist(), DEMO_D["RIAGENDR"].map({1: "Male", 2: "Female"}).tolist())
+
+        # Refused (7) and don't know (9) become NaN in the same pass
+        expected = DEMO_D["DMDEDUC2"].map(EDUCATION)
+        self.assertEqual(data["DMDEDUC2"].isna().tolist(), expected.isna().tolist())
+        self.assertEqual(data["DMDEDUC2"].dropna().tolist(), expected.dropna().tolist())
+
+        # Variables with ranges of values and without value labels stay numeric
+        pd.testing.assert_series_equal(data["RIDAGEYR"], DEMO_D["RIDAGEYR"], check_dtype=False)
+        pd.testing.assert_series_equal(data["SEQN"], DEMO_D["SEQN"], check_dtype=False)
+
+    def test_multiple_cycles_share_categories(self):
+        data = self.api.retrieve_data("demographics", "2005-2008", "Demographic Variables & Sample Weights",
+                                      decode_labels=True)
+        self.assertIn("Less than 9th grade", data["DMDEDUC2"].cat.categories)
+        first = data.loc[data["year"] == "2005-2006", "DMDEDUC2"]
+        second = data.loc[data["year"] == "2007-2008", "DMDEDUC2"]
+        self.assertEqual((first == "Less Than 9th Grade").sum(), (DEMO_D["DMDEDUC2"] == 1).sum())
+        self.assertEqual((second == "Less than 9th grade").sum(), (DEMO_E["DMDEDUC2"] == 1).sum())
+        self.assertFalse((second == "Less Than 9th Grade").any())
+
+    def test_spilled_data_is_decoded(self):
+        expected = self.api.retrieve_data("demographics", "2005-2008", "Demographic Variables & Sample Weights",
+                                          decode_labels=True)
+        dataset = self.api.retrieve_data("demographics", "2005-2008", "Demographic Variables & Sample Weights",
+                                         decode_labels=True, max_memory=10000)
+        self.assertIsInstance(dataset, PartitionedDataset)
+        spilled = dataset.to_pandas()
+        self.assertEqual(spilled["RIAGENDR"].astype(object).tolist(), expected["RIAGENDR"].astype(object).tolist())
+
+    def test_join_data_files_decodes_labels(self):
+        joined = self.api.join_data_files("2005-2006", "demographics", "Demographic Variables & Sample Weights",
+                                          "examination", "Body Measures", decode_labels=True)
+        self.assertIsInstance(joined["RIAGENDR"].dtype, pd.CategoricalDtype)
+        self.assertEqual(joined["BMXWT"].dtype, np.float64)
+        self.assertEqual(len(joined), ROWS)
+
+    def test_lazy_is_not_supported(self):
+        with self.assertRaises(ValueError):
+            self.api.retrieve_data("demographics", "2005-2006", "Demographic Variables & Sample Weights", lazy=True,
+                                   decode_labels=True)
+
+    def test_codebooks_are_parsed_once(self):
+        for _ in range(2):
+            self.api.retrieve_data("demographics", "2005-2006", "Demographic Variables & Sample Weights",
+                                   decode_labels=True)
+        self.assertEqual(self.server.requests.count("/Nchs/Nhanes/2005-2006/DEMO_D.htm"), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.lazy import LazyDataset
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.tests.helpers import make_variable_table, make_xport_bytes
+
+
+DEMO = {
+    "2005-2006": pd.DataFrame({"SEQN": [1.0, 2.0, 3.0, 4.0], "RIAGENDR": [1.0, 2.0, 1.0, 2.0],
+                               "RIDAGEYR": [10.0, 40.0, 70.0, 25.0]}),
+    "2007-2008": pd.DataFrame({"SEQN": [5.0, 6.0, 7.0], "RIAGENDR": [2.0, 2.0, 1.0],
+                               "RIDAGEYR": [30.0, 5.0, 60.0], "DMDHRGND": [1.0, np.nan, 2.0]}),
+    "2009-2010": pd.DataFrame({"SEQN": [8.0, 9.0], "RIAGENDR": [1.0, 2.0], "RIDAGEYR": [50.0, 15.0]}),
+}
+SUFFIXES = {"2005-2006": "D", "2007-2008": "E", "2009-2010": "F"}
+FILES = {f"/Nchs/Nhanes/{cycle}/DEMO_{SUFFIXES[cycle]}.XPT": make_xport_bytes(frame) for cycle, frame in DEMO.items()}
+TABLE = make_variable_table([(name, f"DEMO_{SUFFIXES[cycle]}", "Demographic Variables & Sample Weights", cycle)
+                             for cycle, frame in DEMO.items() for name in frame.columns])
+
+
+class TestLazyDataset(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", return_value=TABLE)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = LocalNHANESServer(FILES).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDataAPI(tempfile.mkdtemp(), base_url=self.server.base_url)
+        self.lazy = self.api.retrieve_data("demographics", "2005-2010", "Demographic Variables & Sample Weights", lazy=True)
+
+    def downloads(self):
+        """The requested paths, without the Range requests of header probes."""
+        downloads = list(self.server.requests)
+        for path, _ in self.server.range_requests:
+            downloads.remove(path)
+        return downloads
+
+    def test_plan_without_download(self):
+        self.assertIsInstance(self.lazy, LazyDataset)
+        self.assertEqual(self.lazy.cycles, ["2005-2006", "2007-2008", "2009-2010"])
+        self.assertEqual(self.lazy.file_names, ["DEMO_D", "DEMO_E", "DEMO_F"])
+        self.assertEqual(self.server.requests, [])
+        self.assertEqual(self.lazy.columns, ["SEQN", "RIAGENDR", "RIDAGEYR", "DMDHRGND", "year"])
+        self.assertEqual(self.downloads(), [])
+
+    def test_collect_matches_retrieve_data(self):
+        expected = self.api.retrieve_data("demographics", "2005-2010", "Demographic Variables & Sample Weights")
+        pd.testing.assert_frame_equal(self.lazy.collect(), expected)
+
+    def test_select_and_filter(self):
+        data = self.lazy[["SEQN", "RIDAGEYR"]].filter("RIDAGEYR", ">=", 18).filter("RIAGENDR", "==", 2).collect()
+        self.assertEqual(list(data.columns), ["SEQN", "RIDAGEYR"])
+        self.assertEqual(data["SEQN"].tolist(), [2.0, 4.0, 5.0])
+
+        with self.assertRaises(KeyError):
+            self.lazy.select(["LBXGH"])
+        with self.assertRaises(ValueError):
+            self.lazy.filter("RIDAGEYR", "~", 18)
+
+    def test_year_filter_prunes_downloads(self):
+        data = self.lazy.filter("year", "in", ["2007-2008"]).select(["SEQN", "year"]).collect()
+        self.assertEqual(data["SEQN"].tolist(), [5.0, 6.0, 7.0])
+        self.assertEqual(self.downloads(), ["/Nchs/Nhanes/2007-2008/DEMO_E.XPT"])
+
+    def test_head_downloads_only_needed_files(self):
+        head = self.lazy.head(3)
+        self.assertEqual(head["SEQN"].tolist(), [1.0, 2.0, 3.0])
+        self.assertEqual(self.downloads(), ["/Nchs/Nhanes/2005-2006/DEMO_D.XPT"])
+
+    def test_common_variables_plan(self):
+        lazy = self.api.retrieve_data("demographics", "2005-2010", "Demographic Variables & Sample Weights",
+                                      include_uncommon_variables=False, lazy=True)
+        self.assertEqual(lazy.columns, ["SEQN", "RIAGENDR", "RIDAGEYR", "year"])
+        self.assertEqual(len(lazy.collect()), 9)
+
+    def test_columns_come_from_the_data_file_headers(self):
+        table = make_variable_table([("SEQN", "DEMO_D", "Demographic Variables & Sample Weights", "2005-2006"),
+                                     ("RIAGENDR", "DEMO_D", "Demographic Variables & Sample Weights", "2005-2006"),
+                                     ("LBXGH", "DEMO_D", "Demographic Variables & Sample Weights", "2005-2006")])
+        with mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", return_value=table):
+            api = NHANESDataAPI(tempfile.mkdtemp(), base_url=self.server.base_url)
+            lazy = api.retrieve_data("demographics", "2005-2006", "Demographic Variables & Sample Weights", lazy=True)
+        self.assertEqual(lazy.columns, ["SEQN", "RIAGENDR", "RIDAGEYR", "year"])
+        self.assertEqual(lazy.select(["SEQN", "RIDAGEYR"]).collect()["RIDAGEYR"].tolist(), [10.0, 40.0, 70.0, 25.0])
+        with self.assertRaises(KeyError):
+            lazy.select(["LBXGH"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.mart import AnalysisMart, MartDefinition
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.tests.helpers import make_variable_table, make_xport_bytes
+
+ROWS = 800
+rng = np.random.default_rng(3)
+CYCLES = {"2005-2006": "D", "2007-2008": "E", "2009-2010": "F"}
+DEMO = {}
+BMX = {}
+TCHOL = {}
+for index, cycle in enumerate(CYCLES):
+    seqn = np.arange(index * ROWS + 1, (index + 1) * ROWS + 1, dtype=float)
+    DEMO[cycle] = pd.DataFrame({"SEQN": seqn, "RIAGENDR": rng.integers(1, 3, ROWS).astype(float),
+                                "RIDAGEYR": rng.integers(0, 86, ROWS).astype(float),
+                                "WTMEC2YR": rng.uniform(1000, 50000, ROWS)})
+    BMX[cycle] = pd.DataFrame({"SEQN": rng.permutation(seqn)[:ROWS - 100], "BMXWT": rng.normal(70, 15, ROWS - 100),
+                               "BMXHT": rng.normal(165, 10, ROWS - 100)})
+    # Cholesterol was only measured in the last two cycles; WTMEC2YR is also in the demographics
+    if index:
+        TCHOL[cycle] = pd.DataFrame({"SEQN": seqn[::3], "LBXTC": rng.normal(190, 40, len(seqn[::3])),
+                                     "WTMEC2YR": rng.uniform(1000, 50000, len(seqn[::3]))})
+FILES = {}
+for cycle, suffix in CYCLES.items():
+    FILES[f"/Nchs/Nhanes/{cycle}/DEMO_{suffix}.XPT"] = make_xport_bytes(DEMO[cycle])
+    FILES[f"/Nchs/Nhanes/{cycle}/BMX_{suffix}.XPT"] = make_xport_bytes(BMX[cycle])
+    if cycle in TCHOL:
+        FILES[f"/Nchs/Nhanes/{cycle}/TCHOL_{suffix}.XPT"] = make_xport_bytes(TCHOL[cycle])
+TABLES = {
+    "demographics": make_variable_table([(name, f"DEMO_{CYCLES[cycle]}", "Demographic Variables & Sample Weights", cycle)
+                                         for cycle in DEMO for name in DEMO[cycle].columns]),
+    "examination": make_variable_table([(name, f"BMX_{CYCLES[cycle]}", "Body Measures", cycle)
+                                        for cycle in BMX for name in BMX[cycle].columns]),
+    "laboratory": make_variable_table([(name, f"TCHOL_{CYCLES[cycle]}", "Cholesterol - Total", cycle)
+                                       for cycle in TCHOL for name in TCHOL[cycle].columns]),
+}
+DEFINITION = MartDefinition("cardiometabolic", [
+    ("demographics", "Demographic Variables & Sample Weights", ["RIAGENDR", "RIDAGEYR", "WTMEC2YR"]),
+    ("examination", "Body Measures", ["BMXWT"]),
+    {"data_category": "laboratory", "filename": "Cholesterol - Total"},
+])
+
+
+class TestMartDefinition(unittest.TestCase):
+    def test_round_trip(self):
+        definition = MartDefinition.from_dict(json.loads(json.dumps(DEFINITION.to_dict())))
+        self.assertEqual(definition, DEFINITION)
+        self.assertEqual(definition.tables[1], {"data_category": "examination", "filename": "Body Measures", "columns": ["BMXWT"]})
+        self.assertNotEqual(definition.fingerprint([("DEMO_D", "a")]), definition.fingerprint([("DEMO_D", "b")]))
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            MartDefinition("../mart", DEFINITION.tables)
+        with self.assertRaises(ValueError):
+            MartDefinition("mart", [])
+        with self.assertRaises(ValueError):
+            MartDefinition("mart", [("demographics",)])
+        with self.assertRaises(ValueError):
+            MartDefinition("mart", DEFINITION.tables, how="outer")
+
+
+class TestBuildMart(unittest.TestCase):
+    def setUp(self):
+        self.data_directory = tempfile.mkdtemp()
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", autospec=True,
+                                    side_effect=lambda api, data_category: TABLES.get(data_category))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = LocalNHANESServer(dict(FILES)).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDataAPI(self.data_directory, base_url=self.server.base_url)
+
+    def expected(self, cycle):
+        data = DEMO[cycle][["SEQN", "RIAGENDR", "RIDAGEYR", "WTMEC2YR"]]
+        data = data.merge(BMX[cycle][["SEQN", "BMXWT"]], on="SEQN", how="left")
+        data = data.merge(TCHOL[cycle][["SEQN", "LBXTC"]], on="SEQN", how="left")
+        data["year"] = cycle
+        return data
+
+    def test_build_and_load(self):
+        mart = self.api.build_mart(DEFINITION, "2005-2010")
+        self.assertIsInstance(mart, AnalysisMart)
+        # The first cycle has no cholesterol data file
+        self.assertEqual(mart.partitions, ["2007-2008", "2009-2010"])
+        self.assertEqual(mart.built, ["2007-2008", "2009-2010"])
+
+        requests = len(self.server.requests)
+        loaded = NHANESDataAPI(self.data_directory, base_url=self.server.base_url).load_mart("cardiometabolic")
+        self.assertEqual(loaded.definition, DEFINITION)
+        for cycle in ["2007-2008", "2009-2010"]:
+            pd.testing.assert_frame_equal(loaded.read_partition(cycle), self.expected(cycle))
+        self.assertEqual(len(self.server.requests), requests)
+
+        with self.assertRaises(ValueError):
+            self.api.load_mart("missing")
+
+    def test_incremental_rebuild(self):
+        self.api.build_mart(DEFINITION, "2007-2008")
+        mart = self.api.build_mart(DEFINITION, "2007-2010")
+        self.assertEqual(mart.built, ["2009-2010"])
+        self.assertEqual(self.api.build_mart(DEFINITION, "2007-2010").built, [])
+
+        # A data file downloaded again with other contents rebuilds only its cycle
+        changed = BMX["2009-2010"].assign(BMXWT=BMX["2009-2010"]["BMXWT"] + 1)
+        self.api._cache.add_file("2009-2010", "BMX_F", io.BytesIO(make_xport_bytes(changed)))
+        mart = self.api.build_mart(DEFINITION, "2007-2010")
+        self.assertEqual(mart.built, ["2009-2010"])
+        expected = self.expected("2009-2010")
+        expected["BMXWT"] = expected["BMXWT"] + 1
+        pd.testing.assert_frame_equal(mart.read_partition("2009-2010"), expected)
+        self.assertEqual(mart.read_state()["partitions"]["2009-2010"]["data_files"], ["DEMO_F", "BMX_F", "TCHOL_F"])
+
+    def test_changed_definition_rebuilds_everything(self):
+        self.api.build_mart(DEFINITION, "2007-2010")
+        definition = MartDefinition("cardiometabolic", DEFINITION.tables[:2], how="inner")
+        mart = self.api.build_mart(definition.to_dict(), "2009-2010")
+        self.assertEqual(mart.built, ["2009-2010"])
+        self.assertEqual(mart.partitions, ["2009-2010"])
+        data = mart.to_pandas()
+        self.assertEqual(list(data.columns), ["SEQN", "RIAGENDR", "RIDAGEYR", "WTMEC2YR", "BMXWT", "year"])
+        self.assertEqual(len(data), ROWS - 100)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.api.build_mart(DEFINITION, "2005-2006")
+        with self.assertRaises(ValueError):
+            self.api.build_mart(MartDefinition("mart", [("questionnaire", "Smoking")]), "2005-2010")
+        self.assertFalse(os.path.exists(os.path.join(self.data_directory, "marts", "mart", "mart.json")))
+
+
+if __name__ == '__main__':
+    unittest.main()
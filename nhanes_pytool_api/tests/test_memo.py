@@ -0,0 +1,166 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from nhanes_pytool_api.nhanes_data.catalog import VariableCatalog
+from nhanes_pytool_api.nhanes_data.memo import MemoCache
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.tests.helpers import make_variable_table
+
+TABLES = {
+    "demographics": make_variable_table([
+        ("SEQN", "DEMO_D", "Demographic Variables & Sample Weights", "2005-2006"),
+        ("RIAGENDR", "DEMO_D", "Demographic Variables & Sample Weights", "2005-2006"),
+        ("SEQN", "DEMO_E", "Demographic Variables & Sample Weights", "2007-2008"),
+        ("RIAGENDR", "DEMO_E", "Demographic Variables & Sample Weights", "2007-2008"),
+        ("DMDHRGND", "DEMO_E", "Demographic Variables & Sample Weights", "2007-2008"),
+    ]),
+    "laboratory": make_variable_table([
+        ("SEQN", "GHB_D", "Glycohemoglobin", "2005-2006"),
+        ("SEQN", "GHB_E", "Glycohemoglobin", "2007-2008"),
+        ("SEQN", "CRP_D", "C-Reactive Protein (CRP)", "2005-2006"),
+    ]),
+}
+REVISED_LABORATORY = make_variable_table([
+    ("SEQN", "GHB_D", "Glycohemoglobin", "2005-2006"),
+    ("SEQN", "GHB_E", "Glycohemoglobin", "2007-2008"),
+    ("SEQN", "CRP_E", "C-Reactive Protein (CRP)", "2007-2008"),
+])
+
+
+class TestMemoCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        memo = MemoCache(max_entries=2)
+        memo.get_or_compute(("a",), lambda: 1)
+        memo.get_or_compute(("b",), lambda: 2)
+        memo.get_or_compute(("a",), lambda: None)  # "a" is now the most recently used
+        memo.get_or_compute(("c",), lambda: 3)
+        self.assertEqual(memo.get_or_compute(("a",), lambda: None), 1)
+        self.assertEqual(memo.get_or_compute(("b",), lambda: "recomputed"), "recomputed")
+        self.assertEqual(memo.stats(), {"entries": 2, "max_entries": 2, "hits": 2, "misses": 4, "evictions": 2})
+
+    def test_results_are_copied(self):
+        memo = MemoCache()
+        memo.get_or_compute(("files",), lambda: ["a", "b"]).append("c")
+        self.assertEqual(memo.get_or_compute(("files",), lambda: None), ["a", "b"])
+
+    def test_errors_are_not_memoized(self):
+        memo = MemoCache()
+        with self.assertRaises(ValueError):
+            memo.get_or_compute(("key",), mock.Mock(side_effect=ValueError))
+        self.assertEqual(memo.get_or_compute(("key",), lambda: 1), 1)
+
+    def test_concurrent_misses_compute_once(self):
+        memo = MemoCache()
+        compute = mock.Mock(side_effect=lambda: time.sleep(0.1) or 42)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(memo.get_or_compute(("slow",), compute))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [42] * 5)
+        self.assertEqual(compute.call_count, 1)
+
+    def test_invalidate(self):
+        memo = MemoCache()
+        memo.get_or_compute(("file_names", "laboratory", "hash"), lambda: 1)
+        memo.get_or_compute(("file_names", "demographics", "hash"), lambda: 2)
+        self.assertEqual(memo.invalidate(lambda key: key[1] == "laboratory"), 1)
+        self.assertEqual(len(memo), 1)
+        self.assertEqual(memo.invalidate(), 1)
+
+    def test_save_and_load(self):
+        path = os.path.join(tempfile.mkdtemp(), "memo.json")
+        memo = MemoCache()
+        for index in range(3):
+            memo.get_or_compute(("key", index, ["2005-2006"]), lambda: {"index": index})
+        memo.save(path)
+
+        loaded = MemoCache(max_entries=2)
+        self.assertEqual(loaded.load(path), 2)
+        self.assertEqual(loaded.get_or_compute(("key", 2, ["2005-2006"]), lambda: None), {"index": 2})
+        self.assertEqual(loaded.get_or_compute(("key", 0, ["2005-2006"]), lambda: "evicted"), "evicted")
+        self.assertEqual(MemoCache().load(path + ".missing"), 0)
+
+
+class TestMemoizedLookups(unittest.TestCase):
+    def setUp(self):
+        self.data_directory = tempfile.mkdtemp()
+        self.tables = dict(TABLES)
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", autospec=True,
+                                    side_effect=lambda api, data_category: self.tables.get(data_category))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.api = NHANESDataAPI(self.data_directory)
+
+    def test_lookups_are_memoized(self):
+        with mock.patch.object(VariableCatalog, "file_descriptions", autospec=True,
+                               side_effect=VariableCatalog.file_descriptions) as file_descriptions:
+            self.assertEqual(self.api.list_file_names("laboratory", ["2005-2006", "2007-2008"]),
+                             ["Glycohemoglobin", "C-Reactive Protein (CRP)"])
+            # Equivalent cycle inputs share the result
+            self.assertEqual(self.api.list_file_names("laboratory", ["2007", "2005-2006", "2007-2008"]),
+                             ["Glycohemoglobin", "C-Reactive Protein (CRP)"])
+            self.assertEqual(self.api.list_file_names("laboratory", "2005-2008"),
+                             ["Glycohemoglobin", "C-Reactive Protein (CRP)"])
+        self.assertEqual(file_descriptions.call_count, 1)
+
+        with mock.patch.object(VariableCatalog, "variable_names", autospec=True,
+                               side_effect=VariableCatalog.variable_names) as variable_names:
+            first = self.api.get_common_and_uncommon_variables("demographics", ["2007-2008", "2005-2006"])
+            second = self.api.get_common_and_uncommon_variables("demographics", "2005-2008")
+        self.assertEqual(variable_names.call_count, 2)
+        self.assertEqual(first, second)
+        self.assertEqual(sorted(first[0]), ["RIAGENDR", "SEQN"])
+        self.assertEqual(first[1], ["DMDHRGND"])
+        self.assertEqual(first[2]["SEQN"], ["2005-2006", "2007-2008"])
+
+        mapping = self.api.retrieve_cycle_data_file_name_mapping("laboratory", "Glycohemoglobin")
+        self.assertEqual(mapping, {"2005-2006": "GHB_D", "2007-2008": "GHB_E"})
+        self.assertEqual(self.api.retrieve_cycle_data_file_name_mapping(TABLES["laboratory"], "Glycohemoglobin"), mapping)
+        with self.assertRaises(ValueError):
+            self.api.retrieve_cycle_data_file_name_mapping("laboratory", "Cholesterol - Total")
+        self.assertEqual(self.api.memo_stats()["entries"], 4)
+
+    def test_catalog_changes_invalidate_results(self):
+        self.assertEqual(self.api.list_file_names("laboratory", "2007-2008"), ["Glycohemoglobin"])
+        self.tables["laboratory"] = REVISED_LABORATORY
+        self.api.build_catalog("laboratory", refresh=True)
+        self.assertEqual(self.api.list_file_names("laboratory", "2007-2008"), ["Glycohemoglobin", "C-Reactive Protein (CRP)"])
+
+        # Another process changing the catalog changes its content hash, so memoized results no longer match
+        other = NHANESDataAPI(self.data_directory)
+        self.assertEqual(other.retrieve_cycle_data_file_name_mapping("laboratory", "C-Reactive Protein (CRP)"), {"2007-2008": "CRP_E"})
+        self.tables["laboratory"] = TABLES["laboratory"]
+        self.api.build_catalog("laboratory", refresh=True)
+        self.assertEqual(other.retrieve_cycle_data_file_name_mapping("laboratory", "C-Reactive Protein (CRP)"), {"2005-2006": "CRP_D"})
+
+    def test_memo_persists_across_instances(self):
+        self.api.list_file_names("demographics")
+        self.api.get_common_and_uncommon_variables("demographics", "2005-2008")
+        self.assertTrue(os.path.exists(self.api.save_memo()))
+
+        other = NHANESDataAPI(self.data_directory)
+        with mock.patch.object(VariableCatalog, "variable_names", autospec=True) as variable_names:
+            common, uncommon, _ = other.get_common_and_uncommon_variables("demographics", ["2005-2006", "2007-2008"])
+        variable_names.assert_not_called()
+        self.assertEqual(uncommon, ["DMDHRGND"])
+        self.assertEqual(other.list_file_names("demographics"), ["Demographic Variables & Sample Weights"])
+        self.assertEqual(other.memo_stats()["hits"], 2)
+
+    def test_catalog_without_content_hash(self):
+        self.api.build_catalog("demographics")
+        content_hash = self.api._catalog.content_hash("demographics")
+        with sqlite3.connect(os.path.join(self.data_directory, "catalog.sqlite")) as connection:
+            connection.execute("DELETE FROM category_versions")
+        self.assertEqual(self.api._catalog.content_hash("demographics"), content_hash)
+        self.assertIsNone(self.api._catalog.content_hash("laboratory"))
+
+
+if __name__ == '__main__':
+    unittest.main()
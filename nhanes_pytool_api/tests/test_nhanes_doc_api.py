@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_doc.codebook import parse_codebook
+from nhanes_pytool_api.nhanes_doc.nhanes_doc_api import NHANESDocAPI
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "DEMO_D.htm")
+
+
+def read_fixture():
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+class TestParseCodebook(unittest.TestCase):
+    def setUp(self):
+        self.codebook = parse_codebook(read_fixture())
+
+    def test_variables(self):
+        self.assertEqual(list(self.codebook),
+                         ["SEQN", "RIAGENDR", "RIDAGEYR", "DMDEDUC2", "INDFMPIR", "DMDHRGND"])
+        self.assertEqual(self.codebook["SEQN"]["values"], [])
+        self.assertEqual(self.codebook["DMDHRGND"]["label"], "HH ref person's gender")
+        self.assertEqual(self.codebook["RIAGENDR"]["target"], ["Both males and females 0 YEARS - 150 YEARS"])
+
+    def test_value_labels(self):
+        self.assertEqual(self.codebook["RIAGENDR"]["values"], [[1, "Male", 5080], [2, "Female", 5268]])
+        self.assertEqual(self.codebook["RIAGENDR"]["missing"], [])
+
+    def test_ranges_and_missing_codes(self):
+        self.assertEqual(self.codebook["RIDAGEYR"]["ranges"], [[0, 84, 9990]])
+        self.assertEqual(self.codebook["RIDAGEYR"]["values"], [[85, "85 years of age and over", 358]])
+        self.assertEqual(self.codebook["INDFMPIR"]["ranges"], [[0, 4.99, 9285]])
+        self.assertEqual(self.codebook["DMDEDUC2"]["missing"], [7, 9])
+        self.assertEqual(self.codebook["DMDEDUC2"]["values"][-1], [9, "Don't Know", 5])
+
+
+class TestNHANESDocAPI(unittest.TestCase):
+    def setUp(self):
+        self.data_directory = tempfile.mkdtemp()
+        self.server = LocalNHANESServer({"/Nchs/Nhanes/2005-2006/DEMO_D.htm": read_fixture().encode("utf-8")}).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDocAPI(self.data_directory, base_url=self.server.base_url)
+
+    def test_batch_lookup_parses_each_file_once(self):
+        codebooks = self.api.get_codebooks([("2005-2006", "DEMO_D", name) for name in ["RIAGENDR", "DMDEDUC2", "NOTDOCUMENTED"]])
+        self.assertEqual(set(codebooks), {("2005-2006", "DEMO_D", "RIAGENDR"), ("2005-2006", "DEMO_D", "DMDEDUC2")})
+        self.assertEqual(self.api.get_variable_codebook("2005-2006", "DEMO_D", "RIAGENDR")["label"], "Gender")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_codebook_is_stored_in_the_catalog(self):
+        codebook = self.api.get_codebook("2005-2006", "DEMO_D")
+        other = NHANESDocAPI(self.data_directory, base_url=self.server.base_url)
+        self.assertEqual(other.get_codebook("2005-2006", "DEMO_D"), codebook)
+        self.assertEqual(len(self.server.requests), 1)
+
+        other.get_codebook("2005-2006", "DEMO_D", refresh=True)
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_value_labels(self):
+        labels = self.api.value_labels("2005-2006", "DEMO_D", ["DMDEDUC2"])
+        self.assertEqual(list(labels.columns), ["Variable Name", "Code", "Value Description", "Count", "Missing"])
+        self.assertEqual(len(labels), 7)
+        self.assertEqual(labels.loc[labels["Missing"], "Code"].tolist(), [7, 9])
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.api.get_codebook("2007-2008", "DEMO_E")
+        with self.assertRaises(KeyError):
+            self.api.get_variable_codebook("2005-2006", "DEMO_D", "NOTDOCUMENTED")
+
+
+if __name__ == '__main__':
+    unittest.main()
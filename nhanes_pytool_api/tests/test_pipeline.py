@@ -0,0 +1,122 @@
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.nhanes_data.pipeline import bounded_prefetch
+from nhanes_pytool_api.tests.helpers import make_variable_table, make_xport_bytes
+
+ROWS = 2000
+rng = np.random.default_rng(4)
+CYCLES = {"2005-2006": "D", "2007-2008": "E", "2009-2010": "F", "2011-2012": "G"}
+BMX = {cycle: pd.DataFrame({"SEQN": np.arange(index * ROWS + 1, (index + 1) * ROWS + 1, dtype=float),
+                            "BMXWT": rng.normal(70, 10, ROWS)})
+       for index, cycle in enumerate(CYCLES)}
+BMX["2009-2010"]["BMXWAIST"] = rng.normal(90, 10, ROWS)
+FILES = {f"/Nchs/Nhanes/{cycle}/BMX_{suffix}.XPT": make_xport_bytes(BMX[cycle]) for cycle, suffix in CYCLES.items()}
+TABLES = {"examination": make_variable_table(
+    [(name, f"BMX_{CYCLES[cycle]}", "Body Measures", cycle) for cycle in BMX for name in BMX[cycle].columns])}
+
+
+class TestBoundedPrefetch(unittest.TestCase):
+    def test_results_are_in_order(self):
+        def fetch(item):
+            time.sleep(0.01 * (5 - item))  # Later items finish first
+            return item * 2
+
+        results = [(item, result) for item, result, _ in bounded_prefetch(list(range(5)), fetch, [1] * 5, 100, 3)]
+        self.assertEqual(results, [(item, item * 2) for item in range(5)])
+
+    def test_backpressure_on_buffered_bytes(self):
+        started = []
+        consumed = []
+        lock = threading.Lock()
+
+        def fetch(item):
+            with lock:
+                started.append(item)
+                # Fetched or in-flight items that are not consumed yet never exceed the limit of two items
+                self.assertLessEqual(len(started) - len(consumed), 2)
+
+        for item, _, buffered in bounded_prefetch(list(range(6)), fetch, [10] * 6, 25, 4):
+            self.assertLessEqual(buffered, 25)
+            time.sleep(0.02)
+            with lock:
+                consumed.append(item)
+        self.assertEqual(started, list(range(6)))
+
+    def test_items_larger_than_the_limit_pass(self):
+        results = list(bounded_prefetch(["a", "b"], str.upper, [100, 100], 10, 2))
+        self.assertEqual([(item, result, buffered) for item, result, buffered in results], [("a", "A", 100), ("b", "B", 100)])
+
+    def test_fetch_overlaps_consumer(self):
+        start = time.perf_counter()
+        for _ in bounded_prefetch(list(range(4)), lambda item: time.sleep(0.1), [1] * 4, 100, 1):
+            time.sleep(0.1)
+        # Sequential fetching and consuming would take 0.8 seconds
+        self.assertLess(time.perf_counter() - start, 0.7)
+
+    def test_errors_are_raised_in_order(self):
+        def fetch(item):
+            if item == 1:
+                raise IOError("failed")
+            return item
+
+        items = []
+        with self.assertRaises(IOError):
+            for item, _, _ in bounded_prefetch([0, 1, 2], fetch, [1] * 3, 100, 2):
+                items.append(item)
+        self.assertEqual(items, [0])
+
+
+class TestPipelinedRetrieval(unittest.TestCase):
+    def setUp(self):
+        self.data_directory = tempfile.mkdtemp()
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", autospec=True,
+                                    side_effect=lambda api, data_category: TABLES.get(data_category))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = LocalNHANESServer(dict(FILES)).__enter__()
+        self.addCleanup(self.server.__exit__)
+
+    def test_result_and_stage_statistics(self):
+        api = NHANESDataAPI(self.data_directory, base_url=self.server.base_url, download_workers=3)
+        data = api.retrieve_data("examination", "2005-2012", "Body Measures")
+
+        expected = pd.concat([frame.assign(year=cycle) for cycle, frame in BMX.items()], ignore_index=True)
+        pd.testing.assert_frame_equal(data, expected[data.columns], check_dtype=False)
+
+        pipeline = data.attrs["pipeline"]
+        self.assertEqual(list(pipeline["stages"]), ["download", "decode", "assemble"])
+        self.assertEqual(pipeline["stages"]["download"]["workers"], 3)
+        self.assertEqual(pipeline["stages"]["download"]["items"], 4)
+        self.assertEqual(pipeline["stages"]["decode"]["items"], 4)
+        self.assertEqual(pipeline["stages"]["decode"]["bytes"], sum(len(body) for body in FILES.values()))
+        for stage in pipeline["stages"].values():
+            self.assertGreaterEqual(stage["utilization"], 0)
+            self.assertLessEqual(stage["utilization"], 1)
+        self.assertGreater(pipeline["wall_seconds"], 0)
+
+    def test_buffered_bytes_limit(self):
+        api = NHANESDataAPI(self.data_directory, base_url=self.server.base_url, download_workers=4, max_buffered_bytes=1)
+        data = api.retrieve_data("examination", "2005-2012", "Body Measures")
+        # Only one data file at a time is downloaded ahead of decoding
+        self.assertEqual(data.attrs["pipeline"]["max_buffered_bytes"], max(len(body) for body in FILES.values()))
+        self.assertEqual(len(data), ROWS * 4)
+
+    def test_missing_data_file(self):
+        api = NHANESDataAPI(self.data_directory, base_url=self.server.base_url)
+        api.probe_data_file("2011-2012", "BMX_G")
+        self.server.files.pop("/Nchs/Nhanes/2011-2012/BMX_G.XPT")
+        with self.assertRaises(ValueError):
+            api.retrieve_data("examination", "2005-2012", "Body Measures")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.dataset import PartitionedDataset
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.nhanes_data.plan import RetrievalPlan
+from nhanes_pytool_api.nhanes_data.synthetic import SyntheticNHANES
+
+
+class TestPlan(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        site = SyntheticNHANES(cycles=["2013-2014", "2015-2016", "2017-2018"], participants=800, extra_columns=2,
+                               data_files=["DEMO", "BMX"]).write(os.path.join(self.directory, "site"))
+        # Glycohemoglobin is only published for the last two cycles
+        site.update(SyntheticNHANES(cycles=["2015-2016", "2017-2018"], participants=800,
+                                    data_files=["GHB"]).write(os.path.join(self.directory, "lab")))
+        self.server = LocalNHANESServer(site).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDataAPI(os.path.join(self.directory, "data"), base_url=self.server.base_url)
+
+    def test_plan_does_not_download(self):
+        plan = self.api.plan("examination", "2013-2018", "Body Measures")
+        self.assertIsInstance(plan, RetrievalPlan)
+        self.assertEqual(plan.cycles, ["2013-2014", "2015-2016", "2017-2018"])
+        self.assertEqual(list(plan.files["Data File Name"]), ["BMX_H", "BMX_I", "BMX_J"])
+        self.assertEqual(plan.cache_hits, 0)
+        self.assertEqual(plan.download_bytes, int(plan.files["File Size"].sum()))
+        self.assertFalse(any(self.api._cache.is_cached(cycle_year, name) for cycle_year, name in
+                             zip(plan.files["Years"], plan.files["Data File Name"])))
+        data_file_requests = [path for path in self.server.requests if path.endswith(".XPT")]
+        self.assertEqual(len(data_file_requests), len(self.server.range_requests))  # header probes only
+
+    def test_execute_matches_estimates(self):
+        self.api.prefetch_data(["examination"], ["2013-2014"], ["Body Measures"])
+        plan = self.api.plan("examination", "2013-2018", "Body Measures")
+        self.assertEqual(plan.cache_hits, 1)
+        self.assertEqual(plan.download_bytes, int(plan.files["File Size"].iloc[1:].sum()))
+
+        data = plan.execute()
+        self.assertEqual(plan.rows, len(data))
+        self.assertEqual(plan.columns, list(data.columns))
+        self.assertAlmostEqual(plan.result_bytes, data.memory_usage(deep=True).sum(), delta=0.25 * plan.result_bytes)
+        self.assertGreater(plan.peak_memory, plan.result_bytes)
+        self.assertFalse(plan.spill)
+        pd.testing.assert_frame_equal(data.drop(columns="year"),
+                                      self.api.retrieve_data("examination", "2013-2018", "Body Measures").drop(columns="year"))
+
+    def test_join_plan(self):
+        plan = self.api.plan("demographics", "2013-2018", "Demographic Variables & Sample Weights",
+                             join=("laboratory", "Glycohemoglobin"))
+        self.assertEqual(plan.operation, "join_data_files")
+        self.assertEqual(plan.skipped, ["2013-2014"])
+        self.assertEqual(plan.cycles, ["2015-2016", "2017-2018"])
+        self.assertEqual(len(plan.files), 4)
+
+        data = plan.execute()
+        self.assertEqual(plan.columns, list(data.columns))
+        self.assertEqual(plan.rows, len(data))
+        report = self.api.plan("demographics", "2015-2018", "Demographic Variables & Sample Weights",
+                               join=("laboratory", "Glycohemoglobin")).report()
+        self.assertIn("Cached: 4 of 4 file(s); to download: 0.0 B", report)
+
+    def test_common_variables_and_memory_budget(self):
+        plan = self.api.plan("examination", "2013-2018", "Body Measures", include_uncommon_variables=False,
+                             max_memory="100KB")
+        self.assertEqual(plan.columns, ["SEQN", "BMXWT", "BMXHT", "BMXBMI", "BMXX0001", "BMXX0002", "year"])
+        self.assertTrue(plan.spill)
+        self.assertLess(plan.peak_memory, plan.result_bytes)
+        self.assertEqual(plan.summary()["spill"], True)
+
+    def test_cycles_without_the_data_file_are_skipped(self):
+        plan = self.api.plan("laboratory", "2013-2018", "Glycohemoglobin")
+        self.assertEqual(plan.skipped, ["2013-2014"])
+        self.assertEqual(plan.cycles, ["2015-2016", "2017-2018"])
+        data = self.api.retrieve_data("laboratory", "2013-2018", "Glycohemoglobin")
+        self.assertEqual(list(data["year"].unique()), plan.cycles)
+        self.assertEqual(plan.rows, len(data))
+        self.assertEqual(self.api.retrieve_data("laboratory", "2013-2018", "Glycohemoglobin", lazy=True).cycles, plan.cycles)
+
+    def test_join_spill_matches_execution(self):
+        for cycle in ["2015-2016", "2015-2018"]:
+            spills = set()
+            for max_memory in ["10KB", "60KB", "120KB", "200KB", "400KB", "1MB"]:
+                with self.subTest(cycle=cycle, max_memory=max_memory):
+                    plan = self.api.plan("demographics", cycle, "Demographic Variables & Sample Weights",
+                                         join=("laboratory", "Glycohemoglobin"), max_memory=max_memory)
+                    result = plan.execute()
+                    self.assertEqual(plan.spill, isinstance(result, PartitionedDataset))
+                    if isinstance(result, PartitionedDataset):
+                        result.delete()
+                    spills.add(plan.spill)
+            self.assertEqual(spills, {True, False})
+
+    def test_invalid_plans(self):
+        with self.assertRaises(ValueError):
+            self.api.plan("examination", "1900", "Body Measures")
+        with self.assertRaises(ValueError):
+            self.api.plan("laboratory", "2013-2014", "Glycohemoglobin")
+        with self.assertRaises(ValueError):
+            self.api.plan("laboratory", "2013-2014", "Glycohemoglobin", join=("examination", "Body Measures"))
+
+
+if __name__ == '__main__':
+    unittest.main()
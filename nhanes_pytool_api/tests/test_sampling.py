@@ -0,0 +1,133 @@
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data import xport
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.nhanes_data.sampling import participant_hash, sample_rows
+from nhanes_pytool_api.tests.helpers import make_variable_table, make_xport_bytes
+
+ROWS = 2000
+rng = np.random.default_rng(11)
+CYCLES = {"2005-2006": "D", "2007-2008": "E"}
+DEMO = {}
+BMX = {}
+for index, cycle in enumerate(CYCLES):
+    seqn = np.arange(index * ROWS + 1, (index + 1) * ROWS + 1, dtype=float)
+    DEMO[cycle] = pd.DataFrame({"SEQN": seqn, "RIAGENDR": rng.integers(1, 3, ROWS).astype(float),
+                                "RIDAGEYR": rng.integers(0, 86, ROWS).astype(float)})
+    # Body measures of most participants, in another order
+    measured = rng.permutation(seqn)[:ROWS - 200]
+    BMX[cycle] = pd.DataFrame({"SEQN": measured, "BMXWT": rng.normal(70, 15, len(measured)).round(1)})
+FILES = {}
+for cycle, suffix in CYCLES.items():
+    FILES[f"/Nchs/Nhanes/{cycle}/DEMO_{suffix}.XPT"] = make_xport_bytes(DEMO[cycle])
+    FILES[f"/Nchs/Nhanes/{cycle}/BMX_{suffix}.XPT"] = make_xport_bytes(BMX[cycle])
+TABLES = {
+    "demographics": make_variable_table([(name, f"DEMO_{CYCLES[cycle]}", "Demographic Variables & Sample Weights", cycle)
+                                         for cycle in DEMO for name in DEMO[cycle].columns]),
+    "examination": make_variable_table([(name, f"BMX_{CYCLES[cycle]}", "Body Measures", cycle)
+                                        for cycle in BMX for name in BMX[cycle].columns]),
+}
+
+
+class TestParticipantHash(unittest.TestCase):
+    def test_hash_is_consistent_and_uniform(self):
+        seqn = np.arange(1, 100001, dtype=float)
+        values = participant_hash(seqn)
+        self.assertTrue(((values >= 0) & (values < 1)).all())
+        np.testing.assert_array_equal(participant_hash(seqn[::-1]), values[::-1])
+        self.assertAlmostEqual(values.mean(), 0.5, places=2)
+        self.assertFalse(np.array_equal(participant_hash(seqn, seed=1), values))
+
+    def test_sample_rows(self):
+        seqn = np.array([5.0, np.nan, 7.0, 5.0])
+        rows = sample_rows(seqn, 1.0)
+        # Missing participants are never sampled, and a participant's records are sampled together
+        self.assertEqual(rows.tolist(), [0, 2, 3])
+        seqn = np.arange(1, 10001, dtype=float)
+        self.assertTrue(set(sample_rows(seqn, 0.1)) <= set(sample_rows(seqn, 0.2)))
+
+
+class TestSampleData(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", autospec=True,
+                                    side_effect=lambda api, data_category: TABLES.get(data_category))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = LocalNHANESServer(dict(FILES)).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDataAPI(tempfile.mkdtemp(), base_url=self.server.base_url)
+
+    def sample_demographics(self, **arguments):
+        return self.api.sample_data("demographics", "2005-2008", "Demographic Variables & Sample Weights", **arguments)
+
+    def test_sampled_records_match_full_retrieval(self):
+        sample = self.sample_demographics(fraction=0.1)
+        full = self.api.retrieve_data("demographics", "2005-2008", "Demographic Variables & Sample Weights")
+        expected = full[full["SEQN"].isin(sample["SEQN"])].reset_index(drop=True)
+        pd.testing.assert_frame_equal(sample, expected)
+        self.assertEqual(set(sample["year"]), set(CYCLES))
+        self.assertAlmostEqual(len(sample) / len(full), 0.1, delta=0.03)
+        self.assertEqual(sample.attrs["sample"], {"fraction": 0.1, "seed": 0, "participants": len(sample),
+                                                  "rows": len(sample)})
+
+    def test_samples_join_across_data_files(self):
+        demographics = self.sample_demographics(fraction=0.2, seed=3)
+        body_measures = self.api.sample_data("examination", "2005-2008", "Body Measures", fraction=0.2, seed=3)
+        bmx = pd.concat(BMX.values())
+        # The sample of body measures is exactly the measured participants of the sample of demographics
+        self.assertEqual(set(body_measures["SEQN"]), set(demographics["SEQN"]) & set(bmx["SEQN"]))
+        joined = demographics.merge(body_measures, on=["SEQN", "year"])
+        self.assertEqual(len(joined), len(body_measures))
+
+    def test_n_and_seed(self):
+        sample = self.sample_demographics(n=400)
+        self.assertAlmostEqual(len(sample), 400, delta=80)
+        self.assertEqual(sample.attrs["sample"]["fraction"], 400 / (2 * ROWS))
+
+        other = self.sample_demographics(n=400, seed=1)
+        self.assertNotEqual(set(sample["SEQN"]), set(other["SEQN"]))
+        pd.testing.assert_frame_equal(self.sample_demographics(n=400, seed=1), other)
+
+    def test_only_sampled_records_are_decoded(self):
+        self.sample_demographics(fraction=0.5)  # Download and probe first
+        with mock.patch.object(xport, "_decode_field", wraps=xport._decode_field) as decode_field:
+            sample = self.sample_demographics(fraction=0.05)
+        decoded = {}
+        for (block, field), _ in decode_field.call_args_list:
+            decoded.setdefault(field["name"], 0)
+            decoded[field["name"]] += len(block)
+        # All SEQN values are decoded to select the participants, other columns only for the sampled records
+        self.assertEqual(decoded["SEQN"], 2 * ROWS + len(sample))
+        self.assertEqual(decoded["RIDAGEYR"], len(sample))
+
+    def test_common_variables(self):
+        sample = self.sample_demographics(fraction=0.1, include_uncommon_variables=False)
+        self.assertEqual(list(sample.columns), ["SEQN", "RIAGENDR", "RIDAGEYR", "year"])
+
+    def test_skips_cycles_without_the_data_file(self):
+        sample = self.api.sample_data("demographics", "2005-2010", "Demographic Variables & Sample Weights", fraction=0.1)
+        pd.testing.assert_frame_equal(sample, self.sample_demographics(fraction=0.1))
+        with self.assertRaises(ValueError):
+            self.api.sample_data("demographics", "2009-2010", "Demographic Variables & Sample Weights", fraction=0.1)
+
+    def test_errors(self):
+        with self.assertRaises(ValueError):
+            self.sample_demographics()
+        with self.assertRaises(ValueError):
+            self.sample_demographics(fraction=0.1, n=10)
+        with self.assertRaises(ValueError):
+            self.sample_demographics(fraction=1.5)
+        with self.assertRaises(ValueError):
+            self.sample_demographics(n=0)
+        with self.assertRaises(ValueError):
+            self.api.sample_data("demographics", "2005-2006", "Body Measures", fraction=0.1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,180 @@
+import http.client
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pyarrow
+
+from nhanes_pytool_api.nhanes_data.lazy import LazyDataset
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.nhanes_data.service import NHANESDataService
+from nhanes_pytool_api.tests.helpers import make_variable_table, make_xport_bytes
+
+
+ROWS = 500
+rng = np.random.default_rng(0)
+DEMO_D = pd.DataFrame({"SEQN": np.arange(1, ROWS + 1, dtype=float), "RIAGENDR": rng.integers(1, 3, ROWS).astype(float),
+                       "RIDAGEYR": rng.integers(0, 85, ROWS).astype(float)})
+DEMO_E = pd.DataFrame({"SEQN": np.arange(ROWS + 1, 2 * ROWS + 1, dtype=float), "RIAGENDR": rng.integers(1, 3, ROWS).astype(float),
+                       "RIDAGEYR": rng.integers(0, 85, ROWS).astype(float)})
+BMX_D = pd.DataFrame({"SEQN": np.arange(1, ROWS + 1, 2, dtype=float), "BMXWT": rng.normal(70, 10, ROWS // 2)})
+GHB_D = pd.DataFrame({"SEQN": np.arange(1, 101, dtype=float), "LBXGH": rng.normal(5.5, 1, 100),
+                      "LBDCODE": rng.choice(["AB", "C", ""], 100)})
+
+FILES = {
+    "/Nchs/Nhanes/2005-2006/DEMO_D.XPT": make_xport_bytes(DEMO_D),
+    "/Nchs/Nhanes/2007-2008/DEMO_E.XPT": make_xport_bytes(DEMO_E),
+    "/Nchs/Nhanes/2005-2006/BMX_D.XPT": make_xport_bytes(BMX_D),
+    "/Nchs/Nhanes/2005-2006/GHB_D.XPT": make_xport_bytes(GHB_D),
+}
+DEMOGRAPHICS = "Demographic Variables & Sample Weights"
+TABLES = {
+    "demographics": make_variable_table(
+        [(name, "DEMO_D", DEMOGRAPHICS, "2005-2006") for name in DEMO_D.columns]
+        + [(name, "DEMO_E", DEMOGRAPHICS, "2007-2008") for name in DEMO_E.columns]),
+    "examination": make_variable_table([(name, "BMX_D", "Body Measures", "2005-2006") for name in BMX_D.columns]),
+    "laboratory": make_variable_table([(name, "GHB_D", "Glycohemoglobin", "2005-2006") for name in GHB_D.columns]),
+}
+
+
+class TestNHANESDataService(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", autospec=True,
+                                    side_effect=lambda api, data_category: TABLES.get(data_category))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = LocalNHANESServer(FILES, delay=0.1).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.data_directory = tempfile.mkdtemp()
+        self.api = NHANESDataAPI(self.data_directory, base_url=self.server.base_url)
+        self.service = self.start(NHANESDataService(self.api, port=0, chunk_rows=100))
+
+    def start(self, service):
+        threading.Thread(target=service.serve_forever, daemon=True).start()
+        self.addCleanup(service.shutdown)
+        return service
+
+    def get(self, path, service=None, **params):
+        url = f"{(service or self.service).url}{path}?{urllib.parse.urlencode(params, doseq=True)}"
+        with urllib.request.urlopen(url, timeout=30) as response:
+            return response.headers, response.read()
+
+    def test_list_file_names(self):
+        _, body = self.get("/files", category="demographics", cycle="2005-2006")
+        self.assertEqual(json.loads(body), [DEMOGRAPHICS])
+
+    def test_data_as_chunked_csv(self):
+        headers, body = self.get("/data", category="demographics", cycle="2005-2008", file=DEMOGRAPHICS)
+        self.assertEqual(headers["Transfer-Encoding"], "chunked")
+        data = pd.read_csv(io.BytesIO(body))
+        expected = self.api.retrieve_data("demographics", "2005-2008", DEMOGRAPHICS)
+        pd.testing.assert_frame_equal(data, expected, check_dtype=False)
+
+    def test_data_as_arrow_with_selection(self):
+        headers, body = self.get("/data", category="demographics", cycle=["2005-2006", "2007-2008"], file=DEMOGRAPHICS,
+                                 columns="SEQN,RIDAGEYR", filter=["RIDAGEYR>=18", "RIAGENDR==2"], offset=5, limit=50,
+                                 format="arrow")
+        self.assertEqual(headers["Content-Type"], "application/vnd.apache.arrow.stream")
+        data = pyarrow.ipc.open_stream(body).read_pandas()
+
+        full = pd.concat([DEMO_D, DEMO_E], ignore_index=True)
+        expected = full[(full["RIDAGEYR"] >= 18) & (full["RIAGENDR"] == 2)][["SEQN", "RIDAGEYR"]].iloc[5:55]
+        pd.testing.assert_frame_equal(data, expected.reset_index(drop=True))
+        self.assertNotIn("X-Row-Count", headers)  # not counted with row filters
+
+    def test_character_columns_as_text(self):
+        headers, body = self.get("/data", category="laboratory", cycle="2005-2006", file="Glycohemoglobin",
+                                 filter="LBDCODE==AB", columns="SEQN,LBDCODE")
+        data = pd.read_csv(io.BytesIO(body))
+        expected = GHB_D[GHB_D["LBDCODE"] == "AB"]
+        self.assertEqual(data["SEQN"].tolist(), expected["SEQN"].tolist())
+        self.assertEqual(set(data["LBDCODE"]), {"AB"})
+
+        _, body = self.get("/data", category="laboratory", cycle="2005-2006", file="Glycohemoglobin", format="arrow")
+        table = pyarrow.ipc.open_stream(body).read_all()
+        self.assertEqual(table.schema.field("LBDCODE").type, pyarrow.string())
+        self.assertEqual(table.column("LBDCODE").to_pylist(), GHB_D["LBDCODE"].tolist())
+
+    def test_data_streams_only_the_planned_cycles(self):
+        headers, body = self.get("/data", category="demographics", cycle="2005-2008", file=DEMOGRAPHICS,
+                                 filter="year==2007-2008", limit=10)
+        data = pd.read_csv(io.BytesIO(body))
+        self.assertEqual(headers["X-Row-Count"], "10")
+        self.assertEqual(data["SEQN"].tolist(), DEMO_E["SEQN"].iloc[:10].tolist())
+        self.assertNotIn("/Nchs/Nhanes/2005-2006/DEMO_D.XPT", self.server.requests)
+
+    def test_join(self):
+        _, body = self.get("/join", cycle="2005-2006", category1="demographics", file1=DEMOGRAPHICS,
+                           category2="examination", file2="Body Measures", columns="SEQN,BMXWT")
+        data = pd.read_csv(io.BytesIO(body))
+        self.assertEqual(data["SEQN"].tolist(), BMX_D["SEQN"].tolist())
+        np.testing.assert_allclose(data["BMXWT"], BMX_D["BMXWT"])
+
+    def test_join_over_budget_streams_from_disk(self):
+        service = self.start(NHANESDataService(self.api, port=0, chunk_rows=100, max_memory=1000))
+        params = dict(cycle="2005-2006", category1="demographics", file1=DEMOGRAPHICS, category2="examination",
+                      file2="Body Measures", columns="SEQN,RIDAGEYR,BMXWT", filter="RIDAGEYR>=18", offset=3, limit=40)
+        headers, body = self.get("/join", service=service, **params)
+        _, expected = self.get("/join", **params)
+        self.assertNotIn("X-Row-Count", headers)
+        pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(body)), pd.read_csv(io.BytesIO(expected)))
+        self.assertEqual(os.listdir(os.path.join(self.data_directory, "spill")), [])
+
+        headers, body = self.get("/join", service=service, cycle="2005-2006", category1="demographics", file1=DEMOGRAPHICS,
+                                 category2="examination", file2="Body Measures", format="arrow")
+        data = pyarrow.ipc.open_stream(body).read_pandas()
+        self.assertEqual(headers["X-Row-Count"], str(len(BMX_D)))
+        self.assertEqual(data["SEQN"].tolist(), BMX_D["SEQN"].tolist())
+
+    def test_error_while_streaming_ends_the_response_incomplete(self):
+        def iter_chunks(lazy):
+            yield DEMO_D.iloc[:10].assign(year="2005-2006")
+            raise RuntimeError("decode failed")
+
+        with mock.patch.object(LazyDataset, "iter_chunks", iter_chunks):
+            with self.assertLogs("nhanes_pytool_api.nhanes_data.service", "ERROR") as logs:
+                with self.assertRaises(http.client.IncompleteRead):
+                    self.get("/data", category="demographics", cycle="2005-2006", file=DEMOGRAPHICS)
+        self.assertIn("decode failed", "\n".join(logs.output))
+
+    def test_errors(self):
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            self.get("/data", category="demographics", cycle="2005-2006", file=DEMOGRAPHICS, columns="LBXGH")
+        self.assertEqual(error.exception.code, 400)
+        self.assertIn("LBXGH", json.loads(error.exception.read())["error"])
+
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            self.get("/data", category="demographics", file=DEMOGRAPHICS)
+        self.assertEqual(error.exception.code, 400)
+
+        with self.assertRaises(urllib.error.HTTPError) as error:
+            self.get("/unknown")
+        self.assertEqual(error.exception.code, 404)
+
+    def test_concurrent_clients_share_one_download(self):
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            bodies = list(executor.map(lambda _: self.get("/data", category="examination", cycle="2005-2006",
+                                                          file="Body Measures")[1], range(6)))
+        self.assertEqual(len(set(bodies)), 1)
+        self.assertEqual(self.server.requests.count("/Nchs/Nhanes/2005-2006/BMX_D.XPT"), 1)
+
+    def test_parse_filter(self):
+        self.assertEqual(NHANESDataService.parse_filter("RIDAGEYR >= 18"), ("RIDAGEYR", ">=", 18.0))
+        self.assertEqual(NHANESDataService.parse_filter("year==2005-2006"), ("year", "==", "2005-2006"))
+        with self.assertRaises(ValueError):
+            NHANESDataService.parse_filter("RIDAGEYR ~ 18")
+
+
+if __name__ == '__main__':
+    unittest.main()
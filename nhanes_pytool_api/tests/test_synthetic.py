@@ -0,0 +1,98 @@
+import os
+import tempfile
+import unittest
+import urllib.request
+
+import numpy as np
+
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.nhanes_data.synthetic import SyntheticNHANES, load_site
+
+
+class TestSyntheticNHANES(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.generator = SyntheticNHANES(cycles=["2005-2006", "2007-2008"], participants=600, extra_columns=3,
+                                         data_files=["DEMO", "BMX", "GHB", "DR1IFF"], chunk_rows=250)
+        site = self.generator.write(os.path.join(self.directory, "site"))
+        self.server = LocalNHANESServer(site).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDataAPI(os.path.join(self.directory, "data"), base_url=self.server.base_url)
+
+    def test_variable_lists_list_the_data_files(self):
+        self.assertEqual(self.api.list_file_names("examination", ["2005-2006", "2007-2008"]), ["Body Measures"])
+        self.assertEqual(self.api.list_file_names("laboratory", ["2005-2006"]), ["Glycohemoglobin"])
+        with self.assertRaises(Exception):
+            self.api.list_file_names("questionnaire")  # no data files, no variablelist page
+
+    def test_retrieve_data_matches_the_generated_data(self):
+        data = self.api.retrieve_data("examination", "2005-2008", "Body Measures")
+        expected = [self.generator.data_frame("2005-2006", "BMX"), self.generator.data_frame("2007-2008", "BMX")]
+        self.assertEqual(list(data.columns), ["SEQN", "BMXWT", "BMXHT", "BMXBMI", "BMXX0001", "BMXX0002", "BMXX0003", "year"])
+        self.assertEqual(len(data), sum(len(frame) for frame in expected))
+        np.testing.assert_array_equal(data["BMXWT"].to_numpy(), np.concatenate([frame["BMXWT"] for frame in expected]))
+        self.assertEqual(data.loc[data["year"] == "2005-2006", "SEQN"].max(), 4 * 600)
+        self.assertEqual(data.loc[data["year"] == "2007-2008", "SEQN"].min(), 4 * 600 + 1)
+
+    def test_data_files_share_participants(self):
+        demographics = self.generator.data_frame("2005-2006", "DEMO").set_index("SEQN")
+        glycohemoglobin = self.generator.data_frame("2005-2006", "GHB")
+        ages = demographics.loc[glycohemoglobin["SEQN"], "RIDAGEYR"].dropna()
+        self.assertGreaterEqual(ages.min(), 12)
+        self.assertLess(len(glycohemoglobin), len(demographics))
+        self.assertTrue(np.isnan(demographics.loc[demographics["RIDAGEYR"] < 20, "DMDEDUC2"]).all())
+
+        joined = self.api.join_data_files("2005-2006", "demographics", "Demographic Variables & Sample Weights",
+                                          "laboratory", "Glycohemoglobin")
+        self.assertEqual(len(joined), len(glycohemoglobin))
+        self.assertIn("RIAGENDR", joined.columns)
+        self.assertIn("LBXGH", joined.columns)
+
+    def test_multi_record_data_file(self):
+        foods = self.generator.data_frame("2007-2008", "DR1IFF")
+        self.assertGreater(len(foods), 5 * foods["SEQN"].nunique())
+        first_lines = foods.groupby("SEQN")["DR1ILINE"].min().dropna()
+        self.assertTrue((first_lines == 1).all())
+
+    def test_decode_labels_with_generated_codebooks(self):
+        data = self.api.retrieve_data("demographics", "2005-2006", "Demographic Variables & Sample Weights",
+                                      decode_labels=True)
+        self.assertEqual(list(data["RIAGENDR"].cat.categories), ["Male", "Female"])
+        self.assertNotIn("Refused", data["DMDEDUC2"].cat.categories)
+        self.assertEqual(set(data["DEMX0003"].dropna()), {"Yes", "No"})
+        self.assertEqual(data["RIDAGEYR"].dtype, np.float64)
+
+    def test_missing_rate_and_determinism(self):
+        generator = SyntheticNHANES(cycles=["2017-2018"], participants=20000, missing_rate=0.2, data_files=["BMX"])
+        frame = generator.data_frame("2017-2018", "BMX")
+        self.assertAlmostEqual(frame["BMXHT"].isna().mean(), 0.2, delta=0.02)
+        self.assertEqual(frame["SEQN"].isna().sum(), 0)
+        rechunked = SyntheticNHANES(cycles=["2017-2018"], participants=20000, missing_rate=0.2, data_files=["BMX"],
+                                    chunk_rows=20000)
+        self.assertEqual(list(rechunked.data_frame("2017-2018", "BMX")["SEQN"]), list(frame["SEQN"]))
+
+    def test_serves_files_from_disk_with_ranges(self):
+        site = load_site(os.path.join(self.directory, "site"))
+        path = site["/Nchs/Nhanes/2005-2006/DEMO_D.XPT"]
+        with open(path, "rb") as data_file:
+            content = data_file.read()
+        request = urllib.request.Request(f"{self.server.base_url}/Nchs/Nhanes/2005-2006/DEMO_D.XPT",
+                                         headers={"Range": "bytes=100-"})
+        with urllib.request.urlopen(request) as response:
+            self.assertEqual(response.status, 206)
+            self.assertEqual(response.read(), content[100:])
+        with urllib.request.urlopen(f"{self.server.base_url}/Nchs/Nhanes/2005-2006/DEMO_D.htm") as page:
+            self.assertEqual(page.headers.get_content_type(), "text/html")
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            SyntheticNHANES(cycles=["2019-2020"])
+        with self.assertRaises(ValueError):
+            SyntheticNHANES(data_files=["XYZ"])
+        with self.assertRaises(ValueError):
+            SyntheticNHANES(missing_rate=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
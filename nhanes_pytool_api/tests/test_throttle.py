@@ -0,0 +1,133 @@
+import tempfile
+import time
+import unittest
+import urllib.error
+from unittest import mock
+
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.nhanes_data.throttle import AdaptiveConcurrency, HostThrottle, TokenBucket, host_throttle
+from nhanes_pytool_api.nhanes_data.xport import fetch_header
+from nhanes_pytool_api.tests.helpers import make_variable_table
+
+CYCLES = ["1999-2000", "2001-2002", "2003-2004", "2005-2006", "2007-2008", "2009-2010", "2011-2012", "2013-2014",
+          "2015-2016", "2017-2018"]
+VARIABLE_TABLE = make_variable_table([("SEQN", f"BMX_{index}", "Body Measures", cycle) for index, cycle in enumerate(CYCLES)])
+FILES = {f"/Nchs/Nhanes/{cycle}/BMX_{index}.XPT": bytes([index]) * 20000 for index, cycle in enumerate(CYCLES)}
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_rate(self):
+        bucket = TokenBucket(rate=50, burst=1)
+        start = time.monotonic()
+        for _ in range(11):
+            bucket.acquire()
+        # The first token is available at once, the next ten take 1/50 second each
+        self.assertGreaterEqual(time.monotonic() - start, 0.18)
+
+    def test_burst(self):
+        bucket = TokenBucket(rate=1, burst=5)
+        start = time.monotonic()
+        for _ in range(5):
+            bucket.acquire()
+        self.assertLess(time.monotonic() - start, 0.1)
+
+    def test_pause(self):
+        bucket = TokenBucket(rate=None)
+        bucket.pause(0.1)
+        start = time.monotonic()
+        bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.09)
+
+
+class TestAdaptiveConcurrency(unittest.TestCase):
+    def saturate(self, concurrency):
+        for _ in range(int(concurrency.limit)):
+            concurrency.acquire()
+
+    def test_additive_increase_while_saturated(self):
+        concurrency = AdaptiveConcurrency(initial=4, maximum=6)
+        for _ in range(10):
+            self.saturate(concurrency)
+            for _ in range(int(concurrency.limit)):
+                concurrency.release(latency=0.01)
+        self.assertEqual(concurrency.limit, 6)
+
+        # Requests that do not use the limit do not raise it
+        concurrency = AdaptiveConcurrency(initial=4)
+        for _ in range(10):
+            concurrency.acquire()
+            concurrency.release(latency=0.01)
+        self.assertEqual(concurrency.limit, 4)
+
+    def test_multiplicative_decrease(self):
+        concurrency = AdaptiveConcurrency(initial=8, minimum=2)
+        self.saturate(concurrency)
+        concurrency.release(congested=True)
+        self.assertEqual(concurrency.limit, 4)
+        concurrency._last_decrease = 0
+        concurrency.release(congested=True)
+        concurrency._last_decrease = 0
+        concurrency.release(congested=True)
+        self.assertEqual(concurrency.limit, 2)
+
+    def test_rising_latency_is_congestion(self):
+        concurrency = AdaptiveConcurrency(initial=8)
+        concurrency.acquire()
+        concurrency.release(latency=0.02)
+        for _ in range(10):
+            concurrency.acquire()
+            concurrency.release(latency=0.5)
+        self.assertLess(concurrency.limit, 8)
+
+
+class TestThrottlingServer(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", return_value=VARIABLE_TABLE)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def prefetch(self, **settings):
+        with LocalNHANESServer(dict(FILES), delay=0.2, max_concurrent=3) as server:
+            host = server.base_url.split("//")[1]
+            api = NHANESDataAPI(tempfile.mkdtemp(), base_url=server.base_url, host_limits={host: settings})
+            summary = api.prefetch_data("examination", "1999-2018", "Body Measures", max_workers=10)
+        return server, summary
+
+    def test_adapts_to_throttling(self):
+        server, summary = self.prefetch(initial_concurrency=10, max_concurrency=10)
+        self.assertEqual(summary["downloaded"], len(FILES))
+        self.assertGreater(summary["throttle"]["throttled"], 0)
+        self.assertEqual(summary["throttle"]["throttled"], len(server.throttled))
+        self.assertLess(summary["throttle"]["concurrency_limit"], 10)
+
+        # Without adaptation, the server throttles many more requests
+        fixed_server, fixed_summary = self.prefetch(initial_concurrency=10, min_concurrency=10, max_concurrency=10)
+        self.assertEqual(fixed_summary["downloaded"], len(FILES))
+        self.assertLess(len(server.throttled), len(fixed_server.throttled))
+
+    def test_rate_limit(self):
+        start = time.monotonic()
+        _, summary = self.prefetch(rate=40, burst=1)
+        self.assertEqual(summary["downloaded"], len(FILES))
+        self.assertGreaterEqual(time.monotonic() - start, (summary["throttle"]["requests"] - 1) / 40)
+
+    def test_throttled_after_retries(self):
+        with LocalNHANESServer(dict(FILES), max_concurrent=0) as server:
+            throttle = host_throttle(server.base_url)
+            throttle.retries = 1
+            with self.assertRaises(urllib.error.HTTPError) as error:
+                fetch_header(f"{server.base_url}/Nchs/Nhanes/1999-2000/BMX_0.XPT")
+        self.assertEqual(error.exception.code, 429)
+        self.assertEqual(len(server.throttled), 2)
+        self.assertEqual(throttle.stats()["throttled"], 2)
+
+    def test_host_throttle_is_shared(self):
+        self.assertIs(host_throttle("http://example.org/a"), host_throttle("http://example.org/b"))
+        self.assertIsNot(host_throttle("http://example.org/a"), host_throttle("http://example.com/a"))
+        self.assertIsInstance(host_throttle("https://wwwn.cdc.gov/Nchs/Nhanes/"), HostThrottle)
+        self.assertEqual(host_throttle("https://wwwn.cdc.gov/").bucket.rate, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
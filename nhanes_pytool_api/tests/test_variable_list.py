@@ -0,0 +1,98 @@
+import io
+import os
+import tempfile
+import unittest
+
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.nhanes_data.variable_list import parse_table
+
+FIXTURE = os.path.join(os.path.dirname(__file__), "fixtures", "variablelist_demographics.html")
+COLUMNS = ["Variable Name", "Variable Description", "Data File Name", "Data File Description", "Begin Year", "EndYear"]
+CYCLES = NHANESDataAPI().list_cycle_years()
+
+
+def read_fixture():
+    with open(FIXTURE, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def chunked(text, size):
+    return (text[start:start + size] for start in range(0, len(text), size))
+
+
+def read_html_variable_table(page):
+    """
+    The variable table as it was built with pd.read_html and a row-wise apply.
+    """
+    variable_table = pd.read_html(io.StringIO(page))[0]
+    variable_table["Years"] = variable_table.apply(lambda row: f"{row['Begin Year']}-{row['EndYear']}", axis=1)
+    variable_table.drop(["Begin Year", "EndYear", "Component", "Use Constraints"], axis=1, inplace=True)
+    variable_table = variable_table.loc[variable_table["Years"].isin(CYCLES)]
+    return variable_table.reset_index(drop=True)
+
+
+class TestParseTable(unittest.TestCase):
+    def test_matches_read_html(self):
+        page = read_fixture()
+        expected = pd.read_html(io.StringIO(page))[0][COLUMNS].astype(str)
+        for size in [1, 7, 100, len(page)]:
+            with self.subTest(size=size):
+                table = parse_table(chunked(page, size), COLUMNS)
+                self.assertEqual(list(table.columns), COLUMNS)
+                pd.testing.assert_frame_equal(table.astype(str), expected)
+
+    def test_keeps_only_requested_columns(self):
+        table = parse_table([read_fixture()], ["EndYear", "Variable Name", "Not A Column"])
+        self.assertEqual(list(table.columns), ["EndYear", "Variable Name"])
+        self.assertEqual(len(table), 14)
+
+    def test_cell_text(self):
+        table = parse_table([read_fixture()], ["Variable Description", "Data File Description", "Use Constraints"])
+        self.assertEqual(table["Data File Description"][0], "Demographic Variables & Sample Weights")
+        self.assertEqual(table["Variable Description"][8], "HH ref person's gender")
+        self.assertNotIn("\n", table["Variable Description"][2])
+        self.assertTrue(pd.isna(table["Use Constraints"][0]))
+
+    def test_rows_with_missing_cells(self):
+        page = ("<table><tr><th>A</th><th>B</th></tr><TR><td>1</td><td>2</td></TR><tr><td>3</td></tr></table>"
+                "<table><tr><th>C</th></tr></table>")
+        table = parse_table([page], ["B", "A"])
+        self.assertEqual(table["A"].tolist(), ["1", "3"])
+        self.assertEqual(table["B"][0], "2")
+        self.assertTrue(pd.isna(table["B"][1]))
+
+    def test_no_table(self):
+        with self.assertRaises(ValueError):
+            parse_table(["<html><body><p>No results</p></body></html>"], COLUMNS)
+
+
+class TestRetrieveVariableTable(unittest.TestCase):
+    def setUp(self):
+        files = {
+            "/nchs/nhanes/search/variablelist.aspx?Component=demographics": read_fixture().encode("utf-8"),
+            "/nchs/nhanes/search/variablelist.aspx?Component=empty": b"<html><body>No tables</body></html>",
+        }
+        self.server = LocalNHANESServer(files).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.api = NHANESDataAPI(tempfile.mkdtemp(), base_url=self.server.base_url)
+
+    def test_matches_read_html(self):
+        expected = read_html_variable_table(read_fixture())
+        expected["Data File Description"] = "Demographic Variables & Sample Weights"
+
+        variable_table = self.api._retrieve_variable_table("demographics")
+        self.assertEqual(list(variable_table.columns), list(expected.columns))
+        self.assertNotIn("2017-2020", set(variable_table["Years"]))
+        pd.testing.assert_frame_equal(variable_table.astype(str), expected.astype(str))
+
+    def test_no_table_returns_none(self):
+        with self.assertLogs("nhanes_pytool_api.nhanes_data.nhanes_data_api", level="WARNING") as logs:
+            self.assertIsNone(self.api._retrieve_variable_table("empty"))
+        self.assertIn("'empty'", logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,237 @@
+import io
+import os
+import struct
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from nhanes_pytool_api.nhanes_data import xport
+from nhanes_pytool_api.nhanes_data.local_server import LocalNHANESServer
+from nhanes_pytool_api.nhanes_data.nhanes_data_api import NHANESDataAPI
+from nhanes_pytool_api.tests.helpers import make_variable_table, make_xport_bytes
+
+
+def _card(text):
+    return text.encode("ascii")
+
+
+def _namestr(ntype, length, number, name, label, position):
+    return struct.pack(">hhhh8s40s8shhh2s8shhl52s", ntype, 0, length, number, name.ljust(8).encode("ascii"),
+                       label.ljust(40).encode("ascii"), b" " * 8, 0, 0, 0, b"  ", b" " * 8, 0, 0, position, b"\x00" * 52)
+
+
+# A SAS XPORT (version 5) file written byte by byte, independently of write_xport: two numeric variables with IBM
+# floats and a 6-byte character variable, six records of 22 bytes padded with blanks to a multiple of 80 bytes
+PADDING_ROWS = [
+    ("4110000000000000", "4264000000000000", b"AB    "),  # 1.0, 100.0, blank padded
+    ("4120000000000000", "2E00000000000000", b"C\x00\x00\x00\x00\x00"),  # 2.0, missing, NUL padded
+    ("4130000000000000", "C110000000000000", b"      "),  # 3.0, -1.0, all blanks
+    ("4140000000000000", "4080000000000000", b"E F\t  "),  # 4.0, 0.5, a tab before the blanks
+    ("4150000000000000", "4040000000000000", b"G\x00    "),  # 5.0, 0.25, a NUL before the blanks
+    ("4160000000000000", "4210000000000000", b"  D   "),  # 6.0, 16.0, leading blanks
+]
+PADDING_XPT = b"".join([
+    _card("HEADER RECORD*******LIBRARY HEADER RECORD!!!!!!!000000000000000000000000000000  "),
+    _card("SAS     SAS     SASLIB  9.4     X64_10PR" + " " * 24 + "01JAN24:00:00:00"),
+    _card("01JAN24:00:00:00" + " " * 64),
+    _card("HEADER RECORD*******MEMBER  HEADER RECORD!!!!!!!000000000000000001600000000140  "),
+    _card("HEADER RECORD*******DSCRPTR HEADER RECORD!!!!!!!000000000000000000000000000000  "),
+    _card("SAS     PAD     SASDATA 9.4     X64_10PR" + " " * 24 + "01JAN24:00:00:00"),
+    _card("01JAN24:00:00:00" + " " * 16 + "Padding fixture".ljust(40) + " " * 8),
+    _card("HEADER RECORD*******NAMESTR HEADER RECORD!!!!!!!000000000300000000000000000000  "),
+    (_namestr(1, 8, 1, "SEQN", "Respondent sequence number", 0) + _namestr(1, 8, 2, "LBXVAL", "Value", 8)
+     + _namestr(2, 6, 3, "LBDCODE", "Code", 16)).ljust(480, b" "),
+    _card("HEADER RECORD*******OBS     HEADER RECORD!!!!!!!000000000000000000000000000000  "),
+    b"".join(bytes.fromhex(seqn) + bytes.fromhex(value) + code for seqn, value, code in PADDING_ROWS).ljust(160, b" "),
+])
+
+
+class TestXportFixture(unittest.TestCase):
+    def test_decode_matches_read_sas(self):
+        header = xport.read_header(io.BytesIO(PADDING_XPT), len(PADDING_XPT))
+        self.assertEqual(header["nobs"], 6)
+        self.assertEqual([field["type"] for field in header["fields"]], ["numeric", "numeric", "char"])
+        buffers = xport.allocate_buffers(xport.union_schema([header]), header["nobs"])
+        xport.decode_into(io.BytesIO(PADDING_XPT), header, buffers, 0)
+        data = pd.DataFrame(buffers)
+        pd.testing.assert_frame_equal(data, pd.read_sas(io.BytesIO(PADDING_XPT), format="xport"))
+
+        np.testing.assert_array_equal(data["LBXVAL"], [100.0, np.nan, -1.0, 0.5, 0.25, 16.0])
+        # Like pd.read_sas, trailing NULs and trailing whitespace (tabs included) are stripped, leading blanks and
+        # inner NULs are kept
+        self.assertEqual(data["LBDCODE"].tolist(), [b"AB", b"C", b"", b"E F", b"G\x00", b"  D"])
+
+    def test_chunks_match_read_sas(self):
+        header = xport.read_header(io.BytesIO(PADDING_XPT), len(PADDING_XPT))
+        source = io.BytesIO(PADDING_XPT)
+        source.seek(header["record_start"])
+        data = pd.concat(xport.iter_frames(source, header, 4), ignore_index=True)
+        pd.testing.assert_frame_equal(data, pd.read_sas(io.BytesIO(PADDING_XPT), format="xport"))
+
+
+class TestXport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        rng = np.random.default_rng(0)
+        self.frame = pd.DataFrame({
+            "SEQN": np.arange(1, 1001, dtype=float),
+            "LBXGH": rng.normal(5.5, 1.0, 1000),
+            "RIAGENDR": rng.integers(1, 3, 1000).astype(float),
+            "LBDCODE": rng.choice(["A", "BB", ""], 1000),
+        })
+        self.frame.loc[::9, "LBXGH"] = np.nan
+        self.path = self.write("GHB.XPT", self.frame)
+
+    def write(self, name, frame):
+        path = os.path.join(self.directory, name)
+        xport.write_xport(frame, path, dataset_name=name.split(".")[0])
+        return path
+
+    def test_read_header(self):
+        header = xport.read_header(self.path)
+        self.assertEqual(header["dataset"], "GHB")
+        self.assertEqual(header["nobs"], 1000)
+        self.assertEqual([field["name"] for field in header["fields"]], list(self.frame.columns))
+        self.assertEqual([field["type"] for field in header["fields"]], ["numeric", "numeric", "numeric", "char"])
+        self.assertEqual(header["record_length"], 8 * 3 + 2)
+
+    def test_parse_header_needs_complete_header(self):
+        with open(self.path, "rb") as xport_file:
+            data = xport_file.read()
+        self.assertIsNone(xport.parse_header(data[:700]))
+        self.assertIsNotNone(xport.parse_header(data[:2000]))
+        with self.assertRaises(ValueError):
+            xport.parse_header(b"<html>" + b" " * 1000)
+
+    def test_decode_matches_read_sas(self):
+        header = xport.read_header(self.path)
+        buffers = xport.allocate_buffers(xport.union_schema([header]), header["nobs"])
+        xport.decode_into(self.path, header, buffers, 0, batch_rows=64)
+        pd.testing.assert_frame_equal(pd.DataFrame(buffers), pd.read_sas(self.path, format="xport"))
+
+    def test_ibm_to_ieee_zero_and_missing(self):
+        words = np.array([0, 0x2E << 56, 0x41 << 56, 0x4110000000000000, 0xC110000000000000], dtype=">u8")
+        np.testing.assert_array_equal(xport.ibm_to_ieee(words), [0.0, np.nan, np.nan, 1.0, -1.0])
+
+    def test_ieee_to_ibm_range(self):
+        smallest, largest = 16.0 ** -65, (1 - 2.0 ** -53) * 16.0 ** 63
+        values = np.array([smallest, -smallest, largest, -largest, 1.5, np.nan, 0.0])
+        np.testing.assert_array_equal(xport.ibm_to_ieee(xport.ieee_to_ibm(values)), values)
+        np.testing.assert_array_equal(xport.ibm_to_ieee(xport.ieee_to_ibm(np.array([1e-79, -1e-300, smallest / 2]))), [0.0, 0.0, 0.0])
+        for value in [7.3e75, -1e76, np.inf]:
+            with self.assertRaises(ValueError):
+                xport.ieee_to_ibm(np.array([1.0, value]))
+
+    def test_writer_appends_chunks(self):
+        path = os.path.join(self.directory, "CHUNKS.XPT")
+        fields = [{"name": "SEQN", "type": "numeric"}, {"name": "LBXGH", "type": "numeric", "label": "Glycohemoglobin (%)"},
+                  {"name": "LBDCODE", "type": "char", "length": 2}]
+        with xport.XportWriter(path, fields, dataset_name="CHUNKS") as writer:
+            for start in range(0, 1000, 300):
+                writer.write(self.frame.iloc[start:start + 300])
+        self.assertEqual(writer.rows, 1000)
+        header = xport.read_header(path)
+        self.assertEqual((header["dataset"], header["nobs"]), ("CHUNKS", 1000))
+        self.assertEqual(header["fields"][1]["label"], "Glycohemoglobin (%)")
+        pd.testing.assert_frame_equal(pd.read_sas(path, format="xport"),
+                                      pd.read_sas(self.path, format="xport")[["SEQN", "LBXGH", "LBDCODE"]])
+
+    def test_union_schema(self):
+        other = self.write("GHB2.XPT", pd.DataFrame({"SEQN": [1.0], "LBXGH": ["n/a"], "LBXNEW": [2.0]}))
+        headers = [xport.read_header(self.path), xport.read_header(other)]
+        self.assertEqual(xport.union_schema(headers), [
+            ("SEQN", "numeric"), ("LBXGH", "char"), ("RIAGENDR", "numeric"), ("LBDCODE", "char"), ("LBXNEW", "numeric"),
+        ])
+        self.assertEqual(xport.union_schema(headers, ["LBXNEW", "SEQN", "MISSING"]), [("LBXNEW", "numeric"), ("SEQN", "numeric")])
+
+    def test_decode_into_schema_aligned_buffers(self):
+        other = self.write("GHB2.XPT", pd.DataFrame({"SEQN": [1001.0, 1002.0], "LBXNEW": [2.0, 3.0]}))
+        headers = [xport.read_header(self.path), xport.read_header(other)]
+        buffers = xport.allocate_buffers(xport.union_schema(headers), 1002)
+        xport.decode_into(self.path, headers[0], buffers, 0)
+        xport.decode_into(other, headers[1], buffers, 1000)
+
+        expected = pd.concat([pd.read_sas(self.path, format="xport"), pd.read_sas(other, format="xport")], ignore_index=True)
+        pd.testing.assert_frame_equal(pd.DataFrame(buffers), expected)
+
+    def test_fetch_header_with_range_requests(self):
+        with open(self.path, "rb") as xport_file:
+            files = {"/GHB.XPT": xport_file.read()}
+        with LocalNHANESServer(files) as server:
+            header = xport.fetch_header(f"{server.base_url}/GHB.XPT", initial_bytes=256)
+        self.assertEqual(header, xport.read_header(self.path))
+        # The 1280-byte header takes requests of 256, 1024 and 4096 bytes, then the last card counts the padded records
+        self.assertEqual(server.range_requests, [("/GHB.XPT", 0)] * 3 + [("/GHB.XPT", len(files["/GHB.XPT"]) - 80)])
+
+    def test_fetch_header_without_range_support(self):
+        wide = self.write("WIDE.XPT", pd.DataFrame({f"X{index}": np.arange(20, dtype=float) for index in range(12)}))
+        files = {}
+        for name, path in [("/GHB.XPT", self.path), ("/WIDE.XPT", wide)]:
+            with open(path, "rb") as xport_file:
+                files[name] = xport_file.read()
+        with LocalNHANESServer(files, ranges=False) as server:
+            # Records over 80 bytes need no last card, so the start of the full response is enough
+            self.assertEqual(xport.fetch_header(f"{server.base_url}/WIDE.XPT"), xport.read_header(wide))
+            # The last card would take the whole response
+            self.assertIsNone(xport.fetch_header(f"{server.base_url}/GHB.XPT"))
+        with LocalNHANESServer(files, content_length=False) as server:
+            self.assertEqual(xport.fetch_header(f"{server.base_url}/WIDE.XPT"), xport.read_header(wide))
+        with LocalNHANESServer(files, ranges=False, content_length=False) as server:
+            self.assertIsNone(xport.fetch_header(f"{server.base_url}/WIDE.XPT"))
+
+
+class TestProbeDataFile(unittest.TestCase):
+    def setUp(self):
+        self.frames = {
+            "2005-2006": pd.DataFrame({"SEQN": [1.0, 2.0, 3.0], "BMXWT": [60.0, 70.0, 80.0], "BMXHT": [150.0, 160.0, 170.0]}),
+            "2007-2008": pd.DataFrame({"SEQN": [4.0, 5.0], "BMXWT": [65.0, 75.0], "BMXLEG": [40.0, 41.0]}),
+        }
+        suffixes = {"2005-2006": "D", "2007-2008": "E"}
+        files = {f"/Nchs/Nhanes/{cycle}/BMX_{suffixes[cycle]}.XPT": make_xport_bytes(frame) for cycle, frame in self.frames.items()}
+        rows = [(name, f"BMX_{suffixes[cycle]}", "Body Measures", cycle) for cycle, frame in self.frames.items() for name in frame.columns]
+        # BMXHT is listed for 2007-2008 too, but in another data file of the category
+        rows.append(("BMXHT", "BMXEXT_E", "Body Measures Extension", "2007-2008"))
+        patcher = mock.patch.object(NHANESDataAPI, "_retrieve_variable_table", return_value=make_variable_table(rows))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.server = LocalNHANESServer(files).__enter__()
+        self.addCleanup(self.server.__exit__)
+        self.directory = tempfile.mkdtemp()
+        self.api = NHANESDataAPI(self.directory, base_url=self.server.base_url)
+
+    def test_probe_reads_only_the_header(self):
+        info = self.api.describe_data_files("examination", "2005-2008", "Body Measures")
+        self.assertEqual(info["Data File Name"].tolist(), ["BMX_D", "BMX_E"])
+        self.assertEqual(info["Observations"].tolist(), [3, 2])
+        self.assertEqual(info["Variables"].tolist(), [3, 3])
+        self.assertEqual(len(self.server.requests), len(self.server.range_requests))
+        self.assertFalse(os.path.exists(os.path.join(self.directory, "2005-2006", "BMX_D.XPT")))
+
+        # Probed headers are stored in the catalog of the data directory
+        requests = len(self.server.requests)
+        header = NHANESDataAPI(self.directory, base_url=self.server.base_url).probe_data_file("2007-2008", "BMX_E")
+        self.assertEqual([field["name"] for field in header["fields"]], ["SEQN", "BMXWT", "BMXLEG"])
+        self.assertEqual(len(self.server.requests), requests)
+
+    def test_probe_downloads_when_the_server_reports_no_size(self):
+        self.server.ranges = self.server.content_length = False
+        header = self.api.probe_data_file("2005-2006", "BMX_D")
+        self.assertEqual(header["nobs"], 3)
+        self.assertEqual([field["name"] for field in header["fields"]], ["SEQN", "BMXWT", "BMXHT"])
+        self.assertTrue(self.api._cache.is_cached("2005-2006", "BMX_D"))
+
+    def test_common_variables_of_the_data_files(self):
+        common, uncommon, _ = self.api.get_common_and_uncommon_variables("examination", "2005-2008", "Body Measures")
+        self.assertEqual(sorted(common), ["BMXWT", "SEQN"])
+        self.assertEqual(sorted(uncommon), ["BMXHT", "BMXLEG"])
+
+        data = self.api.retrieve_data("examination", "2005-2008", "Body Measures", include_uncommon_variables=False)
+        self.assertEqual(list(data.columns), ["SEQN", "BMXWT", "year"])
+        self.assertEqual(data["SEQN"].tolist(), [1.0, 2.0, 3.0, 4.0, 5.0])
+
+
+if __name__ == '__main__':
+    unittest.main()